@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Compare the B2B dashboard aggregation backends (pandas x SQL x cube) for equality and time.
+
+Uso:
+    python benchmark_b2b_aggregation.py               # 10k e 100k itens
+    python benchmark_b2b_aggregation.py 5000 50000    # tamanhos personalizados
+
+O banco é criado em um diretório temporário (mesmos dados sintéticos de
+benchmark_sales_dataframe.py); nenhum dado real é tocado.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+from src.db import init_engine, Base
+from src.b2b.dashboard_cache import DashboardCache
+from src.b2b.sales_analyzer import SalesAnalyzer
+from src.b2b.sales_repository import SalesRepository
+from src.services.exchange_rate_service import ExchangeRateService, RateTimelineCache
+from src.services.sales_cube_service import SalesCubeService
+from benchmark_sales_dataframe import DEFAULT_SIZES, seed
+
+BACKENDS = ('pandas', 'sql', 'cube')
+
+
+def run(sizes=DEFAULT_SIZES) -> None:
+    for size in sizes:
+        # Cache de câmbio próprio: cada tamanho usa um banco novo
+        exchange_rate_service = ExchangeRateService(rate_cache=RateTimelineCache())
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = init_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            Base.metadata.create_all(engine)
+            seed(size)
+
+            for currency in ('BRL', 'PYG'):
+                repository = SalesRepository(exchange_rate_service=exchange_rate_service, target_currency=currency)
+                analyzer = SalesAnalyzer(
+                    repository,
+                    target_currency=currency,
+                    dashboard_cache=DashboardCache(max_entries=0),
+                    sales_cube=SalesCubeService(exchange_rate_service),
+                )
+                with contextlib.redirect_stdout(io.StringIO()):
+                    analyzer.sales_cube.ensure_current()  # construção do cubo fora da medição
+                    report = analyzer.compare_aggregation_backends(backends=BACKENDS)
+
+                groups = len(repository.fetch_client_aggregates()) + len(repository.fetch_country_aggregates())
+                timings = ' | '.join(f"{name} {report['timings_ms'][name]:8.1f} ms" for name in BACKENDS)
+                status = '✅ iguais' if report['equal'] else f"❌ divergem: {', '.join(report['mismatches'])}"
+                print(f"📊 {size:>7} itens {currency} | {timings} | {groups} grupos SQL | {status}")
+                assert report['equal'], report['mismatches']
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    run(tuple(int(arg) for arg in sys.argv[1:]) or DEFAULT_SIZES)
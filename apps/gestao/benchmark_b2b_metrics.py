@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Regression check + benchmark for the vectorized B2BMetrics client metrics.
+
+Compara ``calculate_inactive_clients`` e ``calculate_top_clients`` com a
+implementação linha a linha anterior (iterrows + filtro por cliente) sobre vendas
+sintéticas, falhando se qualquer saída divergir, e mede os dois tempos.
+
+Uso:
+    python benchmark_b2b_metrics.py              # 5k clientes
+    python benchmark_b2b_metrics.py 1000 20000   # tamanhos personalizados
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from src.b2b.b2b_metrics import B2BMetrics
+
+DEFAULT_SIZES = (5_000,)
+SALES_PER_CLIENT = 8
+
+
+def build_sales(client_count: int, seed_value: int = 42) -> List[Dict[str, Any]]:
+    """Vendas dos últimos ~2 anos, com nomes em caixa/espaços variados."""
+    rng = random.Random(seed_value)
+    today = datetime.now()
+    sales = []
+    for client in range(client_count):
+        name = f'cliente {client:05d}'
+        # Último contato espalhado em ~120 dias para cobrir as três faixas de risco
+        last_gap = rng.randint(0, 120)
+        for _ in range(rng.randint(1, SALES_PER_CLIENT * 2)):
+            sales.append({
+                'cliente': rng.choice([name, name.upper(), f'  {name} ']),
+                'data': (today - timedelta(days=last_gap + rng.randint(0, 700))).strftime('%Y-%m-%d'),
+                'valor': round(rng.uniform(50, 5000), 2),
+                'quantidade': float(rng.randint(1, 30)),
+            })
+    return sales
+
+
+# -------------------------------------------------------------------------
+# Implementação anterior (referência)
+# -------------------------------------------------------------------------
+
+def _reference_risk(days: int) -> str:
+    if days >= 60:
+        return 'Alto'
+    if days >= 45:
+        return 'Médio'
+    return 'Baixo'
+
+
+def reference_inactive_clients(sales: List[Dict[str, Any]], reference: datetime) -> Dict[str, Any]:
+    df = pd.DataFrame(sales)
+    df['data'] = pd.to_datetime(df['data'])
+    df['cliente'] = df['cliente'].str.strip().str.title()
+    cutoff_date = reference.replace(day=1).date()
+
+    last_purchase = df.groupby('cliente')['data'].max().reset_index()
+    last_purchase.columns = ['cliente', 'ultima_compra']
+    inactive = last_purchase[last_purchase['ultima_compra'].dt.date < cutoff_date]
+    client_totals = df.groupby('cliente')['valor'].agg(['sum', 'count']).reset_index()
+    client_totals.columns = ['cliente', 'valor_total_historico', 'numero_compras']
+
+    result = []
+    for _, row in inactive.iterrows():
+        client_total = client_totals[client_totals['cliente'] == row['cliente']]
+        dias = (reference.date() - row['ultima_compra'].date()).days
+        result.append({
+            'cliente': row['cliente'],
+            'ultima_compra': row['ultima_compra'].strftime('%Y-%m-%d'),
+            'dias_sem_comprar': dias,
+            'valor_total_historico': float(client_total['valor_total_historico'].iloc[0]),
+            'numero_compras': int(client_total['numero_compras'].iloc[0]),
+            'risco_churn': _reference_risk(dias),
+        })
+    return {'inactive_clients': result, 'total_inactive': len(result), 'total_clients': len(last_purchase)}
+
+
+def reference_top_clients(sales: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+    df = pd.DataFrame(sales)
+    df['data'] = pd.to_datetime(df['data'])
+    df['cliente'] = df['cliente'].str.strip().str.title()
+    metrics = df.groupby('cliente').agg({'valor': ['sum', 'count', 'mean'], 'data': 'max'}).reset_index()
+    metrics.columns = ['cliente', 'receita_total', 'numero_compras', 'ticket_medio', 'ultima_compra']
+    top = metrics.sort_values('receita_total', ascending=False).head(top_n)
+    return [
+        {
+            'cliente': row['cliente'],
+            'receita_total': float(row['receita_total']),
+            'numero_compras': int(row['numero_compras']),
+            'ticket_medio': float(row['ticket_medio']),
+            'ultima_compra': row['ultima_compra'].strftime('%Y-%m-%d'),
+        }
+        for _, row in top.iterrows()
+    ]
+
+
+def run(sizes=DEFAULT_SIZES) -> None:
+    metrics = B2BMetrics()
+    reference = datetime.now()
+
+    for size in sizes:
+        sales = build_sales(size)
+
+        started = time.perf_counter()
+        expected_inactive = reference_inactive_clients(sales, reference)
+        expected_top = reference_top_clients(sales, top_n=size)
+        reference_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            inactive = metrics.calculate_inactive_clients(sales, days_threshold=60, reference_date=reference)
+        top = metrics.calculate_top_clients(sales, top_n=size)
+        vectorized_seconds = time.perf_counter() - started
+
+        for key in ('inactive_clients', 'total_inactive', 'total_clients'):
+            assert inactive[key] == expected_inactive[key], f'{key} divergente para {size} clientes'
+        assert top == expected_top, f'top clientes divergente para {size} clientes'
+        risk_total = inactive['high_risk_count'] + inactive['medium_risk_count'] + inactive['low_risk_count']
+        assert risk_total == inactive['total_inactive']
+
+        print(
+            f"📊 {size:>6} clientes ({len(sales)} vendas, {inactive['total_inactive']} inativos) | "
+            f"linha a linha {reference_seconds * 1000:9.1f} ms | "
+            f"vetorizado {vectorized_seconds * 1000:8.1f} ms | "
+            f"{reference_seconds / vectorized_seconds:5.1f}x ✅ saída idêntica"
+        )
+
+
+if __name__ == '__main__':
+    run(tuple(int(arg) for arg in sys.argv[1:]) or DEFAULT_SIZES)
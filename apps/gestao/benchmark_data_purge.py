@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Benchmark for the order/lead reset used before a full sheet re-import.
+
+Popula um SQLite temporário com leads, interações, pedidos, itens e comissões e
+compara a limpeza antiga (``count()`` + ``delete()`` em ``orders`` e ``crm_leads``,
+que no SQLite sem ``PRAGMA foreign_keys`` deixa itens, comissões e interações
+órfãos) com ``reset_orders_and_leads`` (filhos primeiro, uma transação).
+
+Uso:
+    python benchmark_data_purge.py           # 20k pedidos
+    python benchmark_data_purge.py 100000    # tamanho personalizado
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+from sqlalchemy import func, insert, select
+
+from src import db
+from src.models import Base, Commission, CRMInteraction, CRMLead, CRMUser, Order, OrderItem
+from src.services.data_purge import reset_orders_and_leads
+
+DEFAULT_SIZE = 20_000
+CHILD_TABLES = (OrderItem, Commission, CRMInteraction)
+
+
+def seed(size: int) -> None:
+    now = datetime.now()
+    today = date.today()
+    with db.session_scope() as session:
+        if session.get(CRMUser, 1) is None:
+            session.execute(insert(CRMUser.__table__).values(
+                id=1, username='bench', password_hash='x',
+            ))
+        session.execute(insert(CRMLead.__table__), [{'id': i, 'name': f"Lead {i}"} for i in range(1, size + 1)])
+        session.execute(insert(CRMInteraction.__table__), [
+            {'lead_id': i, 'interaction_type': 'note', 'interaction_at': now} for i in range(1, size + 1)
+        ])
+        session.execute(insert(Order.__table__), [
+            {'id': i, 'lead_id': i, 'user_id': 1, 'order_date': today, 'total_amount': 10} for i in range(1, size + 1)
+        ])
+        session.execute(insert(OrderItem.__table__), [
+            {'order_id': i, 'description': 'Café', 'quantity': 1, 'unit_price': 10, 'line_total': 10}
+            for i in range(1, size + 1)
+        ])
+        session.execute(insert(Commission.__table__), [
+            {'order_id': i, 'user_id': 1, 'amount': 1, 'amount_brl': 1, 'rate_applied': 0.1, 'status': 'pending'}
+            for i in range(1, size + 1)
+        ])
+
+
+def orphans() -> int:
+    with db.session_scope() as session:
+        return sum(session.execute(select(func.count()).select_from(model)).scalar() for model in CHILD_TABLES)
+
+
+def legacy_reset() -> None:
+    with db.session_scope() as session:
+        session.query(Order).count()
+        session.query(Order).delete()
+    with db.session_scope() as session:
+        session.query(CRMLead).count()
+        session.query(CRMLead).delete()
+
+
+def run(size: int = DEFAULT_SIZE) -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        db.init_engine(f"sqlite:///{os.path.join(folder, 'purge.db')}")
+        Base.metadata.create_all(db.get_engine())
+        print(f"🗑️ {size} pedidos/leads (+ itens, comissões e interações)")
+
+        seed(size)
+        started = time.perf_counter()
+        legacy_reset()
+        legacy_seconds = time.perf_counter() - started
+        left = orphans()
+        print(f"   antigo: {legacy_seconds * 1000:8.1f} ms | {left} linhas filhas órfãs")
+
+        with db.session_scope() as session:
+            for model in CHILD_TABLES:
+                session.query(model).delete()
+        seed(size)
+        with db.session_scope() as session:
+            report = reset_orders_and_leads(session)
+        print(f"   novo:   {report.seconds * 1000:8.1f} ms | {orphans()} órfãs | {report.summary()}")
+        for step, seconds in report.timings.items():
+            print(f"      {step:<24} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SIZE)
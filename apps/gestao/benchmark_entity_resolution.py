@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Benchmark + quality check for lead entity resolution (blocking + Jaro-Winkler).
+
+Gera nomes sintéticos de cafeterias (palavras inventadas + termos genéricos) e
+duplica ~10% deles com variações reais de cadastro: sem acento, erro de digitação,
+"Ltda"/"ME", ordem trocada, prefixo "Café", grafia fonética ou só o mesmo
+telefone/Instagram. Mede a construção do ``EntityIndex``, o custo por ``lookup``,
+o lote ``find_duplicates`` e a comparação de todos os pares numa amostra, e
+reporta precisão/recall contra as duplicatas geradas (palavras inventadas curtas
+se repetem por acaso, então parte dos "falsos positivos" são nomes idênticos).
+Antes disso, casos de regressão: filiais numeradas ("Cafeteria São João 1", "... 2")
+com telefones diferentes não podem virar uma proposta de mesclagem.
+
+Uso:
+    python benchmark_entity_resolution.py           # 50k nomes
+    python benchmark_entity_resolution.py 10000     # tamanho personalizado
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+from typing import Dict, List, Set, Tuple
+
+from src.b2b.entity_resolution import (
+    MATCH_THRESHOLD, EntityIndex, EntityRecord, compare_records, find_duplicates,
+)
+
+DEFAULT_SIZE = 50_000
+DUPLICATE_RATE = 0.10
+ALL_PAIRS_SAMPLE = 2_000
+SYLLABLES = [
+    'ba', 'be', 'bo', 'ca', 'co', 'da', 'de', 'di', 'fa', 'fe', 'ga', 'go', 'la', 'le', 'li',
+    'lu', 'ma', 'me', 'mi', 'mo', 'na', 'ne', 'no', 'pa', 'pe', 'pi', 'ra', 're', 'ri', 'ro',
+    'sa', 'se', 'si', 'ta', 'te', 'ti', 'to', 'va', 've', 'vi', 'za', 'ju', 'xa', 'nha', 'lha',
+]
+PREFIXES = ['Café', 'Cafeteria', 'Padaria', 'Empório', 'Bistrô', '']
+CITIES = ['Curitiba', 'São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'Porto Alegre', 'Florianópolis']
+ACCENTS = str.maketrans('áéíóúãõâêôç', 'aeiouaoaeoc')
+
+
+def make_word(rng: random.Random) -> str:
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def make_variant(rng: random.Random, name: str) -> str:
+    kind = rng.randrange(6)
+    if kind == 0:
+        return name.lower().translate(ACCENTS)
+    if kind == 1:
+        words = name.split()
+        target = max(range(len(words)), key=lambda i: len(words[i]))
+        word = words[target]
+        position = rng.randrange(1, len(word))
+        words[target] = word[:position] + word[position + 1:]  # letra faltando
+        return ' '.join(words)
+    if kind == 2:
+        return f"{name} {rng.choice(['Ltda', 'ME', 'EIRELI'])}"
+    if kind == 3:
+        return ' '.join(reversed(name.split()))
+    if kind == 4:
+        return f"Café {name}" if not name.startswith('Café') else name[5:]
+    return name.replace('c', 'k').replace('ss', 's').replace('ph', 'f').upper()
+
+
+def build_records(size: int, seed_value: int = 7) -> Tuple[List[EntityRecord], Set[Tuple[int, int]]]:
+    rng = random.Random(seed_value)
+    originals = int(size / (1 + DUPLICATE_RATE))
+    records: List[EntityRecord] = []
+    raw: List[Dict] = []
+    for record_id in range(originals):
+        words = [make_word(rng) for _ in range(rng.choice([1, 2, 2, 3]))]
+        row = {
+            'name': ' '.join(filter(None, [rng.choice(PREFIXES), *words])),
+            'city': rng.choice(CITIES),
+            'phone': f"(41) 3{rng.randrange(10 ** 7):07d}" if rng.random() < 0.5 else None,
+            'instagram': f"@{words[0].lower()}{record_id}" if rng.random() < 0.3 else None,
+        }
+        raw.append(row)
+        records.append(EntityRecord.build(record_id, **row))
+
+    truth: Set[Tuple[int, int]] = set()
+    for record_id in range(originals, size):
+        source_id = rng.randrange(originals)
+        source = raw[source_id]
+        if rng.random() < 0.15 and (source['phone'] or source['instagram']):
+            # Mesmo negócio cadastrado com outro nome: só o contato liga os dois
+            row = {**source, 'name': f"{make_word(rng)} {make_word(rng)}"}
+        else:
+            row = {
+                'name': make_variant(rng, source['name']),
+                'city': source['city'] if rng.random() < 0.8 else None,
+                'phone': source['phone'] if rng.random() < 0.3 else None,
+                'instagram': None,
+            }
+        records.append(EntityRecord.build(record_id, **row))
+        truth.add((source_id, record_id))
+    return records, truth
+
+
+def proposal_pairs(proposals) -> Set[Tuple[int, int]]:
+    pairs = set()
+    for proposal in proposals:
+        ids = [proposal['keep_id'], *proposal['merge_ids']]
+        for i, first in enumerate(ids):
+            for second in ids[i + 1:]:
+                pairs.add((min(first, second), max(first, second)))
+    return pairs
+
+
+def check_numbered_branches(branches: int = 14) -> None:
+    """Regression: numbered branches and records with conflicting phones are never merged."""
+    with_phones = [
+        EntityRecord.build(i, f"Cafeteria São João {i}", 'Curitiba', phone=f"(41) 3333-{1000 + i}")
+        for i in range(branches)
+    ]
+    without_phones = [EntityRecord.build(i, f"Cafeteria São João {i}", 'Curitiba') for i in range(branches)]
+    assert find_duplicates(with_phones) == [], 'filiais numeradas com telefones diferentes mescladas'
+    assert find_duplicates(without_phones) == [], 'filiais numeradas mescladas pelo nome'
+
+    matriz = EntityRecord.build(1, 'Café Aroma', 'Curitiba', phone='(41) 3333-1111')
+    filial = EntityRecord.build(2, 'Café Aroma 2', 'Curitiba')
+    outro_telefone = EntityRecord.build(3, 'Cafe Arôma Ltda', 'Curitiba', phone='(41) 3333-2222')
+    mesmo_nome = EntityRecord.build(4, 'Cafe Arôma Ltda', 'Curitiba')
+    for other in (filial, outro_telefone):
+        match = compare_records(matriz, other)
+        assert match is None or match.score < MATCH_THRESHOLD, f"{other.name!r} casado automaticamente"
+    assert compare_records(matriz, mesmo_nome).score >= MATCH_THRESHOLD, 'variação do mesmo nome não casou'
+    print(f"✅ regressão: {branches} filiais numeradas e telefones em conflito não são mesclados")
+
+
+def run(size: int = DEFAULT_SIZE) -> None:
+    check_numbered_branches()
+
+    records, truth = build_records(size)
+    print(f"🔎 {len(records)} nomes, {len(truth)} duplicatas geradas (limiar {MATCH_THRESHOLD})")
+
+    started = time.perf_counter()
+    index = EntityIndex().add_many(records[:len(records) - len(truth)])
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    found = 0
+    for record in records[len(records) - len(truth):]:
+        if index.lookup(record) is not None:
+            found += 1
+    lookup_seconds = time.perf_counter() - started
+    print(
+        f"   índice: {build_seconds:6.2f}s para {len(index)} registros | "
+        f"lookup {lookup_seconds / len(truth) * 1e6:7.1f} µs/registro ({found}/{len(truth)} casados)"
+    )
+
+    started = time.perf_counter()
+    proposals = find_duplicates(records)
+    batch_seconds = time.perf_counter() - started
+    predicted = proposal_pairs(proposals)
+    # Duplicatas do mesmo original também são pares verdadeiros entre si
+    clusters: Dict[int, Set[int]] = {}
+    for source_id, record_id in truth:
+        clusters.setdefault(source_id, {source_id}).add(record_id)
+    expected = proposal_pairs([{'keep_id': min(ids), 'merge_ids': sorted(ids)[1:]} for ids in clusters.values()])
+    true_positives = len(predicted & expected)
+    precision = true_positives / len(predicted) if predicted else 1.0
+    recall = true_positives / len(expected) if expected else 1.0
+    print(
+        f"   lote:   {batch_seconds:6.2f}s, {len(proposals)} propostas | "
+        f"precisão {precision:.3f} recall {recall:.3f}"
+    )
+
+    sample = records[:ALL_PAIRS_SAMPLE]
+    started = time.perf_counter()
+    for i, record in enumerate(sample):
+        for other in sample[:i]:
+            compare_records(record, other)
+    sample_seconds = time.perf_counter() - started
+    estimated = sample_seconds * (len(records) / len(sample)) ** 2
+    print(
+        f"   todos os pares: {sample_seconds:6.2f}s para {len(sample)} nomes "
+        f"(~{estimated / 60:.0f} min estimados para {len(records)}; blocking {estimated / batch_seconds:.0f}x)"
+    )
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SIZE)
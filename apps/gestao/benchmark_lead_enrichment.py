@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Time batch lead enrichment against a local HTTP stub (no Google, no real sites).
+
+Uso:
+    python benchmark_lead_enrichment.py            # 100 leads, 200ms por requisição
+    python benchmark_lead_enrichment.py 50 0.5     # quantidade e latência personalizadas
+
+``EnrichmentStub`` sobe um ``ThreadingHTTPServer`` em 127.0.0.1 que imita a página do
+Google Business Profile (``/maps/place``) e os sites dos leads (``/site/<n>``), e
+``StubMapsClient`` imita o Place Details. Cada lead recebe um host próprio
+(um IP de loopback ``127.0.0.x`` diferente), então o limite por host só segura as requisições ao "Google".
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from src.b2b.lead_enrichment import HOST_LIMITS, HostLimiter, LeadEnrichmentService
+
+DEFAULT_LEADS = 100
+DEFAULT_LATENCY = 0.2
+
+
+class EnrichmentStub:
+    """Local HTTP server with Google Business Profile and website pages."""
+
+    def __init__(self, latency: float = DEFAULT_LATENCY):
+        self.latency = latency
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa: N802
+                stub.requests += 1
+                time.sleep(stub.latency)
+                url = urlparse(self.path)
+                if url.path == '/maps/place':
+                    number = parse_qs(url.query).get('q', [''])[0].rsplit('-', 1)[-1]
+                    # Metade dos perfis já traz o Instagram
+                    body = (
+                        f'"sameAs":["https://instagram.com/perfil{number}"]'
+                        if number[-1:] in '02468' else '<html>sem redes</html>'
+                    )
+                else:
+                    number = url.path.rsplit('/', 1)[-1]
+                    body = f'<a href="https://wa.me/5541999{number.zfill(6)}">WhatsApp</a>'
+                payload = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('0.0.0.0', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def gbp_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/maps/place?q=place_id:{{place_id}}"
+
+    def site_url(self, number: int) -> str:
+        # Toda a faixa 127.0.0.0/8 é loopback: um host distinto por lead
+        return f"http://127.0.{number // 250}.{number % 250 + 2}:{self.port}/site/{number}"
+
+    def __enter__(self) -> 'EnrichmentStub':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubMapsClient:
+    """Place Details fake with the same latency as the HTTP stub."""
+
+    DETAILS_URL = 'maps.googleapis.com'
+
+    def __init__(self, stub: EnrichmentStub):
+        self.stub = stub
+
+    def get_place_details(self, place_id: str):
+        time.sleep(self.stub.latency)
+        number = int(place_id.rsplit('-', 1)[-1])
+        return {'status': 'OK', 'result': {
+            'formatted_phone_number': f'(41) 3333-{number:04d}',
+            'website': self.stub.site_url(number),
+        }}
+
+
+def make_leads(count: int):
+    return [{'name': f'Cafeteria {i}', 'city': 'Curitiba', 'place_id': f'place-{i}'} for i in range(count)]
+
+
+def run(count: int = DEFAULT_LEADS, latency: float = DEFAULT_LATENCY) -> None:
+    leads = make_leads(count)
+    with EnrichmentStub(latency) as stub:
+        client = StubMapsClient(stub)
+        print(f"{count} leads, {latency * 1000:.0f}ms por requisição (3 etapas por lead)")
+        for label, workers in (('pool', 16), ('serial', 1)):
+            # O stub do "Google" recebe os mesmos limites de www.google.com
+            limiter = HostLimiter(overrides={**HOST_LIMITS, '127.0.0.1': HOST_LIMITS['www.google.com']})
+            service = LeadEnrichmentService(host_limiter=limiter, gbp_url=stub.gbp_url)
+            stub.requests = 0
+            start = time.perf_counter()
+            enriched = service.enrich_batch(leads, google_maps_client=client, max_workers=workers)
+            elapsed = time.perf_counter() - start
+            with_whatsapp = sum(1 for lead in enriched if lead.get('whatsapp'))
+            with_instagram = sum(1 for lead in enriched if lead.get('instagram'))
+            print(
+                f"{label:>7}: {elapsed:6.2f}s  requisições HTTP={stub.requests} "
+                f"whatsapp={with_whatsapp} instagram={with_instagram}"
+            )
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    run(int(args[0]) if args else DEFAULT_LEADS, float(args[1]) if len(args) > 1 else DEFAULT_LATENCY)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Benchmark SalesRepository.fetch_sales_dataframe on a synthetic SQLite database.
+
+Uso:
+    python benchmark_sales_dataframe.py               # 10k e 100k itens
+    python benchmark_sales_dataframe.py 5000 50000    # tamanhos personalizados
+
+O banco é criado em um diretório temporário; nenhum dado real é tocado. Depois de uma
+chamada de aquecimento, cada rodada mede no mesmo estado a carga SQL
+(``_fetch_raw_rows``), a transformação vetorizada (``_build_sales_frame``) e a
+transformação antiga (dicts por linha + quatro ``apply``) sobre as mesmas linhas, e
+confere que as duas transformações produzem as mesmas colunas.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+
+from src.db import init_engine, Base, session_scope
+from src.models import CRMLead, CoffeeProduct, ExchangeRate, Order, OrderItem
+from src.b2b.sales_repository import SalesRepository
+from src.services.exchange_rate_service import ExchangeRateService
+
+DEFAULT_SIZES = (10_000, 100_000)
+ITEMS_PER_ORDER = 3
+ROUNDS = 3
+# Bugs da versão antiga corrigidos na vetorizada: lead sem país e pedido sem origem
+# viravam "nan" na observação (o DataFrame troca None por NaN antes do apply)
+LEGACY_NAN_FIXES = ((' - nan', ' - Brasil'), (' | Origem: nan', ''))
+COMPARED_COLUMNS = ('client_id', 'cliente', 'product', 'observacoes', 'pais', 'moeda', 'data', 'quantidade', 'valor')
+
+
+def seed(item_count: int, seed_value: int = 42) -> None:
+    """Insert leads, products, orders (BRL/PYG) and daily PYG->BRL rates."""
+    rng = random.Random(seed_value)
+    start = date.today() - timedelta(days=730)
+    order_count = max(1, item_count // ITEMS_PER_ORDER)
+
+    with session_scope() as session:
+        session.execute(insert(CoffeeProduct), [{'name': f'Café {i}'} for i in range(20)])
+        session.execute(insert(CRMLead), [
+            {'name': f'Cliente {i}', 'city': 'Curitiba', 'country': rng.choice(['Brasil', 'Paraguai'])}
+            for i in range(max(10, order_count // 10))
+        ])
+        session.execute(insert(ExchangeRate), [
+            {'from_currency': 'PYG', 'to_currency': 'BRL', 'rate': 0.0007 + rng.random() * 0.0001,
+             'effective_date': start + timedelta(days=day)}
+            for day in range(0, 731, 7)
+        ])
+        lead_total = max(10, order_count // 10)
+        session.execute(insert(Order), [
+            {
+                'id': order_id,
+                'lead_id': rng.randint(1, lead_total) if rng.random() > 0.1 else None,
+                'client_id': rng.randint(1, 50) if rng.random() > 0.5 else None,
+                'order_date': start + timedelta(days=rng.randint(0, 730)),
+                'currency': rng.choice(['BRL', 'BRL', 'PYG']),
+                'source': rng.choice([None, 'manual', 'sheet']),
+            }
+            for order_id in range(1, order_count + 1)
+        ])
+        session.execute(insert(OrderItem), [
+            {
+                'order_id': (index // ITEMS_PER_ORDER) + 1,
+                'coffee_id': rng.randint(1, 20) if rng.random() > 0.2 else None,
+                'description': 'Item avulso',
+                'quantity': qty,
+                'unit_price': price,
+                'line_total': qty * price,
+            }
+            for index in range(order_count * ITEMS_PER_ORDER)
+            for qty, price in [(rng.randint(1, 20), rng.choice([35.0, 42.0, 120000.0]))]
+        ])
+
+
+def legacy_sales_frame(repository: SalesRepository, raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Transformação anterior à vetorização: um dict por linha e ``apply`` linha a linha.
+
+    Única mudança: o nome do cliente é resolvido antes de ``client_id`` virar 'L12'/'C3'
+    (na ordem original ``int('L12')`` quebrava para leads sem nome). ``raw`` deve ter
+    None nos nulos, como os dicts de ``record._mapping`` que o código antigo montava.
+    """
+    target = repository._target_currency
+    rates = repository._exchange_rate_service
+
+    rows: List[Dict] = []
+    for record in raw.itertuples(index=False):
+        row = record._asdict()
+        if row.get('value') is None:
+            row['value'] = float(row.get('quantity') or 0) * float(row.get('unit_price') or 0)
+        rows.append(row)
+
+    def resolve_client_id(row: pd.Series) -> str:
+        if pd.notna(row.get('lead_id')):
+            return f"L{int(row['lead_id'])}"
+        if pd.notna(row.get('client_id')):
+            return f"C{int(row['client_id'])}"
+        return 'desconhecido'
+
+    def resolve_client_name(row: pd.Series) -> str:
+        lead_name = row.get('lead_name')
+        if isinstance(lead_name, str) and lead_name.strip():
+            return lead_name.strip()
+        if pd.notna(row.get('client_id')):
+            return f"Cliente #{int(row['client_id'])}"
+        return 'Cliente não identificado'
+
+    def build_observation(row: pd.Series) -> str:
+        order_date: datetime = row['date']
+        parts = [f"Venda {order_date.strftime('%m/%Y')} - {row.get('lead_country') or 'Brasil'}"]
+        if row.get('order_source'):
+            parts.append(f"Origem: {row['order_source']}")
+        return ' | '.join(parts)
+
+    def convert(row: pd.Series) -> float:
+        value = float(row.get('value') or 0)
+        currency = str(row.get('currency') or 'BRL').upper().strip()
+        if currency == target or not rates:
+            return value
+        converted = rates.convert(value, currency, target, row['date'].date())
+        return float(converted) if converted is not None else value
+
+    frame = pd.DataFrame(rows)
+    frame['date'] = pd.to_datetime(frame['date'])
+    frame['value'] = frame['value'].astype(float)
+    frame['quantity'] = frame['quantity'].astype(float)
+    frame['cliente'] = frame.apply(resolve_client_name, axis=1)
+    frame['client_id'] = frame.apply(resolve_client_id, axis=1)
+    frame['product'] = frame['coffee_name'].fillna(frame['item_description']).fillna('Produto não informado')
+    frame['observacoes'] = frame.apply(build_observation, axis=1)
+    frame['data'] = frame['date']
+    frame['quantidade'] = frame['quantity']
+    frame['pais'] = frame['lead_country'].fillna('Brasil')
+    frame['moeda'] = frame['currency'].fillna('BRL')
+    frame['valor'] = frame.apply(convert, axis=1)
+    return frame
+
+
+def mismatched_columns(old: pd.DataFrame, new: pd.DataFrame) -> Dict[str, int]:
+    """Rows that differ per compared column (``valor``/``quantidade`` with float tolerance)."""
+    observations = old['observacoes']
+    for legacy, fixed in LEGACY_NAN_FIXES:
+        observations = observations.str.replace(legacy, fixed, regex=False)
+    old = old.assign(observacoes=observations)
+    differences = {}
+    for column in COMPARED_COLUMNS:
+        if column in ('valor', 'quantidade'):
+            equal = np.isclose(old[column].to_numpy(float), new[column].to_numpy(float), rtol=1e-9, equal_nan=True)
+        else:
+            equal = old[column].reset_index(drop=True).eq(new[column].reset_index(drop=True)).to_numpy()
+        if not equal.all():
+            differences[column] = int((~equal).sum())
+    return differences
+
+
+def best_of(rounds: int, step: Callable[[], object]) -> Tuple[float, object]:
+    best, result = float('inf'), None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = step()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run(sizes=DEFAULT_SIZES) -> None:
+    repository = SalesRepository(exchange_rate_service=ExchangeRateService())
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = init_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            Base.metadata.create_all(engine)
+            seed(size)
+            repository.fetch_sales_dataframe()  # aquecimento: cache de páginas e de câmbio
+
+            load_seconds, raw = best_of(ROUNDS, lambda: repository._fetch_raw_rows(start_date=None, end_date=None))
+            new_seconds, new = best_of(ROUNDS, lambda: repository._build_sales_frame(raw.copy()))
+            legacy_raw = raw.astype(object).where(raw.notna(), None)
+            old_seconds, old = best_of(ROUNDS, lambda: legacy_sales_frame(repository, legacy_raw))
+
+            print(
+                f"📊 {len(new):>7} itens | carga SQL {load_seconds * 1000:8.1f} ms | "
+                f"transformação nova {new_seconds * 1000:8.1f} ms | "
+                f"antiga {old_seconds * 1000:8.1f} ms ({old_seconds / new_seconds:5.1f}x)"
+            )
+            differences = mismatched_columns(old, new)
+            assert not differences, f"saídas diferentes entre as implementações: {differences}"
+            legacy_nan = int(old['observacoes'].str.contains('nan', regex=False).sum())
+            print(f"   saídas iguais nas colunas comparadas ({legacy_nan} observações com 'nan' na versão antiga)")
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    run(tuple(int(arg) for arg in sys.argv[1:]) or DEFAULT_SIZES)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Backtest the sales forecast methods (MAPE/WAPE) and time the vectorized fit.
+
+Uso:
+    python benchmark_sales_forecast.py              # 500 e 5.000 clientes
+    python benchmark_sales_forecast.py 1000 20000   # quantidades personalizadas
+
+A série sintética tem 36 meses por cliente: nível, tendência, sazonalidade anual,
+ruído e meses sem compra. Os últimos 3 meses ficam fora do ajuste e são comparados
+com a previsão; ``linear_trend`` é o método anterior (tendência dos últimos 3 meses).
+Por fim, ``SalesForecaster.forecast`` é chamado duas vezes com a mesma chave de cache
+para conferir que a segunda chamada reaproveita o modelo ajustado.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.b2b.b2b_metrics import PreparedSales
+from src.b2b.dashboard_cache import DashboardCache
+from src.b2b.sales_forecast import FORECAST_METHODS, MonthlySeries, SalesForecaster, backtest
+
+DEFAULT_CLIENTS = (500, 5000)
+MONTHS = 36
+HORIZON = 3
+
+
+def synthetic_series(client_count: int, months: int = MONTHS, seed_value: int = 42) -> MonthlySeries:
+    rng = np.random.default_rng(seed_value)
+    t = np.arange(months)
+    level = rng.lognormal(mean=8, sigma=1, size=(client_count, 1))
+    growth = rng.normal(0, 0.01, size=(client_count, 1))
+    amplitude = rng.uniform(0, 0.5, size=(client_count, 1))
+    # Sazonalidade do mercado (comum) com pequeno deslocamento por cliente
+    phase = rng.integers(0, 2, size=(client_count, 1))
+    season = 1 + amplitude * np.sin(2 * np.pi * (t + phase) / 12)
+    noise = rng.normal(1, 0.15, size=(client_count, months)).clip(0.2)
+    active = rng.random((client_count, months)) > rng.uniform(0, 0.4, size=(client_count, 1))
+    values = level * (1 + growth) ** t * season * noise * active
+    periods = pd.period_range('2023-01', periods=months, freq='M')
+    return MonthlySeries([f'Cliente {i}' for i in range(client_count)], periods, values)
+
+
+def check_fit_cache(client_count: int = 200) -> None:
+    """Second ``forecast()`` with the same key must be a cache hit (loader not called again)."""
+    series = synthetic_series(client_count)
+    records = [
+        {'cliente': label, 'data': period.to_timestamp(), 'valor': float(value)}
+        for label, row in zip(series.labels, series.values)
+        for period, value in zip(series.periods, row)
+        if value > 0
+    ]
+    loads = []
+
+    def loader() -> PreparedSales:
+        loads.append(1)
+        return PreparedSales.from_sales(records)
+
+    cache = DashboardCache(max_entries=4, ttl=60)
+    forecaster = SalesForecaster(cache=cache)
+    reference = (series.periods[-1] + 1).to_timestamp().to_pydatetime()
+    key = ('all', 'BRL', 'benchmark', '1')
+    timings = []
+    results = []
+    for _ in range(2):
+        start = time.perf_counter()
+        results.append(forecaster.forecast(loader, reference_date=reference, cache_key=key))
+        timings.append(time.perf_counter() - start)
+
+    stats = cache.stats()
+    assert len(loads) == 1, f"loader chamado {len(loads)} vezes"
+    assert stats['hits'] == 1, f"esperado 1 hit no cache, obtido {stats['hits']}"
+    assert results[0] == results[1], 'previsão do cache difere da original'
+    print(
+        f"\ncache do ajuste: 1ª chamada {timings[0] * 1000:.1f} ms, "
+        f"2ª chamada {timings[1] * 1000:.1f} ms (hit, sem recarregar vendas)"
+    )
+
+
+def run(sizes=DEFAULT_CLIENTS) -> None:
+    print(f"{'clientes':>9} {'método':<15} {'MAPE total':>11} {'WAPE clientes':>14} {'ajuste':>9}")
+    for size in sizes:
+        series = synthetic_series(size)
+        for method in FORECAST_METHODS:
+            result = backtest(series, horizon=HORIZON, method=method)
+            print(
+                f"{size:>9} {method:<15} {result['mape']:>10.1f}% {result['client_wape']:>13.1f}% "
+                f"{result['fit_seconds']:>8.3f}s"
+            )
+
+
+if __name__ == '__main__':
+    run(tuple(int(arg) for arg in sys.argv[1:]) or DEFAULT_CLIENTS)
+    check_fit_cache()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Bulk ingest of the Financeiro/dados JSON ledgers into the transactions table.
+
+Uso:
+    python ingest_financeiro.py                          # ../../Financeiro/dados
+    python ingest_financeiro.py /caminho/para/dados      # outro diretório
+    python ingest_financeiro.py /caminho/para/dados 1000 # chunk de 1000 lançamentos
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from src.db import init_engine, Base
+from src.services.ledger_ingest_service import DEFAULT_CHUNK_SIZE, LedgerIngestService
+
+DEFAULT_DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'Financeiro', 'dados'
+)
+
+
+def ingest(data_dir: str = DEFAULT_DATA_DIR, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    engine = init_engine()
+    Base.metadata.create_all(engine)
+
+    print(f"📥 Importando lançamentos de {data_dir} (chunks de {chunk_size})...")
+    report = LedgerIngestService(chunk_size=chunk_size).ingest_directory(data_dir)
+
+    print(f"   Lidos:          {report['read']}")
+    print(f"   Inseridos:      {report['inserted']}")
+    print(f"   Duplicados:     {report['duplicates']}")
+    print(f"   Inválidos:      {report['skipped']}")
+    print(f"   Pendentes:      {report['pending']} (sem categoria)")
+    print(f"   Transferências: {report['transfers_linked']} vinculadas")
+    print(
+        f"✅ {report['chunks']} chunks em {report['elapsed_seconds']:.2f}s "
+        f"({report['rows_per_second']:.0f} lançamentos/s)"
+    )
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    ingest(
+        sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DATA_DIR,
+        int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CHUNK_SIZE,
+    )
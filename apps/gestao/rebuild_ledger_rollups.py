@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Rebuild the monthly ledger rollup (ledger_monthly_rollups) from transactions.
+
+Uso:
+    python rebuild_ledger_rollups.py          # reconstrói todos os anos
+    python rebuild_ledger_rollups.py 2025     # reconstrói apenas 2025
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from src.db import init_engine, Base
+from src.services.ledger_rollup_service import LedgerRollupService
+
+
+def rebuild(year: int | None = None) -> None:
+    engine = init_engine()
+    Base.metadata.create_all(engine)
+
+    label = str(year) if year else 'todos os anos'
+    print(f"🔧 Reconstruindo rollup mensal do ledger ({label})...")
+
+    started = time.perf_counter()
+    rows = LedgerRollupService().rebuild(year)
+    elapsed = time.perf_counter() - started
+
+    print(f"✅ {rows} linhas agregadas em {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    rebuild(int(sys.argv[1]) if len(sys.argv) > 1 else None)
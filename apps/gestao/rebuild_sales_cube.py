@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Rebuild the B2B sales cube (sales_cube) from orders.
+
+Uso:
+    python rebuild_sales_cube.py
+"""
+
+from __future__ import annotations
+
+import time
+
+from dotenv import load_dotenv
+
+from src.db import init_engine, Base
+from src.services.sales_cube_service import SalesCubeService
+
+
+def rebuild() -> None:
+    engine = init_engine()
+    Base.metadata.create_all(engine)
+
+    print("🔧 Reconstruindo cubo de vendas B2B...")
+
+    started = time.perf_counter()
+    service = SalesCubeService()
+    rows = service.rebuild()
+    elapsed = time.perf_counter() - started
+
+    per_currency = ', '.join(f"{currency}: {count}" for currency, count in service.count_rows().items())
+    print(f"✅ {rows} células agregadas em {elapsed:.2f}s ({per_currency or 'sem pedidos'})")
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    rebuild()
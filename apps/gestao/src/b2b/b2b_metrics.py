@@ -6,16 +6,137 @@ Calcula métricas essenciais para vendas B2B
 
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from functools import cached_property
+from typing import Dict, List, Any, Optional, Union
 import numpy as np
 
+from .dashboard_cache import CacheKey
+from .sales_forecast import SalesForecaster
+
+
+class PreparedSales:
+    """
+    Frame de vendas preparado uma única vez para todas as métricas.
+
+    ``data`` já convertido para datetime, ``cliente`` normalizado (strip/title) como
+    categoria e ``mes_ano`` como Period mensal. Os agrupamentos por cliente e por mês
+    são calculados sob demanda e reaproveitados por todos os ``calculate_*``.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+
+    @classmethod
+    def from_sales(cls, sales_data: Union[List[Dict], pd.DataFrame]) -> 'PreparedSales':
+        if isinstance(sales_data, pd.DataFrame):
+            frame = sales_data.copy(deep=False)
+        else:
+            frame = pd.DataFrame(sales_data)
+        if frame.empty:
+            return cls(frame)
+
+        if not pd.api.types.is_datetime64_any_dtype(frame['data']):
+            frame['data'] = pd.to_datetime(frame['data'])
+        # Normalizar nomes de clientes para comparação case insensitive
+        frame['cliente'] = frame['cliente'].str.strip().str.title().astype('category')
+        frame['mes_ano'] = frame['data'].dt.to_period('M')
+        return cls(frame)
+
+    @property
+    def empty(self) -> bool:
+        return self.frame.empty
+
+    def subset(self, mask: pd.Series) -> 'PreparedSales':
+        """Recorte (ex.: mês selecionado) sem repetir parse/normalização."""
+        return type(self)(self.frame[mask])
+
+    @cached_property
+    def by_client(self) -> pd.DataFrame:
+        """Receita, compras, ticket médio, primeira e última compra por cliente."""
+        return self.frame.groupby('cliente', observed=True).agg(
+            receita_total=('valor', 'sum'),
+            numero_compras=('valor', 'count'),
+            ticket_medio=('valor', 'mean'),
+            primeira_compra=('data', 'min'),
+            ultima_compra=('data', 'max'),
+        )
+
+    @cached_property
+    def by_month(self) -> pd.DataFrame:
+        """Receita e volume por mês (index ``mes_ano``)."""
+        columns = [col for col in ('valor', 'quantidade') if col in self.frame.columns]
+        return self.frame.groupby('mes_ano')[columns].sum()
+
+    @cached_property
+    def by_client_month(self) -> pd.Series:
+        """Receita por (``cliente``, ``mes_ano``), base das previsões por cliente."""
+        return self.frame.groupby(['cliente', 'mes_ano'], observed=True)['valor'].sum()
+
+    @property
+    def average_item_value(self) -> float:
+        return float(self.frame['valor'].mean())
+
+    def top_clients(self, top_n: int) -> pd.DataFrame:
+        """Maiores clientes por receita (mesmas colunas de ``by_client``)."""
+        return self.by_client.sort_values('receita_total', ascending=False).head(top_n)
+
+
+class AggregatedSales(PreparedSales):
+    """
+    ``PreparedSales`` sobre células já agregadas (ex.: cubo de vendas) em vez de itens.
+
+    Cada célula traz ``mes_ano``, ``cliente``, ``pais``, ``valor``, ``quantidade``,
+    ``itens`` (nº de itens), ``primeira_compra`` e ``ultima_compra``; os agrupamentos
+    por cliente e por mês têm o mesmo significado da versão por item.
+    """
+
+    @classmethod
+    def from_cells(cls, cells: pd.DataFrame) -> 'AggregatedSales':
+        frame = cells.copy(deep=False)
+        if not frame.empty:
+            frame['cliente'] = frame['cliente'].str.strip().str.title().astype('category')
+        return cls(frame)
+
+    @cached_property
+    def by_client(self) -> pd.DataFrame:
+        by_client = self.frame.groupby('cliente', observed=True).agg(
+            receita_total=('valor', 'sum'),
+            numero_compras=('itens', 'sum'),
+            primeira_compra=('primeira_compra', 'min'),
+            ultima_compra=('ultima_compra', 'max'),
+        )
+        by_client.insert(2, 'ticket_medio', by_client['receita_total'] / by_client['numero_compras'])
+        return by_client
+
+    @property
+    def average_item_value(self) -> float:
+        items = self.frame['itens'].sum()
+        return float(self.frame['valor'].sum() / items) if items else float('nan')
+
+
+SalesInput = Union[List[Dict], pd.DataFrame, PreparedSales]
+
+
 class B2BMetrics:
-    def __init__(self):
-        self.today = datetime.now().date()
+    def __init__(self, forecaster: Optional[SalesForecaster] = None):
+        self.forecaster = forecaster or SalesForecaster()
+
+    @staticmethod
+    def prepare(sales_data: SalesInput) -> PreparedSales:
+        """Aceita lista de vendas, DataFrame ou ``PreparedSales`` já pronto."""
+        if isinstance(sales_data, PreparedSales):
+            return sales_data
+        return PreparedSales.from_sales(sales_data if sales_data is not None else [])
+
+    @staticmethod
+    def _is_empty(sales_data: SalesInput) -> bool:
+        if isinstance(sales_data, (PreparedSales, pd.DataFrame)):
+            return sales_data.empty
+        return not sales_data
         
     def calculate_inactive_clients(
         self,
-        sales_data: List[Dict],
+        sales_data: SalesInput,
         days_threshold: int = 30,
         *,
         reference_date: Optional[datetime] = None,
@@ -24,13 +145,14 @@ class B2BMetrics:
         Calcula clientes que não compraram no período especificado
         
         Args:
-            sales_data: Lista de vendas com formato [{'cliente': str, 'data': str, 'valor': float}]
+            sales_data: Lista de vendas com formato [{'cliente': str, 'data': str, 'valor': float}],
+                DataFrame equivalente ou ``PreparedSales``
             days_threshold: Dias sem compra para considerar inativo (default: 30)
         """
         reference = reference_date or datetime.now()
         today = reference.date()
 
-        if not sales_data:
+        if self._is_empty(sales_data):
             return {
                 'inactive_clients': [],
                 'total_inactive': 0,
@@ -45,10 +167,8 @@ class B2BMetrics:
             }
         
         try:
-            df = pd.DataFrame(sales_data)
-            df['data'] = pd.to_datetime(df['data'])
-            # Normalizar nomes de clientes para comparação case insensitive
-            df['cliente'] = df['cliente'].str.strip().str.title()
+            sales = self.prepare(sales_data)
+            by_client = sales.by_client
 
             # Para B2B, considerar clientes inativos se não compraram no mês atual
             # Sempre usar data atual real, não cached
@@ -56,64 +176,33 @@ class B2BMetrics:
             
             print(f"🎯 Considerando clientes inativos que não compraram desde: {cutoff_date}")
             
-            # Última compra por cliente
-            last_purchase = df.groupby('cliente')['data'].max().reset_index()
-            last_purchase.columns = ['cliente', 'ultima_compra']
-            
-            # Clientes inativos
-            inactive_clients = last_purchase[
-                last_purchase['ultima_compra'].dt.date < cutoff_date
-            ].copy()
+            # Clientes inativos (última compra antes do corte), já com o histórico agregado
+            inactive_clients = by_client[
+                by_client['ultima_compra'] < pd.Timestamp(cutoff_date)
+            ].reset_index()
             
-            # Processar apenas se há clientes inativos
-            inactive_list = []
-            high_risk = medium_risk = low_risk = 0
+            # Dias sem comprar e risco de churn para todos os inativos de uma vez
+            dias_sem_comprar = (
+                pd.Timestamp(today) - inactive_clients['ultima_compra'].dt.normalize()
+            ).dt.days
+            risco = self._classify_churn_risk(dias_sem_comprar)
+            risk_counts = risco.value_counts()
             
-            if not inactive_clients.empty:
-                # Calcular valor histórico
-                client_totals = df.groupby('cliente')['valor'].agg(['sum', 'count']).reset_index()
-                client_totals.columns = ['cliente', 'valor_total_historico', 'numero_compras']
-                
-                for _, row in inactive_clients.iterrows():
-                    cliente = row['cliente']
-                    ultima_compra = row['ultima_compra']
-                    
-                    # Calcular dias sem comprar
-                    dias_sem_comprar = (today - ultima_compra.date()).days
-                    
-                    # Obter histórico do cliente
-                    client_total = client_totals[client_totals['cliente'] == cliente]
-                    valor_total = float(client_total['valor_total_historico'].iloc[0]) if not client_total.empty else 0
-                    num_compras = int(client_total['numero_compras'].iloc[0]) if not client_total.empty else 0
-                    
-                    # Classificar risco
-                    risco = self._classify_churn_risk(dias_sem_comprar)
-                    if risco == 'Alto':
-                        high_risk += 1
-                    elif risco == 'Médio':
-                        medium_risk += 1
-                    else:
-                        low_risk += 1
-                    
-                    inactive_list.append({
-                        'cliente': cliente,
-                        'ultima_compra': ultima_compra.strftime('%Y-%m-%d'),
-                        'dias_sem_comprar': dias_sem_comprar,
-                        'valor_total_historico': valor_total,
-                        'numero_compras': num_compras,
-                        'risco_churn': risco
-                    })
+            inactive_list = pd.DataFrame({
+                'cliente': inactive_clients['cliente'].astype(object),
+                'ultima_compra': inactive_clients['ultima_compra'].dt.strftime('%Y-%m-%d'),
+                'dias_sem_comprar': dias_sem_comprar.astype(int),
+                'valor_total_historico': inactive_clients['receita_total'].astype(float),
+                'numero_compras': inactive_clients['numero_compras'].astype(int),
+                'risco_churn': risco.astype(object),
+            }).to_dict('records')
             
             # Calcular novos clientes do mês atual (sempre data atual real)
             current_month_start = reference.replace(day=1).date()
             
-            # Primeira compra por cliente
-            first_purchase = df.groupby('cliente')['data'].min().reset_index()
-            first_purchase.columns = ['cliente', 'primeira_compra']
-            
             # Clientes novos (primeira compra no mês atual)
-            new_clients = first_purchase[
-                first_purchase['primeira_compra'].dt.date >= current_month_start
+            new_clients = by_client.index[
+                by_client['primeira_compra'] >= pd.Timestamp(current_month_start)
             ]
             
             print(f"📈 {len(new_clients)} novos clientes no mês atual")
@@ -121,14 +210,14 @@ class B2BMetrics:
             return {
                 'inactive_clients': inactive_list,
                 'total_inactive': len(inactive_clients),
-                'total_clients': len(last_purchase),
-                'inactive_percentage': (len(inactive_clients) / len(last_purchase)) * 100 if len(last_purchase) > 0 else 0,
+                'total_clients': len(by_client),
+                'inactive_percentage': (len(inactive_clients) / len(by_client)) * 100 if len(by_client) > 0 else 0,
                 'threshold_days': days_threshold,
-                'high_risk_count': high_risk,
-                'medium_risk_count': medium_risk,
-                'low_risk_count': low_risk,
+                'high_risk_count': int(risk_counts.get('Alto', 0)),
+                'medium_risk_count': int(risk_counts.get('Médio', 0)),
+                'low_risk_count': int(risk_counts.get('Baixo', 0)),
                 'new_clients_count': len(new_clients),
-                'new_clients_list': new_clients['cliente'].tolist() if not new_clients.empty else []
+                'new_clients_list': new_clients.tolist()
             }
             
         except Exception as e:
@@ -148,12 +237,12 @@ class B2BMetrics:
     
     def calculate_monthly_revenue(
         self,
-        sales_data: List[Dict],
+        sales_data: SalesInput,
         *,
         reference_date: Optional[datetime] = None,
     ) -> Dict[str, Any]:
         """Calcula receita mensal e tendências"""
-        if not sales_data:
+        if self._is_empty(sales_data):
             return {
                 'monthly_data': [],
                 'current_month': 0,
@@ -162,52 +251,36 @@ class B2BMetrics:
                 'total_revenue': 0
             }
 
-        df = pd.DataFrame(sales_data)
-        df['data'] = pd.to_datetime(df['data'])
-        # Normalizar nomes de clientes para comparação case insensitive
-        df['cliente'] = df['cliente'].str.strip().str.title()
-        df['mes_ano'] = df['data'].dt.to_period('M')
-        
-        # Receita por mês
-        monthly_revenue = df.groupby('mes_ano')['valor'].sum().reset_index()
-        monthly_revenue['mes_ano_str'] = monthly_revenue['mes_ano'].astype(str)
-        
+        sales = self.prepare(sales_data)
+        by_month = sales.by_month
         # Converter Period para string para serialização JSON
-        monthly_revenue['mes_ano'] = monthly_revenue['mes_ano'].astype(str)
+        month_labels = by_month.index.astype(str)
         
         # Mês atual e anterior (sempre usar data atual real)
         reference = reference_date or datetime.now()
         current_month = pd.Period(reference.date(), freq='M')
         previous_month = current_month - 1
         
-        # Converter para string para comparação
-        current_month_str = str(current_month)
-        previous_month_str = str(previous_month)
-        
-        current_revenue = monthly_revenue[
-            monthly_revenue['mes_ano'] == current_month_str
-        ]['valor'].sum() if len(monthly_revenue[monthly_revenue['mes_ano'] == current_month_str]) > 0 else 0
-        
-        previous_revenue = monthly_revenue[
-            monthly_revenue['mes_ano'] == previous_month_str
-        ]['valor'].sum() if len(monthly_revenue[monthly_revenue['mes_ano'] == previous_month_str]) > 0 else 0
+        # Receita por mês
+        monthly_revenue = pd.DataFrame({
+            'mes_ano': month_labels,
+            'valor': by_month['valor'].to_numpy(),
+            'mes_ano_str': month_labels,
+        })
+        current_revenue = by_month['valor'].get(current_month, 0)
+        previous_revenue = by_month['valor'].get(previous_month, 0)
         
         # Cálculo de crescimento
         growth = ((current_revenue - previous_revenue) / previous_revenue * 100) if previous_revenue > 0 else 0
         
-        # Calcular volume mensal (quantidade em Kg)
-        monthly_volume = df.groupby('mes_ano')['quantidade'].sum().reset_index()
-        monthly_volume['mes_ano_str'] = monthly_volume['mes_ano'].astype(str)
-        monthly_volume['mes_ano'] = monthly_volume['mes_ano'].astype(str)
-        
-        # Volume atual e anterior
-        current_volume = monthly_volume[
-            monthly_volume['mes_ano'] == current_month_str
-        ]['quantidade'].sum() if len(monthly_volume[monthly_volume['mes_ano'] == current_month_str]) > 0 else 0
-        
-        previous_volume = monthly_volume[
-            monthly_volume['mes_ano'] == previous_month_str
-        ]['quantidade'].sum() if len(monthly_volume[monthly_volume['mes_ano'] == previous_month_str]) > 0 else 0
+        # Volume mensal (quantidade em Kg)
+        monthly_volume = pd.DataFrame({
+            'mes_ano': month_labels,
+            'quantidade': by_month['quantidade'].to_numpy(),
+            'mes_ano_str': month_labels,
+        })
+        current_volume = by_month['quantidade'].get(current_month, 0)
+        previous_volume = by_month['quantidade'].get(previous_month, 0)
         
         # Crescimento de volume
         volume_growth = ((current_volume - previous_volume) / previous_volume * 100) if previous_volume > 0 else 0
@@ -218,124 +291,82 @@ class B2BMetrics:
             'current_month': float(current_revenue),
             'previous_month': float(previous_revenue),
             'growth_percentage': float(growth),
-            'total_revenue': float(df['valor'].sum()),
+            'total_revenue': float(sales.frame['valor'].sum()),
             'current_volume': float(current_volume),
             'previous_volume': float(previous_volume),
             'volume_growth_percentage': float(volume_growth),
-            'total_volume': float(df['quantidade'].sum())
+            'total_volume': float(sales.frame['quantidade'].sum())
         }
     
-    def calculate_top_clients(self, sales_data: List[Dict], top_n: int = 5) -> List[Dict]:
+    def calculate_top_clients(self, sales_data: SalesInput, top_n: int = 5) -> List[Dict]:
         """Calcula top clientes por receita"""
-        if not sales_data:
+        if self._is_empty(sales_data):
             return []
         
         try:
-            df = pd.DataFrame(sales_data)
-            df['data'] = pd.to_datetime(df['data'])
-            # Normalizar nomes de clientes para comparação case insensitive
-            df['cliente'] = df['cliente'].str.strip().str.title()
-
-            # Calcular métricas por cliente
-            client_metrics = df.groupby('cliente').agg({
-                'valor': ['sum', 'count', 'mean'],
-                'data': 'max'
-            }).reset_index()
-            
-            # Renomear colunas
-            client_metrics.columns = ['cliente', 'receita_total', 'numero_compras', 'ticket_medio', 'ultima_compra']
-            
-            # Ordenar por receita e pegar top N
-            top_clients = client_metrics.sort_values('receita_total', ascending=False).head(top_n)
+            # Top N por receita (no banco, quando os agregados vêm de SQL)
+            top_clients = self.prepare(sales_data).top_clients(top_n)[
+                ['receita_total', 'numero_compras', 'ticket_medio', 'ultima_compra']
+            ].reset_index()
             
             # Converter para lista de dicts com formatação segura
-            result = []
-            for _, row in top_clients.iterrows():
-                result.append({
-                    'cliente': row['cliente'],
-                    'receita_total': float(row['receita_total']),
-                    'numero_compras': int(row['numero_compras']),
-                    'ticket_medio': float(row['ticket_medio']),
-                    'ultima_compra': row['ultima_compra'].strftime('%Y-%m-%d')
-                })
-            
-            return result
+            return top_clients.astype({
+                'cliente': object,
+                'receita_total': float,
+                'numero_compras': int,
+                'ticket_medio': float,
+            }).assign(
+                ultima_compra=top_clients['ultima_compra'].dt.strftime('%Y-%m-%d')
+            ).to_dict('records')
             
         except Exception as e:
             print(f"❌ Erro ao calcular top clientes: {e}")
             return []
     
-    def calculate_sales_forecast(self, sales_data: List[Dict], months_ahead: int = 3) -> Dict[str, Any]:
-        """Previsão simples de vendas baseada em tendência histórica"""
-        if not sales_data:
+    def calculate_sales_forecast(
+        self,
+        sales_data: SalesInput,
+        months_ahead: int = 3,
+        reference_date: Optional[datetime] = None,
+        cache_key: Optional[CacheKey] = None,
+    ) -> Dict[str, Any]:
+        """
+        Previsão do total e por cliente para os meses seguintes a ``reference_date``
+        (padrão: agora, avaliado a cada chamada). Com ``cache_key`` o ajuste é
+        reaproveitado enquanto a versão dos dados não mudar.
+        """
+        if self._is_empty(sales_data):
             return {'forecast': [], 'trend': 'estável'}
-        
-        df = pd.DataFrame(sales_data)
-        df['data'] = pd.to_datetime(df['data'])
-        # Normalizar nomes de clientes para comparação case insensitive
-        df['cliente'] = df['cliente'].str.strip().str.title()
-        df['mes_ano'] = df['data'].dt.to_period('M')
-        
-        monthly_revenue = df.groupby('mes_ano')['valor'].sum()
-        
-        if len(monthly_revenue) < 3:
-            return {'forecast': [], 'trend': 'dados insuficientes'}
-        
-        # Tendência simples (últimos 3 meses)
-        recent_months = monthly_revenue.tail(3).values
-        trend_slope = np.polyfit(range(len(recent_months)), recent_months, 1)[0]
-        
-        # Classificar tendência
-        if trend_slope > 1000:
-            trend = 'crescimento'
-        elif trend_slope < -1000:
-            trend = 'declínio'
-        else:
-            trend = 'estável'
-        
-        # Previsão simples
-        last_value = recent_months[-1]
-        forecast = []
-        
-        for i in range(1, months_ahead + 1):
-            predicted_value = max(0, last_value + (trend_slope * i))
-            future_month = pd.Period(self.today, freq='M') + i
-            forecast.append({
-                'mes': str(future_month),
-                'valor_previsto': predicted_value
-            })
-        
-        return {
-            'forecast': forecast,
-            'trend': trend,
-            'trend_value': trend_slope
-        }
+
+        return self.forecaster.forecast(
+            self.prepare(sales_data),
+            months_ahead=months_ahead,
+            reference_date=reference_date,
+            cache_key=cache_key,
+        )
     
-    def _classify_churn_risk(self, days_inactive: int) -> str:
-        """Classifica risco de churn baseado em dias sem comprar - mais sensível para B2B"""
-        if days_inactive >= 60:  # 2 meses = Alto risco
-            return 'Alto'
-        elif days_inactive >= 45:  # 1.5 mês = Médio risco
-            return 'Médio'
-        else:  # Menos de 1.5 mês = Baixo risco
-            return 'Baixo'
+    # Risco de churn por dias sem comprar - mais sensível para B2B:
+    # < 45 dias = Baixo, 45-59 (1.5 mês) = Médio, >= 60 (2 meses) = Alto
+    CHURN_RISK_BINS = [-np.inf, 45, 60, np.inf]
+    CHURN_RISK_LABELS = ['Baixo', 'Médio', 'Alto']
+
+    @classmethod
+    def _classify_churn_risk(cls, days_inactive: pd.Series) -> pd.Series:
+        """Classifica risco de churn de uma série de dias sem comprar"""
+        return pd.cut(days_inactive, bins=cls.CHURN_RISK_BINS, labels=cls.CHURN_RISK_LABELS, right=False)
     
-    def calculate_client_lifetime_value(self, sales_data: List[Dict]) -> Dict[str, Any]:
+    def calculate_client_lifetime_value(self, sales_data: SalesInput) -> Dict[str, Any]:
         """Calcula LTV médio dos clientes"""
-        if not sales_data:
+        if self._is_empty(sales_data):
             return {'average_ltv': 0, 'median_ltv': 0, 'ltv_distribution': []}
         
-        df = pd.DataFrame(sales_data)
-        df['data'] = pd.to_datetime(df['data'])
-        # Normalizar nomes de clientes para comparação case insensitive
-        df['cliente'] = df['cliente'].str.strip().str.title()
+        sales = self.prepare(sales_data)
 
         # LTV por cliente (soma total de compras)
-        client_ltv = df.groupby('cliente')['valor'].sum().reset_index()
-        client_ltv.columns = ['cliente', 'ltv']
+        client_ltv = sales.by_client['receita_total'].rename('ltv').reset_index()
         
         # Calcular ticket médio real (valor médio por transação)
-        avg_transaction_value = df['valor'].mean()
+        avg_transaction_value = sales.average_item_value
         
         return {
             'average_ltv': client_ltv['ltv'].mean(),
@@ -346,12 +377,12 @@ class B2BMetrics:
     
     def calculate_country_metrics(
         self,
-        sales_data: List[Dict],
+        sales_data: SalesInput,
         *,
         reference_date: Optional[datetime] = None,
     ) -> Dict[str, Any]:
         """Calcula métricas por país"""
-        if not sales_data:
+        if self._is_empty(sales_data):
             return {
                 'countries_revenue': [],
                 'countries_volume': [],
@@ -360,18 +391,15 @@ class B2BMetrics:
             }
         
         try:
-            df = pd.DataFrame(sales_data)
-            df['data'] = pd.to_datetime(df['data'])
-            # Normalizar nomes de clientes para comparação case insensitive
-            df['cliente'] = df['cliente'].str.strip().str.title()
+            df = self.prepare(sales_data).frame
 
             if 'pais' in df.columns:
-                df['pais'] = df['pais'].fillna('Brasil').astype(str).str.strip()
+                paises = df['pais'].fillna('Brasil').astype(str).str.strip()
             else:
                 # Extrair país das observações (formato: "Venda MM/YYYY - País")
                 extracted = df['observacoes'].str.extract(r'-\s*([^|\n]+)')
-                df['pais'] = extracted[0].fillna('Brasil').astype(str).str.strip()
-            df['mes_ano'] = df['data'].dt.to_period('M')
+                paises = extracted[0].fillna('Brasil').astype(str).str.strip()
+            df = df[['mes_ano', 'valor', 'quantidade']].assign(pais=paises)
             
             # Receita por país
             countries_revenue = df.groupby('pais')['valor'].sum().reset_index()
@@ -2,15 +2,26 @@
 
 from __future__ import annotations
 
+import base64
 import json
 import os
-from datetime import datetime
-from typing import Dict, Any, List, Optional
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Any, List, Optional, Tuple
 
-from sqlalchemy import func, or_
+from sqlalchemy import and_, func, insert, or_, update
+from sqlalchemy.orm import aliased, joinedload
 
+from src.b2b.dashboard_cache import DashboardCache
+from src.b2b.entity_resolution import MATCH_THRESHOLD, EntityIndex, EntityRecord, find_duplicates
 from src.db import session_scope
 from src.models import CRMLead, CRMInteraction
+from src.services.data_purge import PurgeReport, purge_leads
+from src.services.data_versions import LEADS, bump_data_version, get_data_version
+from src.services.lead_geo_service import NEARBY_LIMIT, VIEWPORT_LIMIT, LeadGeoService, lead_geohash
+from src.services.lead_search_service import (
+    SEARCH_FIELDS, TYPEAHEAD_LIMIT, LeadSearchService, build_lead_search_text, normalize_search_text,
+)
 
 
 LEAD_STAGE_DEFINITIONS: List[Dict[str, str]] = [
@@ -35,6 +46,80 @@ LEGACY_STAGE_MAP = {
     'lost': 'perdido',
 }
 
+LEAD_FIELDS = [
+    'name', 'category', 'customer_type', 'status', 'source', 'search_keyword', 'search_city',
+    'address_line', 'address_number', 'address_complement', 'neighborhood',
+    'city', 'state', 'postal_code', 'country', 'latitude', 'longitude',
+    'phone', 'whatsapp', 'email', 'instagram', 'website', 'primary_contact_name',
+    'owner', 'user_id', 'notes', 'google_place_id', 'is_customer', 'converted_account_id'
+]
+# Campos que o upsert em lote nunca altera em leads existentes (curadoria do vendedor)
+BULK_PROTECTED_FIELDS = {'name', 'status', 'owner', 'user_id', 'is_customer', 'converted_account_id', 'customer_type'}
+MAX_BULK_LEADS = 1000
+OTHER_SELLER_LEAD_ERROR = 'Lead já cadastrado para outro vendedor'
+
+LEAD_PAGE_SIZE = 50
+LEAD_PAGE_SIZE_MAX = 500
+# Contagem por etapa do kanban: reaproveitada até a próxima escrita em leads
+_stage_counts_cache = DashboardCache(max_entries=128, ttl=600)
+# Índice de entity resolution de todos os leads, sincronizado a cada nova versão de LEADS
+_entity_index_lock = threading.Lock()
+_entity_index_state: Dict[str, Any] = {'version': None, 'index': None, 'synced_at': None}
+# Folga na releitura por updated_at: cobre transações que commitaram depois da última sincronização
+ENTITY_INDEX_SYNC_MARGIN = timedelta(minutes=5)
+ENTITY_FIELDS = ('id', 'name', 'city', 'phone', 'whatsapp', 'instagram', 'google_place_id', 'user_id')
+DUPLICATE_PROPOSALS_LIMIT = 100
+# Timelines em lote: interações por lead e leads por chamada
+TIMELINE_PREVIEW_LIMIT = 20
+MAX_TIMELINE_LEADS = 500
+FOLLOW_UP_OVERDUE_DAYS = 30
+FOLLOW_UPS_LIMIT = 200
+
+
+def lead_dedupe_key(name: Optional[str], city: Optional[str]) -> str:
+    """Normalized ``name|city`` used to match leads that have no ``google_place_id``."""
+    return f"{normalize_search_text(name)}|{normalize_search_text(city)}"
+
+
+def lead_entity_record(lead: Any, record_id: Any = None, scoped: bool = False) -> EntityRecord:
+    """
+    EntityRecord for a lead row/payload (attributes or dict keys of ``CRMLead``).
+
+    ``scoped`` puts the record in its seller's scope (``user_id``), so it only
+    matches leads of the same seller.
+    """
+    get = lead.get if isinstance(lead, dict) else lambda field: getattr(lead, field, None)
+    return EntityRecord.build(
+        get('id') if record_id is None else record_id,
+        get('name'),
+        city=get('city'),
+        phone=get('phone'),
+        whatsapp=get('whatsapp'),
+        instagram=get('instagram'),
+        place_id=get('google_place_id'),
+        scope=get('user_id') if scoped else None,
+    )
+
+
+def _bulk_identity(place_id: Optional[str], user_id: Optional[int], dedupe_key: str) -> str:
+    """Batch identity of a bulk row: the place id, else seller + ``name|city`` (the unique keys)."""
+    return f"place:{place_id}" if place_id else f"key:{user_id or 0}:{dedupe_key}"
+
+
+def encode_lead_cursor(updated_at: datetime, lead_id: int) -> str:
+    """Opaque cursor for the (updated_at, id) position of the last lead of a page."""
+    raw = f"{updated_at.isoformat()}|{lead_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_lead_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        updated_at, lead_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(updated_at), int(lead_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('Cursor inválido') from exc
+
 
 class CRMService:
     """High-level helper to manage CRM leads and interactions."""
@@ -43,6 +128,8 @@ class CRMService:
         # Sempre usar SQLAlchemy (PostgreSQL) - SQLite legado removido
         self.use_sqlalchemy = True
         self.db = None
+        self.search_index = LeadSearchService()
+        self.geo_index = LeadGeoService()
 
     # ----------------------
     # Stage helpers
@@ -225,9 +312,13 @@ class CRMService:
                 is_customer=payload.get('is_customer'),
                 converted_account_id=payload.get('converted_account_id'),
             )
+            lead.search_text = build_lead_search_text(lead)
+            lead.dedupe_key = self._available_dedupe_key(session, lead)
+            lead.geohash = lead_geohash(lead.latitude, lead.longitude)
             session.add(lead)
             session.flush()
             lead_id = lead.id
+            bump_data_version(session, LEADS)
 
         self._record_interaction(
             lead_id,
@@ -242,6 +333,318 @@ class CRMService:
         )
         return lead_id
 
+    def create_leads_bulk(
+        self,
+        rows: List[Dict[str, Any]],
+        *,
+        user_id: Optional[int] = None,
+        owner: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Insert or enrich many leads in one transaction.
+
+        Each row is matched by ``google_place_id`` first, then by normalized name+city
+        (only against leads without a different place id, so branches of a chain stay
+        apart), then through the entity-resolution index on exact keys (same
+        phone/WhatsApp or Instagram). A near-identical name in the same city is never
+        merged automatically: the row becomes a new lead and ``review`` points at the
+        lead it may duplicate, for a person to confirm. Matches are limited to
+        leads of the seller the row belongs to; a place id already saved for another
+        seller is an error (with the lead id only for admins). New leads are inserted
+        with ``INSERT ... ON CONFLICT DO NOTHING`` on the unique place id and (seller,
+        name+city) keys; matched leads only get their empty fields filled, never the
+        seller-curated ones (status, owner, seller, customer flags).
+
+        Args:
+            rows: Lead payloads, same fields as ``create_lead``
+            user_id: Seller assigned to new leads that do not bring one
+            owner: Owner label for new leads and for the timeline entries
+
+        Returns:
+            ``{'results': [{'row', 'status', 'lead_id', 'matched_by', 'review', 'error'}], 'summary': {...}}``
+            where status is created, updated, unchanged, duplicate or error,
+            matched_by is google_place_id, name_city, phone, instagram or batch and
+            review is ``{'lead_id', 'score'}`` of a similarly named lead (or None)
+        """
+        if len(rows) > MAX_BULK_LEADS:
+            raise ValueError(f"Máximo de {MAX_BULK_LEADS} leads por lote")
+
+        results: List[Dict[str, Any]] = [
+            {'row': index, 'status': None, 'lead_id': None, 'matched_by': None, 'review': None, 'error': None}
+            for index in range(len(rows))
+        ]
+        prepared: Dict[int, Dict[str, Any]] = {}
+        for index, row in enumerate(rows):
+            try:
+                prepared[index] = self._prepare_bulk_lead(row, user_id=user_id, owner=owner)
+            except (ValueError, TypeError, AttributeError) as exc:
+                results[index].update(status='error', error=str(exc))
+
+        created_interactions: List[Dict[str, Any]] = []
+        updated_interactions: List[Dict[str, Any]] = []
+
+        with session_scope() as session:
+            entity_index = self._lead_entity_index(session, get_data_version(LEADS, session)) if prepared else EntityIndex()
+            batch_index = EntityIndex()
+            place_ids = {payload['google_place_id'] for payload in prepared.values() if payload.get('google_place_id')}
+            dedupe_keys = {payload['dedupe_key'] for payload in prepared.values()}
+            same_name_city = CRMLead.dedupe_key.in_(dedupe_keys)
+            if user_id:
+                same_name_city = and_(same_name_city, CRMLead.user_id == user_id)
+            existing = (
+                session.query(CRMLead)
+                .filter(or_(CRMLead.google_place_id.in_(place_ids), same_name_city))
+                .all()
+            ) if prepared else []
+            by_place_id = {lead.google_place_id: lead for lead in existing if lead.google_place_id}
+            by_dedupe_key: Dict[Tuple[Optional[int], str], CRMLead] = {}
+            for lead in sorted(existing, key=lambda item: item.id):
+                by_dedupe_key.setdefault((lead.user_id, lead.dedupe_key), lead)
+
+            seen: Dict[str, int] = {}
+            to_insert: Dict[str, Dict[str, Any]] = {}
+            to_update: Dict[int, Dict[str, Any]] = {}
+            matched_rows: Dict[int, int] = {}
+            for index, payload in prepared.items():
+                place_id = payload.get('google_place_id')
+                owner_id = payload.get('user_id')
+                identity = _bulk_identity(place_id, owner_id, payload['dedupe_key'])
+                if identity in seen:
+                    results[index].update(status='duplicate', matched_by='batch')
+                    results[index]['_same_as'] = seen[identity]
+                    continue
+                seen[identity] = index
+
+                lead = by_place_id.get(place_id) if place_id else None
+                if lead is not None and lead.user_id != owner_id:
+                    results[index].update(
+                        status='error', error=OTHER_SELLER_LEAD_ERROR, lead_id=None if user_id else lead.id,
+                    )
+                    continue
+                matched_by = 'google_place_id' if lead else None
+                if lead is None:
+                    candidate = by_dedupe_key.get((owner_id, payload['dedupe_key']))
+                    if candidate is not None and (not place_id or not candidate.google_place_id):
+                        lead, matched_by = candidate, 'name_city'
+
+                record = lead_entity_record(payload, scoped=True)
+                if lead is None:
+                    # Só chaves exatas unem sozinhas; nome parecido vira proposta de revisão
+                    exact, similar = entity_index.resolve(record)
+                    if exact is not None:
+                        lead = session.get(CRMLead, exact.record_id)
+                        matched_by = exact.reason if lead else None
+                    elif similar is not None:
+                        results[index]['review'] = {'lead_id': similar.record_id, 'score': round(similar.score, 4)}
+
+                if lead is not None and lead.id in matched_rows:
+                    # Outra linha do lote já casou com este lead
+                    results[index].update(status='duplicate', matched_by='batch')
+                    results[index]['_same_as'] = matched_rows[lead.id]
+                    continue
+
+                if lead is None:
+                    record.record_id = index
+                    batch_exact, batch_similar = batch_index.resolve(record)
+                    if batch_exact is not None:
+                        results[index].update(status='duplicate', matched_by='batch')
+                        results[index]['_same_as'] = batch_exact.record_id
+                        continue
+                    if batch_similar is not None and results[index]['review'] is None:
+                        # Lead novo do próprio lote: o id só existe depois do INSERT
+                        results[index]['_review_row'] = (batch_similar.record_id, round(batch_similar.score, 4))
+                    batch_index.add(record)
+                    to_insert[identity] = payload
+                    results[index].update(status='created', _identity=identity)
+                    continue
+
+                changes = {
+                    field: value
+                    for field, value in payload.items()
+                    if field in LEAD_FIELDS
+                    and field not in BULK_PROTECTED_FIELDS
+                    and value not in (None, '')
+                    and getattr(lead, field) in (None, '')
+                }
+                matched_rows[lead.id] = index
+                results[index].update(lead_id=lead.id, matched_by=matched_by)
+                if not changes:
+                    results[index]['status'] = 'unchanged'
+                    continue
+
+                results[index]['status'] = 'updated'
+                merged = {field: getattr(lead, field) for field in SEARCH_FIELDS}
+                merged.update({field: value for field, value in changes.items() if field in SEARCH_FIELDS})
+                to_update[lead.id] = {
+                    'id': lead.id,
+                    **changes,
+                    'search_text': build_lead_search_text(merged),
+                    'updated_at': datetime.utcnow(),
+                }
+                if 'latitude' in changes or 'longitude' in changes:
+                    to_update[lead.id]['geohash'] = lead_geohash(
+                        changes.get('latitude', lead.latitude), changes.get('longitude', lead.longitude),
+                    )
+                updated_interactions.append({
+                    'lead_id': lead.id,
+                    'interaction_type': 'update',
+                    'subject': 'Dados do lead atualizados',
+                    'owner': owner,
+                    'metadata_json': json.dumps({'changes': [
+                        {'field': field, 'old': None, 'new': value} for field, value in changes.items()
+                    ]}, ensure_ascii=False),
+                })
+
+            inserted_ids: Dict[str, int] = {}
+            if to_insert:
+                inserted_ids = self._insert_leads(session, list(to_insert.values()))
+            if to_update:
+                session.execute(update(CRMLead), list(to_update.values()))
+
+            for result in results:
+                identity = result.pop('_identity', None)
+                if identity is None:
+                    continue
+                lead_id = inserted_ids.get(identity)
+                if lead_id is None:
+                    # Inserido por outra requisição entre a leitura e o INSERT (ON CONFLICT)
+                    payload = to_insert[identity]
+                    winner = self._conflicting_lead(session, payload)
+                    if winner is not None and winner.user_id != payload.get('user_id'):
+                        result.update(status='error', error=OTHER_SELLER_LEAD_ERROR)
+                        lead_id = None if user_id else winner.id
+                    else:
+                        lead_id = winner.id if winner is not None else None
+                        result.update(
+                            status='unchanged',
+                            matched_by='google_place_id' if payload.get('google_place_id') else 'name_city',
+                        )
+                else:
+                    payload = to_insert[identity]
+                    created_interactions.append({
+                        'lead_id': lead_id,
+                        'interaction_type': 'create',
+                        'subject': 'Lead criado',
+                        'owner': owner,
+                        'metadata_json': json.dumps({'status': {
+                            'value': payload['status'],
+                            'label': self.stage_label(payload['status']),
+                        }}, ensure_ascii=False),
+                    })
+                result['lead_id'] = lead_id
+
+            for result in results:
+                same_as = result.pop('_same_as', None)
+                if same_as is not None:
+                    result['lead_id'] = results[same_as]['lead_id']
+                review_row = result.pop('_review_row', None)
+                if review_row is not None and results[review_row[0]]['lead_id'] is not None:
+                    result['review'] = {'lead_id': results[review_row[0]]['lead_id'], 'score': review_row[1]}
+
+            timeline = created_interactions + updated_interactions
+            if timeline:
+                now = datetime.utcnow()
+                session.execute(insert(CRMInteraction), [
+                    {**entry, 'interaction_at': now, 'created_at': now} for entry in timeline
+                ])
+            if to_insert or to_update:
+                bump_data_version(session, LEADS)
+
+        summary = {status: 0 for status in ('created', 'updated', 'unchanged', 'duplicate', 'error')}
+        for result in results:
+            summary[result['status']] += 1
+        summary['review'] = sum(1 for result in results if result['review'])
+        return {'results': results, 'summary': summary}
+
+    def _prepare_bulk_lead(self, row: Dict[str, Any], *, user_id: Optional[int], owner: Optional[str]) -> Dict[str, Any]:
+        name = (row.get('name') or '').strip()
+        if not name:
+            raise ValueError('Nome e obrigatorio')
+
+        payload = {field: row.get(field) for field in LEAD_FIELDS if row.get(field) not in (None, '')}
+        payload['name'] = name
+        payload['status'] = self.validate_stage(row.get('status'))
+        payload.setdefault('customer_type', 'B2B')
+        payload['is_customer'] = bool(payload.get('is_customer', payload['status'] == 'cliente'))
+        if user_id and not payload.get('user_id'):
+            payload['user_id'] = user_id
+        if owner and not payload.get('owner'):
+            payload['owner'] = owner
+        payload.setdefault('google_place_id', None)
+        payload['dedupe_key'] = lead_dedupe_key(name, payload.get('city'))
+        payload['search_text'] = build_lead_search_text(payload)
+        payload['geohash'] = lead_geohash(payload.get('latitude'), payload.get('longitude'))
+        return payload
+
+    @staticmethod
+    def _available_dedupe_key(session, lead: CRMLead) -> Optional[str]:
+        """
+        ``name|city`` key for ``lead``, or None when another lead of the same seller
+        (both without place id) already holds it: the unique index keeps the oldest.
+        """
+        key = lead_dedupe_key(lead.name, lead.city)
+        if lead.google_place_id:
+            return key
+        with session.no_autoflush:
+            query = session.query(CRMLead.id).filter(
+                CRMLead.dedupe_key == key,
+                CRMLead.google_place_id.is_(None),
+                CRMLead.user_id == lead.user_id if lead.user_id else CRMLead.user_id.is_(None),
+            )
+            if lead.id is not None:
+                query = query.filter(CRMLead.id != lead.id)
+            taken = query.first() is not None
+        return None if taken else key
+
+    @staticmethod
+    def _conflicting_lead(session, payload: Dict[str, Any]) -> Optional[CRMLead]:
+        """Lead holding the unique key (place id, or seller + name/city) a bulk INSERT hit."""
+        query = session.query(CRMLead)
+        if payload.get('google_place_id'):
+            query = query.filter(CRMLead.google_place_id == payload['google_place_id'])
+        else:
+            owner_id = payload.get('user_id')
+            query = query.filter(
+                CRMLead.dedupe_key == payload['dedupe_key'],
+                CRMLead.google_place_id.is_(None),
+                CRMLead.user_id == owner_id if owner_id else CRMLead.user_id.is_(None),
+            )
+        return query.order_by(CRMLead.id).first()
+
+    @staticmethod
+    def _insert_leads(session, payloads: List[Dict[str, Any]]) -> Dict[str, int]:
+        """INSERT ... ON CONFLICT DO NOTHING (place id and seller + name/city); returns ids by batch identity."""
+        now = datetime.utcnow()
+        records = [
+            {**payload, 'created_at': now, 'updated_at': now, 'last_stage_change': now}
+            for payload in payloads
+        ]
+        # Todas as linhas precisam das mesmas colunas para um único INSERT em lote
+        columns = sorted({key for record in records for key in record})
+        records = [{column: record.get(column) for column in columns} for record in records]
+
+        dialect = session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            dialect_insert = None
+
+        if dialect_insert is not None:
+            # Sem alvo: cobre o google_place_id e os índices únicos de nome+cidade por vendedor
+            statement = dialect_insert(CRMLead).on_conflict_do_nothing()
+        else:
+            statement = insert(CRMLead)
+        rows = session.execute(
+            statement.returning(CRMLead.id, CRMLead.google_place_id, CRMLead.user_id, CRMLead.dedupe_key),
+            records,
+        ).all()
+        return {
+            _bulk_identity(place_id, user_id, dedupe_key): lead_id
+            for lead_id, place_id, user_id, dedupe_key in rows
+        }
+
     def get_lead(self, lead_id: int) -> Optional[Dict[str, Any]]:
         if not self.use_sqlalchemy:
             return self.db.get_crm_lead(lead_id)
@@ -285,13 +688,274 @@ class CRMService:
             )
 
         for lead in leads:
-            stage = lead.get('status')
-            normalized_stage = LEGACY_STAGE_MAP.get(stage, stage)
-            lead['status'] = normalized_stage
-            lead['status_label'] = self.stage_label(normalized_stage)
-            lead['status_badge'] = STAGE_BADGES.get(normalized_stage, 'secondary')
+            self._decorate_stage(lead)
         return leads
 
+    def _decorate_stage(self, lead: Dict[str, Any]) -> None:
+        stage = lead.get('status')
+        normalized_stage = LEGACY_STAGE_MAP.get(stage, stage)
+        lead['status'] = normalized_stage
+        lead['status_label'] = self.stage_label(normalized_stage)
+        lead['status_badge'] = STAGE_BADGES.get(normalized_stage, 'secondary')
+
+    def list_leads_page(
+        self,
+        status: Optional[str] = None,
+        owner: Optional[str] = None,
+        user_id: Optional[int] = None,
+        city: Optional[str] = None,
+        country: Optional[str] = None,
+        is_customer: Optional[bool] = None,
+        search: Optional[str] = None,
+        limit: int = LEAD_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Keyset page of leads, most recently updated first.
+
+        Pages are ordered by ``(updated_at, id)`` descending and continue after
+        ``cursor`` (the ``next_cursor`` of the previous page), so every page is an
+        index range scan no matter how deep it is.
+
+        Returns:
+            ``{'leads': [...], 'next_cursor': str | None, 'has_more': bool}``
+        """
+        limit = max(1, min(int(limit), LEAD_PAGE_SIZE_MAX))
+        filters = dict(
+            status=status, owner=owner, user_id=user_id, city=city,
+            country=country, is_customer=is_customer, search=search,
+        )
+
+        with session_scope() as session:
+            query = self._filter_leads(session.query(CRMLead), **filters)
+            if cursor:
+                cursor_updated_at, cursor_id = decode_lead_cursor(cursor)
+                query = query.filter(or_(
+                    CRMLead.updated_at < cursor_updated_at,
+                    and_(CRMLead.updated_at == cursor_updated_at, CRMLead.id < cursor_id),
+                ))
+            rows = (
+                query
+                .options(joinedload(CRMLead.user))
+                .order_by(CRMLead.updated_at.desc(), CRMLead.id.desc())
+                .limit(limit + 1)
+                .all()
+            )
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            next_cursor = encode_lead_cursor(rows[-1].updated_at, rows[-1].id) if has_more else None
+            leads = [self._serialize_lead(lead) for lead in rows]
+
+        for lead in leads:
+            self._decorate_stage(lead)
+        return {'leads': leads, 'next_cursor': next_cursor, 'has_more': has_more}
+
+    def search_leads(self, query: str, user_id: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Fuzzy, accent-insensitive search; best matches first, each with its ``search_rank``."""
+        hits = self.search_index.search(query, user_id=user_id, limit=max(1, min(int(limit), LEAD_PAGE_SIZE_MAX)))
+        if not hits:
+            return []
+
+        with session_scope() as session:
+            rows = (
+                session.query(CRMLead)
+                .options(joinedload(CRMLead.user))
+                .filter(CRMLead.id.in_([hit['id'] for hit in hits]))
+                .all()
+            )
+            by_id = {lead.id: self._serialize_lead(lead) for lead in rows}
+
+        leads = []
+        for hit in hits:
+            lead = by_id.get(hit['id'])
+            if lead is None:
+                continue
+            self._decorate_stage(lead)
+            lead['search_rank'] = hit['rank']
+            leads.append(lead)
+        return leads
+
+    def typeahead_leads(self, query: str, user_id: Optional[int] = None, limit: int = TYPEAHEAD_LIMIT) -> List[Dict[str, Any]]:
+        """Compact suggestions (id, name, city, country, status) for a search box."""
+        suggestions = self.search_index.typeahead(query, user_id=user_id, limit=limit)
+        for suggestion in suggestions:
+            self._decorate_stage(suggestion)
+        return suggestions
+
+    def nearby_leads(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        user_id: Optional[int] = None,
+        status: Optional[str] = None,
+        limit: int = NEARBY_LIMIT,
+    ) -> List[Dict[str, Any]]:
+        """Full leads within ``radius_km`` of a point, closest first, each with ``distance_km``."""
+        hits = self.geo_index.nearby(
+            latitude, longitude, radius_km,
+            user_id=user_id,
+            status=self.validate_stage(status) if status else None,
+            limit=limit,
+        )
+        if not hits:
+            return []
+
+        with session_scope() as session:
+            rows = (
+                session.query(CRMLead)
+                .options(joinedload(CRMLead.user))
+                .filter(CRMLead.id.in_([hit['id'] for hit in hits]))
+                .all()
+            )
+            by_id = {lead.id: self._serialize_lead(lead) for lead in rows}
+
+        leads = []
+        for hit in hits:
+            lead = by_id.get(hit['id'])
+            if lead is None:
+                continue
+            self._decorate_stage(lead)
+            lead['distance_km'] = hit['distance_km']
+            leads.append(lead)
+        return leads
+
+    def leads_in_viewport(
+        self,
+        south: float,
+        west: float,
+        north: float,
+        east: float,
+        user_id: Optional[int] = None,
+        status: Optional[str] = None,
+        limit: int = VIEWPORT_LIMIT,
+    ) -> Dict[str, Any]:
+        """Compact map points (id, name, status, city, coordinates) inside a viewport."""
+        result = self.geo_index.in_viewport(
+            south, west, north, east,
+            user_id=user_id,
+            status=self.validate_stage(status) if status else None,
+            limit=limit,
+        )
+        for point in result['leads']:
+            self._decorate_stage(point)
+        return result
+
+    def find_duplicate_leads(
+        self,
+        user_id: Optional[int] = None,
+        threshold: float = MATCH_THRESHOLD,
+        limit: int = DUPLICATE_PROPOSALS_LIMIT,
+    ) -> Dict[str, Any]:
+        """
+        Merge proposals for leads that look like the same business.
+
+        Leads are matched by phone/WhatsApp, Instagram or place id, or by a name at
+        or above ``threshold`` in the same city (see ``entity_resolution``). Each
+        proposal keeps the oldest lead; nothing is merged here.
+
+        Returns:
+            ``{'proposals': [{'keep', 'merge', 'score', 'reasons', 'pairs'}], 'total', 'scanned'}``
+            where ``keep``/``merge`` are compact leads (id, name, city, status, contacts)
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError('threshold deve estar entre 0 e 1')
+
+        with session_scope() as session:
+            query = session.query(*[getattr(CRMLead, field) for field in ENTITY_FIELDS], CRMLead.status)
+            if user_id:
+                query = query.filter(CRMLead.user_id == user_id)
+            rows = query.order_by(CRMLead.id).all()
+
+        proposals = find_duplicates([lead_entity_record(row) for row in rows], threshold=threshold)
+        by_id = {
+            row.id: {**{field: getattr(row, field) for field in ENTITY_FIELDS}, 'status': row.status}
+            for row in rows
+        }
+        selected = []
+        for proposal in proposals[:max(1, min(limit, 1000))]:
+            leads = [dict(by_id[lead_id]) for lead_id in (proposal['keep_id'], *proposal['merge_ids'])]
+            for lead in leads:
+                self._decorate_stage(lead)
+            selected.append({
+                'keep': leads[0],
+                'merge': leads[1:],
+                'score': proposal['score'],
+                'reasons': proposal['reasons'],
+                'pairs': proposal['pairs'],
+            })
+        return {'proposals': selected, 'total': len(proposals), 'scanned': len(rows)}
+
+    def _lead_entity_index(self, session, version: int) -> EntityIndex:
+        """
+        Entity-resolution index of every lead, kept in sync with ``version``.
+
+        Built once; afterwards a new version only re-reads the leads changed since
+        the last sync (``updated_at``, with a safety margin) and drops deleted ones.
+        Re-added leads replace their old keys, so a changed phone stops matching.
+        """
+        with _entity_index_lock:
+            index = _entity_index_state['index']
+            if index is not None and _entity_index_state['version'] == version:
+                return index
+
+            started = datetime.utcnow()
+            columns = [getattr(CRMLead, field) for field in ENTITY_FIELDS]
+            if index is None:
+                index = EntityIndex().add_many(
+                    lead_entity_record(row, scoped=True) for row in session.query(*columns)
+                )
+            else:
+                since = _entity_index_state['synced_at'] - ENTITY_INDEX_SYNC_MARGIN
+                changed = session.query(*columns).filter(CRMLead.updated_at >= since).all()
+                index.add_many(lead_entity_record(row, scoped=True) for row in changed)
+                total = session.query(func.count(CRMLead.id)).scalar() or 0
+                if total != len(index):
+                    # Leads excluídos (ou mesclados) desde a última sincronização
+                    alive = {lead_id for lead_id, in session.query(CRMLead.id)}
+                    for lead_id in [lead_id for lead_id in index.records if lead_id not in alive]:
+                        index.remove(lead_id)
+            _entity_index_state.update(version=version, index=index, synced_at=started)
+            return index
+
+    def count_leads_by_stage(
+        self,
+        owner: Optional[str] = None,
+        user_id: Optional[int] = None,
+        city: Optional[str] = None,
+        country: Optional[str] = None,
+        is_customer: Optional[bool] = None,
+        search: Optional[str] = None,
+    ) -> Dict[str, int]:
+        """
+        Lead count per pipeline stage for the given filters (kanban column totals).
+
+        Cached by filters and the leads data version, so it is recomputed only after
+        a lead write.
+        """
+        filters = dict(owner=owner, user_id=user_id, city=city, country=country, is_customer=is_customer, search=search)
+        signature = '|'.join(f'{key}={value}' for key, value in sorted(filters.items()) if value is not None)
+
+        with session_scope() as session:
+            version = get_data_version(LEADS, session)
+            cache_key = ('crm', 'stage_counts', signature, str(version))
+            cached = _stage_counts_cache.get(cache_key)
+            if cached is not None:
+                return dict(cached)
+
+            rows = (
+                self._filter_leads(session.query(CRMLead.status, func.count(CRMLead.id)), **filters)
+                .group_by(CRMLead.status)
+                .all()
+            )
+
+        counts = {stage: 0 for stage in DEFAULT_PIPELINE_STAGES}
+        for stage, count in rows:
+            normalized = LEGACY_STAGE_MAP.get(stage, stage) or DEFAULT_PIPELINE_STAGES[0]
+            counts[normalized] = counts.get(normalized, 0) + int(count)
+        _stage_counts_cache.set(cache_key, counts)
+        return dict(counts)
+
     def update_lead(self, lead_id: int, **updates: Any) -> None:
         if not updates:
             return
@@ -367,16 +1031,15 @@ class CRMService:
         else:
             self._delete_lead_sqlalchemy(lead_id)
 
-    def delete_all_leads(self) -> int:
-        """Delete all leads and their interactions. Returns count of deleted leads."""
+    def delete_all_leads(self) -> PurgeReport:
+        """Delete all leads and their interactions (orders are unlinked). Returns the per-table counts."""
         if not self.use_sqlalchemy:
             # SQLite implementation would go here if needed
             raise NotImplementedError("delete_all_leads not implemented for SQLite")
 
         with session_scope() as session:
-            count = session.query(CRMLead).count()
-            session.query(CRMLead).delete()
-            return count
+            report = purge_leads(session)
+        return report
 
     # ----------------------
     # Timeline helpers
@@ -387,31 +1050,170 @@ class CRMService:
             interactions = self.db.list_crm_interactions(lead_id, limit=limit)
         else:
             interactions = self._list_crm_interactions_sqlalchemy(lead_id, limit=limit)
-        timeline: List[Dict[str, Any]] = []
-        for interaction in interactions:
-            metadata = self._parse_metadata(interaction.get('metadata'))
-            timeline.append({
-                'id': interaction.get('id'),
-                'interaction_type': interaction.get('interaction_type'),
-                'subject': interaction.get('subject'),
-                'notes': interaction.get('notes'),
-                'owner': interaction.get('owner'),
-                'channel': interaction.get('channel'),
-                'interaction_at': self._normalize_timestamp(interaction.get('interaction_at')),
-                'follow_up_at': self._normalize_timestamp(interaction.get('follow_up_at')),
-                'metadata': metadata,
-            })
-        return timeline
+        return [self._timeline_entry(interaction) for interaction in interactions]
 
-    def add_comment(self, lead_id: int, notes: str, owner: Optional[str] = None) -> int:
+    def list_interactions_for_leads(
+        self,
+        lead_ids: List[int],
+        limit: int = TIMELINE_PREVIEW_LIMIT,
+        user_id: Optional[int] = None,
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Latest ``limit`` interactions of many leads in one query, grouped by lead id.
+
+        Ranks rows with ``ROW_NUMBER() OVER (PARTITION BY lead_id ORDER BY
+        interaction_at DESC, id DESC)`` (served by ``ix_crm_interactions_lead_time``).
+        Every requested lead that exists, and belongs to ``user_id`` when given, is a
+        key, with an empty list when it has no interactions.
+        """
+        ids = sorted({int(lead_id) for lead_id in lead_ids})
+        if len(ids) > MAX_TIMELINE_LEADS:
+            raise ValueError(f"Máximo de {MAX_TIMELINE_LEADS} leads por chamada")
+        if not ids:
+            return {}
+        limit = max(1, min(int(limit), 500))
+
+        with session_scope() as session:
+            leads_query = session.query(CRMLead.id).filter(CRMLead.id.in_(ids))
+            if user_id:
+                leads_query = leads_query.filter(CRMLead.user_id == user_id)
+            timelines: Dict[int, List[Dict[str, Any]]] = {lead_id: [] for (lead_id,) in leads_query}
+            if not timelines:
+                return {}
+
+            position = func.row_number().over(
+                partition_by=CRMInteraction.lead_id,
+                order_by=(CRMInteraction.interaction_at.desc(), CRMInteraction.id.desc()),
+            ).label('position')
+            ranked = (
+                session.query(
+                    CRMInteraction.id, CRMInteraction.lead_id, CRMInteraction.interaction_type,
+                    CRMInteraction.subject, CRMInteraction.notes, CRMInteraction.owner,
+                    CRMInteraction.channel, CRMInteraction.interaction_at, CRMInteraction.follow_up_at,
+                    CRMInteraction.metadata_json.label('metadata'), position,
+                )
+                .filter(CRMInteraction.lead_id.in_(list(timelines)))
+                .subquery()
+            )
+            rows = (
+                session.query(ranked)
+                .filter(ranked.c.position <= limit)
+                .order_by(ranked.c.lead_id, ranked.c.position)
+                .all()
+            )
+
+        for row in rows:
+            timelines[row.lead_id].append(self._timeline_entry(row._mapping))
+        return timelines
+
+    def due_follow_ups(
+        self,
+        user_id: Optional[int] = None,
+        until: Optional[date] = None,
+        overdue_days: int = FOLLOW_UP_OVERDUE_DAYS,
+        limit: int = FOLLOW_UPS_LIMIT,
+    ) -> Dict[str, Any]:
+        """
+        Pending follow-ups due by the end of ``until`` (default: today, UTC), oldest first.
+
+        A follow-up is pending while its lead has no newer interaction at or after the
+        follow-up time; only the latest pending one per lead is listed. The range scan
+        on ``ix_crm_interactions_follow_up`` goes back ``overdue_days`` days.
+
+        Returns:
+            ``{'follow_ups': [{'lead', 'interaction', 'follow_up_at', 'overdue'}], 'total', 'overdue', 'date'}``
+        """
+        if overdue_days < 0:
+            raise ValueError('overdue_days deve ser positivo')
+        day = until or datetime.utcnow().date()
+        day_start = datetime.combine(day, time.min)
+        day_end = day_start + timedelta(days=1)
+        later = aliased(CRMInteraction)
+
+        with session_scope() as session:
+            handled = (
+                session.query(later.id)
+                .filter(
+                    later.lead_id == CRMInteraction.lead_id,
+                    later.id != CRMInteraction.id,
+                    later.interaction_at >= CRMInteraction.follow_up_at,
+                    later.interaction_at >= CRMInteraction.interaction_at,
+                )
+                .exists()
+            )
+            query = (
+                session.query(
+                    CRMInteraction, CRMLead.name, CRMLead.city, CRMLead.status,
+                    CRMLead.phone, CRMLead.whatsapp, CRMLead.user_id,
+                )
+                .join(CRMLead, CRMLead.id == CRMInteraction.lead_id)
+                .filter(
+                    CRMInteraction.follow_up_at >= day_start - timedelta(days=overdue_days),
+                    CRMInteraction.follow_up_at < day_end,
+                    ~handled,
+                )
+            )
+            if user_id:
+                query = query.filter(CRMLead.user_id == user_id)
+            rows = query.order_by(CRMInteraction.follow_up_at, CRMInteraction.id).all()
+
+            latest: Dict[int, Dict[str, Any]] = {}
+            for interaction, name, city, status, phone, whatsapp, owner_id in rows:
+                lead = {
+                    'id': interaction.lead_id, 'name': name, 'city': city, 'status': status,
+                    'phone': phone, 'whatsapp': whatsapp, 'user_id': owner_id,
+                }
+                self._decorate_stage(lead)
+                latest[interaction.lead_id] = {
+                    'lead': lead,
+                    'interaction': self._timeline_entry(self._serialize_interaction(interaction)),
+                    'follow_up_at': interaction.follow_up_at.isoformat(),
+                    'overdue': interaction.follow_up_at < day_start,
+                }
+
+        follow_ups = sorted(latest.values(), key=lambda item: item['follow_up_at'])
+        return {
+            'follow_ups': follow_ups[:max(1, limit)],
+            'total': len(follow_ups),
+            'overdue': sum(1 for item in follow_ups if item['overdue']),
+            'date': day.isoformat(),
+        }
+
+    def _timeline_entry(self, interaction: Any) -> Dict[str, Any]:
+        """Timeline item from a serialized interaction (or row mapping with the same keys)."""
+        return {
+            'id': interaction.get('id'),
+            'interaction_type': interaction.get('interaction_type'),
+            'subject': interaction.get('subject'),
+            'notes': interaction.get('notes'),
+            'owner': interaction.get('owner'),
+            'channel': interaction.get('channel'),
+            'interaction_at': self._normalize_timestamp(interaction.get('interaction_at')),
+            'follow_up_at': self._normalize_timestamp(interaction.get('follow_up_at')),
+            'metadata': self._parse_metadata(interaction.get('metadata')),
+        }
+
+    def add_comment(
+        self,
+        lead_id: int,
+        notes: str,
+        owner: Optional[str] = None,
+        follow_up_at: Optional[Any] = None,
+    ) -> int:
         if not notes or not notes.strip():
             raise ValueError('Comentário não pode ser vazio')
+        if follow_up_at and not isinstance(follow_up_at, datetime):
+            try:
+                follow_up_at = datetime.fromisoformat(str(follow_up_at))
+            except ValueError as exc:
+                raise ValueError('Data de follow-up inválida') from exc
         return self._record_interaction(
             lead_id,
             interaction_type='comment',
             subject='Comentário',
             notes=notes.strip(),
             owner=owner.strip() if owner else None,
+            follow_up_at=follow_up_at or None,
         )
 
     # ----------------------
@@ -470,43 +1272,13 @@ class CRMService:
         return leads
 
     def _list_leads_sqlalchemy(self, **filters: Any) -> List[Dict[str, Any]]:
-        status = filters.get('status')
-        owner = filters.get('owner')
-        user_id = filters.get('user_id')
-        city = filters.get('city')
-        country = filters.get('country')
-        is_customer = filters.get('is_customer')
-        search = filters.get('search')
-        limit = int(filters.get('limit', 200))
-        offset = int(filters.get('offset', 0))
+        limit = int(filters.pop('limit', 200))
+        offset = int(filters.pop('offset', 0))
 
         with session_scope() as session:
-            query = session.query(CRMLead)
-
-            if status:
-                query = query.filter(CRMLead.status == self.validate_stage(status))
-            if owner:
-                query = query.filter(CRMLead.owner == owner)
-            if user_id:
-                query = query.filter(CRMLead.user_id == user_id)
-            if city:
-                query = query.filter(CRMLead.city == city)
-            if country:
-                query = query.filter(CRMLead.country == country)
-            if is_customer is not None:
-                query = query.filter(CRMLead.is_customer.is_(bool(is_customer)))
-            if search:
-                pattern = f"%{search.lower()}%"
-                query = query.filter(
-                    or_(
-                        func.lower(CRMLead.name).like(pattern),
-                        func.lower(CRMLead.city).like(pattern),
-                        func.lower(CRMLead.state).like(pattern)
-                    )
-                )
-
             leads = (
-                query
+                self._filter_leads(session.query(CRMLead), **filters)
+                .options(joinedload(CRMLead.user))
                 .order_by(CRMLead.updated_at.desc(), CRMLead.id.desc())
                 .offset(offset)
                 .limit(limit)
@@ -515,6 +1287,34 @@ class CRMService:
 
             return [self._serialize_lead(lead) for lead in leads]
 
+    def _filter_leads(self, query, **filters: Any):
+        """Apply the listing filters shared by pages, offsets and stage counts."""
+        status = filters.get('status')
+        owner = filters.get('owner')
+        user_id = filters.get('user_id')
+        city = filters.get('city')
+        country = filters.get('country')
+        is_customer = filters.get('is_customer')
+        search = filters.get('search')
+
+        if status:
+            query = query.filter(CRMLead.status == self.validate_stage(status))
+        if owner:
+            query = query.filter(CRMLead.owner == owner)
+        if user_id:
+            query = query.filter(CRMLead.user_id == user_id)
+        if city:
+            query = query.filter(CRMLead.city == city)
+        if country:
+            query = query.filter(CRMLead.country == country)
+        if is_customer is not None:
+            query = query.filter(CRMLead.is_customer.is_(bool(is_customer)))
+        if search:
+            # Sem acentos/caixa; cada palavra precisa aparecer (índice trigram no PostgreSQL)
+            for token in normalize_search_text(search).split():
+                query = query.filter(CRMLead.search_text.like(f'%{token}%'))
+        return query
+
     def _update_lead_sqlite(self, lead_id: int, **updates: Any):
         current_lead = self.db.get_crm_lead(lead_id)
         if not current_lead:
@@ -597,25 +1397,24 @@ class CRMService:
             if not updates:
                 return None
 
-            allowed_fields = [
-                'name', 'category', 'customer_type', 'status', 'source', 'search_keyword', 'search_city',
-                'address_line', 'address_number', 'address_complement', 'neighborhood',
-                'city', 'state', 'postal_code', 'country', 'latitude', 'longitude',
-                'phone', 'whatsapp', 'email', 'instagram', 'website', 'primary_contact_name',
-                'owner', 'user_id', 'notes', 'google_place_id', 'is_customer', 'converted_account_id'
-            ]
-
             for field, value in updates.items():
-                if field not in allowed_fields:
+                if field not in LEAD_FIELDS:
                     continue
                 if field == 'is_customer':
                     setattr(lead, field, bool(value))
                 else:
                     setattr(lead, field, value)
 
+            if any(field in updates for field in SEARCH_FIELDS):
+                lead.search_text = build_lead_search_text(lead)
+            if any(field in updates for field in ('name', 'city', 'user_id', 'google_place_id')):
+                lead.dedupe_key = self._available_dedupe_key(session, lead)
+            if 'latitude' in updates or 'longitude' in updates:
+                lead.geohash = lead_geohash(lead.latitude, lead.longitude)
             if status_changed:
                 lead.last_stage_change = datetime.utcnow()
             lead.updated_at = datetime.utcnow()
+            bump_data_version(session, LEADS)
 
             session.flush()
             updated_data = self._serialize_lead(lead)
@@ -652,6 +1451,7 @@ class CRMService:
             lead = session.get(CRMLead, lead_id)
             if lead:
                 session.delete(lead)
+                bump_data_version(session, LEADS)
 
     # ----------------------
     # Serialization helpers
@@ -0,0 +1,257 @@
+"""Dashboard result cache - in-process LRU with TTL plus an optional shared backend.
+
+Entries are keyed by ``(user_id or 'all', target_currency, month, data_version)``. The
+data version combines the ``data_versions`` generations of orders, exchange rates and
+CRM leads (lead funnel), so any write bumps it and old payloads are simply never looked up again (they age out
+by TTL/LRU). A shared backend lets other workers reuse a payload computed elsewhere.
+
+Backend selection (``DASHBOARD_CACHE_BACKEND``): unset = only in-process,
+``db`` = table ``dashboard_cache_entries``, ``redis`` = ``REDIS_URL``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from ..db import session_scope
+from ..models import DashboardCacheEntry
+from ..services.data_versions import EXCHANGE_RATES, LEADS, ORDERS, get_data_versions
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 256
+DASHBOARD_VERSION_KEYS = (ORDERS, EXCHANGE_RATES, LEADS)
+
+CacheKey = Tuple[str, str, str, str]
+
+
+def dashboard_data_version(session=None) -> str:
+    """Combined generation of everything the dashboard reads, e.g. ``'12.3.40'``."""
+    versions = get_data_versions(DASHBOARD_VERSION_KEYS, session)
+    return '.'.join(str(versions[key]) for key in DASHBOARD_VERSION_KEYS)
+
+
+def make_cache_key(
+    user_id: Optional[int],
+    target_currency: Optional[str],
+    month: Optional[str],
+    data_version: str,
+) -> CacheKey:
+    return (
+        str(user_id) if user_id is not None else 'all',
+        (target_currency or 'BRL').upper(),
+        month or '',
+        data_version,
+    )
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+# -------------------------------------------------------------------------
+# Shared backends (payloads as JSON strings)
+# -------------------------------------------------------------------------
+
+class DatabaseCacheBackend:
+    """Shared cache in ``dashboard_cache_entries``; works with SQLite and PostgreSQL."""
+
+    def get(self, key: str) -> Optional[str]:
+        with session_scope() as session:
+            entry = session.get(DashboardCacheEntry, key)
+            if entry is None or entry.expires_at <= datetime.utcnow():
+                return None
+            return entry.payload
+
+    def set(self, key: str, payload: str, ttl: float) -> None:
+        now = datetime.utcnow()
+        with session_scope() as session:
+            # Entradas de versões antigas nunca mais são lidas: limpar as vencidas aqui
+            session.query(DashboardCacheEntry).filter(DashboardCacheEntry.expires_at <= now).delete()
+            session.merge(DashboardCacheEntry(
+                key=key,
+                payload=payload,
+                expires_at=now + timedelta(seconds=ttl),
+                created_at=now,
+            ))
+
+    def clear(self) -> None:
+        with session_scope() as session:
+            session.query(DashboardCacheEntry).delete()
+
+
+class RedisCacheBackend:
+    """Shared cache in Redis (``SETEX``); requires the optional ``redis`` package."""
+
+    def __init__(self, url: str, prefix: str = 'dashboard:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key: str, payload: str, ttl: float) -> None:
+        self.client.setex(self.prefix + key, max(1, int(ttl)), payload)
+
+    def clear(self) -> None:
+        for name in self.client.scan_iter(match=f'{self.prefix}*'):
+            self.client.delete(name)
+
+
+# -------------------------------------------------------------------------
+# Cache
+# -------------------------------------------------------------------------
+
+class DashboardCache:
+    """
+    Thread-safe LRU with TTL in front of an optional shared backend.
+
+    With ``serialize=True`` payloads are kept as the JSON the shared backend stores and
+    every ``get`` returns a fresh copy, so a caller that changes its payload cannot
+    change what other requests receive (values must be JSON-serializable). Otherwise
+    entries are stored by reference, for values such as fitted models. Backend failures never break the dashboard: they are logged and the in-process
+    layer keeps working.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        backend=None,
+        serialize: bool = False,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.serialize = serialize
+        # serialize=True: JSON do payload; senão, o próprio objeto
+        self._entries: 'OrderedDict[CacheKey, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _backend_key(key: CacheKey) -> str:
+        return ':'.join(key)
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, stored = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                else:
+                    del self._entries[key]
+                    entry = None
+        if entry is not None:
+            return json.loads(stored) if self.serialize else stored
+
+        if self.backend is not None:
+            try:
+                payload = self.backend.get(self._backend_key(key))
+            except Exception as exc:
+                print(f"⚠️ Cache compartilhado do dashboard indisponível: {exc}")
+                payload = None
+            if payload is not None:
+                value = json.loads(payload)
+                self._store(key, payload if self.serialize else value)
+                with self._lock:
+                    self.shared_hits += 1
+                return json.loads(payload) if self.serialize else value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: CacheKey, value: Dict[str, Any]) -> None:
+        payload = None
+        if self.serialize or self.backend is not None:
+            payload = json.dumps(value, default=_json_default)
+        self._store(key, payload if self.serialize else value)
+        if self.backend is not None:
+            try:
+                self.backend.set(self._backend_key(key), payload, self.ttl)
+            except Exception as exc:
+                print(f"⚠️ Falha ao gravar cache compartilhado do dashboard: {exc}")
+
+    def _store(self, key: CacheKey, stored: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            try:
+                self.backend.clear()
+            except Exception as exc:
+                print(f"⚠️ Falha ao limpar cache compartilhado do dashboard: {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'backend': type(self.backend).__name__ if self.backend is not None else None,
+            }
+
+
+def create_backend_from_env():
+    backend = (os.getenv('DASHBOARD_CACHE_BACKEND') or '').strip().lower()
+    if backend == 'db':
+        return DatabaseCacheBackend()
+    if backend == 'redis':
+        try:
+            return RedisCacheBackend(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        except ImportError:
+            print("⚠️ DASHBOARD_CACHE_BACKEND=redis, mas o pacote redis não está instalado")
+    return None
+
+
+_dashboard_cache: Optional[DashboardCache] = None
+_dashboard_cache_lock = threading.Lock()
+
+
+def get_dashboard_cache() -> DashboardCache:
+    """Process-wide cache shared by every SalesAnalyzer (including per-request ones)."""
+    global _dashboard_cache
+    if _dashboard_cache is None:
+        with _dashboard_cache_lock:
+            if _dashboard_cache is None:
+                _dashboard_cache = DashboardCache(
+                    ttl=float(os.getenv('DASHBOARD_CACHE_TTL', DEFAULT_TTL_SECONDS)),
+                    backend=create_backend_from_env(),
+                    serialize=True,
+                )
+    return _dashboard_cache
+
+
+__all__ = [
+    'DashboardCache', 'DatabaseCacheBackend', 'RedisCacheBackend',
+    'dashboard_data_version', 'make_cache_key', 'get_dashboard_cache',
+]
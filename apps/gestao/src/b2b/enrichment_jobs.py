@@ -0,0 +1,435 @@
+"""Background lead enrichment jobs with progress polling.
+
+``POST /crm/api/leads/enrich-jobs`` starts a job and returns at once; the job
+enriches leads through ``LeadEnrichmentService.enrich_batch`` (thread pool with
+per-host limits) and ``GET /crm/api/leads/enrich-jobs/<id>`` reports progress.
+The same manager runs the duplicate-lead scan behind ``/crm/api/leads/duplicates``
+(too slow for a request with tens of thousands of leads) and keeps its result
+until leads change.
+
+A job runs in the worker that started it, but its status, progress and results live
+in ``background_jobs`` (like ``DashboardCacheEntry``), so the progress poll can land
+on any gunicorn worker. Progress is written at most every ``PERSIST_INTERVAL_SECONDS``;
+the owning worker refreshes ``heartbeat_at`` of its unfinished jobs, and a job whose
+heartbeat stops (worker restarted) is reported as failed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..db import session_scope
+from ..models import BackgroundJob
+from ..services.data_versions import LEADS, get_data_version
+from .entity_resolution import MATCH_THRESHOLD
+from .lead_enrichment import LeadEnrichmentService
+
+MAX_JOB_LEADS = 500
+MAX_RUNNING_JOBS = int(os.getenv('LEAD_ENRICH_MAX_JOBS', '2'))
+JOB_TTL_SECONDS = 3600
+# Progresso gravado no banco no máximo uma vez por intervalo (e sempre ao terminar)
+PERSIST_INTERVAL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 60
+# Sem heartbeat por esse tempo, o worker dono morreu: o job é dado como falho
+STALE_JOB_SECONDS = 300
+# Mesmos campos do enriquecimento individual (/enrich-full)
+UPDATABLE_FIELDS = ('phone', 'website', 'instagram', 'whatsapp')
+# Propostas guardadas por varredura de duplicados; a rota corta no limit pedido
+MAX_DUPLICATE_PROPOSALS = 1000
+UNFINISHED = ('queued', 'running')
+INTERRUPTED_ERROR = 'Job interrompido (worker reiniciado)'
+
+
+@dataclass
+class EnrichmentJob:
+    id: str
+    user_id: Optional[int]
+    total: int
+    kind: str  # 'leads' (já salvos no CRM), 'discovery' (resultados da busca) ou 'duplicates'
+    status: str = 'queued'
+    done: int = 0
+    failed: int = 0
+    results: List[Optional[Dict[str, Any]]] = field(default_factory=list)
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    scope: Optional[str] = None  # duplicates: "<user_id>|<threshold>"
+    data_version: Optional[int] = None  # duplicates: versão de LEADS varrida
+    persisted_at: float = field(default=0.0, repr=False, compare=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self, include_results: bool = True) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 2)
+        data = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'total': self.total,
+            'done': self.done,
+            'failed': self.failed,
+            'progress': round(self.done / self.total, 3) if self.total else 1.0,
+            'elapsed_seconds': elapsed,
+            'error': self.error,
+        }
+        if include_results:
+            data['results'] = [result for result in self.results if result is not None]
+        return data
+
+    def to_row(self) -> BackgroundJob:
+        return BackgroundJob(
+            id=self.id,
+            kind=self.kind,
+            user_id=self.user_id,
+            scope=self.scope,
+            status=self.status,
+            total=self.total,
+            done=self.done,
+            failed=self.failed,
+            results=json.dumps(self.results, ensure_ascii=False, default=str),
+            error=self.error,
+            data_version=self.data_version,
+            created_at=_datetime(self.created_at),
+            started_at=_datetime(self.started_at),
+            finished_at=_datetime(self.finished_at),
+            heartbeat_at=datetime.utcnow(),
+        )
+
+    @classmethod
+    def from_row(cls, row: BackgroundJob) -> 'EnrichmentJob':
+        job = cls(
+            id=row.id,
+            user_id=row.user_id,
+            total=row.total or 0,
+            kind=row.kind,
+            status=row.status,
+            done=row.done or 0,
+            failed=row.failed or 0,
+            results=json.loads(row.results) if row.results else [],
+            error=row.error,
+            created_at=_epoch(row.created_at),
+            started_at=_epoch(row.started_at),
+            finished_at=_epoch(row.finished_at),
+            scope=row.scope,
+            data_version=row.data_version,
+        )
+        if job.status in UNFINISHED and row.heartbeat_at < datetime.utcnow() - timedelta(seconds=STALE_JOB_SECONDS):
+            job.status = 'failed'
+            job.error = INTERRUPTED_ERROR
+            job.finished_at = _epoch(row.heartbeat_at)
+        return job
+
+
+def _datetime(value: Optional[float]) -> Optional[datetime]:
+    return datetime.utcfromtimestamp(value) if value is not None else None
+
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    """Naive UTC datetime (as stored) to epoch seconds."""
+    return (value - datetime(1970, 1, 1)).total_seconds() if value is not None else None
+
+
+class EnrichmentJobManager:
+    """Runs enrichment jobs in background threads and keeps their progress in the database."""
+
+    def __init__(
+        self,
+        enrichment_service: LeadEnrichmentService,
+        crm_service=None,
+        google_maps_client=None,
+        max_running_jobs: int = MAX_RUNNING_JOBS,
+    ):
+        self.enrichment_service = enrichment_service
+        self.crm_service = crm_service
+        self.google_maps_client = google_maps_client
+        self._executor = ThreadPoolExecutor(max_workers=max_running_jobs, thread_name_prefix='lead-enrich')
+        # Jobs ainda não terminados que rodam neste worker (estado mais novo que o do banco)
+        self._jobs: Dict[str, EnrichmentJob] = {}
+        self._lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def start(
+        self,
+        lead_ids: Optional[List[int]] = None,
+        leads: Optional[List[Dict[str, Any]]] = None,
+        user_id: Optional[int] = None,
+    ) -> EnrichmentJob:
+        """
+        Queue a job for saved leads (``lead_ids``) or for discovery results (``leads``).
+
+        Saved leads get their empty phone/website/instagram/whatsapp filled in the CRM;
+        discovery results are only returned in the job results. ``user_id`` restricts a
+        seller to their own leads.
+        """
+        if bool(lead_ids) == bool(leads):
+            raise ValueError('Informe lead_ids ou leads')
+        items = lead_ids or leads
+        if not isinstance(items, list):
+            raise ValueError('lead_ids e leads devem ser listas')
+        if len(items) > MAX_JOB_LEADS:
+            raise ValueError(f"Máximo de {MAX_JOB_LEADS} leads por job")
+        if lead_ids:
+            if self.crm_service is None:
+                raise ValueError('CRM indisponível para enriquecer leads salvos')
+            # Validado antes de registrar o job: um id inválido não deixa job "queued" órfão
+            try:
+                lead_ids = [int(lead_id) for lead_id in lead_ids]
+            except (TypeError, ValueError) as exc:
+                raise ValueError('lead_ids deve conter apenas números') from exc
+
+        job = EnrichmentJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            total=len(items),
+            kind='leads' if lead_ids else 'discovery',
+            results=[None] * len(items),
+        )
+        self._register(job)
+        if lead_ids:
+            self._executor.submit(self._run_saved, job, lead_ids)
+        else:
+            self._executor.submit(self._run_discovery, job, leads)
+        return job
+
+    def duplicate_scans(
+        self,
+        user_id: Optional[int] = None,
+        threshold: float = MATCH_THRESHOLD,
+        refresh: bool = False,
+    ) -> Tuple[Optional[EnrichmentJob], Optional[EnrichmentJob]]:
+        """
+        Latest finished duplicate-lead scan for the seller/threshold and the one in progress.
+
+        A scan (``CRMService.find_duplicate_leads``) is queued when there is none yet,
+        when leads changed since the last one (LEADS data version) or on ``refresh``;
+        the previous result stays available while it runs.
+
+        Returns:
+            ``(finished, running)``, either may be None
+        """
+        if self.crm_service is None:
+            raise ValueError('CRM indisponível para buscar duplicados')
+        if not 0 < threshold <= 1:
+            raise ValueError('threshold deve estar entre 0 e 1')
+
+        scope = f"{user_id or ''}|{round(threshold, 4)}"
+        version = get_data_version(LEADS)
+        with session_scope() as session:
+            rows = (
+                session.query(BackgroundJob)
+                .filter(BackgroundJob.kind == 'duplicates', BackgroundJob.scope == scope)
+                .order_by(BackgroundJob.created_at.desc())
+                .limit(10)
+                .all()
+            )
+            with self._lock:
+                local = {row.id: self._jobs.get(row.id) for row in rows}
+            jobs = [local[row.id] or EnrichmentJob.from_row(row) for row in rows]
+
+        finished = running = None
+        for job in jobs:
+            if job.finished:
+                finished = finished or job
+            else:
+                running = running or job
+        if running is not None or not (refresh or finished is None or finished.data_version != version):
+            return finished, running
+
+        running = EnrichmentJob(
+            id=uuid.uuid4().hex, user_id=user_id, total=1, kind='duplicates', results=[None], scope=scope,
+        )
+        self._register(running)
+        self._executor.submit(self._run_duplicates, running, threshold)
+        return finished, running
+
+    def get(self, job_id: str, user_id: Optional[int] = None) -> Optional[EnrichmentJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            with session_scope() as session:
+                row = session.get(BackgroundJob, job_id)
+                job = EnrichmentJob.from_row(row) if row is not None else None
+        if job is None or (user_id is not None and job.user_id != user_id):
+            return None
+        return job
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _register(self, job: EnrichmentJob) -> None:
+        self._prune()
+        with self._lock:
+            self._jobs[job.id] = job
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(
+                    target=self._heartbeat_loop, name='lead-enrich-heartbeat', daemon=True,
+                )
+                self._heartbeat.start()
+        self._persist(job, force=True)
+
+    def _persist(self, job: EnrichmentJob, force: bool = False) -> None:
+        """Write the job row; progress updates are throttled unless ``force``."""
+        with self._persist_lock:
+            now = time.time()
+            if not force and now - job.persisted_at < PERSIST_INTERVAL_SECONDS:
+                return
+            with self._lock:
+                row = job.to_row()
+                job.persisted_at = now
+            try:
+                with session_scope() as session:
+                    session.merge(row)
+            except Exception as exc:
+                print(f"⚠️ Falha ao gravar job {job.id}: {exc}")
+
+    def _heartbeat_loop(self) -> None:
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self._lock:
+                job_ids = list(self._jobs)
+            if not job_ids:
+                continue
+            try:
+                with session_scope() as session:
+                    session.query(BackgroundJob).filter(BackgroundJob.id.in_(job_ids)).update(
+                        {BackgroundJob.heartbeat_at: datetime.utcnow()}, synchronize_session=False,
+                    )
+            except Exception as exc:
+                print(f"⚠️ Falha ao renovar heartbeat dos jobs: {exc}")
+
+    def _prune(self) -> None:
+        """Drop finished jobs past the TTL and mark jobs of dead workers as failed."""
+        now = datetime.utcnow()
+        try:
+            with session_scope() as session:
+                session.query(BackgroundJob).filter(
+                    BackgroundJob.status.in_(UNFINISHED),
+                    BackgroundJob.heartbeat_at < now - timedelta(seconds=STALE_JOB_SECONDS),
+                ).update({
+                    BackgroundJob.status: 'failed',
+                    BackgroundJob.error: INTERRUPTED_ERROR,
+                    BackgroundJob.finished_at: BackgroundJob.heartbeat_at,
+                }, synchronize_session=False)
+                session.query(BackgroundJob).filter(
+                    BackgroundJob.status.notin_(UNFINISHED),
+                    BackgroundJob.finished_at < now - timedelta(seconds=JOB_TTL_SECONDS),
+                ).delete(synchronize_session=False)
+        except Exception as exc:
+            print(f"⚠️ Falha ao limpar jobs antigos: {exc}")
+
+    def _record(self, job: EnrichmentJob, index: int, result: Dict[str, Any], failed: bool) -> None:
+        with self._lock:
+            job.results[index] = result
+            job.done += 1
+            job.failed += int(failed)
+        self._persist(job)
+
+    def _run(self, job: EnrichmentJob, body) -> None:
+        job.status = 'running'
+        job.started_at = time.time()
+        self._persist(job, force=True)
+        try:
+            body()
+            job.status = 'completed'
+        except Exception as exc:
+            print(f"❌ Job de enriquecimento {job.id} falhou: {exc}")
+            job.error = str(exc)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            self._persist(job, force=True)
+            with self._lock:
+                self._jobs.pop(job.id, None)
+
+    def _run_duplicates(self, job: EnrichmentJob, threshold: float) -> None:
+        def body() -> None:
+            # Versão lida antes da varredura: uma escrita durante ela deixa o resultado velho
+            job.data_version = get_data_version(LEADS)
+            result = self.crm_service.find_duplicate_leads(
+                user_id=job.user_id, threshold=threshold, limit=MAX_DUPLICATE_PROPOSALS,
+            )
+            self._record(job, 0, result, False)
+
+        self._run(job, body)
+
+    def _run_discovery(self, job: EnrichmentJob, leads: List[Dict[str, Any]]) -> None:
+        def on_progress(index: int, enriched: Dict[str, Any], error: Optional[Exception]) -> None:
+            self._record(job, index, {
+                'index': index,
+                'success': error is None,
+                'enriched_data': enriched,
+                'instagram_suggestion': enriched.get('instagram_suggestion'),
+                'error': str(error) if error else None,
+            }, error is not None)
+
+        self._run(job, lambda: self.enrichment_service.enrich_batch(
+            leads, google_maps_client=self.google_maps_client, progress_callback=on_progress,
+        ))
+
+    def _run_saved(self, job: EnrichmentJob, lead_ids: List[int]) -> None:
+        def body() -> None:
+            saved: Dict[int, Dict[str, Any]] = {}
+            batch: List[Dict[str, Any]] = []
+            positions: List[int] = []
+            for index, lead_id in enumerate(lead_ids):
+                lead = self.crm_service.get_lead(lead_id)
+                if not lead or (job.user_id is not None and lead.get('user_id') != job.user_id):
+                    self._record(job, index, {
+                        'index': index, 'lead_id': lead_id, 'success': False,
+                        'updated_fields': [], 'error': 'Lead não encontrado',
+                    }, True)
+                    continue
+                saved[index] = lead
+                positions.append(index)
+                batch.append({
+                    'name': lead.get('name'),
+                    'place_id': lead.get('google_place_id'),
+                    'website': lead.get('website'),
+                    'phone': lead.get('phone'),
+                    'city': lead.get('city'),
+                    '_details_fetched': bool(lead.get('phone') and lead.get('website')),
+                })
+
+            def on_progress(position: int, enriched: Dict[str, Any], error: Optional[Exception]) -> None:
+                index = positions[position]
+                lead = saved[index]
+                update_data = {
+                    name: enriched[name]
+                    for name in UPDATABLE_FIELDS
+                    if enriched.get(name) and not lead.get(name)
+                }
+                if error is None and update_data:
+                    try:
+                        self.crm_service.update_lead(lead['id'], **update_data)
+                    except Exception as exc:
+                        error = exc
+                self._record(job, index, {
+                    'index': index,
+                    'lead_id': lead['id'],
+                    'success': error is None,
+                    'updated_fields': list(update_data) if error is None else [],
+                    'enriched_data': {name: enriched.get(name) for name in UPDATABLE_FIELDS},
+                    'instagram_suggestion': enriched.get('instagram_suggestion'),
+                    'error': str(error) if error else None,
+                }, error is not None)
+
+            self.enrichment_service.enrich_batch(
+                batch, google_maps_client=self.google_maps_client, progress_callback=on_progress,
+            )
+
+        self._run(job, body)
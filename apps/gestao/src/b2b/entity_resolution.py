@@ -0,0 +1,552 @@
+"""Entity resolution for CRM leads and imported clients.
+
+Names are normalized (accents, punctuation, legal suffixes such as "Ltda"/"ME",
+connectives) and split into tokens. Records are only compared inside *blocks*:
+records sharing the phonetic key of a distinctive token (Portuguese-flavoured
+simplification: "Café Aroma" / "Cafe Arôma" / "Kafe Aroma" share ``ARM``). Inside a
+block, pairs are scored with Jaro-Winkler on the distinctive tokens, in order and
+sorted (so "Padaria Pão Quente" / "Pão Quente Padaria" match and "Cafeteria X" /
+"Cafeteria Y" do not ride on the shared prefix). Phone, Instagram and Google place_id are exact keys and win
+over any name score; a conflict on them (both records have phones and none is shared,
+or different Instagram handles) caps a name match at review. Tokens with digits
+("Unidade 2", "Loja 14") must match exactly: numbered branches are different places.
+
+``EntityIndex`` answers "is this record already known?" in (near) constant time
+at import; ``find_duplicates`` runs the same comparisons as a batch and groups the
+matches into merge proposals. ``rapidfuzz`` is used for Jaro-Winkler when installed,
+otherwise a pure-Python implementation.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from ..services.lead_search_service import normalize_search_text
+
+try:  # Dependência opcional (mais rápida); o resultado é o mesmo
+    from rapidfuzz.distance import JaroWinkler as _RapidJaroWinkler
+except ImportError:  # pragma: no cover - depende do ambiente
+    _RapidJaroWinkler = None
+
+# Acima disso dois nomes são a mesma empresa; entre REVIEW e MATCH só vira sugestão
+MATCH_THRESHOLD = 0.92
+REVIEW_THRESHOLD = 0.85
+# Blocos maiores que isso são de palavras genéricas demais para comparar todos os pares
+MAX_BLOCK_SIZE = 300
+
+LEGAL_SUFFIXES = {
+    'ltda', 'me', 'mei', 'epp', 'eireli', 'sa', 's', 'a', 'cia', 'co', 'inc', 'llc',
+    'srl', 'sociedade', 'limitada', 'comercio', 'com', 'ind', 'industria',
+}
+CONNECTIVES = {'de', 'da', 'do', 'das', 'dos', 'e', 'the', 'del', 'la', 'el', 'y'}
+# Palavras que sozinhas não identificam um negócio (mesma ideia de lead_enrichment)
+GENERIC_TOKENS = {
+    'cafe', 'cafes', 'coffee', 'cafeteria', 'padaria', 'confeitaria', 'restaurante', 'bar',
+    'lanchonete', 'loja', 'emporio', 'mercado', 'armazem', 'bistro', 'casa', 'shop',
+    'store', 'especiais', 'especial', 'gourmet', 'torrefacao', 'torrado', 'grao', 'graos',
+}
+_LONG_GENERIC_TOKENS = sorted(token for token in GENERIC_TOKENS if len(token) >= 6)
+GENERIC_TYPO_THRESHOLD = 0.9
+
+_DIGITS_RE = re.compile(r'\D')
+_INSTAGRAM_RE = re.compile(r'(?:https?://)?(?:www\.)?(?:instagram\.com/)?@?([a-z0-9._]+)')
+_PHONETIC_RULES = [
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'ch|sh'), 'x'),
+    (re.compile(r'lh'), 'l'),
+    (re.compile(r'nh'), 'n'),
+    (re.compile(r'qu|q'), 'k'),
+    (re.compile(r'c(?=[ei])'), 's'),
+    (re.compile(r'g(?=[ei])'), 'j'),
+    (re.compile(r'c'), 'k'),
+    (re.compile(r'z'), 's'),
+    (re.compile(r'y'), 'i'),
+    (re.compile(r'w'), 'v'),
+    (re.compile(r'h'), ''),
+    (re.compile(r'(.)\1+'), r'\1'),
+]
+
+
+# -------------------------------------------------------------------------
+# Normalization and keys
+# -------------------------------------------------------------------------
+
+def name_tokens(name: Any) -> List[str]:
+    """Normalized tokens without legal suffixes and connectives."""
+    tokens = [
+        token for token in normalize_search_text(name).split()
+        if token not in LEGAL_SUFFIXES and token not in CONNECTIVES
+    ]
+    # Nome feito só de sufixos ("Comercio Ltda"): melhor manter o que havia
+    return tokens or normalize_search_text(name).split()
+
+
+def phonetic_key(token: str) -> str:
+    """
+    Consonant skeleton of a token after Portuguese-ish spelling rules.
+
+    ``phonetic_key('kafe') == phonetic_key('cafe') == 'KF'``; digits are kept as-is.
+    """
+    if token.isdigit():
+        return token
+    value = token
+    for pattern, replacement in _PHONETIC_RULES:
+        value = pattern.sub(replacement, value)
+    if not value:
+        return token.upper()
+    skeleton = value[0] + re.sub(r'[aeiou]', '', value[1:])
+    return skeleton[:6].upper()
+
+
+def normalize_phone(phone: Any) -> Optional[str]:
+    """
+    Area code + 8-digit number: drops the +55 country code, the trunk ``0`` and the
+    mobile ``9`` so "(41) 99999-0000" and "+55 41 9999-0000" share one key.
+    Numbers without area code are not used as keys (too ambiguous).
+    """
+    digits = _DIGITS_RE.sub('', str(phone or '')).lstrip('0')
+    if len(digits) >= 12 and digits.startswith('55'):
+        digits = digits[2:].lstrip('0')
+    if len(digits) == 11 and digits[2] == '9':
+        digits = digits[:2] + digits[3:]
+    return digits if len(digits) == 10 else None
+
+
+def normalize_instagram(handle: Any) -> Optional[str]:
+    if not handle:
+        return None
+    match = _INSTAGRAM_RE.match(str(handle).strip().lower())
+    value = match.group(1).strip('.') if match else ''
+    return value or None
+
+
+def blocking_keys(tokens: Sequence[str]) -> Set[str]:
+    """
+    Blocks a name belongs to: phonetic keys of its distinctive tokens (first two and
+    the longest), or of its first generic token when the name has nothing else.
+    """
+    distinctive = [token for token in tokens if not is_generic_token(token) and len(token) > 1]
+    if not distinctive:
+        return {f'g:{phonetic_key(token)}' for token in tokens[:1]}
+    chosen = set(distinctive[:2])
+    chosen.add(max(distinctive, key=len))
+    return {f'n:{phonetic_key(token)}' for token in chosen}
+
+
+# -------------------------------------------------------------------------
+# Similarity
+# -------------------------------------------------------------------------
+
+def jaro_winkler(a: str, b: str, prefix_weight: float = 0.1) -> float:
+    """Jaro-Winkler similarity in [0, 1]."""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    if _RapidJaroWinkler is not None:
+        return _RapidJaroWinkler.similarity(a, b, prefix_weight=prefix_weight)
+
+    window = max(0, max(len(a), len(b)) // 2 - 1)
+    a_matched = [False] * len(a)
+    b_matched = [False] * len(b)
+    matches = 0
+    for i, char in enumerate(a):
+        start, end = max(0, i - window), min(len(b), i + window + 1)
+        for j in range(start, end):
+            if not b_matched[j] and b[j] == char:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+
+    transpositions = 0
+    j = 0
+    for i, char in enumerate(a):
+        if a_matched[i]:
+            while not b_matched[j]:
+                j += 1
+            if char != b[j]:
+                transpositions += 1
+            j += 1
+    jaro = (matches / len(a) + matches / len(b) + (matches - transpositions / 2) / matches) / 3
+
+    prefix = 0
+    for char_a, char_b in zip(a[:4], b[:4]):
+        if char_a != char_b:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_weight * (1 - jaro)
+
+
+_GENERIC_BY_PHONETIC = {}
+for _generic in sorted(GENERIC_TOKENS, key=len):
+    _GENERIC_BY_PHONETIC.setdefault(phonetic_key(_generic), _generic)
+
+
+@lru_cache(maxsize=65536)
+def generic_form(token: str) -> Optional[str]:
+    """
+    Canonical generic business word for ``token`` (typos of the long ones included:
+    "cafeteia" -> "cafeteria"), or None for a distinctive token.
+    """
+    if token in GENERIC_TOKENS:
+        return token
+    # Grafia fonética ("kafe", "kafeteria")
+    phonetic = _GENERIC_BY_PHONETIC.get(phonetic_key(token))
+    if phonetic and abs(len(phonetic) - len(token)) <= 1 and jaro_winkler(token, phonetic) >= 0.75:
+        return phonetic
+    if len(token) < 5:
+        return None
+    scored = [
+        (jaro_winkler(token, generic), generic)
+        for generic in _LONG_GENERIC_TOKENS
+        if token[0] == generic[0] and abs(len(token) - len(generic)) <= 2
+    ]
+    score, generic = max(scored, default=(0.0, None))
+    return generic if score >= GENERIC_TYPO_THRESHOLD else None
+
+
+def is_generic_token(token: str) -> bool:
+    return generic_form(token) is not None
+
+
+def distinctive_tokens(tokens: Sequence[str]) -> List[str]:
+    """Tokens without the generic business words, or all of them if nothing is left."""
+    return [token for token in tokens if not is_generic_token(token)] or list(tokens)
+
+
+def token_set_score(a: Sequence[str], b: Sequence[str]) -> float:
+    """Order-insensitive score: Jaro-Winkler of the sorted token sets (1.0 when equal)."""
+    set_a, set_b = set(a), set(b)
+    if set_a == set_b:
+        return 1.0
+    return jaro_winkler(' '.join(sorted(set_a)), ' '.join(sorted(set_b)))
+
+
+NameProfile = Tuple[str, str, frozenset, frozenset]
+
+
+def name_profile(tokens: Sequence[str]) -> NameProfile:
+    """Distinctive text, sorted distinctive text, canonical generic words and tokens with digits."""
+    distinct = distinctive_tokens(tokens)
+    generics = frozenset(form for form in map(generic_form, tokens) if form)
+    numbers = frozenset(token for token in tokens if any(char.isdigit() for char in token))
+    return ' '.join(distinct), ' '.join(sorted(set(distinct))), generics, numbers
+
+
+def name_similarity(a: Sequence[str], b: Sequence[str]) -> float:
+    """
+    Similarity of two token lists, computed on their distinctive tokens so a shared
+    "Cafeteria" prefix does not make unrelated names look alike: best of the
+    in-order and the sorted (token-set) Jaro-Winkler.
+    """
+    if not a or not b:
+        return 0.0
+    return _profile_similarity(name_profile(a), name_profile(b))
+
+
+def _jaro_winkler_bound(a: str, b: str) -> float:
+    """Upper bound of ``jaro_winkler(a, b)`` from the lengths alone (cheap pre-filter)."""
+    short, long = sorted((len(a), len(b)))
+    if not short:
+        return 0.0
+    jaro = (1 + short / long + 1) / 3
+    return jaro + 0.4 * (1 - jaro)
+
+
+def _profile_similarity(a: NameProfile, b: NameProfile) -> float:
+    text_a, sorted_a, generics_a, numbers_a = a
+    text_b, sorted_b, generics_b, numbers_b = b
+    if numbers_a and numbers_b and numbers_a != numbers_b:
+        # "Cafeteria São João 1" x "... 2": filiais numeradas são lugares diferentes
+        return 0.0
+    if sorted_a == sorted_b:
+        score = 1.0
+    elif _jaro_winkler_bound(text_a, text_b) < REVIEW_THRESHOLD:
+        return 0.0
+    else:
+        score = max(jaro_winkler(text_a, text_b), jaro_winkler(sorted_a, sorted_b))
+    if generics_a and generics_b and not generics_a & generics_b:
+        # "Café Lulu" x "Empório Lulu": mesmo nome, negócios possivelmente diferentes
+        score = min(score, REVIEW_THRESHOLD)
+    if numbers_a != numbers_b:
+        # Número só de um lado ("Café Lulu" x "Café Lulu 2"): pode ser a matriz e uma filial
+        score = min(score, REVIEW_THRESHOLD)
+    return score
+
+
+# -------------------------------------------------------------------------
+# Records, index and batch resolution
+# -------------------------------------------------------------------------
+
+@dataclass
+class EntityRecord:
+    record_id: Any
+    name: str
+    city: Optional[str] = None
+    phones: Tuple[str, ...] = ()
+    instagram: Optional[str] = None
+    place_id: Optional[str] = None
+    tokens: List[str] = field(default_factory=list)
+    city_key: str = ''
+    scope: Any = None  # ex.: vendedor dono do lead; só registros do mesmo escopo se comparam
+    keys: frozenset = field(init=False, repr=False)
+    profile: NameProfile = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.keys = frozenset(self.exact_keys())
+        self.profile = name_profile(self.tokens)
+
+    @classmethod
+    def build(cls, record_id: Any, name: Any, city: Any = None, phone: Any = None,
+              instagram: Any = None, place_id: Any = None, whatsapp: Any = None,
+              scope: Any = None) -> 'EntityRecord':
+        phones = [normalize_phone(value) for value in (phone, whatsapp)]
+        return cls(
+            record_id=record_id,
+            name=str(name or ''),
+            city=city,
+            phones=tuple(dict.fromkeys(value for value in phones if value)),
+            instagram=normalize_instagram(instagram),
+            place_id=place_id or None,
+            tokens=name_tokens(name),
+            city_key=normalize_search_text(city),
+            scope=scope,
+        )
+
+    def exact_keys(self) -> List[Tuple[str, str]]:
+        keys = []
+        if self.place_id:
+            keys.append(('place_id', self.place_id))
+        keys.extend(('phone', value) for value in self.phones)
+        if self.instagram:
+            keys.append(('instagram', self.instagram))
+        return keys
+
+
+@dataclass
+class EntityMatch:
+    record_id: Any
+    score: float
+    reason: str  # place_id, phone, instagram ou name
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'record_id': self.record_id, 'score': round(self.score, 4), 'reason': self.reason}
+
+
+def compare_records(a: EntityRecord, b: EntityRecord) -> Optional[EntityMatch]:
+    """Match of ``b`` against ``a``, or None when they are different entities."""
+    if a.place_id and b.place_id:
+        # Place ids diferentes são lugares diferentes, mesmo com telefone/Instagram da rede
+        return EntityMatch(b.record_id, 1.0, 'place_id') if a.place_id == b.place_id else None
+    shared = a.keys & b.keys
+    if shared:
+        return EntityMatch(b.record_id, 1.0, min(shared)[0])
+    if a.city_key and b.city_key and a.city_key != b.city_key:
+        return None
+    if not a.tokens or not b.tokens:
+        return None
+    score = _profile_similarity(a.profile, b.profile)
+    if _strong_key_conflict(a, b):
+        # Telefones/Instagram diferentes: nome parecido vira no máximo sugestão
+        score = min(score, REVIEW_THRESHOLD)
+    if score >= REVIEW_THRESHOLD:
+        return EntityMatch(b.record_id, score, 'name')
+    return None
+
+
+def _strong_key_conflict(a: EntityRecord, b: EntityRecord) -> bool:
+    """Both records carry phones (or Instagram handles) and none of them is shared."""
+    if a.phones and b.phones and not set(a.phones) & set(b.phones):
+        return True
+    return bool(a.instagram and b.instagram and a.instagram != b.instagram)
+
+
+class EntityIndex:
+    """
+    Incremental lookup index: exact-key maps plus blocking-key buckets.
+
+    ``lookup`` costs a few dict reads plus the comparisons inside the record's
+    blocks, independent of the number of indexed records. Every key is prefixed
+    with the record's ``scope``, so records of different scopes never meet.
+    Re-adding a record replaces its old keys; reads and writes share one lock, so
+    the index can be updated in place while other threads look it up.
+    """
+
+    def __init__(self, threshold: float = MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.records: Dict[Any, EntityRecord] = {}
+        # Buckets são dicts (conjuntos ordenados) para remover ids em O(1)
+        self._exact: Dict[Tuple[Any, Any], Dict[Any, None]] = {}
+        self._blocks: Dict[Tuple[Any, Any], Dict[Any, None]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, record_id: Any) -> bool:
+        return record_id in self.records
+
+    def add(self, record: EntityRecord) -> None:
+        """Index ``record``, evicting the keys of a previous version of it."""
+        with self._lock:
+            previous = self.records.get(record.record_id)
+            old_keys = _scoped(previous, previous.keys) if previous is not None else set()
+            old_blocks = _scoped(previous, blocking_keys(previous.tokens)) if previous is not None else set()
+            new_keys = _scoped(record, record.keys)
+            new_blocks = _scoped(record, blocking_keys(record.tokens))
+            _discard(self._exact, old_keys - new_keys, record.record_id)
+            _discard(self._blocks, old_blocks - new_blocks, record.record_id)
+            for key in new_keys - old_keys:
+                self._exact.setdefault(key, {})[record.record_id] = None
+            for key in new_blocks - old_blocks:
+                self._blocks.setdefault(key, {})[record.record_id] = None
+            self.records[record.record_id] = record
+
+    def add_many(self, records: Iterable[EntityRecord]) -> 'EntityIndex':
+        with self._lock:
+            for record in records:
+                self.add(record)
+        return self
+
+    def remove(self, record_id: Any) -> None:
+        with self._lock:
+            previous = self.records.pop(record_id, None)
+            if previous is None:
+                return
+            _discard(self._exact, _scoped(previous, previous.keys), record_id)
+            _discard(self._blocks, _scoped(previous, blocking_keys(previous.tokens)), record_id)
+
+    def candidates(self, record: EntityRecord) -> List[EntityMatch]:
+        """Every indexed record that matches at or above ``REVIEW_THRESHOLD``, best first."""
+        matches: Dict[Any, EntityMatch] = {}
+        seen: Set[Any] = {record.record_id}
+        others: List[EntityRecord] = []
+        # Copia os candidatos sob o lock; as comparações (caras) rodam fora dele
+        with self._lock:
+            buckets = [self._exact.get(key, {}) for key in _scoped(record, record.keys)]
+            buckets.extend(
+                bucket for bucket in (self._blocks.get(key, {}) for key in _scoped(record, blocking_keys(record.tokens)))
+                if len(bucket) <= MAX_BLOCK_SIZE
+            )
+            for bucket in buckets:
+                for record_id in bucket:
+                    if record_id not in seen:
+                        seen.add(record_id)
+                        others.append(self.records[record_id])
+        for other in others:
+            match = compare_records(record, other)
+            if match is not None:
+                matches[other.record_id] = match
+        return sorted(matches.values(), key=lambda match: (-match.score, str(match.record_id)))
+
+    def lookup(self, record: EntityRecord) -> Optional[EntityMatch]:
+        """Best match at or above the index threshold, or None."""
+        matches = self.candidates(record)
+        if matches and (matches[0].reason != 'name' or matches[0].score >= self.threshold):
+            return matches[0]
+        return None
+
+    def resolve(self, record: EntityRecord) -> Tuple[Optional[EntityMatch], Optional[EntityMatch]]:
+        """
+        ``(exact, similar)``: best match on an exact key (place_id, phone, Instagram)
+        and best name match at or above the index threshold. Only ``exact`` is safe
+        to merge automatically; ``similar`` is a proposal for a person to review.
+        """
+        exact = similar = None
+        for match in self.candidates(record):
+            if match.reason != 'name':
+                exact = exact or match
+            elif similar is None and match.score >= self.threshold:
+                similar = match
+        return exact, similar
+
+
+def find_duplicates(
+    records: Sequence[EntityRecord],
+    threshold: float = MATCH_THRESHOLD,
+) -> List[Dict[str, Any]]:
+    """
+    Group matching records into merge proposals.
+
+    Matches at or above ``threshold`` (or on an exact key) are merged transitively
+    (union-find); each group keeps its lowest ``record_id`` as the survivor.
+
+    Returns:
+        ``[{'keep_id', 'merge_ids', 'score', 'reasons', 'pairs'}]`` sorted by size,
+        where ``score`` is the weakest link of the group
+    """
+    index = EntityIndex(threshold)
+    parent: Dict[Any, Any] = {}
+    pairs: List[Tuple[Any, Any, EntityMatch]] = []
+
+    def find(item: Any) -> Any:
+        root = item
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while parent.get(item, item) != root:
+            parent[item], item = root, parent[item]
+        return root
+
+    for record in records:
+        for match in index.candidates(record):
+            if match.reason == 'name' and match.score < threshold:
+                continue
+            pairs.append((record.record_id, match.record_id, match))
+            root_a, root_b = find(record.record_id), find(match.record_id)
+            if root_a != root_b:
+                keep, drop = sorted((root_a, root_b), key=_sort_key)
+                parent[drop] = keep
+        index.add(record)
+
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for record_id, other_id, match in pairs:
+        root = find(record_id)
+        group = groups.setdefault(root, {'ids': set(), 'score': 1.0, 'reasons': set(), 'pairs': []})
+        group['ids'].update((record_id, other_id))
+        group['score'] = min(group['score'], match.score)
+        group['reasons'].add(match.reason)
+        group['pairs'].append({'a': other_id, 'b': record_id, 'score': round(match.score, 4), 'reason': match.reason})
+
+    proposals = []
+    for root, group in groups.items():
+        ids = sorted(group['ids'], key=_sort_key)
+        proposals.append({
+            'keep_id': ids[0],
+            'merge_ids': ids[1:],
+            'score': round(group['score'], 4),
+            'reasons': sorted(group['reasons']),
+            'pairs': group['pairs'],
+        })
+    proposals.sort(key=lambda proposal: (-len(proposal['merge_ids']), proposal['score'], _sort_key(proposal['keep_id'])))
+    return proposals
+
+
+def _scoped(record: EntityRecord, keys: Iterable[Any]) -> Set[Tuple[Any, Any]]:
+    return {(record.scope, key) for key in keys}
+
+
+def _discard(buckets: Dict[Any, Dict[Any, None]], keys: Iterable[Any], record_id: Any) -> None:
+    for key in keys:
+        bucket = buckets.get(key)
+        if bucket is None:
+            continue
+        bucket.pop(record_id, None)
+        if not bucket:
+            del buckets[key]
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    return (0, value) if isinstance(value, (int, float)) else (1, str(value))
+
+
+__all__ = [
+    'EntityIndex', 'EntityMatch', 'EntityRecord', 'MATCH_THRESHOLD', 'REVIEW_THRESHOLD',
+    'blocking_keys', 'compare_records', 'distinctive_tokens', 'generic_form', 'is_generic_token', 'name_profile', 'find_duplicates', 'jaro_winkler', 'name_similarity',
+    'name_tokens', 'normalize_instagram', 'normalize_phone', 'phonetic_key', 'token_set_score',
+]
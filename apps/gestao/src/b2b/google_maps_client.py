@@ -4,49 +4,23 @@ from __future__ import annotations
 
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
 import requests
 
+from .places_cache import get_places_cache
+from ..services.lead_search_service import normalize_search_text
 
-class PlaceDetailsCache:
-    """Cache simples em memória para Place Details com TTL."""
-
-    def __init__(self, ttl_seconds: int = 3600):
-        self._cache: Dict[str, Dict[str, Any]] = {}
-        self._timestamps: Dict[str, float] = {}
-        self._ttl = ttl_seconds
-
-    def get(self, place_id: str) -> Optional[Dict[str, Any]]:
-        """Retorna dados do cache se existir e não expirado."""
-        if place_id not in self._cache:
-            return None
-        if time.time() - self._timestamps.get(place_id, 0) > self._ttl:
-            # Expirado, remover
-            del self._cache[place_id]
-            del self._timestamps[place_id]
-            return None
-        return self._cache[place_id]
-
-    def set(self, place_id: str, data: Dict[str, Any]) -> None:
-        """Armazena dados no cache."""
-        self._cache[place_id] = data
-        self._timestamps[place_id] = time.time()
-
-    def clear(self) -> None:
-        """Limpa todo o cache."""
-        self._cache.clear()
-        self._timestamps.clear()
-
-    def stats(self) -> Dict[str, int]:
-        """Retorna estatísticas do cache."""
-        return {
-            'entries': len(self._cache),
-            'ttl_seconds': self._ttl,
-        }
-
-
-# Cache global compartilhado entre instâncias
-_place_details_cache = PlaceDetailsCache(ttl_seconds=3600)  # 1 hora
+# Status do Place Details que não mudam ao repetir a chamada (cache negativo)
+NEGATIVE_DETAILS_STATUSES = ('NOT_FOUND', 'ZERO_RESULTS', 'INVALID_REQUEST')
+# O Text Search devolve no máximo 3 páginas de 20 lugares
+MAX_TEXT_SEARCH_PAGES = 3
+# Páginas extras são opt-in: cada uma é cobrada e espera o next_page_token
+DEFAULT_TEXT_SEARCH_PAGES = 1
+# O next_page_token só fica válido alguns segundos depois de emitido
+NEXT_PAGE_DELAY_SECONDS = 2.0
+NEXT_PAGE_RETRIES = 3
+DETAILS_MAX_WORKERS = int(os.getenv('PLACE_DETAILS_MAX_WORKERS', '8'))
 
 
 class GoogleMapsClient:
@@ -55,12 +29,40 @@ class GoogleMapsClient:
         self.api_key = api_key or env_key
         if not self.api_key:
             raise RuntimeError('GOOGLE_MAPS_API_KEY / GOOGLE_API_KEY não configurada no ambiente')
-        self._cache = _place_details_cache
+        self._cache = get_places_cache()
 
     BASE_URL = 'https://maps.googleapis.com/maps/api/place/textsearch/json'
     DETAILS_URL = 'https://maps.googleapis.com/maps/api/place/details/json'
 
-    def text_search(self, query: str, region: Optional[str] = None) -> Dict[str, Any]:
+    def text_search(
+        self,
+        query: str,
+        region: Optional[str] = None,
+        max_pages: int = DEFAULT_TEXT_SEARCH_PAGES,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Busca lugares via Text Search, seguindo ``next_page_token`` até ``max_pages``.
+
+        Resultados ficam em cache por consulta normalizada + região (TTL do tipo
+        ``textsearch``); uma busca repetida não gera chamada nem custo.
+
+        Returns:
+            Dict com status, results (todas as páginas), pages e cached
+        """
+        max_pages = max(1, min(int(max_pages), MAX_TEXT_SEARCH_PAGES))
+        cache_key = f"{' '.join(normalize_search_text(query).split())}|{(region or '').lower()}"
+        if use_cache:
+            hit, cached = self._cache.get('textsearch', cache_key)
+            if hit and cached and (cached['complete'] or len(cached['pages']) >= max_pages):
+                pages = cached['pages'][:max_pages]
+                return {
+                    'status': cached['status'],
+                    'results': [item for page in pages for item in page],
+                    'pages': len(pages),
+                    'cached': True,
+                }
+
         params = {
             'key': self.api_key,
             'query': query,
@@ -69,10 +71,51 @@ class GoogleMapsClient:
         if region:
             params['region'] = region
 
+        pages: List[List[Dict[str, Any]]] = []
+        first = self._text_search_page(params)
+        status = first.get('status', 'UNKNOWN')
+        if status not in ('OK', 'ZERO_RESULTS'):
+            # Erros (cota, chave) não entram no cache
+            return first
+        pages.append(first.get('results', []))
+
+        token = first.get('next_page_token')
+        while token and len(pages) < max_pages:
+            page = self._next_page(token)
+            if page.get('status') != 'OK':
+                print(f"⚠️ Text Search: página {len(pages) + 1} indisponível ({page.get('status')})")
+                break
+            pages.append(page.get('results', []))
+            token = page.get('next_page_token')
+
+        self._cache.set('textsearch', cache_key, {
+            'status': status,
+            'pages': pages,
+            'complete': not token,
+        })
+        return {
+            'status': status,
+            'results': [item for page in pages for item in page],
+            'pages': len(pages),
+            'cached': False,
+        }
+
+    def _text_search_page(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._cache.record_call('textsearch')
         response = requests.get(self.BASE_URL, params=params, timeout=10)
         response.raise_for_status()
         return response.json()
 
+    def _next_page(self, token: str) -> Dict[str, Any]:
+        """Próxima página; INVALID_REQUEST significa token ainda não ativo."""
+        page: Dict[str, Any] = {}
+        for _ in range(NEXT_PAGE_RETRIES):
+            time.sleep(NEXT_PAGE_DELAY_SECONDS)
+            page = self._text_search_page({'key': self.api_key, 'pagetoken': token})
+            if page.get('status') != 'INVALID_REQUEST':
+                break
+        return page
+
     def get_place_details(self, place_id: str, use_cache: bool = True) -> Dict[str, Any]:
         """
         Busca detalhes completos de um lugar via Place Details API.
@@ -85,12 +128,12 @@ class GoogleMapsClient:
         Returns:
             Dict com status e result (dados do lugar)
         """
-        # Verificar cache primeiro
+        # Verificar cache primeiro (compartilhado entre workers e reinícios)
         if use_cache:
-            cached = self._cache.get(place_id)
-            if cached:
+            hit, cached = self._cache.get('details', place_id)
+            if hit:
                 print(f"      💾 Cache hit para place_id: {place_id[:20]}...")
-                return cached
+                return cached if cached is not None else {'status': 'NOT_FOUND', 'cached': True}
 
         params = {
             'key': self.api_key,
@@ -99,24 +142,27 @@ class GoogleMapsClient:
             'fields': 'name,formatted_address,formatted_phone_number,international_phone_number,website,url,types,address_components,geometry'
         }
 
+        self._cache.record_call('details')
         response = requests.get(self.DETAILS_URL, params=params, timeout=10)
         response.raise_for_status()
         result = response.json()
 
-        # Armazenar no cache se sucesso
+        # Armazenar no cache se sucesso; place_id inválido/removido vira entrada negativa
         if result.get('status') == 'OK':
-            self._cache.set(place_id, result)
+            self._cache.set('details', place_id, result)
             print(f"      📡 API call + cache save para place_id: {place_id[:20]}...")
+        elif result.get('status') in NEGATIVE_DETAILS_STATUSES:
+            self._cache.set_negative('details', place_id)
 
         return result
 
-    def get_cache_stats(self) -> Dict[str, int]:
-        """Retorna estatísticas do cache."""
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Retorna estatísticas do cache (entradas, hits/misses, chamadas e custo estimado)."""
         return self._cache.stats()
 
     def clear_cache(self) -> None:
         """Limpa o cache de Place Details."""
-        self._cache.clear()
+        self._cache.clear('details')
         print("🗑️ Cache de Place Details limpo")
 
     def build_address(self, result: Dict[str, Any]) -> Dict[str, Any]:
@@ -161,6 +207,11 @@ class GoogleMapsClient:
             search_city: Cidade buscada
             fetch_details: Se True, busca detalhes adicionais de cada lugar (mais lento, mas mais completo)
         """
+        details_by_place: Dict[str, Dict[str, Any]] = {}
+        if fetch_details:
+            place_ids = list(dict.fromkeys(item['place_id'] for item in results if item.get('place_id')))
+            details_by_place = self._fetch_details_concurrently(place_ids)
+
         leads = []
         for item in results:
             location = item.get('geometry', {}).get('location', {})
@@ -172,17 +223,12 @@ class GoogleMapsClient:
             website = item.get('website')
             details_fetched = False
 
-            # Se solicitado, buscar detalhes adicionais (usa cache automaticamente)
-            if fetch_details and place_id:
-                try:
-                    details_response = self.get_place_details(place_id)
-                    if details_response.get('status') == 'OK':
-                        details = details_response.get('result', {})
-                        phone = details.get('formatted_phone_number') or details.get('international_phone_number') or phone
-                        website = details.get('website') or website
-                        details_fetched = True
-                except Exception as e:
-                    print(f"⚠️ Erro ao buscar detalhes do place_id {place_id}: {e}")
+            # Detalhes adicionais buscados acima em paralelo (usa cache automaticamente)
+            details = details_by_place.get(place_id)
+            if details is not None:
+                phone = details.get('formatted_phone_number') or details.get('international_phone_number') or phone
+                website = details.get('website') or website
+                details_fetched = True
 
             lead = {
                 'name': item.get('name'),
@@ -209,3 +255,20 @@ class GoogleMapsClient:
             }
             leads.append(lead)
         return leads
+
+    def _fetch_details_concurrently(self, place_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Place Details de vários lugares em paralelo; retorna apenas os com status OK."""
+        def fetch(place_id: str) -> Optional[Dict[str, Any]]:
+            try:
+                response = self.get_place_details(place_id)
+                if response.get('status') == 'OK':
+                    return response.get('result', {})
+            except Exception as e:
+                print(f"⚠️ Erro ao buscar detalhes do place_id {place_id}: {e}")
+            return None
+
+        if not place_ids:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(DETAILS_MAX_WORKERS, len(place_ids)))) as executor:
+            details = list(executor.map(fetch, place_ids))
+        return {place_id: result for place_id, result in zip(place_ids, details) if result is not None}
@@ -5,36 +5,60 @@ Integração com planilha de controle de vendas B2B
 """
 
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 import json
+import pandas as pd
 from dotenv import load_dotenv
 
+from ..db import session_scope
+from ..services.sheet_ingest import (
+    DEFAULT_BATCH_SIZE, GspreadRangeSource, LocalCsvSource, SheetWatermarkStore,
+    drop_blank_rows, iter_sheet_batches, parse_br_numbers, parse_month_dates,
+)
+
+# Colunas lidas da aba de vendas: País, Cliente, Mês, Qtde (Kg), Valor
+SALES_LAST_COLUMN = 'E'
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
 class GoogleSheetsClient:
-    def __init__(self, credentials_file: str = None, spreadsheet_key: str = None):
+    def __init__(self, credentials_file: str = None, spreadsheet_key: str = None,
+                 local_csv_path: str = None, batch_size: int = DEFAULT_BATCH_SIZE):
         self.credentials_file = credentials_file or os.getenv('GOOGLE_CREDENTIALS_FILE')
         self.credentials_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
         self.spreadsheet_key = spreadsheet_key or os.getenv('GOOGLE_SPREADSHEET_KEY')
+        self.batch_size = batch_size
+
+        # CSV local no formato da planilha (testes offline)
+        self.local_csv_path = local_csv_path or os.getenv('GOOGLE_SHEETS_LOCAL_CSV')
 
         # Para desenvolvimento, usar dados mock se não tiver credenciais
         has_credentials = self.credentials_file and self.spreadsheet_key and os.path.exists(self.credentials_file or "")
-        self.use_mock_data = not has_credentials
+        self.use_mock_data = not has_credentials and not self.local_csv_path
 
-        if self.use_mock_data:
+        if self.local_csv_path:
+            print(f"📄 Usando CSV local como planilha: {self.local_csv_path}")
+        elif self.use_mock_data:
             print("⚠️ Usando dados mock para desenvolvimento - Configure credenciais Google Sheets para dados reais")
         else:
             print("✅ Google Sheets configurado - usando dados reais")
     
-    def get_sales_data(self, sheet_name: str = 'Vendas') -> List[Dict[str, Any]]:
+    def get_sales_data(self, sheet_name: str = 'Vendas', incremental: bool = False) -> List[Dict[str, Any]]:
         """
-        Obtém dados de vendas da planilha Google Sheets
+        Obtém dados de vendas da planilha Google Sheets, lendo em lotes de linhas (A1 ranges)
+        
+        Args:
+            sheet_name: Aba da planilha
+            incremental: Retorna apenas linhas após o último watermark e o avança
         
         Returns:
             Lista de vendas no formato: [{'cliente': str, 'data': str, 'valor': float, 'produto': str}]
         """
+        if self.local_csv_path:
+            return self._read_sales(LocalCsvSource(self.local_csv_path), f"sales:{self.local_csv_path}", incremental)
+
         if self.use_mock_data:
             return self._get_mock_sales_data()
         
@@ -62,35 +86,38 @@ class GoogleSheetsClient:
             # Abrir planilha
             sheet = client.open_by_key(self.spreadsheet_key)
             worksheet = sheet.worksheet(sheet_name)
-            
-            # Obter dados da planilha de forma mais robusta
-            # Primeiro, obter apenas as primeiras 5 colunas para evitar problemas com vazias
-            all_values = worksheet.get_all_values()
-            
-            if len(all_values) < 2:
+
+            source = GspreadRangeSource(worksheet, last_column=SALES_LAST_COLUMN)
+            records = self._read_sales(source, f"sales:{self.spreadsheet_key}:{sheet_name}", incremental)
+
+            if not records and not incremental:
                 print("⚠️ Planilha vazia ou sem dados")
                 return self._get_mock_sales_data()
-            
-            # Cabeçalhos (primeira linha)
-            headers = all_values[0][:5]  # Primeiras 5 colunas
-            
-            # Dados (demais linhas)
-            records = []
-            for row in all_values[1:]:  # Pular cabeçalho
-                if len(row) >= 5 and any(cell.strip() for cell in row[:5]):  # Linha não vazia
-                    record = {}
-                    for i, header in enumerate(headers):
-                        if i < len(row):
-                            record[header] = row[i]
-                    records.append(record)
-            
+
             print(f"📊 Conectado ao Google Sheets! {len(records)} registros encontrados")
-            
-            return self._normalize_sales_data(records)
+            return records
             
         except Exception as e:
             print(f"❌ Erro ao acessar Google Sheets: {e}")
             return self._get_mock_sales_data()
+
+    def _read_sales(self, source, watermark_key: str, incremental: bool) -> List[Dict[str, Any]]:
+        """Lê a aba em lotes, normaliza cada lote de forma vetorizada e avança o watermark"""
+        start_row = 2
+        if incremental:
+            with session_scope() as session:
+                start_row = SheetWatermarkStore.get(session, watermark_key) + 1
+
+        records: List[Dict[str, Any]] = []
+        last_row: Optional[int] = None
+        for batch_last_row, frame in iter_sheet_batches(source, start_row, self.batch_size):
+            records.extend(self._normalize_sales_frame(frame))
+            last_row = max(last_row or 0, batch_last_row)
+
+        if incremental and last_row:
+            with session_scope() as session:
+                SheetWatermarkStore.set(session, watermark_key, last_row)
+        return records
     
     def _get_mock_sales_data(self) -> List[Dict[str, Any]]:
         """
@@ -175,122 +202,55 @@ class GoogleSheetsClient:
         
         return vendas_mock
     
-    def _normalize_sales_data(self, raw_data: List[Dict]) -> List[Dict[str, Any]]:
+    def _normalize_sales_frame(self, frame: pd.DataFrame) -> List[Dict[str, Any]]:
         """
-        Normaliza dados da planilha para formato padrão
+        Normaliza um lote da planilha para formato padrão (pandas, sem loop por linha)
         Mapeia os campos reais: País, Cliente, Mês, Qtde (Kg), Valor
         """
-        normalized = []
-        
-        for row in raw_data:
-            try:
-                # Validar se tem dados essenciais
-                cliente = row.get('Cliente', '').strip()
-                valor_str = row.get('Valor', '').strip()
-                mes = row.get('Mês', '').strip()
-                
-                if not cliente or not valor_str or not mes:
-                    continue  # Pular linhas sem dados essenciais
-                
-                # Processar valor (remover símbolos de moeda se houver)
-                valor_limpo = valor_str.replace('R$', '').replace('.', '').replace(',', '.').strip()
-                valor = float(valor_limpo) if valor_limpo else 0
-                
-                # Processar quantidade (formato brasileiro com vírgula)
-                qtde_str = row.get('Qtde (Kg)', '').strip()
-                qtde_limpa = qtde_str.replace(',', '.') if qtde_str else '1'
-                quantidade = float(qtde_limpa) if qtde_limpa else 1
-                
-                # Gerar data a partir do mês
-                data = self._parse_month_to_date(mes)
-                
-                normalized.append({
-                    'cliente': cliente,
-                    'data': data,
-                    'produto': 'Café',  # Default
-                    'valor': valor,
-                    'quantidade': quantidade,
-                    'observacoes': f"Venda {mes} - {row.get('País', 'Brasil')}"
-                })
-                
-            except (ValueError, TypeError) as e:
-                print(f"⚠️ Erro ao processar linha: {row} - {e}")
-                continue
-        
-        return normalized
-    
-    def _parse_month_to_date(self, month_str: str) -> str:
-        """
-        Converte strings de mês/ano para data YYYY-MM-DD
-        Ex: "08/2025", "01/24", "12/2024" -> "2025-08-15"
-        """
-        if not month_str:
-            return datetime.now().strftime('%Y-%m-%d')
-        
-        try:
-            month_str = month_str.strip()
-            
-            # Formato "MM/YYYY" ou "MM/YY"
-            if '/' in month_str:
-                parts = month_str.split('/')
-                if len(parts) == 2:
-                    month_part = parts[0].strip().zfill(2)  # Garantir 2 dígitos
-                    year_part = parts[1].strip()
-                    
-                    # Converter ano de 2 dígitos para 4
-                    if len(year_part) == 2:
-                        # Se for > 50, assume século passado, senão atual
-                        year_int = int(year_part)
-                        if year_int > 50:
-                            year = '19' + year_part
-                        else:
-                            year = '20' + year_part
-                    else:
-                        year = year_part
-                    
-                    # Validar mês
-                    month_int = int(month_part)
-                    if 1 <= month_int <= 12:
-                        return f"{year}-{month_part}-15"  # Dia 15 como padrão
-            
-            # Formato "YYYY-MM" 
-            if '-' in month_str and len(month_str) == 7:
-                return f"{month_str}-15"
-            
-            # Se não conseguir parse, usar data atual
-            print(f"⚠️ Formato de data não reconhecido: '{month_str}', usando data atual")
-            return datetime.now().strftime('%Y-%m-%d')
-            
-        except Exception as e:
-            print(f"⚠️ Erro ao processar data '{month_str}': {e}")
-            return datetime.now().strftime('%Y-%m-%d')
-    
-    def _parse_date(self, date_str: str) -> str:
-        """
-        Converte diferentes formatos de data para YYYY-MM-DD
-        """
-        if not date_str:
-            return datetime.now().strftime('%Y-%m-%d')
-        
-        # Tentar diferentes formatos de data
-        date_formats = [
-            '%Y-%m-%d',
-            '%d/%m/%Y',
-            '%d-%m-%Y',
-            '%m/%d/%Y',
-            '%Y/%m/%d'
+        columns = ['País', 'Cliente', 'Mês', 'Qtde (Kg)', 'Valor']
+        frame = drop_blank_rows(frame, columns)
+        frame = frame.reindex(columns=columns, fill_value='').fillna('')
+        for column in columns:
+            frame[column] = frame[column].astype(str).str.strip()
+
+        # Pular linhas sem dados essenciais
+        frame = frame[(frame['Cliente'] != '') & (frame['Valor'] != '') & (frame['Mês'] != '')]
+        if frame.empty:
+            return []
+
+        valor = parse_br_numbers(frame['Valor'])
+        # Quantidade em formato brasileiro com vírgula decimal (sem separador de milhar)
+        quantidade = pd.to_numeric(frame['Qtde (Kg)'].str.replace(',', '.', regex=False), errors='coerce')
+        quantidade = quantidade.where(frame['Qtde (Kg)'] != '', 1)
+
+        invalid = valor.isna() | quantidade.isna()
+        if invalid.any():
+            print(f"⚠️ {int(invalid.sum())} linhas com valor/quantidade inválidos ignoradas")
+
+        # Data a partir do mês (dia 15); formato não reconhecido => data atual
+        datas = parse_month_dates(frame['Mês'])
+        unparsed = datas.isna() & ~invalid
+        if unparsed.any():
+            print(f"⚠️ {int(unparsed.sum())} meses em formato não reconhecido, usando data atual")
+        datas = datas.fillna(pd.Timestamp(datetime.now().date())).dt.strftime('%Y-%m-%d')
+
+        pais = frame['País'].where(frame['País'] != '', 'Brasil')
+        observacoes = 'Venda ' + frame['Mês'] + ' - ' + pais
+
+        valid = ~invalid
+        return [
+            {
+                'cliente': cliente,
+                'data': data,
+                'produto': 'Café',  # Default
+                'valor': float(v),
+                'quantidade': float(q),
+                'observacoes': obs
+            }
+            for cliente, data, v, q, obs in zip(
+                frame['Cliente'][valid], datas[valid], valor[valid], quantidade[valid], observacoes[valid]
+            )
         ]
-        
-        for fmt in date_formats:
-            try:
-                parsed_date = datetime.strptime(str(date_str), fmt)
-                return parsed_date.strftime('%Y-%m-%d')
-            except ValueError:
-                continue
-        
-        # Se não conseguir parse, usar data atual
-        print(f"⚠️ Formato de data não reconhecido: {date_str}")
-        return datetime.now().strftime('%Y-%m-%d')
 
 # Funções de configuração para facilitar setup
 def setup_google_sheets_credentials():
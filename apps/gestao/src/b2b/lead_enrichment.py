@@ -1,25 +1,106 @@
 """
 Lead Enrichment Service - Busca dados adicionais de leads (Instagram, WhatsApp, etc)
+
+O enriquecimento em lote roda num pool de threads limitado. A cortesia com os sites
+é por host (``HostLimiter``): no máximo N requisições simultâneas e um intervalo
+mínimo entre requisições ao mesmo host, em vez de um ``sleep`` global entre leads.
 """
 
+import os
 import re
+import threading
 import requests
-from typing import Dict, Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, List, Tuple
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 import time
 
+from .places_cache import PlacesCache, get_places_cache
+
+ENRICH_MAX_WORKERS = int(os.getenv('LEAD_ENRICH_MAX_WORKERS', '16'))
+HOST_MAX_CONCURRENCY = int(os.getenv('LEAD_ENRICH_HOST_CONCURRENCY', '2'))
+HOST_MIN_INTERVAL = float(os.getenv('LEAD_ENRICH_HOST_INTERVAL', '0.5'))
+# Limites por host: (requisições simultâneas, intervalo mínimo em segundos)
+HOST_LIMITS: Dict[str, Tuple[int, float]] = {
+    'maps.googleapis.com': (8, 0.0),  # API paga, limitada pela cota e não por cortesia
+    'www.google.com': (4, 0.1),
+}
+
+
+class HostLimiter:
+    """Concorrência máxima e intervalo mínimo entre requisições por host."""
+
+    def __init__(
+        self,
+        max_concurrency: int = HOST_MAX_CONCURRENCY,
+        min_interval: float = HOST_MIN_INTERVAL,
+        overrides: Optional[Dict[str, Tuple[int, float]]] = None,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_interval = max(0.0, min_interval)
+        self.overrides = dict(HOST_LIMITS if overrides is None else overrides)
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._next_slot: Dict[str, float] = {}
+
+    def limits(self, host: str) -> Tuple[int, float]:
+        return self.overrides.get(host, (self.max_concurrency, self.min_interval))
+
+    @contextmanager
+    def slot(self, url_or_host: str):
+        """Bloqueia até o host aceitar mais uma requisição."""
+        host = (urlparse(url_or_host).hostname if '//' in url_or_host else url_or_host) or ''
+        host = host.lower()
+        concurrency, interval = self.limits(host)
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(concurrency))
+        with semaphore:
+            if interval:
+                # Reserva o próximo horário livre do host antes de dormir
+                with self._lock:
+                    now = time.monotonic()
+                    start = max(now, self._next_slot.get(host, 0.0))
+                    self._next_slot[host] = start + interval
+                if start > now:
+                    time.sleep(start - now)
+            yield
+
 
 class LeadEnrichmentService:
     """
     Serviço para enriquecer leads com dados adicionais que não vêm da API do Google Maps.
     """
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+    GBP_URL = "https://www.google.com/maps/place/?q=place_id:{place_id}"
+
+    def __init__(
+        self,
+        host_limiter: Optional[HostLimiter] = None,
+        gbp_url: Optional[str] = None,
+        cache: Optional[PlacesCache] = None,
+    ):
+        self.host_limiter = host_limiter or HostLimiter()
+        self.cache = cache or get_places_cache()
+        self.gbp_url = gbp_url or os.getenv('LEAD_ENRICH_GBP_URL') or self.GBP_URL
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """Uma ``requests.Session`` por thread (Session não é thread-safe)."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            })
+            self._local.session = session
+        return session
+
+    def _http_get(self, url: str, **kwargs) -> requests.Response:
+        with self.host_limiter.slot(url):
+            return self.session.get(url, **kwargs)
 
     def enrich_lead(self, lead_data: Dict, google_maps_client=None, skip_api_calls: bool = False) -> Dict:
         """
@@ -99,11 +180,16 @@ class LeadEnrichmentService:
         Returns:
             Dict com instagram, whatsapp, phone, website extraídos
         """
+        hit, cached = self.cache.get('gbp', place_id)
+        if hit:
+            return cached or {'instagram': None, 'whatsapp': None, 'phone': None, 'website': None}
+
         try:
             # URL da página do Google Maps com o place_id
-            url = f"https://www.google.com/maps/place/?q=place_id:{place_id}"
+            url = self.gbp_url.format(place_id=place_id)
 
-            response = self.session.get(url, timeout=15)
+            self.cache.record_call('gbp')
+            response = self._http_get(url, timeout=15)
             response.raise_for_status()
 
             html_content = response.text
@@ -180,16 +266,20 @@ class LeadEnrichmentService:
                     data['website'] = potential_website
                     print(f"      ✅ Website encontrado: {data['website']}")
 
+            self.cache.set('gbp', place_id, data)
             return data
 
         except Exception as e:
             print(f"      ⚠️ Erro ao buscar no Google Business Profile: {e}")
+            self.cache.set_negative('gbp', place_id)
             return {'instagram': None, 'whatsapp': None, 'phone': None, 'website': None}
 
     def _get_place_details(self, place_id: str, google_maps_client) -> Dict:
         """Busca detalhes via Google Maps Place Details API"""
         try:
-            response = google_maps_client.get_place_details(place_id)
+            details_url = getattr(google_maps_client, 'DETAILS_URL', 'maps.googleapis.com')
+            with self.host_limiter.slot(details_url):
+                response = google_maps_client.get_place_details(place_id)
             if response.get('status') == 'OK':
                 result = response.get('result', {})
                 return {
@@ -204,9 +294,15 @@ class LeadEnrichmentService:
         """
         Faz scraping do website para buscar Instagram, WhatsApp, telefone.
         """
+        cache_key = website_url.strip().rstrip('/')
+        hit, cached = self.cache.get('site', cache_key)
+        if hit:
+            return cached or {'instagram': None, 'whatsapp': None, 'phone': None}
+
         try:
             # Timeout de 10 segundos
-            response = self.session.get(website_url, timeout=10)
+            self.cache.record_call('site')
+            response = self._http_get(website_url, timeout=10)
             response.raise_for_status()
 
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -261,10 +357,12 @@ class LeadEnrichmentService:
                     data['phone'] = match.group(0)
                     break
 
+            self.cache.set('site', cache_key, data)
             return data
 
         except Exception as e:
             print(f"⚠️ Erro ao fazer scraping do site {website_url}: {e}")
+            self.cache.set_negative('site', cache_key)
             return {'instagram': None, 'whatsapp': None, 'phone': None}
 
     def _guess_instagram_handle(self, business_name: str, city: Optional[str] = None) -> Optional[str]:
@@ -342,7 +440,8 @@ class LeadEnrichmentService:
 
         try:
             url = f"https://www.instagram.com/{handle.replace('@', '')}/"
-            response = self.session.head(url, timeout=5, allow_redirects=True)
+            with self.host_limiter.slot(url):
+                response = self.session.head(url, timeout=5, allow_redirects=True)
             return response.status_code == 200
         except:
             return False
@@ -351,34 +450,42 @@ class LeadEnrichmentService:
         self,
         leads: List[Dict],
         google_maps_client=None,
-        delay_seconds: float = 1.0
+        delay_seconds: Optional[float] = None,
+        max_workers: int = ENRICH_MAX_WORKERS,
+        progress_callback: Optional[Callable[[int, Dict, Optional[Exception]], None]] = None,
     ) -> List[Dict]:
         """
-        Enriquece múltiplos leads em lote.
+        Enriquece múltiplos leads em paralelo, respeitando os limites por host.
 
         Args:
             leads: Lista de leads para enriquecer
             google_maps_client: Cliente do Google Maps
-            delay_seconds: Delay entre requisições (para evitar rate limiting)
+            delay_seconds: Ignorado; o intervalo agora é por host (``HostLimiter``)
+            max_workers: Tamanho do pool de threads
+            progress_callback: Chamado a cada lead concluído com (índice, resultado, erro)
 
         Returns:
-            Lista de leads enriquecidos
+            Lista de leads enriquecidos, na mesma ordem da entrada
         """
-        enriched_leads = []
+        if not leads:
+            return []
 
-        for i, lead in enumerate(leads):
-            print(f"🔍 Enriquecendo lead {i+1}/{len(leads)}: {lead.get('name')}")
+        enriched_leads: List[Dict] = list(leads)
 
+        def run(index: int) -> None:
+            lead = leads[index]
+            error = None
             try:
-                enriched = self.enrich_lead(lead, google_maps_client)
-                enriched_leads.append(enriched)
-
-                # Delay entre requisições
-                if i < len(leads) - 1:
-                    time.sleep(delay_seconds)
-
+                enriched_leads[index] = self.enrich_lead(lead, google_maps_client)
             except Exception as e:
                 print(f"❌ Erro ao enriquecer lead {lead.get('name')}: {e}")
-                enriched_leads.append(lead)
+                error = e
+            if progress_callback:
+                progress_callback(index, enriched_leads[index], error)
+
+        workers = max(1, min(max_workers, len(leads)))
+        print(f"🔍 Enriquecendo {len(leads)} leads ({workers} threads)")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(run, range(len(leads))))
 
-        return enriched_leads
\ No newline at end of file
+        return enriched_leads
@@ -0,0 +1,323 @@
+"""Places cache - Google Place Details and scraping results shared by every worker.
+
+Entries live in ``places_cache_entries`` (SQLite or PostgreSQL), keyed by
+``<kind>:<place_id or URL>``, with an in-process LRU in front so repeated lookups in
+the same request do not hit the database. Each kind has its own TTL; failures are
+cached as negative entries with a shorter TTL so a dead site or an invalid
+place_id is not retried on every discovery. The table is kept under
+``max_entries`` by evicting the least recently used rows.
+
+Counters (hits, misses, external calls and their estimated cost) are per process and
+exposed through ``stats()`` / ``GoogleMapsClient.get_cache_stats``.
+
+``PLACES_CACHE_BACKEND=memory`` disables the table (only the in-process layer).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import func
+
+from ..db import session_scope
+from ..models import PlacesCacheEntry
+
+DAY = 24 * 3600
+DEFAULT_TTLS = {
+    'details': 30 * DAY,  # Place Details (cobrado por chamada)
+    'gbp': 7 * DAY,  # scraping do Google Business Profile
+    'site': 7 * DAY,  # scraping do website do lead
+    'textsearch': DAY,  # páginas do Text Search (novos lugares aparecem com o tempo)
+}
+DEFAULT_NEGATIVE_TTL = DAY
+DEFAULT_MAX_ENTRIES = 50000
+MEMORY_MAX_ENTRIES = 2048
+# Custo estimado por chamada externa (USD); scraping não é cobrado
+API_COSTS_USD = {'details': 0.017, 'textsearch': 0.032}
+# last_accessed_at só é regravado depois desse intervalo (evita um UPDATE por hit)
+TOUCH_INTERVAL_SECONDS = 300
+EVICT_EVERY_WRITES = 100
+
+
+class PlacesCache:
+    """Persistent TTL/LRU cache with negative entries and hit/miss/cost counters."""
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        persistent: bool = True,
+        memory_max_entries: int = MEMORY_MAX_ENTRIES,
+    ):
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self.memory_max_entries = memory_max_entries
+        # key -> (expires_at epoch, is_negative, value, touched_at epoch)
+        self._memory: 'OrderedDict[str, Tuple[float, bool, Any, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(kind: str, identifier: str) -> str:
+        return f"{kind}:{identifier}"
+
+    def ttl_for(self, kind: str) -> float:
+        return self.ttls.get(kind, DEFAULT_TTLS['details'])
+
+    # -------------------------------------------------------------------------
+    # Counters
+    # -------------------------------------------------------------------------
+
+    def _count(self, kind: str, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(
+                kind, {'hits': 0, 'negative_hits': 0, 'misses': 0, 'calls': 0},
+            )
+            counters[counter] += amount
+
+    def record_call(self, kind: str, count: int = 1) -> None:
+        """Count an external request (API call or page fetch) made after a miss."""
+        self._count(kind, 'calls', count)
+
+    # -------------------------------------------------------------------------
+    # Lookup / store
+    # -------------------------------------------------------------------------
+
+    def get(self, kind: str, identifier: str) -> Tuple[bool, Optional[Any]]:
+        """
+        Look up a cached result.
+
+        Returns:
+            ``(True, value)`` on a hit, ``(True, None)`` on a negative hit (known
+            failure), ``(False, None)`` on a miss
+        """
+        key = self.make_key(kind, identifier)
+        now = time.time()
+        touch = False
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, negative, value, touched_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    if now - touched_at > TOUCH_INTERVAL_SECONDS:
+                        self._memory[key] = (expires_at, negative, value, now)
+                        touch = True
+                else:
+                    del self._memory[key]
+                    entry = None
+
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                self._remember(key, *entry)
+                expires_at, negative, value, touched_at = entry
+                touch = now - touched_at > TOUCH_INTERVAL_SECONDS
+
+        if entry is None:
+            self._count(kind, 'misses')
+            return False, None
+
+        if touch:
+            self._touch(key)
+        self._count(kind, 'negative_hits' if negative else 'hits')
+        return True, None if negative else value
+
+    def set(self, kind: str, identifier: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._store(kind, identifier, value, False, ttl if ttl is not None else self.ttl_for(kind))
+
+    def set_negative(self, kind: str, identifier: str, ttl: Optional[float] = None) -> None:
+        """Remember a failure (not found, HTTP error) so it is not retried until ``ttl``."""
+        self._store(kind, identifier, None, True, ttl if ttl is not None else self.negative_ttl)
+
+    def _remember(self, key: str, expires_at: float, negative: bool, value: Any, touched_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (expires_at, negative, value, touched_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_max_entries:
+                self._memory.popitem(last=False)
+
+    def _store(self, kind: str, identifier: str, value: Any, negative: bool, ttl: float) -> None:
+        key = self.make_key(kind, identifier)
+        now = time.time()
+        self._remember(key, now + ttl, negative, value, now)
+        if not self.persistent:
+            return
+
+        utcnow = datetime.utcnow()
+        try:
+            with session_scope() as session:
+                session.merge(PlacesCacheEntry(
+                    key=key,
+                    kind=kind,
+                    payload=None if negative else json.dumps(value, ensure_ascii=False),
+                    is_negative=negative,
+                    expires_at=utcnow + timedelta(seconds=ttl),
+                    last_accessed_at=utcnow,
+                    created_at=utcnow,
+                ))
+                with self._lock:
+                    self._writes += 1
+                    evict = (self._writes - 1) % EVICT_EVERY_WRITES == 0
+                if evict:
+                    self._evict(session, utcnow)
+        except Exception as exc:
+            print(f"⚠️ Falha ao gravar cache de Places: {exc}")
+
+    # -------------------------------------------------------------------------
+    # Persistent layer
+    # -------------------------------------------------------------------------
+
+    def _load(self, key: str) -> Optional[Tuple[float, bool, Any, float]]:
+        if not self.persistent:
+            return None
+        try:
+            with session_scope() as session:
+                entry = session.get(PlacesCacheEntry, key)
+                if entry is None or entry.expires_at <= datetime.utcnow():
+                    return None
+                value = None if entry.is_negative else json.loads(entry.payload)
+                return (
+                    _epoch(entry.expires_at),
+                    bool(entry.is_negative),
+                    value,
+                    _epoch(entry.last_accessed_at),
+                )
+        except Exception as exc:
+            print(f"⚠️ Cache de Places indisponível: {exc}")
+            return None
+
+    def _touch(self, key: str) -> None:
+        if not self.persistent:
+            return
+        try:
+            with session_scope() as session:
+                session.query(PlacesCacheEntry).filter(PlacesCacheEntry.key == key).update(
+                    {PlacesCacheEntry.last_accessed_at: datetime.utcnow()}, synchronize_session=False,
+                )
+        except Exception as exc:
+            print(f"⚠️ Falha ao atualizar cache de Places: {exc}")
+
+    def _evict(self, session, now: datetime) -> None:
+        """Drop expired rows, then the least recently used beyond ``max_entries``."""
+        session.query(PlacesCacheEntry).filter(PlacesCacheEntry.expires_at <= now).delete(
+            synchronize_session=False,
+        )
+        excess = session.query(func.count(PlacesCacheEntry.key)).scalar() - self.max_entries
+        if excess > 0:
+            oldest = (
+                session.query(PlacesCacheEntry.key)
+                .order_by(PlacesCacheEntry.last_accessed_at)
+                .limit(excess)
+                .subquery()
+            )
+            session.query(PlacesCacheEntry).filter(PlacesCacheEntry.key.in_(oldest.select())).delete(
+                synchronize_session=False,
+            )
+
+    def clear(self, kind: Optional[str] = None) -> None:
+        with self._lock:
+            if kind is None:
+                self._memory.clear()
+            else:
+                for key in [key for key in self._memory if key.startswith(f"{kind}:")]:
+                    del self._memory[key]
+        if not self.persistent:
+            return
+        try:
+            with session_scope() as session:
+                query = session.query(PlacesCacheEntry)
+                if kind is not None:
+                    query = query.filter(PlacesCacheEntry.kind == kind)
+                query.delete(synchronize_session=False)
+        except Exception as exc:
+            print(f"⚠️ Falha ao limpar cache de Places: {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        entries_by_kind: Dict[str, int] = {}
+        if self.persistent:
+            try:
+                with session_scope() as session:
+                    entries_by_kind = dict(
+                        session.query(PlacesCacheEntry.kind, func.count(PlacesCacheEntry.key))
+                        .filter(PlacesCacheEntry.expires_at > datetime.utcnow())
+                        .group_by(PlacesCacheEntry.kind)
+                        .all()
+                    )
+            except Exception as exc:
+                print(f"⚠️ Cache de Places indisponível: {exc}")
+
+        with self._lock:
+            memory_entries = len(self._memory)
+            counters = {kind: dict(values) for kind, values in self._counters.items()}
+
+        by_kind = {}
+        for kind in sorted(set(counters) | set(entries_by_kind)):
+            values = counters.get(kind, {'hits': 0, 'negative_hits': 0, 'misses': 0, 'calls': 0})
+            cost = API_COSTS_USD.get(kind, 0.0)
+            by_kind[kind] = {
+                'entries': entries_by_kind.get(kind, 0),
+                **values,
+                'cost_usd': round(values['calls'] * cost, 4),
+                'saved_usd': round((values['hits'] + values['negative_hits']) * cost, 4),
+            }
+
+        totals = {
+            name: sum(values[name] for values in by_kind.values())
+            for name in ('hits', 'negative_hits', 'misses', 'calls')
+        }
+        lookups = totals['hits'] + totals['negative_hits'] + totals['misses']
+        return {
+            'entries': sum(entries_by_kind.values()) if self.persistent else memory_entries,
+            'memory_entries': memory_entries,
+            'max_entries': self.max_entries,
+            'ttl_seconds': dict(self.ttls),
+            'negative_ttl_seconds': self.negative_ttl,
+            **totals,
+            'hit_rate': round((totals['hits'] + totals['negative_hits']) / lookups, 3) if lookups else None,
+            'cost_usd': round(sum(values['cost_usd'] for values in by_kind.values()), 4),
+            'saved_usd': round(sum(values['saved_usd'] for values in by_kind.values()), 4),
+            'by_kind': by_kind,
+            'backend': 'db' if self.persistent else 'memory',
+        }
+
+
+def _epoch(value: datetime) -> float:
+    """Naive UTC datetime (as stored) to epoch seconds."""
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+_places_cache: Optional[PlacesCache] = None
+_places_cache_lock = threading.Lock()
+
+
+def get_places_cache() -> PlacesCache:
+    """Process-wide cache shared by GoogleMapsClient and LeadEnrichmentService."""
+    global _places_cache
+    if _places_cache is None:
+        with _places_cache_lock:
+            if _places_cache is None:
+                ttls = {
+                    kind: float(os.getenv(f'PLACES_CACHE_TTL_{kind.upper()}', ttl))
+                    for kind, ttl in DEFAULT_TTLS.items()
+                }
+                _places_cache = PlacesCache(
+                    ttls=ttls,
+                    negative_ttl=float(os.getenv('PLACES_CACHE_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL)),
+                    max_entries=int(os.getenv('PLACES_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+                    persistent=(os.getenv('PLACES_CACHE_BACKEND') or 'db').strip().lower() != 'memory',
+                )
+    return _places_cache
+
+
+__all__ = ['PlacesCache', 'get_places_cache', 'API_COSTS_USD']
@@ -3,17 +3,22 @@
 from __future__ import annotations
 
 import calendar
+import math
+import os
+import time
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import func
+from sqlalchemy import and_, func
 
 import pandas as pd
 
 from ..db import session_scope
-from ..models import CRMLead
-from .b2b_metrics import B2BMetrics
+from ..models import CRMLead, CRMUser
+from ..services.sales_cube_service import SalesCubeService
+from .b2b_metrics import AggregatedSales, B2BMetrics, PreparedSales
+from .dashboard_cache import DashboardCache, dashboard_data_version, get_dashboard_cache, make_cache_key
 from .sales_repository import SalesRepository
 
 if TYPE_CHECKING:
@@ -37,17 +42,30 @@ class SalesAnalyzer:
     """Primary analytics façade for the B2B dashboard."""
 
     CURRENCY_SYMBOLS = {'BRL': 'R$', 'PYG': '₲'}
+    # Origem dos agregados do histórico completo: cubo persistido, GROUP BY no banco
+    # ou pandas sobre todos os itens (referência para comparação)
+    AGGREGATION_BACKENDS = ('cube', 'sql', 'pandas')
 
     def __init__(
         self,
         sales_repository: Optional[SalesRepository] = None,
         crm_service: Optional['CRMService'] = None,
         target_currency: str = 'BRL',
+        dashboard_cache: Optional[DashboardCache] = None,
+        sales_cube: Optional[SalesCubeService] = None,
+        aggregation_backend: Optional[str] = None,
     ) -> None:
         self._target_currency = target_currency.upper() if target_currency else 'BRL'
         self.repository = sales_repository or SalesRepository()
         self.metrics_calculator = B2BMetrics()
         self.crm_service = crm_service
+        # Compartilhado entre instâncias (as rotas criam um analyzer por requisição)
+        self.dashboard_cache = dashboard_cache or get_dashboard_cache()
+        self.sales_cube = sales_cube or SalesCubeService()
+        backend = (aggregation_backend or os.getenv('B2B_AGGREGATION_BACKEND') or 'cube').strip().lower()
+        if backend not in self.AGGREGATION_BACKENDS:
+            raise ValueError(f"Backend de agregação inválido: {backend}")
+        self.aggregation_backend = backend
         self.cache_duration = 300  # seconds
         self._last_cache_update: Optional[datetime] = None
         self._cached_data: Optional[pd.DataFrame] = None
@@ -67,20 +85,20 @@ class SalesAnalyzer:
             return self._get_empty_summary()
 
         full_frame = self.repository.fetch_sales_dataframe(user_id=user_id)
-        full_records = full_frame.to_dict("records")
+        full_sales = self.metrics_calculator.prepare(full_frame)
 
         inactive_metrics = self.metrics_calculator.calculate_inactive_clients(
-            full_records,
+            full_sales,
             days_threshold=period_days,
             reference_date=end_date,
         )
         monthly_revenue = self.metrics_calculator.calculate_monthly_revenue(
-            full_records,
+            full_sales,
             reference_date=end_date,
         )
-        top_clients = self.metrics_calculator.calculate_top_clients(full_records, top_n=5)
-        ltv_metrics = self.metrics_calculator.calculate_client_lifetime_value(full_records)
-        forecast = self.metrics_calculator.calculate_sales_forecast(full_records, months_ahead=3)
+        top_clients = self.metrics_calculator.calculate_top_clients(full_sales, top_n=5)
+        ltv_metrics = self.metrics_calculator.calculate_client_lifetime_value(full_sales)
+        forecast = self.metrics_calculator.calculate_sales_forecast(full_sales, months_ahead=3)
 
         summary = self._calculate_summary_metrics(period_frame, inactive_metrics, monthly_revenue)
 
@@ -159,58 +177,102 @@ class SalesAnalyzer:
             ],
         }
 
-    def get_sales_forecast(self, months_ahead: int = 3) -> Dict[str, Any]:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365)
-        frame = self._get_sales_data(start_date, end_date)
-
-        if frame.empty:
+    def get_sales_forecast(self, months_ahead: int = 3, user_id: Optional[int] = None) -> Dict[str, Any]:
+        # Histórico completo (sazonalidade anual); o ajuste fica em cache por versão dos dados
+        cache_key = make_cache_key(user_id, self._target_currency, 'forecast', dashboard_data_version())
+        forecast = self.metrics_calculator.forecaster.forecast(
+            lambda: self._load_full_sales(user_id),
+            months_ahead=months_ahead,
+            cache_key=cache_key,
+        )
+        if not forecast.get('forecast'):
             return {'error': 'Dados insuficientes para previsão'}
-
-        records = frame.to_dict('records')
-        forecast = self.metrics_calculator.calculate_sales_forecast(records, months_ahead)
-        return {'forecast': forecast.get('forecast', []), 'trend': forecast.get('trend')}
+        return {
+            'forecast': forecast['forecast'],
+            'trend': forecast.get('trend'),
+            'method': forecast.get('method'),
+            'clients': forecast.get('clients', []),
+        }
 
     def get_dashboard_data(
         self,
         reference_month: Optional[str] = None,
         user_id: Optional[int] = None
     ) -> Dict[str, Any]:
-        frame = self.repository.fetch_sales_dataframe(user_id=user_id)
-        if frame.empty:
-            return self._get_empty_dashboard_data()
-
         month_start, month_end = self._resolve_month_window(reference_month)
 
-        full_records = frame.to_dict('records')
-        selected_mask = (frame['date'] >= month_start) & (frame['date'] <= month_end)
-        selected_frame = frame[selected_mask]
-        selected_records = selected_frame.to_dict('records')
+        cache_key = make_cache_key(
+            user_id, self._target_currency, month_start.strftime('%Y-%m'), dashboard_data_version()
+        )
+        cached = self.dashboard_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        dashboard = self._build_dashboard_data(month_start, month_end, user_id, data_version=cache_key[-1])
+        self.dashboard_cache.set(cache_key, dashboard)
+        return dashboard
+
+    def _build_dashboard_data(
+        self,
+        month_start: datetime,
+        month_end: datetime,
+        user_id: Optional[int],
+        backend: Optional[str] = None,
+        data_version: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        backend = self._resolve_backend(backend)
+
+        if backend in ('cube', 'sql'):
+            # Histórico completo já agregado; só o mês selecionado é lido item a item
+            full_sales = self._load_full_sales(user_id, backend)
+            selected_frame = self.repository.fetch_sales_dataframe(
+                start_date=month_start.date(),
+                end_date=month_end.date(),
+                user_id=user_id,
+            )
+            selected_sales = self.metrics_calculator.prepare(selected_frame)
+        else:
+            frame = self.repository.fetch_sales_dataframe(user_id=user_id)
+            # Parse/normalização uma vez; todas as métricas compartilham os agrupamentos
+            full_sales = self.metrics_calculator.prepare(frame)
+            selected_mask = (frame['date'] >= month_start) & (frame['date'] <= month_end)
+            selected_frame = frame[selected_mask]
+            selected_sales = full_sales.subset(selected_mask)
+
+        if full_sales.empty:
+            return self._get_empty_dashboard_data()
 
         inactive_metrics = self.metrics_calculator.calculate_inactive_clients(
-            full_records,
+            full_sales,
             days_threshold=60,
             reference_date=month_end,
         )
         monthly_revenue_all = self.metrics_calculator.calculate_monthly_revenue(
-            full_records,
+            full_sales,
             reference_date=month_end,
         )
         monthly_revenue = self._build_monthly_revenue_view(monthly_revenue_all, month_start)
         # Top clientes no período total (não só mês selecionado), top 10
-        top_clients = self.metrics_calculator.calculate_top_clients(full_records, top_n=10)
-        ltv_metrics = self.metrics_calculator.calculate_client_lifetime_value(selected_records)
+        top_clients = self.metrics_calculator.calculate_top_clients(full_sales, top_n=10)
+        ltv_metrics = self.metrics_calculator.calculate_client_lifetime_value(selected_sales)
         ltv_metrics.setdefault('average_transaction_value', float(selected_frame['valor'].mean()) if not selected_frame.empty else 0.0)
         ltv_metrics.setdefault('trend', 'Estável')
 
-        forecast = self.metrics_calculator.calculate_sales_forecast(full_records, months_ahead=3)
+        forecast = self.metrics_calculator.calculate_sales_forecast(
+            full_sales,
+            months_ahead=3,
+            cache_key=(
+                make_cache_key(user_id, self._target_currency, 'forecast', data_version)
+                if data_version is not None else None
+            ),
+        )
         base_country_metrics = self.metrics_calculator.calculate_country_metrics(
-            full_records,
+            full_sales,
             reference_date=month_end,
         )
         country_metrics = self._build_country_metrics(base_country_metrics, selected_frame)
 
-        lead_funnel = self._build_lead_funnel(month_start, month_end)
+        lead_funnel = self._build_lead_funnel(month_start, month_end, user_id=user_id)
 
         metrics = {
             'inactive_clients': inactive_metrics,
@@ -233,16 +295,64 @@ class SalesAnalyzer:
             'metrics': metrics,
             'data_source': 'Banco de dados',
             'selected_month': summary['month'],
-            'total_records': len(selected_records),
+            'total_records': len(selected_frame),
             'last_updated': datetime.now().strftime('%d/%m/%Y %H:%M'),
             'currency': self._target_currency,
             'currency_symbol': self.CURRENCY_SYMBOLS.get(self._target_currency, 'R$'),
         }
 
+    def _resolve_backend(self, backend: Optional[str] = None) -> str:
+        backend = backend or self.aggregation_backend
+        if backend == 'cube' and not self.sales_cube.supports(self._target_currency):
+            return 'sql'
+        return backend
+
+    def _load_full_sales(self, user_id: Optional[int], backend: Optional[str] = None) -> PreparedSales:
+        """Complete sales history through the configured aggregation backend."""
+        backend = self._resolve_backend(backend)
+        if backend == 'cube':
+            return AggregatedSales.from_cells(self.sales_cube.load_cells(self._target_currency, user_id=user_id))
+        if backend == 'sql':
+            return self.repository.aggregated_sales(user_id=user_id)
+        return self.metrics_calculator.prepare(self.repository.fetch_sales_dataframe(user_id=user_id))
+
+    def compare_aggregation_backends(
+        self,
+        reference_month: Optional[str] = None,
+        user_id: Optional[int] = None,
+        backends: Tuple[str, ...] = ('sql', 'pandas'),
+        rel_tol: float = 1e-9,
+    ) -> Dict[str, Any]:
+        """
+        Build the dashboard with each backend (bypassing the cache) and compare them.
+
+        Returns:
+            ``{'equal': bool, 'mismatches': ['sql:top_clients', ...], 'timings_ms': {...}}``
+        """
+        month_start, month_end = self._resolve_month_window(reference_month)
+        results: Dict[str, Dict[str, Any]] = {}
+        timings: Dict[str, float] = {}
+        for backend in backends:
+            started = time.perf_counter()
+            results[backend] = self._build_dashboard_data(month_start, month_end, user_id, backend=backend)
+            timings[backend] = round((time.perf_counter() - started) * 1000, 1)
+
+        reference = results[backends[0]]
+        mismatches = []
+        for backend in backends[1:]:
+            candidate = results[backend]
+            for section in ('summary', 'metrics'):
+                for key, value in reference.get(section, {}).items():
+                    if not _values_match(value, candidate.get(section, {}).get(key), rel_tol):
+                        mismatches.append(f'{backend}:{key}')
+
+        return {'equal': not mismatches, 'mismatches': mismatches, 'timings_ms': timings}
+
     def clear_cache(self) -> None:
         self._cached_data = None
         self._last_cache_update = None
         self._cache_window = (None, None)
+        self.dashboard_cache.clear()
         print("🗑️ Cache de dados B2B limpo")
 
     # ------------------------------------------------------------------
@@ -280,9 +390,9 @@ class SalesAnalyzer:
             try:
                 month_start = datetime.strptime(f"{reference_month}-01", "%Y-%m-%d")
             except ValueError:
-                month_start = datetime.now().replace(day=1)
+                month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         else:
-            month_start = datetime.now().replace(day=1)
+            month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
         last_day = calendar.monthrange(month_start.year, month_start.month)[1]
         month_end = month_start.replace(day=last_day)
@@ -363,7 +473,18 @@ class SalesAnalyzer:
         metrics['countries_revenue_selected'] = countries_revenue
         return metrics
 
-    def _build_lead_funnel(self, month_start: datetime, month_end: datetime) -> Dict[str, Any]:
+    def _build_lead_funnel(
+        self,
+        month_start: datetime,
+        month_end: datetime,
+        user_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Lead funnel (counts per stage, new and converted leads in the month).
+
+        One conditional-aggregate query grouped by seller and status feeds both the
+        funnel of the dashboard scope (``user_id`` or everyone) and ``by_seller``.
+        """
         stage_options: List[Dict[str, Any]] = []
         if self.crm_service:
             try:
@@ -375,58 +496,102 @@ class SalesAnalyzer:
         stage_labels = {stage['value']: stage.get('label', stage['value']) for stage in stage_options}
         stage_badges = {stage['value']: stage.get('badge', 'secondary') for stage in stage_options}
 
-        with session_scope() as session:
-            status_counts = {
-                (status or 'nao_contactado'): count
-                for status, count in session.query(CRMLead.status, func.count(CRMLead.id)).group_by(CRMLead.status)
-            }
-            total_leads = sum(status_counts.values())
+        month_end_next = month_end + timedelta(days=1)
+        created_in_month = and_(CRMLead.created_at >= month_start, CRMLead.created_at < month_end_next)
+        converted_in_month = and_(
+            CRMLead.status == 'cliente',
+            CRMLead.updated_at >= month_start,
+            CRMLead.updated_at < month_end_next,
+        )
 
-            month_end_next = month_end + timedelta(days=1)
-            new_leads = session.query(func.count(CRMLead.id)).filter(
-                CRMLead.created_at >= month_start,
-                CRMLead.created_at < month_end_next,
-            ).scalar() or 0
-            converted_leads = session.query(func.count(CRMLead.id)).filter(
-                CRMLead.status == 'cliente',
-                CRMLead.updated_at >= month_start,
-                CRMLead.updated_at < month_end_next,
-            ).scalar() or 0
+        with session_scope() as session:
+            query = (
+                session.query(
+                    CRMLead.user_id,
+                    CRMUser.username,
+                    CRMLead.status,
+                    func.count(CRMLead.id),
+                    func.count(CRMLead.id).filter(created_in_month),
+                    func.count(CRMLead.id).filter(converted_in_month),
+                )
+                .outerjoin(CRMUser, CRMUser.id == CRMLead.user_id)
+            )
+            if user_id:
+                query = query.filter(CRMLead.user_id == user_id)
+            rows = query.group_by(CRMLead.user_id, CRMUser.username, CRMLead.status).all()
+
+        funnel = self._empty_lead_funnel_counts()
+        sellers: Dict[Optional[int], Dict[str, Any]] = {}
+        for seller_id, username, status, count, new_count, converted_count in rows:
+            seller = sellers.setdefault(seller_id, self._empty_lead_funnel_counts(seller_id, username))
+            for counts in (funnel, seller):
+                stage = status or 'nao_contactado'
+                counts['status_counts'][stage] = counts['status_counts'].get(stage, 0) + int(count)
+                counts['new_leads'] += int(new_count or 0)
+                counts['converted_leads'] += int(converted_count or 0)
 
         if not stage_order:
-            stage_order = sorted(status_counts.keys()) or ['nao_contactado', 'contactado', 'em_negociacao', 'cliente']
+            stage_order = sorted(funnel['status_counts'].keys()) or ['nao_contactado', 'contactado', 'em_negociacao', 'cliente']
             for stage in stage_order:
                 stage_labels.setdefault(stage, stage.replace('_', ' ').title())
                 stage_badges.setdefault(stage, 'secondary')
 
-        stages: List[Dict[str, Any]] = []
-        for stage in stage_order:
-            count = status_counts.pop(stage, 0)
-            percentage = (count / total_leads * 100) if total_leads else 0.0
-            stages.append({
-                'status': stage,
-                'label': stage_labels.get(stage, stage),
-                'badge': stage_badges.get(stage, 'secondary'),
-                'count': int(count),
-                'percentage': percentage,
-            })
-
-        for stage, count in status_counts.items():
-            safe_stage = stage or 'sem_status'
-            percentage = (count / total_leads * 100) if total_leads else 0.0
-            stages.append({
-                'status': safe_stage,
-                'label': stage_labels.get(stage, safe_stage.replace('_', ' ').title()),
-                'badge': stage_badges.get(stage, 'secondary'),
-                'count': int(count),
-                'percentage': percentage,
+        def build_stages(status_counts: Dict[str, int]) -> Tuple[int, List[Dict[str, Any]]]:
+            status_counts = dict(status_counts)
+            total_leads = sum(status_counts.values())
+            stages: List[Dict[str, Any]] = []
+            for stage in stage_order:
+                count = status_counts.pop(stage, 0)
+                percentage = (count / total_leads * 100) if total_leads else 0.0
+                stages.append({
+                    'status': stage,
+                    'label': stage_labels.get(stage, stage),
+                    'badge': stage_badges.get(stage, 'secondary'),
+                    'count': int(count),
+                    'percentage': percentage,
+                })
+
+            for stage, count in status_counts.items():
+                safe_stage = stage or 'sem_status'
+                percentage = (count / total_leads * 100) if total_leads else 0.0
+                stages.append({
+                    'status': safe_stage,
+                    'label': stage_labels.get(stage, safe_stage.replace('_', ' ').title()),
+                    'badge': stage_badges.get(stage, 'secondary'),
+                    'count': int(count),
+                    'percentage': percentage,
+                })
+            return total_leads, stages
+
+        by_seller: List[Dict[str, Any]] = []
+        for seller in sorted(sellers.values(), key=lambda item: (item['user_id'] is None, item['user_name'] or '')):
+            seller_total, seller_stages = build_stages(seller['status_counts'])
+            by_seller.append({
+                'user_id': seller['user_id'],
+                'user_name': seller['user_name'],
+                'total_leads': int(seller_total),
+                'stages': seller_stages,
+                'new_leads': seller['new_leads'],
+                'converted_leads': seller['converted_leads'],
             })
 
+        total_leads, stages = build_stages(funnel['status_counts'])
         return {
             'total_leads': int(total_leads),
             'stages': stages,
-            'new_leads': int(new_leads),
-            'converted_leads': int(converted_leads),
+            'new_leads': funnel['new_leads'],
+            'converted_leads': funnel['converted_leads'],
+            'by_seller': by_seller,
+        }
+
+    @staticmethod
+    def _empty_lead_funnel_counts(user_id: Optional[int] = None, user_name: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            'user_id': user_id,
+            'user_name': user_name,
+            'status_counts': {},
+            'new_leads': 0,
+            'converted_leads': 0,
         }
 
     @staticmethod
@@ -659,9 +824,22 @@ class SalesAnalyzer:
                 'stages': [],
                 'new_leads': 0,
                 'converted_leads': 0,
+                'by_seller': [],
             },
             'alerts': [],
         }
 
 
+def _values_match(left: Any, right: Any, rel_tol: float) -> bool:
+    if isinstance(left, dict) and isinstance(right, dict):
+        return left.keys() == right.keys() and all(_values_match(left[k], right[k], rel_tol) for k in left)
+    if isinstance(left, list) and isinstance(right, list):
+        return len(left) == len(right) and all(_values_match(a, b, rel_tol) for a, b in zip(left, right))
+    if isinstance(left, (int, float)) and isinstance(right, (int, float)) and not isinstance(left, bool):
+        if math.isnan(left) and math.isnan(right):
+            return True
+        return math.isclose(left, right, rel_tol=rel_tol, abs_tol=1e-9)
+    return left == right
+
+
 __all__ = ['SalesAnalyzer']
@@ -0,0 +1,398 @@
+"""Sales forecasting - Holt-Winters and seasonal naive over monthly revenue.
+
+Revenue is laid out as a (series x months) matrix, one row per client plus the total.
+The smoothing recursions loop over months only: every series and every candidate
+parameter set advance together as NumPy arrays, and each series keeps the parameters
+with the lowest one-step-ahead squared error. Fitted states are cached by data version,
+so serving a forecast is a handful of array operations.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import product
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from .dashboard_cache import CacheKey, DashboardCache
+
+if TYPE_CHECKING:
+    from .b2b_metrics import PreparedSales
+
+SEASON_LENGTH = 12
+DAMPING = 0.9
+ALPHAS = (0.1, 0.3, 0.5, 0.7, 0.9)
+BETAS = (0.0, 0.05, 0.15, 0.3)
+GAMMAS = (0.0, 0.1, 0.3)
+FORECAST_METHODS = ('holt_winters', 'seasonal_naive', 'linear_trend')
+# Tendência mensal relativa ao nível recente para classificar crescimento/declínio
+TREND_THRESHOLD = 0.02
+# Limita a memória do grid (parâmetros x séries x sazonalidade) em bases grandes
+FIT_CHUNK_SIZE = 2000
+FORECAST_CACHE_TTL = 3600
+TOTAL_LABEL = 'Total'
+
+
+@dataclass
+class MonthlySeries:
+    """Revenue per client and month over a contiguous range of months."""
+
+    labels: List[str]
+    periods: pd.PeriodIndex
+    values: np.ndarray
+
+    @classmethod
+    def from_sales(cls, sales: 'PreparedSales', end_period: pd.Period) -> 'MonthlySeries':
+        """Build the matrix up to ``end_period`` (inclusive); missing months are zero."""
+        cells = sales.by_client_month
+        if not cells.empty:
+            cells = cells[cells.index.get_level_values('mes_ano') <= end_period]
+        if cells.empty:
+            return cls([], pd.PeriodIndex([], freq='M'), np.zeros((0, 0)))
+
+        periods = pd.period_range(cells.index.get_level_values('mes_ano').min(), end_period, freq='M')
+        matrix = cells.unstack('mes_ano', fill_value=0.0).reindex(columns=periods, fill_value=0.0)
+        return cls([str(label) for label in matrix.index], periods, matrix.to_numpy(dtype=float))
+
+    @property
+    def n_months(self) -> int:
+        return len(self.periods)
+
+    def with_total(self) -> np.ndarray:
+        """Client rows followed by the total row."""
+        return np.vstack([self.values, self.values.sum(axis=0, keepdims=True)])
+
+
+@dataclass
+class FittedForecast:
+    """
+    Final smoothing state per series (clients, then the total as the last row).
+
+    Seasonal naive and linear trend are expressed in the same state, so
+    ``predict`` is shared: ``level + damped trend + season[(n_obs + step - 1) % m]``.
+    """
+
+    method: str
+    labels: List[str]
+    last_period: pd.Period
+    n_obs: int
+    level: np.ndarray
+    trend: np.ndarray
+    season: np.ndarray
+    params: np.ndarray
+    damping: float
+    fit_seconds: float
+
+    def predict(self, steps: Sequence[int]) -> np.ndarray:
+        """Forecast for each series ``steps`` months after ``last_period`` (>= 0)."""
+        steps = np.asarray(steps, dtype=int)
+        horizon = int(steps.max()) if steps.size else 0
+        damped_steps = np.concatenate([[0.0], np.cumsum(self.damping ** np.arange(1, horizon + 1))])
+        season_index = (self.n_obs + steps - 1) % self.season.shape[1]
+        forecast = (
+            self.level[:, None]
+            + self.trend[:, None] * damped_steps[steps][None, :]
+            + self.season[:, season_index]
+        )
+        return np.maximum(forecast, 0.0)
+
+    def steps_to(self, period: pd.Period) -> int:
+        return (period - self.last_period).n
+
+
+def fit_holt_winters(
+    values: np.ndarray,
+    season_length: int = SEASON_LENGTH,
+    damping: float = DAMPING,
+) -> Dict[str, np.ndarray]:
+    """
+    Additive damped Holt-Winters for every row of ``values`` (series x months).
+
+    Seasonality is only used with at least two full seasons; shorter histories fit a
+    damped Holt trend. Parameters are chosen per series from the ALPHAS x BETAS x
+    GAMMAS grid by one-step-ahead SSE.
+    """
+    n_series, n_obs = values.shape
+    seasonal = n_obs >= 2 * season_length
+    grid = np.array(list(product(ALPHAS, BETAS, GAMMAS if seasonal else (0.0,))))
+
+    result = {
+        'level': np.zeros(n_series),
+        'trend': np.zeros(n_series),
+        'season': np.zeros((n_series, season_length)),
+        'params': np.zeros((n_series, 3)),
+    }
+    for start in range(0, n_series, FIT_CHUNK_SIZE):
+        rows = slice(start, start + FIT_CHUNK_SIZE)
+        level, trend, season, best = _fit_chunk(values[rows], grid, season_length, seasonal, damping)
+        result['level'][rows] = level
+        result['trend'][rows] = trend
+        result['season'][rows] = season
+        result['params'][rows] = grid[best]
+    return result
+
+
+def _fit_chunk(values: np.ndarray, grid: np.ndarray, season_length: int, seasonal: bool, damping: float):
+    n_series, n_obs = values.shape
+    n_params = len(grid)
+    alpha, beta, gamma = (grid[:, column, None] for column in range(3))
+
+    if seasonal:
+        first = values[:, :season_length].mean(axis=1)
+        second = values[:, season_length:2 * season_length].mean(axis=1)
+        level0 = first
+        trend0 = (second - first) / season_length
+        season0 = values[:, :season_length] - first[:, None]
+    else:
+        level0 = values[:, 0]
+        trend0 = np.zeros(n_series)
+        season0 = np.zeros((n_series, season_length))
+
+    level = np.tile(level0, (n_params, 1))
+    trend = np.tile(trend0, (n_params, 1))
+    season = np.tile(season0, (n_params, 1, 1))
+    sse = np.zeros((n_params, n_series))
+
+    for t in range(n_obs):
+        observed = values[:, t]
+        slot = t % season_length
+        current_season = season[:, :, slot]
+        damped = level + damping * trend
+        if t > 0:
+            sse += (observed - damped - current_season) ** 2
+        new_level = alpha * (observed - current_season) + (1 - alpha) * damped
+        trend = beta * (new_level - level) + (1 - beta) * damping * trend
+        season[:, :, slot] = gamma * (observed - new_level) + (1 - gamma) * current_season
+        level = new_level
+
+    best = sse.argmin(axis=0)
+    columns = np.arange(n_series)
+    return level[best, columns], trend[best, columns], season[best, columns], best
+
+
+def fit_seasonal_naive(values: np.ndarray, season_length: int = SEASON_LENGTH) -> Dict[str, np.ndarray]:
+    """Same month last year; with less than a season of history, the last month."""
+    n_series, n_obs = values.shape
+    season = np.zeros((n_series, season_length))
+    level = np.zeros(n_series)
+    if n_obs >= season_length:
+        for t in range(n_obs - season_length, n_obs):
+            season[:, t % season_length] = values[:, t]
+    elif n_obs:
+        level = values[:, -1].copy()
+    return {'level': level, 'trend': np.zeros(n_series), 'season': season, 'params': np.zeros((n_series, 3))}
+
+
+def fit_linear_trend(values: np.ndarray, season_length: int = SEASON_LENGTH) -> Dict[str, np.ndarray]:
+    """Previous behaviour: last month plus the least-squares slope of the last three."""
+    n_series = values.shape[0]
+    recent = values[:, -3:]
+    # Inclinação de mínimos quadrados com 3 pontos igualmente espaçados
+    slope = (recent[:, -1] - recent[:, 0]) / max(recent.shape[1] - 1, 1)
+    return {
+        'level': values[:, -1].copy(),
+        'trend': slope,
+        'season': np.zeros((n_series, season_length)),
+        'params': np.zeros((n_series, 3)),
+    }
+
+
+_FITTERS = {
+    'holt_winters': fit_holt_winters,
+    'seasonal_naive': fit_seasonal_naive,
+    'linear_trend': fit_linear_trend,
+}
+
+
+def fit_series(
+    series: MonthlySeries,
+    method: str = 'holt_winters',
+    season_length: int = SEASON_LENGTH,
+) -> FittedForecast:
+    """Fit ``method`` on every client row plus the total row of ``series``."""
+    started = time.perf_counter()
+    state = _FITTERS[method](series.with_total(), season_length=season_length)
+    return FittedForecast(
+        method=method,
+        labels=series.labels + [TOTAL_LABEL],
+        last_period=series.periods[-1],
+        n_obs=series.n_months,
+        level=state['level'],
+        trend=state['trend'],
+        season=state['season'],
+        params=state['params'],
+        damping=DAMPING if method == 'holt_winters' else 1.0,
+        fit_seconds=time.perf_counter() - started,
+    )
+
+
+def backtest(
+    series: MonthlySeries,
+    horizon: int = 3,
+    method: str = 'holt_winters',
+    season_length: int = SEASON_LENGTH,
+) -> Dict[str, float]:
+    """
+    Hold out the last ``horizon`` months, fit on the rest and score the forecast.
+
+    Returns MAPE of the total (months with revenue only), WAPE across clients
+    (sum of absolute errors / sum of revenue) and the fit time in seconds.
+    """
+    if series.n_months <= horizon:
+        raise ValueError("Histórico menor que o horizonte do backtest")
+
+    training = MonthlySeries(series.labels, series.periods[:-horizon], series.values[:, :-horizon])
+    fitted = fit_series(training, method=method, season_length=season_length)
+    predicted = fitted.predict(range(1, horizon + 1))
+    actual = series.with_total()[:, -horizon:]
+
+    total_actual, total_predicted = actual[-1], predicted[-1]
+    with_revenue = total_actual > 0
+    mape = (
+        float(np.mean(np.abs(total_actual - total_predicted)[with_revenue] / total_actual[with_revenue]) * 100)
+        if with_revenue.any() else float('nan')
+    )
+    client_actual = actual[:-1]
+    wape = (
+        float(np.abs(client_actual - predicted[:-1]).sum() / client_actual.sum() * 100)
+        if client_actual.sum() else float('nan')
+    )
+    return {'mape': mape, 'client_wape': wape, 'fit_seconds': fitted.fit_seconds}
+
+
+def classify_trend(trend_value: float, recent_level: float) -> str:
+    threshold = TREND_THRESHOLD * abs(recent_level)
+    if trend_value > threshold:
+        return 'crescimento'
+    if trend_value < -threshold:
+        return 'declínio'
+    return 'estável'
+
+
+SalesSource = Union['PreparedSales', Callable[[], 'PreparedSales']]
+
+
+class SalesForecaster:
+    """
+    Forecasts for the aggregate and for each client, fitted once per data version.
+
+    The history runs until the month before ``reference_date`` (the current month is
+    still open), and forecasts cover the ``months_ahead`` months after it.
+    """
+
+    def __init__(
+        self,
+        method: Optional[str] = None,
+        season_length: int = SEASON_LENGTH,
+        cache: Optional[DashboardCache] = None,
+    ):
+        method = (method or os.getenv('B2B_FORECAST_METHOD') or 'holt_winters').strip().lower()
+        if method not in FORECAST_METHODS:
+            raise ValueError(f"Método de previsão inválido: {method}")
+        self.method = method
+        self.season_length = season_length
+        self.cache = cache or get_forecast_cache()
+
+    def fit(
+        self,
+        sales: SalesSource,
+        reference_date: Optional[datetime] = None,
+        cache_key: Optional[CacheKey] = None,
+    ) -> Optional[FittedForecast]:
+        """
+        Fitted model for ``sales`` (or a loader, only called on a cache miss).
+
+        Returns ``None`` with less than three months of history.
+        """
+        end_period = pd.Period(reference_date or datetime.now(), freq='M') - 1
+        key = None
+        if cache_key is not None:
+            user, currency, scope, version = cache_key
+            key = (user, currency, f'{scope}:{self.method}:{end_period}', version)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached['fitted']
+
+        loaded = sales() if callable(sales) else sales
+        series = MonthlySeries.from_sales(loaded, end_period) if not loaded.empty else None
+        fitted = None
+        if series is not None and series.n_months >= 3:
+            fitted = fit_series(series, method=self.method, season_length=self.season_length)
+        if key is not None:
+            self.cache.set(key, {'fitted': fitted})
+        return fitted
+
+    def forecast(
+        self,
+        sales: SalesSource,
+        months_ahead: int = 3,
+        reference_date: Optional[datetime] = None,
+        cache_key: Optional[CacheKey] = None,
+        top_clients: int = 10,
+    ) -> Dict[str, Any]:
+        reference_date = reference_date or datetime.now()
+        fitted = self.fit(sales, reference_date=reference_date, cache_key=cache_key)
+        if fitted is None:
+            return {'forecast': [], 'trend': 'dados insuficientes'}
+
+        reference_period = pd.Period(reference_date, freq='M')
+        periods = [reference_period + i for i in range(1, months_ahead + 1)]
+        predicted = fitted.predict([fitted.steps_to(period) for period in periods])
+
+        total = predicted[-1]
+        trend_value = float(fitted.trend[-1])
+        recent_level = float(fitted.level[-1]) if fitted.method != 'seasonal_naive' else float(total.mean())
+
+        clients: List[Dict[str, Any]] = []
+        if top_clients and len(fitted.labels) > 1:
+            client_totals = predicted[:-1].sum(axis=1)
+            for index in np.argsort(-client_totals, kind='stable')[:top_clients]:
+                if client_totals[index] <= 0:
+                    break
+                clients.append({
+                    'cliente': fitted.labels[index],
+                    'valor_previsto': float(client_totals[index]),
+                    'previsao_mensal': [float(value) for value in predicted[index]],
+                    'tendencia': classify_trend(float(fitted.trend[index]), float(fitted.level[index])),
+                })
+
+        return {
+            'forecast': [
+                {'mes': str(period), 'valor_previsto': float(value)}
+                for period, value in zip(periods, total)
+            ],
+            'trend': classify_trend(trend_value, recent_level),
+            'trend_value': trend_value,
+            'method': fitted.method,
+            'clients': clients,
+        }
+
+
+_forecast_cache: Optional[DashboardCache] = None
+_forecast_cache_lock = threading.Lock()
+
+
+def get_forecast_cache() -> DashboardCache:
+    """
+    Process-wide in-process LRU of fitted models: entries are stored by reference
+    (no serialization, no shared backend), since ``FittedForecast`` is NumPy state.
+    """
+    global _forecast_cache
+    if _forecast_cache is None:
+        with _forecast_cache_lock:
+            if _forecast_cache is None:
+                _forecast_cache = DashboardCache(max_entries=64, ttl=FORECAST_CACHE_TTL, serialize=False)
+    return _forecast_cache
+
+
+__all__ = [
+    'FORECAST_METHODS', 'MonthlySeries', 'FittedForecast', 'SalesForecaster',
+    'fit_holt_winters', 'fit_seasonal_naive', 'fit_linear_trend', 'fit_series',
+    'backtest', 'classify_trend', 'get_forecast_cache',
+]
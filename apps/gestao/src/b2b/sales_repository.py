@@ -2,16 +2,25 @@
 
 from __future__ import annotations
 
-from datetime import date, datetime
-from typing import Any, Dict, List, Optional, TYPE_CHECKING
+from datetime import date
+from functools import cached_property
+from typing import Optional, Sequence, Tuple, TYPE_CHECKING
 
+import numpy as np
 import pandas as pd
+from sqlalchemy import Float, Integer, String, and_, case, cast, extract, false, func, literal, or_, select, tuple_
+from sqlalchemy.orm import aliased
+
 from ..db import session_scope
-from ..models import CRMLead, CoffeeProduct, Order, OrderItem
+from ..models import CRMLead, CoffeeProduct, ExchangeRate, Order, OrderItem
+from .b2b_metrics import PreparedSales
 
 if TYPE_CHECKING:
     from ..services.exchange_rate_service import ExchangeRateService
 
+# (ano, mês, país) de uma célula de ``fetch_country_aggregates``; ano/mês None = pedido sem data
+CellKey = Tuple[Optional[int], Optional[int], str]
+
 
 class SalesRepository:
     """Provides tabular sales data sourced from orders stored in the database."""
@@ -34,8 +43,8 @@ class SalesRepository:
         user_id: Optional[int] = None,
     ) -> pd.DataFrame:
         """Load order + item data for analytics as a pandas DataFrame."""
-        rows = self._fetch_raw_rows(start_date=start_date, end_date=end_date, user_id=user_id)
-        if not rows:
+        frame = self._fetch_raw_rows(start_date=start_date, end_date=end_date, user_id=user_id)
+        if frame.empty:
             return pd.DataFrame(
                 columns=[
                     "order_id",
@@ -52,19 +61,52 @@ class SalesRepository:
                     "lead_state",
                     "lead_country",
                     "observacoes",
+                    "data",
+                    "valor",
+                    "quantidade",
+                    "produto",
+                    "pais",
+                    "moeda",
                 ]
             )
+        return self._build_sales_frame(frame)
 
-        frame = pd.DataFrame(rows)
+    def _build_sales_frame(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Add the normalized analytics columns to the raw rows of ``_fetch_raw_rows`` (in place)."""
         frame["date"] = pd.to_datetime(frame["date"])
-        frame["value"] = frame["value"].astype(float)
         frame["quantity"] = frame["quantity"].astype(float)
+        frame["value"] = frame["value"].astype(float).fillna(
+            frame["quantity"].fillna(0) * frame["unit_price"].astype(float).fillna(0)
+        )
 
         # Normalized columns expected by existing analytics
-        frame["client_id"] = frame.apply(self._resolve_client_id, axis=1)
-        frame["cliente"] = frame.apply(self._resolve_client_name, axis=1)
+        lead_ids = frame["lead_id"].astype("Int64").astype(str)
+        raw_client_ids = frame["client_id"].astype("Int64").astype(str)
+        has_lead = frame["lead_id"].notna().to_numpy()
+        has_client = frame["client_id"].notna().to_numpy()
+
+        lead_names = frame["lead_name"].fillna("").astype(str).str.strip()
+        frame["cliente"] = np.where(
+            lead_names != "",
+            lead_names,
+            np.where(has_client, "Cliente #" + raw_client_ids, "Cliente não identificado"),
+        )
+        frame["source_client_id"] = frame["client_id"]
+        frame["client_id"] = np.where(
+            has_lead,
+            "L" + lead_ids,
+            np.where(has_client, "C" + raw_client_ids, "desconhecido"),
+        )
         frame["product"] = frame["coffee_name"].fillna(frame["item_description"]).fillna("Produto não informado")
-        frame["observacoes"] = frame.apply(self._build_observation, axis=1)
+
+        countries = frame["lead_country"].fillna("").astype(str)
+        sources = frame["order_source"].fillna("").astype(str)
+        # strftime only over the distinct months, then broadcast back
+        months, month_codes = np.unique(frame["date"].to_numpy().astype("datetime64[M]"), return_inverse=True)
+        month_labels = pd.DatetimeIndex(months).strftime("%m/%Y").to_numpy(dtype=object)[month_codes]
+        frame["observacoes"] = (
+            "Venda " + month_labels + " - " + countries.where(countries != "", "Brasil")
+        ) + np.where(sources != "", " | Origem: " + sources, "")
 
         frame["data"] = frame["date"]
         frame["quantidade"] = frame["quantity"]
@@ -73,46 +115,293 @@ class SalesRepository:
         frame["moeda"] = frame["currency"].fillna("BRL")
 
         # Convert values to target currency for consistent metrics
-        frame["valor"] = frame.apply(self._convert_to_target_currency, axis=1)
+        frame["valor_original"] = frame["value"]
+        frame["valor"] = self._convert_to_target_currency(frame)
         frame["value"] = frame["valor"]  # Keep both columns in sync
         frame["display_currency"] = self._target_currency
 
         return frame
 
-    def _convert_to_target_currency(self, row: pd.Series) -> float:
-        """Convert value to target currency if in different currency."""
-        value = float(row.get("value") or 0)
-        currency = str(row.get("currency") or "BRL").upper().strip()
+    def _convert_to_target_currency(self, frame: pd.DataFrame) -> pd.Series:
+        """Convert values to the target currency with one as-of rate merge for the whole frame."""
+        values = frame["value"]
+        currencies = frame["currency"].fillna("BRL").astype(str).str.upper().str.strip()
 
-        # If already in target currency, no conversion needed
-        if currency == self._target_currency:
-            return value
+        # If no exchange rate service, or everything already in target currency, keep values
+        foreign = currencies != self._target_currency
+        if not self._exchange_rate_service or not foreign.any():
+            return values
+
+        converted = self._exchange_rate_service.convert_series(
+            values[foreign],
+            currencies[foreign],
+            frame.loc[foreign, "date"],
+            self._target_currency,
+        )
+
+        missing = converted.isna()
+        if missing.any():
+            # If conversion fails, keep original value (better than 0)
+            failed = currencies[foreign][missing].unique()
+            print(
+                f"⚠️ Falha na conversão {', '.join(failed)} -> {self._target_currency} "
+                f"para {int(missing.sum())} itens"
+            )
+
+        result = values.copy()
+        result[foreign] = converted.fillna(values[foreign])
+        return result
+
+    # ------------------------------------------------------------------
+    # SQL aggregates (GROUP BY in the database, O(groups) rows returned)
+    # ------------------------------------------------------------------
+    def fetch_monthly_aggregates(
+        self, *, user_id: Optional[int] = None, cells: Optional[Sequence[CellKey]] = None
+    ) -> pd.DataFrame:
+        """Revenue, volume and item count per month (index ``mes_ano`` as Period)."""
+        year, month = self._month_columns()
+        rows = self._run_aggregate(
+            [
+                year, month,
+                func.sum(self._converted_value()).label("valor"),
+                func.sum(self._quantity()).label("quantidade"),
+            ],
+            group_by=[year, month],
+            user_id=user_id,
+            cells=cells,
+        )
+        frame = pd.DataFrame(rows, columns=["year", "month", "valor", "quantidade"]).dropna(subset=["year"])
+        frame.index = pd.PeriodIndex(
+            [pd.Period(year=int(y), month=int(m), freq="M") for y, m in zip(frame["year"], frame["month"])],
+            name="mes_ano",
+        )
+        return frame[["valor", "quantidade"]].astype(float).sort_index()
+
+    def fetch_client_aggregates(
+        self,
+        *,
+        user_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        cells: Optional[Sequence[CellKey]] = None,
+    ) -> pd.DataFrame:
+        """
+        Revenue, item count, average item value and first/last purchase per client.
+
+        Clients are grouped by display name, case-insensitively, like the pandas metrics.
+        With ``limit``, only the top clients by revenue are returned. On PostgreSQL the
+        top-N is an ``ORDER BY receita DESC LIMIT n`` in the database. Elsewhere it is cut
+        after the Python regrouping: SQLite's ``LOWER()`` is ASCII-only, so groups SQL keeps
+        apart ("CAFÉ" / "café") may still merge, and a SQL ``LIMIT`` would cut them first.
+        """
+        name = self._client_name()
+        revenue = func.sum(self._converted_value())
+        rows = self._run_aggregate(
+            [
+                func.min(name).label("cliente"),
+                revenue.label("receita_total"),
+                func.count(OrderItem.id).label("numero_compras"),
+                func.min(Order.order_date).label("primeira_compra"),
+                func.max(Order.order_date).label("ultima_compra"),
+            ],
+            group_by=[func.lower(name)],
+            user_id=user_id,
+            cells=cells,
+            order_by=[revenue.desc(), func.lower(name)] if limit is not None else None,
+            limit=limit,
+            unicode_groups_only=True,
+        )
+        frame = pd.DataFrame(
+            rows, columns=["cliente", "receita_total", "numero_compras", "primeira_compra", "ultima_compra"]
+        )
+        # Mesma normalização do B2BMetrics; reagrupar cobre LOWER() só-ASCII do SQLite
+        frame["cliente"] = frame["cliente"].str.strip().str.title()
+        frame["receita_total"] = frame["receita_total"].astype(float)
+        frame["primeira_compra"] = pd.to_datetime(frame["primeira_compra"])
+        frame["ultima_compra"] = pd.to_datetime(frame["ultima_compra"])
+        by_client = frame.groupby("cliente").agg(
+            receita_total=("receita_total", "sum"),
+            numero_compras=("numero_compras", "sum"),
+            primeira_compra=("primeira_compra", "min"),
+            ultima_compra=("ultima_compra", "max"),
+        )
+        by_client.insert(2, "ticket_medio", by_client["receita_total"] / by_client["numero_compras"])
+        if limit is not None:
+            return by_client.sort_values("receita_total", ascending=False, kind="stable").head(limit)
+        return by_client
+
+    def fetch_client_month_aggregates(
+        self, *, user_id: Optional[int] = None, cells: Optional[Sequence[CellKey]] = None
+    ) -> pd.Series:
+        """Revenue per (``cliente``, ``mes_ano``), clients grouped like ``fetch_client_aggregates``."""
+        year, month = self._month_columns()
+        name = self._client_name()
+        rows = self._run_aggregate(
+            [
+                year, month,
+                func.min(name).label("cliente"),
+                func.sum(self._converted_value()).label("valor"),
+            ],
+            group_by=[year, month, func.lower(name)],
+            user_id=user_id,
+            cells=cells,
+        )
+        frame = pd.DataFrame(rows, columns=["year", "month", "cliente", "valor"]).dropna(subset=["year"])
+        frame["cliente"] = frame["cliente"].str.strip().str.title()
+        frame["mes_ano"] = pd.PeriodIndex(
+            [pd.Period(year=int(y), month=int(m), freq="M") for y, m in zip(frame["year"], frame["month"])],
+            freq="M",
+        )
+        frame["valor"] = frame["valor"].astype(float)
+        return frame.groupby(["cliente", "mes_ano"])["valor"].sum()
+
+    def fetch_top_clients(
+        self, limit: int, *, user_id: Optional[int] = None, cells: Optional[Sequence[CellKey]] = None
+    ) -> pd.DataFrame:
+        return self.fetch_client_aggregates(user_id=user_id, limit=limit, cells=cells)
+
+    def fetch_country_aggregates(
+        self, *, user_id: Optional[int] = None, cells: Optional[Sequence[CellKey]] = None
+    ) -> pd.DataFrame:
+        """Revenue, volume and item count per (month, country); columns as B2BMetrics cells."""
+        year, month = self._month_columns()
+        country = self._country()
+        rows = self._run_aggregate(
+            [
+                year, month, country.label("pais"),
+                func.sum(self._converted_value()).label("valor"),
+                func.sum(self._quantity()).label("quantidade"),
+                func.count(OrderItem.id).label("itens"),
+            ],
+            group_by=[year, month, country],
+            user_id=user_id,
+            cells=cells,
+        )
+        frame = pd.DataFrame(rows, columns=["year", "month", "pais", "valor", "quantidade", "itens"])
+        valid = frame["year"].notna()
+        frame["mes_ano"] = pd.PeriodIndex(
+            [
+                pd.Period(year=int(y), month=int(m), freq="M") if ok else pd.NaT
+                for y, m, ok in zip(frame["year"], frame["month"], valid)
+            ],
+            freq="M",
+        )
+        frame[["valor", "quantidade"]] = frame[["valor", "quantidade"]].astype(float)
+        return frame[["mes_ano", "pais", "valor", "quantidade", "itens"]]
+
+    def aggregated_sales(self, *, user_id: Optional[int] = None) -> "SqlAggregatedSales":
+        return SqlAggregatedSales(self, user_id=user_id)
+
+    def _run_aggregate(
+        self, columns, *, group_by, user_id=None, cells=None, order_by=None, limit=None, unicode_groups_only=False,
+    ):
+        """
+        Run a grouped aggregate over order items.
 
-        # If no exchange rate service, return original value
+        With ``unicode_groups_only``, ``order_by``/``limit`` are only pushed down where
+        ``LOWER()`` folds every letter (PostgreSQL), since the caller regroups in Python
+        otherwise and must see every group before cutting.
+        """
+        query = (
+            select(*columns)
+            .select_from(OrderItem)
+            .join(Order, OrderItem.order_id == Order.id)
+            .outerjoin(CRMLead, CRMLead.id == Order.lead_id)
+            .group_by(*group_by)
+        )
+        if user_id:
+            query = query.where(Order.user_id == user_id)
+        if cells is not None:
+            query = query.where(self._cells_filter(cells))
+        with self._session_factory() as session:
+            push_down = not unicode_groups_only or session.get_bind().dialect.name == "postgresql"
+            if push_down and order_by is not None:
+                query = query.order_by(*order_by)
+            if push_down and limit is not None:
+                query = query.limit(limit)
+            return session.execute(query).all()
+
+    @staticmethod
+    def _month_parts():
+        return (
+            cast(extract("year", Order.order_date), Integer),
+            cast(extract("month", Order.order_date), Integer),
+        )
+
+    @classmethod
+    def _month_columns(cls):
+        year, month = cls._month_parts()
+        return year.label("year"), month.label("month")
+
+    @staticmethod
+    def _country():
+        return func.trim(func.coalesce(CRMLead.country, "Brasil"))
+
+    @classmethod
+    def _cells_filter(cls, cells: Sequence[CellKey]):
+        """Restrict items to the given (year, month, country) cells."""
+        year, month = cls._month_parts()
+        country = cls._country()
+        dated = sorted({(int(y), int(m), c) for y, m, c in cells if y is not None})
+        undated = sorted({c for y, _, c in cells if y is None})
+        clauses = []
+        if dated:
+            clauses.append(tuple_(year, month, country).in_(dated))
+        if undated:
+            clauses.append(and_(Order.order_date.is_(None), country.in_(undated)))
+        return or_(*clauses) if clauses else false()
+
+    @staticmethod
+    def _quantity():
+        return cast(func.coalesce(OrderItem.quantity, 0), Float)
+
+    @staticmethod
+    def _client_name():
+        lead_name = func.trim(func.coalesce(CRMLead.name, ""))
+        return case(
+            (lead_name != "", lead_name),
+            (Order.client_id.isnot(None), literal("Cliente #").concat(cast(Order.client_id, String))),
+            else_=literal("Cliente não identificado"),
+        )
+
+    def _converted_value(self):
+        """Item value in the target currency, same rules as ``convert_series``."""
+        value = cast(
+            func.coalesce(
+                OrderItem.line_total,
+                func.coalesce(OrderItem.quantity, 0) * func.coalesce(OrderItem.unit_price, 0),
+            ),
+            Float,
+        )
         if not self._exchange_rate_service:
             return value
 
-        # Get order date for exchange rate lookup
-        order_date = row.get("date")
-        if isinstance(order_date, pd.Timestamp):
-            order_date = order_date.date()
-        elif isinstance(order_date, datetime):
-            order_date = order_date.date()
-
-        # Convert to target currency
-        converted = self._exchange_rate_service.convert(
-            value,
-            currency,
-            self._target_currency,
-            order_date
-        )
+        currency = func.upper(func.trim(func.coalesce(Order.currency, "BRL")))
+        as_of = func.coalesce(Order.order_date, func.current_date())
 
-        if converted is not None:
-            return float(converted)
+        def latest_rate(from_currency, to_currency):
+            rate = aliased(ExchangeRate)
+            return (
+                # ROUND na escala da coluna: SQLite guarda o float cru, o ORM devolve arredondado
+                select(func.round(cast(rate.rate, Float), ExchangeRate.rate.type.scale))
+                .where(
+                    rate.from_currency == from_currency,
+                    rate.to_currency == to_currency,
+                    rate.effective_date <= as_of,
+                )
+                .order_by(rate.effective_date.desc())
+                .limit(1)
+                .scalar_subquery()
+            )
 
-        # If conversion fails, return original value (better than 0)
-        print(f"⚠️ Falha na conversão {currency} -> {self._target_currency} para valor {value}")
-        return value
+        target = literal(self._target_currency)
+        direct = latest_rate(currency, target)
+        inverse = latest_rate(target, currency)
+        # Sem taxa: mantém o valor original (mesmo fallback do caminho pandas)
+        rate = case(
+            (currency == target, 1.0),
+            else_=func.coalesce(direct, 1.0 / func.nullif(inverse, 0), 1.0),
+        )
+        return value * rate
 
     def _fetch_raw_rows(
         self,
@@ -120,7 +409,7 @@ class SalesRepository:
         start_date: Optional[date],
         end_date: Optional[date],
         user_id: Optional[int] = None,
-    ) -> List[Dict[str, Any]]:
+    ) -> pd.DataFrame:
         with self._session_factory() as session:
             query = (
                 session.query(
@@ -158,46 +447,71 @@ class SalesRepository:
                 query = query.filter(Order.user_id == user_id)
 
             query = query.order_by(Order.order_date.desc(), Order.id.desc())
-            results = query.all()
-
-        rows: List[Dict[str, Any]] = []
-        for record in results:
-            row = dict(record._mapping)
-            if row.get("value") is None:
-                quantity = row.get("quantity") or 0
-                unit_price = row.get("unit_price") or 0
-                row["value"] = float(quantity) * float(unit_price)
-            rows.append(row)
-        return rows
+            result = session.execute(query.statement)
+            return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
 
-    @staticmethod
-    def _resolve_client_id(row: pd.Series) -> str:
-        if pd.notna(row.get("lead_id")):
-            return f"L{int(row['lead_id'])}"
-        client_id = row.get("client_id")
-        if pd.notna(client_id):
-            return f"C{int(client_id)}"
-        return "desconhecido"
 
-    @staticmethod
-    def _resolve_client_name(row: pd.Series) -> str:
-        lead_name = row.get("lead_name")
-        if isinstance(lead_name, str) and lead_name.strip():
-            return lead_name.strip()
-        client_id = row.get("client_id")
-        if pd.notna(client_id):
-            return f"Cliente #{int(client_id)}"
-        return "Cliente não identificado"
+class SqlAggregatedSales(PreparedSales):
+    """
+    ``PreparedSales`` whose aggregates come from ``SalesRepository`` GROUP BY queries.
 
-    @staticmethod
-    def _build_observation(row: pd.Series) -> str:
-        order_date: datetime = row["date"]
-        country = row.get("lead_country") or "Brasil"
-        source = row.get("order_source")
-        parts = [f"Venda {order_date.strftime('%m/%Y')} - {country}"]
-        if source:
-            parts.append(f"Origem: {source}")
-        return " | ".join(parts)
+    ``frame`` holds (month, country) cells, enough for the revenue/volume totals and
+    country metrics; per-client and per-month aggregates and top-N are separate queries.
+    ``subset`` keeps the selected cells and re-runs those queries restricted to them.
+    """
+
+    def __init__(
+        self,
+        repository: SalesRepository,
+        user_id: Optional[int] = None,
+        frame: Optional[pd.DataFrame] = None,
+        cells: Optional[Sequence[CellKey]] = None,
+    ):
+        super().__init__(frame)
+        self.repository = repository
+        self.user_id = user_id
+        self.cells = cells
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        if self._frame is None:
+            self._frame = self.repository.fetch_country_aggregates(user_id=self.user_id, cells=self.cells)
+        return self._frame
+
+    @frame.setter
+    def frame(self, value: Optional[pd.DataFrame]) -> None:
+        self._frame = value  # None = carregar sob demanda
+
+    @cached_property
+    def by_client(self) -> pd.DataFrame:
+        return self.repository.fetch_client_aggregates(user_id=self.user_id, cells=self.cells)
+
+    @cached_property
+    def by_month(self) -> pd.DataFrame:
+        return self.repository.fetch_monthly_aggregates(user_id=self.user_id, cells=self.cells)
+
+    @cached_property
+    def by_client_month(self) -> pd.Series:
+        return self.repository.fetch_client_month_aggregates(user_id=self.user_id, cells=self.cells)
+
+    def top_clients(self, top_n: int) -> pd.DataFrame:
+        if "by_client" in self.__dict__:
+            return super().top_clients(top_n)
+        return self.repository.fetch_top_clients(top_n, user_id=self.user_id, cells=self.cells)
+
+    def subset(self, mask: pd.Series) -> "SqlAggregatedSales":
+        """Recorte por máscara sobre as células (mês, país) de ``frame``."""
+        selected = self.frame[mask]
+        cells = [
+            (None, None, country) if pd.isna(period) else (period.year, period.month, country)
+            for period, country in zip(selected["mes_ano"], selected["pais"])
+        ]
+        return type(self)(self.repository, user_id=self.user_id, frame=selected, cells=cells)
+
+    @property
+    def average_item_value(self) -> float:
+        items = self.frame["itens"].sum()
+        return float(self.frame["valor"].sum() / items) if items else float("nan")
 
 
-__all__ = ["SalesRepository"]
+__all__ = ["SalesRepository", "SqlAggregatedSales"]
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+from datetime import date
 from typing import Optional
 
 import requests
@@ -9,7 +10,9 @@ from flask import Blueprint, jsonify, render_template, request
 from flask_login import current_user, login_required
 
 from .b2b.crm_service import CRMService
-from .b2b.google_maps_client import GoogleMapsClient
+from .b2b.enrichment_jobs import EnrichmentJobManager
+from .b2b.entity_resolution import MATCH_THRESHOLD
+from .b2b.google_maps_client import DEFAULT_TEXT_SEARCH_PAGES, GoogleMapsClient
 from .b2b.lead_enrichment import LeadEnrichmentService
 from .b2b.sales_analyzer import SalesAnalyzer
 from .b2b.sales_repository import SalesRepository
@@ -29,6 +32,7 @@ def create_crm_blueprint(
 ) -> Blueprint:
     """Create blueprint for CRM and B2B routes."""
     bp = Blueprint('crm', __name__)
+    enrichment_jobs = EnrichmentJobManager(lead_enrichment_service, crm_service, google_maps_client)
 
     # ==========================
     # CRM Pages
@@ -111,18 +115,137 @@ def create_crm_blueprint(
             if current_user.is_authenticated and current_user.is_seller:
                 user_id = current_user.id
 
-            leads = crm_service.list_leads(
-                status=request.args.get('status') or None,
+            filters = dict(
                 owner=request.args.get('owner') or None,
                 city=request.args.get('city') or None,
                 country=request.args.get('country') or None,
                 is_customer=None,
                 search=request.args.get('search') or None,
+                user_id=user_id,
+            )
+
+            # Paginação legada por OFFSET, mantida para clientes antigos
+            if 'offset' in request.args:
+                leads = crm_service.list_leads(
+                    status=request.args.get('status') or None,
+                    limit=int(request.args.get('limit', 200)),
+                    offset=int(request.args.get('offset', 0)),
+                    **filters,
+                )
+                return jsonify({'success': True, 'leads': leads})
+
+            cursor = request.args.get('cursor') or None
+            page = crm_service.list_leads_page(
+                status=request.args.get('status') or None,
                 limit=int(request.args.get('limit', 200)),
-                offset=int(request.args.get('offset', 0)),
+                cursor=cursor,
+                **filters,
+            )
+            response = {'success': True, **page}
+            if not cursor:
+                response['stage_counts'] = crm_service.count_leads_by_stage(**filters)
+            if request.args.get('include') == 'interactions':
+                # Timelines da página inteira numa consulta (evita uma chamada por lead)
+                response['interactions'] = crm_service.list_interactions_for_leads(
+                    [lead['id'] for lead in page['leads']],
+                    limit=request.args.get('interactions_limit', default=20, type=int),
+                    user_id=user_id,
+                )
+            return jsonify(response)
+
+        except ValueError as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 400
+        except Exception as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 500
+
+    @bp.route('/crm/api/leads/bulk', methods=['POST'])
+    @login_required
+    def crm_leads_bulk_api():
+        """API para salvar vários leads (ex.: uma página da busca de prospecção) de uma vez"""
+        try:
+            payload = request.get_json(force=True)
+            rows = payload.get('leads') if isinstance(payload, dict) else payload
+            if not isinstance(rows, list) or not rows:
+                return jsonify({'success': False, 'error': 'Lista de leads e obrigatoria'}), 400
+            if not all(isinstance(row, dict) for row in rows):
+                return jsonify({'success': False, 'error': 'Cada lead deve ser um objeto'}), 400
+
+            user_id = None
+            if current_user.is_authenticated and current_user.is_seller:
+                # Vendedor só cria leads para si mesmo
+                user_id = current_user.id
+                rows = [{**row, 'user_id': None} for row in rows]
+            elif not (current_user.is_authenticated and current_user.is_admin):
+                rows = [{**row, 'user_id': None} for row in rows]
+
+            result = crm_service.create_leads_bulk(rows, user_id=user_id)
+            return jsonify({'success': True, **result})
+
+        except ValueError as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 400
+        except Exception as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 500
+
+    @bp.route('/crm/api/leads/search')
+    @login_required
+    def crm_lead_search_api():
+        """API de busca aproximada de leads (ignora acentos), ordenada por relevancia"""
+        try:
+            user_id = None
+            if current_user.is_authenticated and current_user.is_seller:
+                user_id = current_user.id
+
+            leads = crm_service.search_leads(
+                request.args.get('q', ''),
                 user_id=user_id,
+                limit=int(request.args.get('limit', 50)),
             )
+            return jsonify({'success': True, 'leads': leads})
+
+        except ValueError as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 400
+        except Exception as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 500
 
+    @bp.route('/crm/api/leads/typeahead')
+    @login_required
+    def crm_lead_typeahead_api():
+        """API de sugestoes (top 10) para o campo de busca de leads"""
+        try:
+            user_id = None
+            if current_user.is_authenticated and current_user.is_seller:
+                user_id = current_user.id
+
+            suggestions = crm_service.typeahead_leads(request.args.get('q', ''), user_id=user_id)
+            return jsonify({'success': True, 'suggestions': suggestions})
+
+        except Exception as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 500
+
+    @bp.route('/crm/api/leads/nearby')
+    @login_required
+    def crm_leads_nearby_api():
+        """
+        Leads próximos de um ponto (planejamento de visitas), do mais perto ao mais longe.
+
+        Parâmetros: lat, lng, radius (km, padrão 5), status (opcional), limit (padrão 50)
+        """
+        try:
+            if request.args.get('lat') is None or request.args.get('lng') is None:
+                return jsonify({'success': False, 'error': 'Informe lat e lng'}), 400
+
+            user_id = None
+            if current_user.is_authenticated and current_user.is_seller:
+                user_id = current_user.id
+
+            leads = crm_service.nearby_leads(
+                request.args.get('lat'),
+                request.args.get('lng'),
+                float(request.args.get('radius', 5)),
+                user_id=user_id,
+                status=request.args.get('status') or None,
+                limit=int(request.args.get('limit', 50)),
+            )
             return jsonify({'success': True, 'leads': leads})
 
         except ValueError as exc:
@@ -130,6 +253,167 @@ def create_crm_blueprint(
         except Exception as exc:
             return jsonify({'success': False, 'error': str(exc)}), 500
 
+    @bp.route('/crm/api/leads/interactions', methods=['GET', 'POST'])
+    @login_required
+    def crm_leads_interactions_batch_api():
+        """
+        Timelines de vários leads numa chamada, agrupadas por lead.
+
+        Parâmetros: lead_ids (GET: "1,2,3"; POST: lista JSON), limit (por lead, padrão 20)
+        """
+        try:
+            if request.method == 'POST':
+                payload = request.get_json(force=True) or {}
+                lead_ids = payload.get('lead_ids') or []
+                limit = int(payload.get('limit', 20))
+            else:
+                lead_ids = [value for value in (request.args.get('lead_ids') or '').split(',') if value.strip()]
+                limit = request.args.get('limit', default=20, type=int)
+            if not isinstance(lead_ids, list) or not lead_ids:
+                return jsonify({'success': False, 'error': 'Informe lead_ids'}), 400
+
+            user_id = None
+            if current_user.is_authenticated and current_user.is_seller:
+                user_id = current_user.id
+
+            interactions = crm_service.list_interactions_for_leads(lead_ids, limit=limit, user_id=user_id)
+            return jsonify({'success': True, 'interactions': interactions})
+
+        except (ValueError, TypeError) as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 400
+        except Exception as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 500
+
+    @bp.route('/crm/api/follow-ups/due')
+    @login_required
+    def crm_follow_ups_due_api():
+        """
+        Follow-ups pendentes do vendedor logado até o fim do dia (inclui atrasados).
+
+        Parâmetros: date (YYYY-MM-DD, padrão hoje), overdue_days (padrão 30),
+        user_id (só admin), limit (padrão 200)
+        """
+        try:
+            user_id = None
+            if current_user.is_authenticated:
+                if current_user.is_seller:
+                    user_id = current_user.id
+                elif current_user.is_admin:
+                    user_id = request.args.get('user_id', type=int)
+
+            day = request.args.get('date')
+            result = crm_service.due_follow_ups(
+                user_id=user_id,
+                until=date.fromisoformat(day) if day else None,
+                overdue_days=int(request.args.get('overdue_days', 30)),
+                limit=int(request.args.get('limit', 200)),
+            )
+            return jsonify({'success': True, **result})
+
+        except ValueError as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 400
+        except Exception as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 500
+
+    @bp.route('/crm/api/leads/duplicates')
+    @login_required
+    def crm_leads_duplicates_api():
+        """
+        Propostas de mesclagem de leads duplicados (mesmo telefone/Instagram ou nome parecido na mesma cidade).
+
+        A varredura roda em segundo plano: responde 202 enquanto não há resultado (repita
+        a chamada para acompanhar) e depois o último resultado, com ``refreshing`` quando
+        uma nova varredura está em andamento (leads mudaram ou ``refresh=1``).
+
+        Parâmetros: threshold (0-1, padrão 0.92), limit (padrão 100), refresh (1 para recalcular)
+        """
+        try:
+            user_id = None
+            if current_user.is_authenticated and current_user.is_seller:
+                user_id = current_user.id
+
+            limit = int(request.args.get('limit', 100))
+            finished, running = enrichment_jobs.duplicate_scans(
+                user_id=user_id,
+                threshold=float(request.args.get('threshold', MATCH_THRESHOLD)),
+                refresh=request.args.get('refresh') == '1',
+            )
+            job = running.to_dict(include_results=False) if running else None
+            if finished is None:
+                return jsonify({'success': True, 'status': running.status, 'job': job}), 202
+            if finished.status == 'failed' and running is None:
+                return jsonify({'success': False, 'error': finished.error}), 500
+
+            result = finished.results[0] if finished.status == 'completed' else None
+            if result is None:
+                return jsonify({'success': True, 'status': running.status, 'job': job}), 202
+            return jsonify({
+                'success': True,
+                **result,
+                'proposals': result['proposals'][:max(1, limit)],
+                'computed_at': finished.finished_at,
+                'refreshing': running is not None,
+                'job': job,
+            })
+
+        except ValueError as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 400
+        except Exception as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 500
+
+    @bp.route('/crm/api/leads/viewport')
+    @login_required
+    def crm_leads_viewport_api():
+        """
+        Pontos do mapa dentro da área visível.
+
+        Parâmetros: south, west, north, east (graus), status (opcional), limit (padrão 2000)
+        """
+        try:
+            bounds = [request.args.get(name) for name in ('south', 'west', 'north', 'east')]
+            if any(value is None for value in bounds):
+                return jsonify({'success': False, 'error': 'Informe south, west, north e east'}), 400
+
+            user_id = None
+            if current_user.is_authenticated and current_user.is_seller:
+                user_id = current_user.id
+
+            result = crm_service.leads_in_viewport(
+                *bounds,
+                user_id=user_id,
+                status=request.args.get('status') or None,
+                limit=int(request.args.get('limit', 2000)),
+            )
+            return jsonify({'success': True, **result})
+
+        except ValueError as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 400
+        except Exception as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 500
+
+    @bp.route('/crm/api/leads/stage-counts')
+    @login_required
+    def crm_lead_stage_counts_api():
+        """API com o total de leads por etapa (colunas do kanban)"""
+        try:
+            user_id = None
+            if current_user.is_authenticated and current_user.is_seller:
+                user_id = current_user.id
+
+            counts = crm_service.count_leads_by_stage(
+                owner=request.args.get('owner') or None,
+                city=request.args.get('city') or None,
+                country=request.args.get('country') or None,
+                search=request.args.get('search') or None,
+                user_id=user_id,
+            )
+            return jsonify({'success': True, 'stage_counts': counts, 'total': sum(counts.values())})
+
+        except ValueError as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 400
+        except Exception as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 500
+
     @bp.route('/crm/api/leads/<int:lead_id>', methods=['PATCH', 'DELETE'])
     @login_required
     def crm_lead_detail_api(lead_id: int):
@@ -157,7 +441,7 @@ def create_crm_blueprint(
                 payload = request.get_json(force=True) or {}
                 comment = payload.get('notes') or payload.get('comment')
                 owner = current_user.username if current_user.is_authenticated else 'Sistema'
-                crm_service.add_comment(lead_id, comment, owner=owner)
+                crm_service.add_comment(lead_id, comment, owner=owner, follow_up_at=payload.get('follow_up_at'))
                 interactions = crm_service.list_interactions(lead_id)
                 return jsonify({'success': True, 'interactions': interactions}), 201
 
@@ -184,6 +468,8 @@ def create_crm_blueprint(
             country: País (opcional)
             fetch_details: Se 'true', busca telefone/website via Place Details API
                           (custo adicional, mas dados mais completos)
+            pages: Páginas do Text Search (1 a 3, 20 lugares cada; padrão 1). Cada página
+                   extra é cobrada e espera ~2 s pelo next_page_token
 
         Nota: O enriquecimento (Instagram, WhatsApp) agora é feito sob demanda
               via endpoint /crm/api/leads/<id>/enrich-full para economizar custos.
@@ -196,6 +482,7 @@ def create_crm_blueprint(
         state = request.args.get('state', '').strip()
         country = request.args.get('country', '').strip()
         fetch_details = request.args.get('fetch_details', 'false').lower() == 'true'
+        pages = request.args.get('pages', DEFAULT_TEXT_SEARCH_PAGES, type=int)
 
         if not keyword or not city:
             return jsonify({'success': False, 'error': 'Informe keyword e cidade'}), 400
@@ -213,7 +500,7 @@ def create_crm_blueprint(
             region = region_map.get(country.lower())
 
         try:
-            raw = google_maps_client.text_search(query=query, region=region)
+            raw = google_maps_client.text_search(query=query, region=region, max_pages=pages)
             status = raw.get('status', 'UNKNOWN')
             if status not in ('OK', 'ZERO_RESULTS'):
                 return jsonify({'success': False, 'error': raw.get('error_message', status)}), 400
@@ -233,6 +520,8 @@ def create_crm_blueprint(
                 'success': True,
                 'results': leads,
                 'status': status,
+                'pages': raw.get('pages', 1),
+                'cached': raw.get('cached', False),
                 'cache_stats': cache_stats,
                 'tip': 'Use fetch_details=true para obter telefone/website. Enriquecimento completo disponível ao salvar o lead.'
             })
@@ -360,6 +649,54 @@ def create_crm_blueprint(
         except Exception as exc:
             return jsonify({'success': False, 'error': str(exc)}), 500
 
+    @bp.route('/crm/api/leads/enrich-jobs', methods=['POST'])
+    @login_required
+    def crm_leads_enrich_jobs_api():
+        """
+        Inicia o enriquecimento em segundo plano de vários leads.
+
+        Body: ``{"lead_ids": [...]}`` (leads salvos, atualizados no CRM) ou
+        ``{"leads": [...]}`` (resultados da busca, só retornados). Responde 202 com
+        ``job_id``; o progresso fica em /crm/api/leads/enrich-jobs/<job_id>.
+        """
+        try:
+            payload = request.get_json(force=True) or {}
+            leads = payload.get('leads')
+            if leads is not None and (
+                not isinstance(leads, list) or not all(isinstance(lead, dict) and lead.get('name') for lead in leads)
+            ):
+                return jsonify({'success': False, 'error': 'Dados do lead são obrigatórios'}), 400
+
+            user_id = None
+            if current_user.is_authenticated and current_user.is_seller:
+                user_id = current_user.id
+
+            job = enrichment_jobs.start(
+                lead_ids=payload.get('lead_ids'),
+                leads=leads,
+                user_id=user_id,
+            )
+            return jsonify({'success': True, **job.to_dict(include_results=False)}), 202
+
+        except (ValueError, TypeError) as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 400
+        except Exception as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 500
+
+    @bp.route('/crm/api/leads/enrich-jobs/<job_id>')
+    @login_required
+    def crm_leads_enrich_job_status_api(job_id: str):
+        """Progresso (e resultados parciais) de um job de enriquecimento"""
+        user_id = None
+        if current_user.is_authenticated and current_user.is_seller:
+            user_id = current_user.id
+
+        job = enrichment_jobs.get(job_id, user_id=user_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job não encontrado'}), 404
+        include_results = request.args.get('results', '1') != '0'
+        return jsonify({'success': True, **job.to_dict(include_results=include_results)})
+
     # ==========================
     # B2B Dashboard Routes
     # ==========================
@@ -475,8 +812,12 @@ def create_crm_blueprint(
                     'error': 'Modulo B2B nao disponivel'
                 })
 
+            user_id = None
+            if current_user.is_authenticated and current_user.is_seller:
+                user_id = current_user.id
+
             months_ahead = int(request.args.get('meses', 3))
-            previsao = sales_analyzer.get_sales_forecast(months_ahead)
+            previsao = sales_analyzer.get_sales_forecast(months_ahead, user_id=user_id)
 
             return jsonify({
                 'success': True,
@@ -505,7 +846,8 @@ def create_crm_blueprint(
                 'success': True,
                 'integrations': {
                     'database': database_status
-                }
+                },
+                'dashboard_cache': sales_analyzer.dashboard_cache.stats() if sales_analyzer else None,
             })
 
         except Exception as e:
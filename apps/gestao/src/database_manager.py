@@ -364,7 +364,7 @@ class DatabaseManager:
             conn.close()
 
     def get_transactions(self, account_id: int = None, start_date: date = None, end_date: date = None,
-                        limit: int = 1000) -> List[Dict]:
+                        limit: int = 1000, offset: int = 0) -> List[Dict]:
         """Busca transações com filtros"""
         conn = self.get_connection()
         try:
@@ -388,8 +388,8 @@ class DatabaseManager:
                 query += ' AND t.date <= ?'
                 params.append(end_date)
 
-            query += ' ORDER BY t.date DESC, t.id DESC LIMIT ?'
-            params.append(limit)
+            query += ' ORDER BY t.date DESC, t.id DESC LIMIT ? OFFSET ?'
+            params.extend([limit, offset])
 
             cursor = conn.execute(query, params)
             return [dict(row) for row in cursor.fetchall()]
@@ -123,15 +123,15 @@ def create_exchange_blueprint(exchange_rate_service: ExchangeRateService) -> Blu
                 else:
                     effective_date = date.fromisoformat(effective_date_str)
 
-                # Update the rate in database
-                with session_scope() as session:
-                    rate_record = session.get(ExchangeRate, rate_id)
-                    if rate_record:
-                        rate_record.from_currency = from_currency
-                        rate_record.to_currency = to_currency
-                        rate_record.rate = rate
-                        rate_record.effective_date = effective_date
-                        rate_record.created_by = int(current_user.get_id())
+                # Update the rate in database (invalidates the rate cache)
+                exchange_rate_service.update_rate(
+                    rate_id,
+                    from_currency,
+                    to_currency,
+                    rate,
+                    effective_date,
+                    updated_by=int(current_user.get_id())
+                )
 
                 flash(f'Taxa de câmbio atualizada com sucesso!', 'success')
                 return redirect(url_for('exchange.index'))
@@ -153,13 +153,10 @@ def create_exchange_blueprint(exchange_rate_service: ExchangeRateService) -> Blu
         if not _require_admin():
             return redirect(url_for('dashboard'))
 
-        with session_scope() as session:
-            rate_record = session.get(ExchangeRate, rate_id)
-            if rate_record:
-                session.delete(rate_record)
-                flash('Taxa de câmbio excluída.', 'success')
-            else:
-                flash('Taxa não encontrada.', 'danger')
+        if exchange_rate_service.delete_rate(rate_id):
+            flash('Taxa de câmbio excluída.', 'success')
+        else:
+            flash('Taxa não encontrada.', 'danger')
 
         return redirect(url_for('exchange.index'))
 
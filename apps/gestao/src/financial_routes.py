@@ -40,7 +40,10 @@ def create_financial_blueprint():
                 
                 if sheet_url and account_id:
                     try:
-                        stats = service.import_from_sheet(sheet_url, int(account_id))
+                        stats = service.import_from_sheet(
+                            sheet_url, int(account_id),
+                            full_resync=request.form.get('full_resync') == 'on'
+                        )
                         flash(f"Sincronizado com sucesso: {stats['imported']} transações. {stats['skipped']} duplicadas.", 'success')
                     except Exception as e:
                         flash(f"Erro ao sincronizar planilha: {e}", 'error')
@@ -92,10 +95,14 @@ def create_financial_blueprint():
         year = request.args.get('year', datetime.now().year, type=int)
         month = request.args.get('month', datetime.now().month, type=int)
         
-        result = service.get_monthly_result(year, month)
+        comparison = service.get_year_over_year(year, month)
+        categories = service.get_category_breakdown(year, month)
         
         return render_template('financial/dre.html', 
-                             result=result, 
+                             result=comparison['current'], 
+                             previous=comparison['previous'],
+                             variation=comparison['variation'],
+                             categories=categories,
                              year=year, 
                              month=month)
                              
@@ -6,17 +6,22 @@ Suporta SQLite legado e SQLAlchemy (PostgreSQL/Railway) de forma transparente.
 
 from __future__ import annotations
 
+import base64
 import json
 import locale
 import os
 from datetime import datetime, date
 from decimal import Decimal
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
-from sqlalchemy import case, func
+from sqlalchemy import and_, case, func, or_, select
 
 from src.db import session_scope
 from src.models import Account, Category, Client, Transaction, ImportBatch
+from src.services.ledger_rollup_service import LedgerRollupService
+from src.services.transaction_search_service import TransactionSearchService
+
+STATEMENT_MAX_PAGE_SIZE = 1000
 
 
 class LocalDataService:
@@ -25,6 +30,8 @@ class LocalDataService:
         self.use_sqlalchemy = True
         self.db_path = db_path
         self.db = None
+        self.rollups = LedgerRollupService()
+        self.search_index = TransactionSearchService()
 
         # Configurar locale brasileiro para formatação
         try:
@@ -100,11 +107,40 @@ class LocalDataService:
         start_date: str,
         end_date: str,
         page: int = 1,
-        per_page: int = 1000
+        per_page: int = 1000,
+        cursor: Optional[str] = None
     ) -> Dict[str, Any]:
+        """
+        Extrato paginado por keyset (date, id) em ordem decrescente.
+
+        ``cursor`` é o ``proximo_cursor`` devolvido pela página anterior; sem cursor,
+        ``page`` continua aceito para compatibilidade (OFFSET). O saldo de cada linha
+        é ``Account.opening_balance`` mais o ``SUM(...) OVER (ORDER BY date, id)`` dos
+        lançamentos da conta, calculado no banco a cada página; o cursor leva apenas
+        a posição (date, id).
+        """
+        per_page = max(1, min(int(per_page or STATEMENT_MAX_PAGE_SIZE), STATEMENT_MAX_PAGE_SIZE))
         if not self.use_sqlalchemy:
             return self._get_account_statement_sqlite(account_id, start_date, end_date, page, per_page)
-        return self._get_account_statement_sqlalchemy(account_id, start_date, end_date, page, per_page)
+        return self._get_account_statement_sqlalchemy(account_id, start_date, end_date, page, per_page, cursor)
+
+    def iter_account_statement(
+        self,
+        account_id: int,
+        start_date: str,
+        end_date: str,
+        per_page: int = 500
+    ) -> Iterator[Dict[str, Any]]:
+        """Percorre o extrato inteiro página a página, seguindo os cursores."""
+        cursor = None
+        while True:
+            page = self.get_account_statement(
+                account_id, start_date, end_date, per_page=per_page, cursor=cursor
+            )
+            yield page
+            cursor = page.get('proximo_cursor')
+            if not page.get('success') or not cursor:
+                return
 
     def _get_account_statement_sqlite(
         self,
@@ -138,7 +174,8 @@ class LocalDataService:
             account_id=local_account['id'],
             start_date=start_date_obj,
             end_date=end_date_obj,
-            limit=per_page
+            limit=per_page,
+            offset=(max(page, 1) - 1) * per_page
         )
 
         extrato: List[Dict[str, Any]] = []
@@ -213,10 +250,20 @@ class LocalDataService:
         start_date: str,
         end_date: str,
         page: int,
-        per_page: int
+        per_page: int,
+        cursor: Optional[str] = None
     ) -> Dict[str, Any]:
         start_date_obj = self._parse_input_date(start_date)
         end_date_obj = self._parse_input_date(end_date)
+        try:
+            keyset = self._decode_statement_cursor(cursor) if cursor else None
+        except ValueError:
+            return {
+                'success': False,
+                'error': 'Cursor de paginação inválido',
+                'extrato': [],
+                'resumo': {}
+            }
 
         with session_scope() as session:
             account = (
@@ -235,46 +282,71 @@ class LocalDataService:
                     'resumo': {}
                 }
 
+            is_credit = Transaction.type == 'credit'
+
+            # Totais do período em um único agregado
+            totals_query = session.query(
+                func.coalesce(func.sum(case((is_credit, Transaction.amount), else_=0)), 0),
+                func.coalesce(func.sum(case((is_credit, 0), else_=Transaction.amount)), 0),
+                func.count(Transaction.id),
+            ).filter(Transaction.account_id == account.id)
+            if start_date_obj:
+                totals_query = totals_query.filter(Transaction.date >= start_date_obj)
+            if end_date_obj:
+                totals_query = totals_query.filter(Transaction.date <= end_date_obj)
+            total_creditos, total_debitos, total_lancamentos = totals_query.one()
+            total_creditos = self._to_float(total_creditos)
+            total_debitos = self._to_float(total_debitos)
+
+            # Saldo corrente por janela: SUM(...) OVER (ORDER BY date, id) sobre todo o
+            # histórico da conta até o fim do período; a página só filtra por cima
+            signed_amount = case((is_credit, Transaction.amount), else_=-Transaction.amount)
+            ledger_query = select(
+                Transaction.id.label('id'),
+                func.sum(signed_amount).over(
+                    order_by=(Transaction.date, Transaction.id)
+                ).label('running_balance'),
+            ).where(Transaction.account_id == account.id)
+            if end_date_obj:
+                ledger_query = ledger_query.where(Transaction.date <= end_date_obj)
+            ledger = ledger_query.subquery('ledger')
+
             query = (
-                session.query(Transaction, Category, Client)
+                session.query(Transaction, Category, Client, ledger.c.running_balance)
+                .join(ledger, ledger.c.id == Transaction.id)
                 .outerjoin(Category, Transaction.category_id == Category.id)
                 .outerjoin(Client, Transaction.client_id == Client.id)
-                .filter(Transaction.account_id == account.id)
             )
-
             if start_date_obj:
                 query = query.filter(Transaction.date >= start_date_obj)
-            if end_date_obj:
-                query = query.filter(Transaction.date <= end_date_obj)
-
-            transactions = (
-                query
-                .order_by(Transaction.date.desc(), Transaction.id.desc())
-                .limit(per_page)
-                .all()
-            )
-
+            if keyset:
+                cursor_date, cursor_id = keyset
+                query = query.filter(or_(
+                    Transaction.date < cursor_date,
+                    and_(Transaction.date == cursor_date, Transaction.id < cursor_id),
+                ))
+
+            query = query.order_by(Transaction.date.desc(), Transaction.id.desc())
+            if not keyset and page > 1:
+                query = query.offset((page - 1) * per_page)
+            rows = query.limit(per_page + 1).all()
+
+            has_more = len(rows) > per_page
+            rows = rows[:per_page]
+
+            opening_balance = Decimal(str(account.opening_balance or 0))
             extrato: List[Dict[str, Any]] = []
-            total_creditos = 0.0
-            total_debitos = 0.0
-
-            for txn, category, client in transactions:
+            for txn, category, client, running_balance in rows:
                 trans_date = txn.date
                 if isinstance(trans_date, datetime):
                     trans_date = trans_date.date()
-                formatted_date = trans_date.strftime('%d/%m/%Y') if trans_date else ''
 
                 amount = self._to_float(txn.amount)
-                if txn.type == 'credit':
-                    total_creditos += amount
-                else:
-                    total_debitos += amount
-
-                balance = self._to_float(txn.balance)
+                balance = self._to_float(opening_balance + Decimal(str(running_balance or 0)))
                 reconciled = txn.reconciled_status == 'reconciled'
                 extrato.append({
                     'codigo': txn.omie_code or txn.id,
-                    'data': formatted_date,
+                    'data': trans_date.strftime('%d/%m/%Y') if trans_date else '',
                     'descricao': txn.description,
                     'categoria': category.name if category else 'Sem Categoria',
                     'categoria_codigo': txn.category_id,
@@ -292,6 +364,11 @@ class LocalDataService:
                     'origem': 'Railway/PostgreSQL'
                 })
 
+            next_cursor = None
+            if has_more and rows:
+                last_txn = rows[-1][0]
+                next_cursor = self._encode_statement_cursor(last_txn.date, last_txn.id)
+
             saldo_periodo = total_creditos - total_debitos
             resumo = {
                 'total_creditos': total_creditos,
@@ -300,7 +377,7 @@ class LocalDataService:
                 'total_debitos_formatado': self.format_currency(total_debitos),
                 'saldo_periodo': saldo_periodo,
                 'saldo_periodo_formatado': self.format_currency(saldo_periodo),
-                'total_lancamentos': len(extrato),
+                'total_lancamentos': int(total_lancamentos or 0),
                 'periodo': f"{start_date} a {end_date}" if start_date and end_date else "Período completo"
             }
 
@@ -316,8 +393,11 @@ class LocalDataService:
                 'extrato': extrato,
                 'resumo': resumo,
                 'conta_info': conta_info,
-                'total_registros': len(extrato),
+                'total_registros': int(total_lancamentos or 0),
                 'pagina_atual': page,
+                'por_pagina': per_page,
+                'tem_mais': has_more,
+                'proximo_cursor': next_cursor,
                 'fonte': 'postgres_database'
             }
 
@@ -567,41 +647,45 @@ class LocalDataService:
             conn.close()
 
     def _search_transactions_sqlalchemy(self, query: str, account_id: int, limit: int) -> List[Dict[str, Any]]:
-        pattern = f"%{query}%"
         with session_scope() as session:
-            txn_query = (
-                session.query(Transaction, Account, Category, Client)
-                .join(Account, Transaction.account_id == Account.id)
-                .outerjoin(Category, Transaction.category_id == Category.id)
-                .outerjoin(Client, Transaction.client_id == Client.id)
-                .filter(Transaction.description.ilike(pattern))
-            )
-
+            internal_account_id = None
             if account_id:
                 account = (
                     session.query(Account)
                     .filter(Account.omie_id == account_id)
                     .first()
                 )
-                if account:
-                    txn_query = txn_query.filter(Transaction.account_id == account.id)
-                else:
-                    txn_query = txn_query.filter(False)  # Conta inexistente => resultado vazio
+                if not account:
+                    return []  # Conta inexistente => resultado vazio
+                internal_account_id = account.id
+
+            # Índice de texto (tsvector/FTS5) devolve ids já ordenados por relevância
+            hits = self.search_index.search(query, internal_account_id, limit)
+            if not hits:
+                return []
 
             rows = (
-                txn_query
-                .order_by(Transaction.date.desc(), Transaction.id.desc())
-                .limit(limit)
+                session.query(Transaction, Account, Category, Client)
+                .join(Account, Transaction.account_id == Account.id)
+                .outerjoin(Category, Transaction.category_id == Category.id)
+                .outerjoin(Client, Transaction.client_id == Client.id)
+                .filter(Transaction.id.in_([hit['id'] for hit in hits]))
                 .all()
             )
+            rows_by_id = {txn.id: (txn, account, category, client) for txn, account, category, client in rows}
 
             results: List[Dict[str, Any]] = []
-            for txn, account, category, client in rows:
+            for hit in hits:
+                if hit['id'] not in rows_by_id:
+                    continue
+                txn, account, category, client = rows_by_id[hit['id']]
                 results.append({
                     'id': txn.id,
                     'account_id': txn.account_id,
                     'date': txn.date.isoformat() if txn.date else None,
                     'description': txn.description,
+                    'description_highlight': hit['highlight'],
+                    'rank': hit['rank'],
                     'amount': self._to_float(txn.amount),
                     'type': txn.type,
                     'balance': self._to_float(txn.balance),
@@ -652,16 +736,9 @@ class LocalDataService:
 
     def _get_monthly_summary_sqlalchemy(self, year: int, account_id: int) -> List[Dict[str, Any]]:
         year_value = int(year)
-        with session_scope() as session:
-            txn_query = session.query(
-                func.extract('year', Transaction.date).label('year'),
-                func.extract('month', Transaction.date).label('month'),
-                func.sum(case((Transaction.type == 'credit', Transaction.amount), else_=0)).label('total_credits'),
-                func.sum(case((Transaction.type == 'debit', Transaction.amount), else_=0)).label('total_debits'),
-                func.count(Transaction.id).label('total_transactions'),
-            ).filter(func.extract('year', Transaction.date) == year_value)
-
-            if account_id:
+        local_account_id = None
+        if account_id:
+            with session_scope() as session:
                 account = (
                     session.query(Account)
                     .filter(Account.omie_id == account_id)
@@ -669,26 +746,25 @@ class LocalDataService:
                 )
                 if not account:
                     return []
-                txn_query = txn_query.filter(Transaction.account_id == account.id)
-
-            rows = (
-                txn_query
-                .group_by(func.extract('year', Transaction.date), func.extract('month', Transaction.date))
-                .order_by(func.extract('month', Transaction.date))
-                .all()
-            )
-
-            summary: List[Dict[str, Any]] = []
-            for row in rows:
-                month_number = int(row.month)
-                summary.append({
-                    'month': f"{month_number:02d}",
-                    'year': str(int(row.year)),
-                    'total_credits': self._to_float(row.total_credits),
-                    'total_debits': self._to_float(row.total_debits),
-                    'total_transactions': int(row.total_transactions),
-                })
-            return summary
+                local_account_id = account.id
+
+        # Lê os totais pré-agregados (ledger_monthly_rollups) em vez de varrer transactions
+        rows = self.rollups.get_monthly_totals(
+            year_value,
+            account_id=local_account_id,
+            credit_types=('credit',),
+            debit_types=('debit',),
+        )
+        return [
+            {
+                'month': f"{row['month']:02d}",
+                'year': str(year_value),
+                'total_credits': row['total_credits'],
+                'total_debits': row['total_debits'],
+                'total_transactions': row['total_transactions'],
+            }
+            for row in rows
+        ]
 
     # -------------------------------------------------------------------------
     # Helpers
@@ -705,6 +781,23 @@ class LocalDataService:
         except (TypeError, ValueError):
             return 0.0
 
+    @staticmethod
+    def _encode_statement_cursor(txn_date: Any, txn_id: int) -> str:
+        if isinstance(txn_date, datetime):
+            txn_date = txn_date.date()
+        raw = f"{txn_date.isoformat()}|{int(txn_id)}"
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def _decode_statement_cursor(cursor: str) -> Tuple[date, int]:
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('ascii')
+            date_part, id_part = raw.split('|', 1)
+            return date.fromisoformat(date_part), int(id_part)
+        except (ValueError, UnicodeError) as exc:
+            raise ValueError(f'Cursor inválido: {cursor}') from exc
+
     @staticmethod
     def _parse_input_date(value: Optional[str]) -> Optional[date]:
         if not value:
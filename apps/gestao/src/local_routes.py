@@ -6,7 +6,7 @@ import json
 import os
 from datetime import date, timedelta
 
-from flask import Blueprint, jsonify, render_template, request
+from flask import Blueprint, Response, jsonify, render_template, request, stream_with_context
 
 from .local_data_service import LocalDataService
 
@@ -69,6 +69,9 @@ def create_local_blueprint(local_service: LocalDataService) -> Blueprint:
             data_fim = request.args.get('data_fim', '')
             conta_id = request.args.get('conta_id')
             pagina = int(request.args.get('pagina', 1))
+            por_pagina = int(request.args.get('por_pagina', 1000))
+            cursor = request.args.get('cursor') or None
+            stream = request.args.get('stream', '').lower() in ('1', 'true', 'sim')
 
             if not conta_id:
                 return jsonify({
@@ -85,11 +88,26 @@ def create_local_blueprint(local_service: LocalDataService) -> Blueprint:
 
             print(f"[LOCAL] Buscando extrato da conta ID: {conta_id} de {data_inicio} a {data_fim}")
 
+            if stream:
+                # Extratos grandes: uma página por linha (NDJSON), seguindo os cursores
+                pages = local_service.iter_account_statement(
+                    account_id=int(conta_id),
+                    start_date=data_inicio,
+                    end_date=data_fim,
+                    per_page=por_pagina
+                )
+                return Response(
+                    stream_with_context(json.dumps(page, default=str) + '\n' for page in pages),
+                    mimetype='application/x-ndjson'
+                )
+
             result = local_service.get_account_statement(
                 account_id=int(conta_id),
                 start_date=data_inicio,
                 end_date=data_fim,
-                page=pagina
+                page=pagina,
+                per_page=por_pagina,
+                cursor=cursor
             )
 
             if result.get('success'):
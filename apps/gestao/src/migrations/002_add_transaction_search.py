@@ -0,0 +1,46 @@
+"""Migration: Add full-text search index over transaction descriptions.
+
+This migration adds:
+- PostgreSQL: unaccent + pg_trgm extensions, f_unaccent() wrapper, GIN tsvector and trigram indexes
+  (built with CREATE INDEX CONCURRENTLY, so the ledger stays writable)
+- SQLite: transactions_fts (FTS5) table with sync triggers, populated from the ledger
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine, Base
+from src.models import *  # noqa: F401,F403
+from src.services.transaction_search_service import TransactionSearchService
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to create the transaction search index."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Add Transaction Search")
+    print("=" * 60)
+
+    Base.metadata.create_all(engine)
+
+    print(f"\n1. Creating search index ({engine.dialect.name})...")
+    backend = TransactionSearchService(engine).create_index()
+    if backend == 'like':
+        print("   ❌ Search index not available (check the log), search will use ILIKE")
+    else:
+        print(f"   ✅ Search backend '{backend}' ready")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,64 @@
+"""Migration: Add indexes used by the dashboard lead funnel.
+
+This migration adds:
+- crm_leads index: created_at
+
+The funnel's status, (user_id, status) and updated_at filters are served by the
+keyset composites of migration 004 (the single-column indexes first created here
+are dropped by migration 014), so only the index the model still declares is created.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine, Base
+from src.models import *  # noqa: F401,F403
+
+# Só os índices desta migration; os demais de crm_leads dependem de colunas de migrations posteriores
+FUNNEL_INDEXES = ('ix_crm_leads_created_at',)
+
+
+def index_exists(engine: Engine, table_name: str, index_name: str) -> bool:
+    """Check if an index exists on a table."""
+    inspector = inspect(engine)
+    return index_name in {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to index crm_leads for the lead funnel."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Add Lead Funnel Indexes")
+    print("=" * 60)
+
+    # create_all não cria índices novos em tabelas que já existem
+    print("\n1. Creating missing tables...")
+    Base.metadata.create_all(engine)
+
+    print("\n2. Creating crm_leads indexes...")
+    for index in sorted(CRMLead.__table__.indexes, key=lambda item: item.name):
+        if index.name not in FUNNEL_INDEXES:
+            continue
+        if index_exists(engine, 'crm_leads', index.name):
+            print(f"   ⏭️  {index.name} already exists")
+            continue
+        index.create(bind=engine)
+        print(f"   ✅ Created {index.name}")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,77 @@
+"""Migration: Add indexes for the keyset-paginated CRM lead listing.
+
+This migration adds:
+- Backfill: crm_leads.updated_at where NULL (the cursor orders by (updated_at, id))
+- crm_leads indexes: (updated_at, id) alone and after status, user_id,
+  user_id+status, city and country
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine, Base
+from src.models import *  # noqa: F401,F403
+
+# Só os índices desta migration; os demais de crm_leads dependem de colunas de migrations posteriores
+LISTING_INDEXES = (
+    'ix_crm_leads_recent',
+    'ix_crm_leads_status_recent',
+    'ix_crm_leads_user_recent',
+    'ix_crm_leads_user_status_recent',
+    'ix_crm_leads_city_recent',
+    'ix_crm_leads_country_recent',
+)
+
+
+def index_exists(engine: Engine, table_name: str, index_name: str) -> bool:
+    """Check if an index exists on a table."""
+    inspector = inspect(engine)
+    return index_name in {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to index crm_leads for cursor pagination."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Add Lead Listing Indexes")
+    print("=" * 60)
+
+    print("\n1. Creating missing tables...")
+    Base.metadata.create_all(engine)
+
+    print("\n2. Backfilling crm_leads.updated_at...")
+    with engine.connect() as conn:
+        result = conn.execute(text(
+            "UPDATE crm_leads SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) "
+            "WHERE updated_at IS NULL"
+        ))
+        conn.commit()
+    print(f"   ✅ {result.rowcount} leads updated")
+
+    print("\n3. Creating crm_leads indexes...")
+    for index in sorted(CRMLead.__table__.indexes, key=lambda item: item.name):
+        if index.name not in LISTING_INDEXES:
+            continue
+        if index_exists(engine, 'crm_leads', index.name):
+            print(f"   ⏭️  {index.name} already exists")
+            continue
+        index.create(bind=engine)
+        print(f"   ✅ Created {index.name}")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
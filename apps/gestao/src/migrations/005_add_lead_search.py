@@ -0,0 +1,70 @@
+"""Migration: Add accent-insensitive fuzzy search over CRM leads.
+
+This migration adds:
+- New column: crm_leads.search_text (normalized name/city/state/neighborhood/instagram/phone)
+- PostgreSQL: pg_trgm extension and GIN trigram index on search_text (CREATE INDEX CONCURRENTLY)
+- SQLite: crm_leads_search (FTS5 trigram) table with sync triggers
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine, Base
+from src.models import *  # noqa: F401,F403
+from src.services.lead_search_service import LeadSearchService
+
+
+def column_exists(engine: Engine, table_name: str, column_name: str) -> bool:
+    """Check if a column exists in a table."""
+    inspector = inspect(engine)
+    columns = [col['name'] for col in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to create the lead search index."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Add Lead Search")
+    print("=" * 60)
+
+    Base.metadata.create_all(engine)
+
+    print("\n1. Adding crm_leads.search_text...")
+    if not column_exists(engine, 'crm_leads', 'search_text'):
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE crm_leads ADD COLUMN search_text TEXT"))
+            conn.commit()
+        print("   ✅ Added crm_leads.search_text")
+    else:
+        print("   ⏭️  crm_leads.search_text already exists")
+
+    service = LeadSearchService(engine)
+    print("\n2. Filling search_text...")
+    updated = service.rebuild_index()
+    print(f"   ✅ search_text filled ({updated} leads)")
+
+    print(f"\n3. Creating search index ({engine.dialect.name})...")
+    backend = service.create_index()
+    if backend == 'like':
+        print("   ❌ Search index not available (check the log), search will use LIKE on search_text")
+    else:
+        print(f"   ✅ Search backend '{backend}' ready")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
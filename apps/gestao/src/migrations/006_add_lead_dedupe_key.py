@@ -0,0 +1,91 @@
+"""Migration: Add the name+city key used by the bulk lead upsert.
+
+This migration adds:
+- New column: crm_leads.dedupe_key (normalized "name|city")
+- Backfill of dedupe_key for existing leads
+- Index: ix_crm_leads_dedupe_key
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.engine import Engine
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine, Base
+from src.models import *  # noqa: F401,F403
+from src.b2b.crm_service import lead_dedupe_key
+
+BATCH_SIZE = 1000
+
+
+def column_exists(engine: Engine, table_name: str, column_name: str) -> bool:
+    """Check if a column exists in a table."""
+    inspector = inspect(engine)
+    columns = [col['name'] for col in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def index_exists(engine: Engine, table_name: str, index_name: str) -> bool:
+    """Check if an index exists on a table."""
+    inspector = inspect(engine)
+    return index_name in {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to add crm_leads.dedupe_key."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Add Lead Dedupe Key")
+    print("=" * 60)
+
+    Base.metadata.create_all(engine)
+
+    print("\n1. Adding crm_leads.dedupe_key...")
+    if not column_exists(engine, 'crm_leads', 'dedupe_key'):
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE crm_leads ADD COLUMN dedupe_key VARCHAR"))
+            conn.commit()
+        print("   ✅ Added crm_leads.dedupe_key")
+    else:
+        print("   ⏭️  crm_leads.dedupe_key already exists")
+
+    print("\n2. Filling dedupe_key...")
+    filled = 0
+    with engine.begin() as conn:
+        rows = conn.execute(
+            select(CRMLead.id, CRMLead.name, CRMLead.city).where(CRMLead.dedupe_key.is_(None))
+        ).all()
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            conn.execute(
+                update(CRMLead.__table__)
+                .where(CRMLead.__table__.c.id == bindparam('lead_id'))
+                .values(dedupe_key=bindparam('key')),
+                [{'lead_id': row.id, 'key': lead_dedupe_key(row.name, row.city)} for row in batch],
+            )
+            filled += len(batch)
+    print(f"   ✅ Filled {filled} leads")
+
+    print("\n3. Creating ix_crm_leads_dedupe_key...")
+    if index_exists(engine, 'crm_leads', 'ix_crm_leads_dedupe_key'):
+        print("   ⏭️  ix_crm_leads_dedupe_key already exists")
+    else:
+        index = next(item for item in CRMLead.__table__.indexes if item.name == 'ix_crm_leads_dedupe_key')
+        index.create(bind=engine)
+        print("   ✅ Created ix_crm_leads_dedupe_key")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,44 @@
+"""Migration: Add the persistent Google Places / scraping cache.
+
+This migration adds:
+- New table: places_cache_entries (Place Details, Google Business Profile and website
+  scraping results with TTL, negative entries and LRU timestamp)
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import inspect
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine
+from src.models import *  # noqa: F401,F403
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to create places_cache_entries."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Add Places Cache")
+    print("=" * 60)
+
+    print("\n1. Creating places_cache_entries...")
+    if 'places_cache_entries' in inspect(engine).get_table_names():
+        print("   ⏭️  places_cache_entries already exists")
+    else:
+        PlacesCacheEntry.__table__.create(bind=engine)
+        print("   ✅ Created places_cache_entries")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,85 @@
+"""Migration: Add geohash-based proximity search over CRM leads.
+
+This migration adds:
+- New column: crm_leads.geohash (precision 9, from latitude/longitude)
+- Backfill of geohash for existing leads
+- Index: ix_crm_leads_geohash
+- PostgreSQL with PostGIS installed: GiST index on the geography point
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine, Base
+from src.models import *  # noqa: F401,F403
+from src.services.lead_geo_service import LeadGeoService
+
+
+def column_exists(engine: Engine, table_name: str, column_name: str) -> bool:
+    """Check if a column exists in a table."""
+    inspector = inspect(engine)
+    columns = [col['name'] for col in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def index_exists(engine: Engine, table_name: str, index_name: str) -> bool:
+    """Check if an index exists on a table."""
+    inspector = inspect(engine)
+    return index_name in {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to add crm_leads.geohash."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Add Lead Geohash")
+    print("=" * 60)
+
+    Base.metadata.create_all(engine)
+
+    print("\n1. Adding crm_leads.geohash...")
+    if not column_exists(engine, 'crm_leads', 'geohash'):
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE crm_leads ADD COLUMN geohash VARCHAR"))
+            conn.commit()
+        print("   ✅ Added crm_leads.geohash")
+    else:
+        print("   ⏭️  crm_leads.geohash already exists")
+
+    geo = LeadGeoService(engine)
+    print("\n2. Filling geohash...")
+    located = geo.rebuild_geohashes()
+    print(f"   ✅ {located} leads with coordinates")
+
+    print("\n3. Creating ix_crm_leads_geohash...")
+    if index_exists(engine, 'crm_leads', 'ix_crm_leads_geohash'):
+        print("   ⏭️  ix_crm_leads_geohash already exists")
+    else:
+        index = next(item for item in CRMLead.__table__.indexes if item.name == 'ix_crm_leads_geohash')
+        index.create(bind=engine)
+        print("   ✅ Created ix_crm_leads_geohash")
+
+    print(f"\n4. Proximity backend ({engine.dialect.name})...")
+    print(f"   ✅ Backend '{geo.ensure_index()}' ready")
+    if geo.check_geohash_ordering():
+        print("   ✅ Database collation orders geohash ranges correctly")
+    else:
+        print("   ❌ Database collation breaks geohash ranges (proximity queries may miss leads)")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
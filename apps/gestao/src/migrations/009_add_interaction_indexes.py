@@ -0,0 +1,55 @@
+"""Migration: Add indexes for batched lead timelines and due follow-ups.
+
+This migration adds:
+- crm_interactions indexes: (lead_id, interaction_at), follow_up_at
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine, Base
+from src.models import *  # noqa: F401,F403
+
+
+def index_exists(engine: Engine, table_name: str, index_name: str) -> bool:
+    """Check if an index exists on a table."""
+    inspector = inspect(engine)
+    return index_name in {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to index crm_interactions for timelines and follow-ups."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Add Interaction Indexes")
+    print("=" * 60)
+
+    # create_all não cria índices novos em tabelas que já existem
+    print("\n1. Creating missing tables...")
+    Base.metadata.create_all(engine)
+
+    print("\n2. Creating crm_interactions indexes...")
+    for index in sorted(CRMInteraction.__table__.indexes, key=lambda item: item.name):
+        if index_exists(engine, 'crm_interactions', index.name):
+            print(f"   ⏭️  {index.name} already exists")
+            continue
+        index.create(bind=engine)
+        print(f"   ✅ Created {index.name}")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,88 @@
+"""Migration: Make the bulk lead upsert key unique per seller.
+
+This migration:
+- Clears dedupe_key on leads that repeat an older lead's (seller, "name|city")
+  among leads without google_place_id (the oldest keeps it; the others stay
+  available to the duplicate-merge proposals)
+- Adds unique partial indexes:
+  - ux_crm_leads_user_dedupe_key: (user_id, dedupe_key) WHERE google_place_id IS NULL
+  - ux_crm_leads_unassigned_dedupe_key: (dedupe_key) WHERE google_place_id IS NULL AND user_id IS NULL
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import inspect, select, update
+from sqlalchemy.engine import Engine
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine, Base
+from src.models import *  # noqa: F401,F403
+
+BATCH_SIZE = 1000
+UNIQUE_INDEXES = ('ux_crm_leads_user_dedupe_key', 'ux_crm_leads_unassigned_dedupe_key')
+
+
+def index_exists(engine: Engine, table_name: str, index_name: str) -> bool:
+    """Check if an index exists on a table."""
+    inspector = inspect(engine)
+    return index_name in {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to make (seller, dedupe_key) unique for leads without place id."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Unique Lead Dedupe Key per Seller")
+    print("=" * 60)
+
+    print("\n1. Creating missing tables...")
+    Base.metadata.create_all(engine)
+
+    print("\n2. Clearing dedupe_key of repeated leads...")
+    with engine.begin() as conn:
+        rows = conn.execute(
+            select(CRMLead.id, CRMLead.user_id, CRMLead.dedupe_key)
+            .where(CRMLead.google_place_id.is_(None), CRMLead.dedupe_key.isnot(None))
+            .order_by(CRMLead.id)
+        ).all()
+        seen = set()
+        repeated = []
+        for row in rows:
+            key = (row.user_id, row.dedupe_key)
+            if key in seen:
+                repeated.append(row.id)
+            seen.add(key)
+        for start in range(0, len(repeated), BATCH_SIZE):
+            conn.execute(
+                update(CRMLead.__table__)
+                .where(CRMLead.__table__.c.id.in_(repeated[start:start + BATCH_SIZE]))
+                .values(dedupe_key=None)
+            )
+    if repeated:
+        print(f"   ✅ Cleared {len(repeated)} leads (veja /crm/api/leads/duplicates)")
+    else:
+        print("   ⏭️  No repeated keys")
+
+    print("\n3. Creating unique dedupe indexes...")
+    for name in UNIQUE_INDEXES:
+        if index_exists(engine, 'crm_leads', name):
+            print(f"   ⏭️  {name} already exists")
+            continue
+        index = next(item for item in CRMLead.__table__.indexes if item.name == name)
+        index.create(bind=engine)
+        print(f"   ✅ Created {name}")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,86 @@
+"""Migration: Make the ledger rollup bucket unique.
+
+This migration:
+- Rebuilds ledger_monthly_rollups from the ledger when a bucket has more than one row
+- Adds the unique indexes used by the rollup upsert:
+  ux_ledger_rollups_key (with category) and ux_ledger_rollups_uncategorized_key
+- Drops ix_ledger_rollups_key (replaced by ux_ledger_rollups_key)
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import func, inspect, text
+from sqlalchemy.engine import Engine
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine, Base, session_scope
+from src.models import *  # noqa: F401,F403
+from src.services.ledger_rollup_service import LedgerRollupService
+
+
+def index_exists(engine: Engine, table_name: str, index_name: str) -> bool:
+    """Check if an index exists on a table."""
+    inspector = inspect(engine)
+    return index_name in {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to enforce one rollup row per account, category, month and type."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Add Ledger Rollup Unique Key")
+    print("=" * 60)
+
+    print("\n1. Creating missing tables...")
+    Base.metadata.create_all(engine)
+
+    print("\n2. Checking repeated rollup buckets...")
+    with session_scope() as session:
+        repeated = (
+            session.query(func.count())
+            .select_from(LedgerMonthlyRollup)
+            .group_by(
+                LedgerMonthlyRollup.account_id, LedgerMonthlyRollup.category_id,
+                LedgerMonthlyRollup.year, LedgerMonthlyRollup.month, LedgerMonthlyRollup.type,
+            )
+            .having(func.count() > 1)
+            .count()
+        )
+    if repeated:
+        # O rollup é derivado do ledger: reconstruir é mais simples (e exato) que somar as linhas
+        rows = LedgerRollupService().rebuild()
+        print(f"   ✅ {repeated} buckets repetidos; rollup reconstruído ({rows} linhas)")
+    else:
+        print("   ⏭️  No repeated buckets")
+
+    print("\n3. Creating ledger_monthly_rollups unique indexes...")
+    for name in ('ux_ledger_rollups_key', 'ux_ledger_rollups_uncategorized_key'):
+        if index_exists(engine, 'ledger_monthly_rollups', name):
+            print(f"   ⏭️  {name} already exists")
+            continue
+        index = next(index for index in LedgerMonthlyRollup.__table__.indexes if index.name == name)
+        index.create(bind=engine)
+        print(f"   ✅ Created {name}")
+
+    print("\n4. Dropping ix_ledger_rollups_key...")
+    if index_exists(engine, 'ledger_monthly_rollups', 'ix_ledger_rollups_key'):
+        with engine.begin() as connection:
+            connection.execute(text('DROP INDEX ix_ledger_rollups_key'))
+        print("   ✅ Dropped ix_ledger_rollups_key")
+    else:
+        print("   ⏭️  ix_ledger_rollups_key does not exist")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
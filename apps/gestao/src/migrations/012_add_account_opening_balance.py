@@ -0,0 +1,95 @@
+"""Migration: Add the account opening balance used by the statement running balance.
+
+This migration adds:
+- New column: accounts.opening_balance (balance before the first transaction, default 0)
+- Backfill: for accounts with a stored ``accounts.balance`` (current balance), the
+  opening balance becomes ``balance - SUM(credits - debits)`` of the account's
+  transactions, so the running balance of the newest row matches ``balance``
+
+Accounts without a stored balance keep 0 and are listed at the end. Set them by hand
+with the bank balance before the account's first transaction:
+
+    UPDATE accounts SET opening_balance = <saldo antes do 1º lançamento> WHERE id = <id>;
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine, Base
+from src.models import *  # noqa: F401,F403
+
+
+def column_exists(engine: Engine, table_name: str, column_name: str) -> bool:
+    """Check if a column exists in a table."""
+    inspector = inspect(engine)
+    columns = [col['name'] for col in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+BACKFILL_OPENING_BALANCE_SQL = """
+    UPDATE accounts
+    SET opening_balance = balance - COALESCE((
+        SELECT SUM(CASE WHEN t.type = 'credit' THEN t.amount ELSE -t.amount END)
+        FROM transactions t
+        WHERE t.account_id = accounts.id
+    ), 0)
+    WHERE balance IS NOT NULL AND balance <> 0
+"""
+
+UNSET_ACCOUNTS_SQL = """
+    SELECT a.id, a.name
+    FROM accounts a
+    WHERE COALESCE(a.balance, 0) = 0
+      AND EXISTS (SELECT 1 FROM transactions t WHERE t.account_id = a.id)
+    ORDER BY a.id
+"""
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to add accounts.opening_balance."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Add Account Opening Balance")
+    print("=" * 60)
+
+    print("\n1. Creating missing tables...")
+    Base.metadata.create_all(engine)
+
+    print("\n2. Adding accounts.opening_balance...")
+    if not column_exists(engine, 'accounts', 'opening_balance'):
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE accounts ADD COLUMN opening_balance NUMERIC(15, 2) DEFAULT 0"))
+            result = conn.execute(text(BACKFILL_OPENING_BALANCE_SQL))
+            conn.commit()
+        print("   ✅ Added accounts.opening_balance")
+        print(f"   ✅ Backfilled opening_balance from accounts.balance ({result.rowcount} accounts)")
+    else:
+        print("   ⏭️  accounts.opening_balance already exists (backfill skipped)")
+
+    print("\n3. Checking accounts without a stored balance...")
+    with engine.connect() as conn:
+        unset = conn.execute(text(UNSET_ACCOUNTS_SQL)).fetchall()
+    if unset:
+        for account_id, name in unset:
+            print(f"   ⚠️  Account {account_id} ({name}) has no stored balance; opening_balance left at 0")
+        print("   Set it with: UPDATE accounts SET opening_balance = <saldo> WHERE id = <id>;")
+    else:
+        print("   ✅ Every account with transactions has an opening balance")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
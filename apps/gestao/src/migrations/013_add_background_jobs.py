@@ -0,0 +1,44 @@
+"""Migration: Persist lead enrichment and duplicate-scan jobs.
+
+This migration adds:
+- New table: background_jobs (status, progress and results of the jobs behind
+  /crm/api/leads/enrich-jobs and /crm/api/leads/duplicates, shared by every worker)
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import inspect
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine
+from src.models import *  # noqa: F401,F403
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to create background_jobs."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Add Background Jobs")
+    print("=" * 60)
+
+    print("\n1. Creating background_jobs...")
+    if 'background_jobs' in inspect(engine).get_table_names():
+        print("   ⏭️  background_jobs already exists")
+    else:
+        BackgroundJob.__table__.create(bind=engine)
+        print("   ✅ Created background_jobs")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,79 @@
+"""Migration: Drop CRM lead indexes covered by the keyset composites.
+
+This migration:
+- Drops ix_crm_leads_status (covered by ix_crm_leads_status_recent),
+  ix_crm_leads_user_status (covered by ix_crm_leads_user_status_recent) and
+  ix_crm_leads_updated_at (covered by ix_crm_leads_recent)
+- Backfills crm_leads.updated_at where NULL and, on PostgreSQL, makes it
+  NOT NULL with a CURRENT_TIMESTAMP default (the lead cursor orders by it)
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+# Add apps/gestao to path for imports
+gestao_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, gestao_root)
+
+from src.db import init_engine
+from src.models import *  # noqa: F401,F403
+
+REDUNDANT_INDEXES = ('ix_crm_leads_status', 'ix_crm_leads_user_status', 'ix_crm_leads_updated_at')
+
+
+def index_exists(engine: Engine, table_name: str, index_name: str) -> bool:
+    """Check if an index exists on a table."""
+    inspector = inspect(engine)
+    return index_name in {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def run_migration(database_url: str | None = None) -> None:
+    """Run the migration to drop redundant crm_leads indexes."""
+    engine = init_engine(database_url)
+
+    print("=" * 60)
+    print("Migration: Drop Redundant Lead Indexes")
+    print("=" * 60)
+
+    print("\n1. Dropping redundant crm_leads indexes...")
+    for name in REDUNDANT_INDEXES:
+        if not index_exists(engine, 'crm_leads', name):
+            print(f"   ⏭️  {name} does not exist")
+            continue
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            conn.commit()
+        print(f"   ✅ Dropped {name}")
+
+    print("\n2. Backfilling crm_leads.updated_at...")
+    with engine.connect() as conn:
+        result = conn.execute(text(
+            "UPDATE crm_leads SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) "
+            "WHERE updated_at IS NULL"
+        ))
+        conn.commit()
+    print(f"   ✅ {result.rowcount} leads updated")
+
+    print("\n3. Making crm_leads.updated_at NOT NULL...")
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE crm_leads ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP"))
+            conn.execute(text("ALTER TABLE crm_leads ALTER COLUMN updated_at SET NOT NULL"))
+            conn.commit()
+        print("   ✅ crm_leads.updated_at is NOT NULL")
+    else:
+        # SQLite não altera colunas existentes; tabelas novas já nascem NOT NULL
+        print(f"   ⏭️  Not supported on {engine.dialect.name} (backfill only)")
+
+    print("\n" + "=" * 60)
+    print("Migration completed successfully!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    run_migration()
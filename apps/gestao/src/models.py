@@ -5,7 +5,7 @@ from __future__ import annotations
 from datetime import datetime
 from sqlalchemy import (
     Column, Integer, String, Float, Boolean, Text, Date, DateTime, ForeignKey,
-    UniqueConstraint, Numeric, Index
+    UniqueConstraint, Numeric, Index, func
 )
 from sqlalchemy.orm import relationship, backref
 
@@ -132,6 +132,7 @@ class Account(Base):
     bank_name = Column(String)
     account_number = Column(String)
     balance = Column(Numeric(15, 2), default=0)
+    opening_balance = Column(Numeric(15, 2), default=0)  # Saldo antes do primeiro lançamento
     active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -196,6 +197,39 @@ class Transaction(Base):
     transfer_pair = relationship('Transaction', remote_side=[id], post_update=True)
 
 
+class LedgerMonthlyRollup(Base):
+    """Pre-aggregated ledger totals per account, category, month and type.
+
+    Maintained incrementally by TransactionService and rebuilt from the
+    ledger by ``LedgerRollupService.rebuild`` for backfills.
+    """
+    __tablename__ = 'ledger_monthly_rollups'
+
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, ForeignKey('accounts.id'), nullable=False)
+    category_id = Column(Integer, ForeignKey('categories.id'))  # NULL = sem categoria
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    type = Column(String, nullable=False)  # revenue, expense, transfer
+    total_amount = Column(Numeric(15, 2), nullable=False, default=0)
+    transaction_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_ledger_rollups_period', 'year', 'month', 'type'),
+        # Uma linha por bucket (alvo do upsert em apply_deltas); NULL não colide em índice único,
+        # por isso "sem categoria" tem o seu próprio índice parcial
+        Index(
+            'ux_ledger_rollups_key', 'account_id', 'category_id', 'year', 'month', 'type', unique=True,
+            sqlite_where=category_id.isnot(None), postgresql_where=category_id.isnot(None),
+        ),
+        Index(
+            'ux_ledger_rollups_uncategorized_key', 'account_id', 'year', 'month', 'type', unique=True,
+            sqlite_where=category_id.is_(None), postgresql_where=category_id.is_(None),
+        ),
+    )
+
+
 class ImportBatch(Base):
     __tablename__ = 'import_batches'
 
@@ -211,6 +245,110 @@ class ImportBatch(Base):
     metadata_json = Column('metadata', Text)  # Renamed to avoid SQLAlchemy reserved word
 
 
+class SheetImportWatermark(Base):
+    """Last sheet row already imported, per sheet/destination, for incremental re-syncs."""
+    __tablename__ = 'sheet_import_watermarks'
+
+    id = Column(Integer, primary_key=True)
+    sheet_key = Column(String, nullable=False, unique=True)
+    last_row = Column(Integer, nullable=False, default=1)  # 1 = apenas cabeçalho
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DataVersion(Base):
+    """Generation counter per data set, shared by all workers for cache invalidation."""
+    __tablename__ = 'data_versions'
+
+    key = Column(String, primary_key=True)  # e.g. 'exchange_rates'
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SalesCubeCell(Base):
+    """Pre-aggregated order items per month, lead/client, seller, product and currency.
+
+    One set of rows per dashboard target currency. Client name and country come from
+    the lead at read time. Refreshed per month by OrderService and rebuilt by
+    ``SalesCubeService.rebuild`` (also when exchange rates change).
+    """
+    __tablename__ = 'sales_cube'
+
+    id = Column(Integer, primary_key=True)
+    target_currency = Column(String(3), nullable=False)
+    month = Column(Date, nullable=False)  # primeiro dia do mês
+    lead_id = Column(Integer)
+    client_id = Column(Integer)
+    user_id = Column(Integer)  # vendedor
+    product = Column(String)
+    currency = Column(String(3))  # moeda nativa do pedido
+    revenue = Column(Float, nullable=False, default=0)  # na moeda alvo
+    revenue_native = Column(Float, nullable=False, default=0)
+    quantity = Column(Float, nullable=False, default=0)
+    item_count = Column(Integer, nullable=False, default=0)
+    order_count = Column(Integer, nullable=False, default=0)
+    first_order_date = Column(Date)
+    last_order_date = Column(Date)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_sales_cube_period', 'target_currency', 'month'),
+        Index('ix_sales_cube_seller', 'target_currency', 'user_id', 'month'),
+    )
+
+
+class DashboardCacheEntry(Base):
+    """Serialized dashboard payload shared between workers (keyed by data version)."""
+    __tablename__ = 'dashboard_cache_entries'
+
+    key = Column(String, primary_key=True)
+    payload = Column(Text, nullable=False)  # JSON
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PlacesCacheEntry(Base):
+    """Cached Google Place Details / scraping result shared between workers and restarts."""
+    __tablename__ = 'places_cache_entries'
+
+    key = Column(String, primary_key=True)  # "<kind>:<place_id ou URL>"
+    kind = Column(String, nullable=False)  # details, gbp, site
+    payload = Column(Text)  # JSON; NULL em entradas negativas
+    is_negative = Column(Boolean, default=False, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    last_accessed_at = Column(DateTime, nullable=False, index=True)  # ordem do LRU
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_places_cache_kind_accessed', 'kind', 'last_accessed_at'),
+    )
+
+
+class BackgroundJob(Base):
+    """Lead enrichment / duplicate-scan job, visible to every worker (EnrichmentJobManager)."""
+    __tablename__ = 'background_jobs'
+
+    id = Column(String, primary_key=True)  # uuid hex
+    kind = Column(String, nullable=False)  # leads, discovery, duplicates
+    user_id = Column(Integer)
+    scope = Column(String)  # duplicates: "<user_id>|<threshold>"
+    status = Column(String, nullable=False, default='queued')
+    total = Column(Integer, nullable=False, default=0)
+    done = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    results = Column(Text)  # JSON, uma posição por item do job
+    error = Column(Text)
+    data_version = Column(Integer)  # duplicates: versão de LEADS varrida
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # worker dono ainda vivo
+
+    __table_args__ = (
+        Index('ix_background_jobs_kind_scope', 'kind', 'scope', 'created_at'),
+        Index('ix_background_jobs_status_heartbeat', 'status', 'heartbeat_at'),
+    )
+
+
 class MLTrainingData(Base):
     __tablename__ = 'ml_training_data'
 
@@ -260,13 +398,44 @@ class CRMLead(Base):
     google_place_id = Column(String, unique=True)
     is_customer = Column(Boolean, default=False)
     converted_account_id = Column(Integer, ForeignKey('clients.id'))
+    search_text = Column(Text)  # Nome/cidade/bairro/instagram/telefone sem acentos (LeadSearchService)
+    dedupe_key = Column(String)  # "nome|cidade" normalizados, para upsert de leads sem google_place_id
+    geohash = Column(String)  # latitude/longitude em geohash (precisão 9), para busca por proximidade
     last_stage_change = Column(DateTime, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # NOT NULL com default no banco: a listagem por cursor ordena por (updated_at, id)
+    updated_at = Column(
+        DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+        server_default=func.current_timestamp(),
+    )
 
     interactions = relationship('CRMInteraction', cascade='all, delete-orphan', back_populates='lead')
     user = relationship('CRMUser', back_populates='leads', foreign_keys=[user_id])
 
+    __table_args__ = (
+        Index('ix_crm_leads_created_at', 'created_at'),
+        # Listagem por cursor (updated_at, id) com os filtros usados pelo CRM; também
+        # atendem filtros só por status, user_id+status e updated_at (funil)
+        Index('ix_crm_leads_recent', 'updated_at', 'id'),
+        Index('ix_crm_leads_status_recent', 'status', 'updated_at', 'id'),
+        Index('ix_crm_leads_user_recent', 'user_id', 'updated_at', 'id'),
+        Index('ix_crm_leads_user_status_recent', 'user_id', 'status', 'updated_at', 'id'),
+        Index('ix_crm_leads_city_recent', 'city', 'updated_at', 'id'),
+        Index('ix_crm_leads_country_recent', 'country', 'updated_at', 'id'),
+        Index('ix_crm_leads_dedupe_key', 'dedupe_key'),
+        Index('ix_crm_leads_geohash', 'geohash'),
+        # Um lead por vendedor e "nome|cidade" entre os sem google_place_id (upsert em lote concorrente)
+        Index(
+            'ux_crm_leads_user_dedupe_key', 'user_id', 'dedupe_key', unique=True,
+            sqlite_where=google_place_id.is_(None), postgresql_where=google_place_id.is_(None),
+        ),
+        Index(
+            'ux_crm_leads_unassigned_dedupe_key', 'dedupe_key', unique=True,
+            sqlite_where=google_place_id.is_(None) & user_id.is_(None),
+            postgresql_where=google_place_id.is_(None) & user_id.is_(None),
+        ),
+    )
+
 
 class CRMInteraction(Base):
     __tablename__ = 'crm_interactions'
@@ -285,6 +454,12 @@ class CRMInteraction(Base):
 
     lead = relationship('CRMLead', back_populates='interactions')
 
+    __table_args__ = (
+        # Timeline por lead (mais recentes primeiro) e follow-ups a vencer
+        Index('ix_crm_interactions_lead_time', 'lead_id', 'interaction_at'),
+        Index('ix_crm_interactions_follow_up', 'follow_up_at'),
+    )
+
 
 class CommissionRate(Base):
     """Commission rate per seller per period. The rate_applied is frozen when commission is created."""
@@ -354,7 +529,7 @@ class ExchangeRate(Base):
 __all__ = [
     'CoffeeProduct', 'CoffeePackagingPrice', 'Order', 'OrderItem',
     'CRMUser', 'Account', 'Category', 'Client', 'Transaction',
-    'ImportBatch', 'MLTrainingData', 'CRMLead', 'CRMInteraction',
+    'LedgerMonthlyRollup', 'ImportBatch', 'SheetImportWatermark', 'DataVersion', 'DashboardCacheEntry', 'PlacesCacheEntry', 'BackgroundJob', 'SalesCubeCell', 'MLTrainingData', 'CRMLead', 'CRMInteraction',
     'CommissionRate', 'Commission', 'ExchangeRate',
     'CURRENCIES', 'COUNTRIES', 'CUSTOMER_TYPES'
 ]
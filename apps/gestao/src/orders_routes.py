@@ -683,9 +683,8 @@ def create_orders_blueprint(
 
             # CLEAR ALL DATA BEFORE IMPORT
             try:
-                orders_deleted = order_service.delete_all_orders()
-                leads_deleted = crm_service.delete_all_leads()
-                print(f"🗑️ Limpeza: {orders_deleted} pedidos e {leads_deleted} leads removidos")
+                purge = order_service.reset_orders_and_leads()
+                print(f"🗑️ Limpeza: {purge.counts.get('orders', 0)} pedidos e {purge.counts.get('crm_leads', 0)} leads removidos")
             except Exception as exc:
                 flash(f'Erro ao limpar dados: {exc}', 'danger')
                 return redirect(url_for('orders.orders_import'))
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import math
 from datetime import date, datetime
 from decimal import Decimal
 from typing import Any, Dict, List, Optional
@@ -104,27 +105,33 @@ class CommissionService:
             total_commission = Decimal('0')
             paid_amount = Decimal('0')
 
-            for order in orders:
+            order_currencies = [(order.currency or 'BRL').upper().strip() for order in orders]
+
+            # Calculate commission in order's original currency
+            commissions_original = [
+                (Decimal(str(order.total_amount or 0)) * rate / Decimal('100')).quantize(Decimal('0.01'))
+                for order in orders
+            ]
+
+            # Convert all commissions to native currency with a single rate lookup
+            converted_amounts = self.exchange_rate_service.convert_series(
+                [float(amount) for amount in commissions_original],
+                order_currencies,
+                [order.order_date or date.today() for order in orders],
+                native_currency
+            ).tolist()
+
+            for order, order_currency, commission_original, converted in zip(
+                orders, order_currencies, commissions_original, converted_amounts
+            ):
                 order_total = Decimal(str(order.total_amount or 0))
-                order_currency = (order.currency or 'BRL').upper().strip()
-
-                # Calculate commission in order's original currency
-                commission_original = (order_total * rate / Decimal('100')).quantize(Decimal('0.01'))
 
                 # Convert to native currency if needed
                 needs_conversion = order_currency != native_currency
                 conversion_failed = False
 
                 if needs_conversion:
-                    # Try to convert using exchange rate service
-                    converted = self.exchange_rate_service.convert(
-                        float(commission_original),
-                        order_currency,
-                        native_currency,
-                        order.order_date or date.today()
-                    )
-
-                    if converted is not None and converted > 0:
+                    if not math.isnan(converted) and converted > 0:
                         commission_native = Decimal(str(converted)).quantize(Decimal('0.01'))
                     else:
                         # Conversion failed - keep original and mark it
@@ -222,6 +229,7 @@ class CommissionService:
         created_ids = []
 
         with session_scope() as session:
+            orders = []
             for order_id in order_ids:
                 # Check if already paid
                 existing = (
@@ -236,21 +244,27 @@ class CommissionService:
                 order = session.get(Order, order_id)
                 if not order or order.user_id != user_id:
                     continue
-
-                # Calculate commission
-                order_total = Decimal(str(order.total_amount or 0))
-                commission_amount = (order_total * rate / Decimal('100')).quantize(Decimal('0.01'))
-
-                # Convert to BRL if needed
+                orders.append(order)
+
+            # Calculate commissions
+            commission_amounts = [
+                (Decimal(str(order.total_amount or 0)) * rate / Decimal('100')).quantize(Decimal('0.01'))
+                for order in orders
+            ]
+
+            # Convert to BRL if needed (single rate lookup for all orders)
+            brl_amounts = self.exchange_rate_service.convert_series(
+                [float(amount) for amount in commission_amounts],
+                [order.currency or 'BRL' for order in orders],
+                [order.order_date for order in orders],
+                'BRL'
+            ).tolist()
+
+            for order, commission_amount, brl_amount in zip(orders, commission_amounts, brl_amounts):
+                order_id = order.id
                 amount_brl = None
                 if order.currency and order.currency.upper() != 'BRL':
-                    brl_amount = self.exchange_rate_service.convert(
-                        float(commission_amount),
-                        order.currency,
-                        'BRL',
-                        order.order_date
-                    )
-                    if brl_amount:
+                    if not math.isnan(brl_amount) and brl_amount:
                         amount_brl = Decimal(str(brl_amount)).quantize(Decimal('0.01'))
 
                 # Create commission record
@@ -0,0 +1,163 @@
+"""Data purge - set-based reset of orders and leads, children first, in the caller's transaction.
+
+``purge_tables`` derives the delete order from the model foreign keys, so children
+(``order_items``, ``commissions``, ``crm_interactions``) never depend on DB-level
+``ON DELETE CASCADE`` (not enforced by SQLite unless ``PRAGMA foreign_keys`` is on).
+Nullable references from tables outside the purge (``orders.lead_id`` when only leads
+are purged) are set to NULL first; non-nullable ones are an error.
+
+On PostgreSQL a purge whose table set is closed under foreign keys is a single
+``TRUNCATE``; otherwise every table is emptied with ``DELETE ... RETURNING`` and the
+returned rows counted in the database. Every step is timed.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Sequence
+
+from sqlalchemy import Table, func, literal, select, text, update
+from sqlalchemy.orm import Session
+
+from ..db import Base
+from .data_versions import LEADS, ORDERS, bump_data_version
+
+# Tabelas de cada reset (os filhos entram na ordem certa automaticamente)
+ORDER_TABLES = ('orders', 'order_items', 'commissions')
+LEAD_TABLES = ('crm_leads', 'crm_interactions')
+
+
+@dataclass
+class PurgeReport:
+    """Rows removed per table, references cleared and per-step timings (seconds)."""
+
+    strategy: str
+    counts: Dict[str, int] = field(default_factory=dict)
+    detached: Dict[str, int] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'strategy': self.strategy,
+            'counts': dict(self.counts),
+            'detached': dict(self.detached),
+            'timings': {step: round(value, 4) for step, value in self.timings.items()},
+            'seconds': round(self.seconds, 4),
+        }
+
+    def summary(self) -> str:
+        removed = ', '.join(f"{table}={count}" for table, count in self.counts.items())
+        return f"{removed} ({self.strategy}, {self.seconds * 1000:.0f} ms)"
+
+
+def _tables(names: Iterable[str]) -> List[Table]:
+    names = set(names)
+    unknown = names - set(Base.metadata.tables)
+    if unknown:
+        raise ValueError(f"Tabelas desconhecidas: {', '.join(sorted(unknown))}")
+    # sorted_tables vem pais antes de filhos; a exclusão precisa do inverso
+    return [table for table in reversed(Base.metadata.sorted_tables) if table.name in names]
+
+
+def _outside_references(tables: Sequence[Table]):
+    """Foreign keys from tables outside the purge set pointing into it."""
+    names = {table.name for table in tables}
+    for other in Base.metadata.sorted_tables:
+        if other.name in names:
+            continue
+        for foreign_key in other.foreign_keys:
+            if foreign_key.column.table.name in names:
+                yield other, foreign_key
+
+
+def _delete_count(session: Session, table: Table) -> int:
+    if session.get_bind().dialect.name == 'postgresql':
+        # Contagem feita no banco: nenhuma linha retornada volta ao Python
+        deleted = table.delete().returning(literal(1).label('deleted')).cte('deleted')
+        return int(session.execute(select(func.count()).select_from(deleted)).scalar())
+    return int(session.execute(table.delete()).rowcount or 0)
+
+
+def purge_tables(session: Session, names: Iterable[str]) -> PurgeReport:
+    """
+    Empty ``names`` (children first) inside the session's transaction.
+
+    Raises:
+        ValueError: for unknown tables, or a non-nullable reference from a table
+            outside the set (it would have to be purged too)
+    """
+    started = time.perf_counter()
+    tables = _tables(names)
+    references = list(_outside_references(tables))
+    for other, foreign_key in references:
+        if not foreign_key.parent.nullable:
+            raise ValueError(
+                f"{other.name}.{foreign_key.parent.name} referencia {foreign_key.column.table.name}; "
+                f"inclua {other.name} na limpeza"
+            )
+
+    dialect = session.get_bind().dialect.name
+    report = PurgeReport(strategy='truncate' if dialect == 'postgresql' and not references else 'delete')
+
+    for other, foreign_key in references:
+        step = time.perf_counter()
+        column = foreign_key.parent
+        result = session.execute(
+            update(other).where(column.isnot(None)).values({column.name: None})
+        )
+        key = f"{other.name}.{column.name}"
+        report.detached[key] = int(result.rowcount or 0)
+        report.timings[f"detach {key}"] = time.perf_counter() - step
+
+    if report.strategy == 'truncate':
+        step = time.perf_counter()
+        preparer = session.get_bind().dialect.identifier_preparer
+        names_sql = ', '.join(preparer.format_table(table) for table in tables)
+        # Trava antes de contar para que a contagem seja exatamente o que o TRUNCATE remove
+        session.execute(text(f"LOCK TABLE {names_sql} IN ACCESS EXCLUSIVE MODE"))
+        for table in tables:
+            report.counts[table.name] = int(session.execute(select(func.count()).select_from(table)).scalar())
+        report.timings['count'] = time.perf_counter() - step
+        step = time.perf_counter()
+        session.execute(text(f"TRUNCATE TABLE {names_sql}"))
+        report.timings['truncate'] = time.perf_counter() - step
+    else:
+        for table in tables:
+            step = time.perf_counter()
+            report.counts[table.name] = _delete_count(session, table)
+            report.timings[f"delete {table.name}"] = time.perf_counter() - step
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def purge_orders(session: Session) -> PurgeReport:
+    """Remove every order with its items and commissions."""
+    report = purge_tables(session, ORDER_TABLES)
+    bump_data_version(session, ORDERS)
+    return report
+
+
+def purge_leads(session: Session) -> PurgeReport:
+    """Remove every lead with its interactions; orders keep existing, unlinked from the lead."""
+    report = purge_tables(session, LEAD_TABLES)
+    bump_data_version(session, LEADS)
+    if any(report.detached.values()):
+        bump_data_version(session, ORDERS)
+    return report
+
+
+def reset_orders_and_leads(session: Session) -> PurgeReport:
+    """Remove all orders and leads (and their children) in one statement set."""
+    report = purge_tables(session, ORDER_TABLES + LEAD_TABLES)
+    bump_data_version(session, ORDERS)
+    bump_data_version(session, LEADS)
+    return report
+
+
+__all__ = [
+    'PurgeReport', 'purge_tables', 'purge_orders', 'purge_leads', 'reset_orders_and_leads',
+    'ORDER_TABLES', 'LEAD_TABLES',
+]
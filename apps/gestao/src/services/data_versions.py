@@ -0,0 +1,75 @@
+"""Data version counters - cross-worker cache invalidation through the database."""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from ..db import session_scope
+from ..models import DataVersion
+
+EXCHANGE_RATES = 'exchange_rates'
+ORDERS = 'orders'
+LEADS = 'crm_leads'
+# Guarda 1 + geração de câmbio usada na última reconstrução do cubo (0 = nunca construído)
+SALES_CUBE_RATES = 'sales_cube.exchange_rates'
+
+
+def bump_data_version(session: Session, key: str) -> None:
+    """
+    Increment the generation of ``key`` inside the caller's transaction.
+
+    Bumping in the same session as the write means other workers only see the new
+    generation once the data change itself is committed.
+    """
+    updated = (
+        session.query(DataVersion)
+        .filter(DataVersion.key == key)
+        .update(
+            {DataVersion.version: DataVersion.version + 1, DataVersion.updated_at: datetime.utcnow()},
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        session.add(DataVersion(key=key, version=1))
+
+
+def set_data_version(session: Session, key: str, version: int) -> None:
+    """Store an explicit value for ``key`` (used for "synced up to" markers)."""
+    updated = (
+        session.query(DataVersion)
+        .filter(DataVersion.key == key)
+        .update({DataVersion.version: version, DataVersion.updated_at: datetime.utcnow()}, synchronize_session=False)
+    )
+    if not updated:
+        session.add(DataVersion(key=key, version=version))
+
+
+def get_data_version(key: str, session: Optional[Session] = None) -> int:
+    """Current generation of ``key`` (0 when it was never bumped)."""
+    if session is not None:
+        value = session.query(DataVersion.version).filter(DataVersion.key == key).scalar()
+        return int(value or 0)
+
+    with session_scope() as own_session:
+        value = own_session.query(DataVersion.version).filter(DataVersion.key == key).scalar()
+        return int(value or 0)
+
+
+def get_data_versions(keys: Iterable[str], session: Optional[Session] = None) -> Dict[str, int]:
+    """Generations of several keys in one query (missing keys are 0)."""
+    keys = list(keys)
+    if session is None:
+        with session_scope() as own_session:
+            return get_data_versions(keys, own_session)
+
+    found = dict(session.query(DataVersion.key, DataVersion.version).filter(DataVersion.key.in_(keys)))
+    return {key: int(found.get(key) or 0) for key in keys}
+
+
+__all__ = [
+    'EXCHANGE_RATES', 'ORDERS', 'LEADS', 'SALES_CUBE_RATES',
+    'bump_data_version', 'set_data_version', 'get_data_version', 'get_data_versions',
+]
@@ -2,19 +2,145 @@
 
 from __future__ import annotations
 
+import threading
+import time
+from bisect import bisect_right
 from datetime import date
 from decimal import Decimal
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
+import pandas as pd
 from sqlalchemy import desc
 
 from ..db import session_scope
 from ..models import ExchangeRate
+from .data_versions import EXCHANGE_RATES, bump_data_version, get_data_version
+
+# Intervalo máximo (s) até notar, via contador no banco, uma alteração feita por outro worker
+GENERATION_CHECK_INTERVAL = 5.0
+
+RatePair = Tuple[str, str]
+PairTimeline = Tuple[List[int], List[float]]  # (effective_date ordinals, rates), sorted
+
+
+class RateTimelineCache:
+    """
+    Process-wide copy of ``exchange_rates`` as sorted date arrays per currency pair.
+
+    Lookups are a dict access plus ``bisect``. The cache is dropped locally by
+    ``invalidate()`` and reloaded when the ``data_versions`` generation for
+    exchange rates changes (checked at most every ``check_interval`` seconds).
+    """
+
+    def __init__(self, check_interval: float = GENERATION_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.version = 0  # bumped on every local invalidation/reload
+        self._lock = threading.Lock()
+        self._pairs: Optional[Dict[RatePair, PairTimeline]] = None
+        self._generation = -1
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._pairs = None
+            self.version += 1
+
+    def reload(self) -> int:
+        """
+        Load the rates now, ignoring ``check_interval``.
+
+        Returns:
+            The exchange-rate generation read before the load (a write landing during
+            the load leaves it behind the database, never ahead)
+        """
+        with self._lock:
+            generation = get_data_version(EXCHANGE_RATES)
+            self._pairs = self._load()
+            self._generation = generation
+            self._checked_at = time.monotonic()
+            self.version += 1
+            return generation
+
+    def pairs(self) -> Dict[RatePair, PairTimeline]:
+        pairs = self._pairs
+        if pairs is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return pairs
+
+        with self._lock:
+            now = time.monotonic()
+            if self._pairs is not None and now - self._checked_at < self.check_interval:
+                return self._pairs
+
+            # Generation first: a write landing during the load forces another reload later
+            generation = get_data_version(EXCHANGE_RATES)
+            if self._pairs is None or generation != self._generation:
+                self._pairs = self._load()
+                self._generation = generation
+                self.version += 1
+            self._checked_at = now
+            return self._pairs
+
+    @staticmethod
+    def _load() -> Dict[RatePair, PairTimeline]:
+        with session_scope() as session:
+            rows = (
+                session.query(
+                    ExchangeRate.from_currency,
+                    ExchangeRate.to_currency,
+                    ExchangeRate.effective_date,
+                    ExchangeRate.rate,
+                )
+                .order_by(ExchangeRate.effective_date)
+                .all()
+            )
+
+        pairs: Dict[RatePair, PairTimeline] = {}
+        for from_currency, to_currency, effective_date, rate in rows:
+            dates, rates = pairs.setdefault((from_currency, to_currency), ([], []))
+            dates.append(effective_date.toordinal())
+            rates.append(float(rate))
+        return pairs
+
+    def lookup(self, from_currency: str, to_currency: str, for_date: date) -> Optional[float]:
+        """As-of rate: latest direct rate on/before ``for_date``, else inverted reverse rate."""
+        pairs = self.pairs()
+        ordinal = for_date.toordinal()
+
+        direct = pairs.get((from_currency, to_currency))
+        if direct:
+            index = bisect_right(direct[0], ordinal) - 1
+            if index >= 0:
+                return direct[1][index]
+
+        reverse = pairs.get((to_currency, from_currency))
+        if reverse:
+            index = bisect_right(reverse[0], ordinal) - 1
+            if index >= 0 and reverse[1][index] != 0:
+                return 1.0 / reverse[1][index]
+
+        return None
+
+
+_rate_cache = RateTimelineCache()
 
 
 class ExchangeRateService:
     """Manages exchange rates between currencies."""
 
+    def __init__(self, rate_cache: Optional[RateTimelineCache] = None):
+        self.rate_cache = rate_cache or _rate_cache
+
+    def _validate(self, from_currency: str, to_currency: str, rate: float) -> Tuple[str, str]:
+        from_currency = from_currency.upper().strip()
+        to_currency = to_currency.upper().strip()
+
+        if rate <= 0:
+            raise ValueError('Taxa de câmbio deve ser maior que zero')
+        if from_currency == to_currency:
+            raise ValueError('Moedas de origem e destino devem ser diferentes')
+        return from_currency, to_currency
+
     def set_rate(
         self,
         from_currency: str,
@@ -36,15 +162,11 @@ class ExchangeRateService:
         Returns:
             The ID of the new exchange rate record
         """
-        from_currency = from_currency.upper().strip()
-        to_currency = to_currency.upper().strip()
-
-        if rate <= 0:
-            raise ValueError('Taxa de câmbio deve ser maior que zero')
-        if from_currency == to_currency:
-            raise ValueError('Moedas de origem e destino devem ser diferentes')
+        from_currency, to_currency = self._validate(from_currency, to_currency, rate)
 
         with session_scope() as session:
+            bump_data_version(session, EXCHANGE_RATES)
+
             # Check if rate already exists for this date and currency pair
             existing = (
                 session.query(ExchangeRate)
@@ -60,19 +182,72 @@ class ExchangeRateService:
                 # Update existing rate
                 existing.rate = Decimal(str(rate))
                 existing.created_by = created_by
-                return existing.id
-
-            # Create new rate
-            new_rate = ExchangeRate(
-                from_currency=from_currency,
-                to_currency=to_currency,
-                rate=Decimal(str(rate)),
-                effective_date=effective_date,
-                created_by=created_by
-            )
-            session.add(new_rate)
-            session.flush()
-            return new_rate.id
+                rate_id = existing.id
+            else:
+                # Create new rate
+                new_rate = ExchangeRate(
+                    from_currency=from_currency,
+                    to_currency=to_currency,
+                    rate=Decimal(str(rate)),
+                    effective_date=effective_date,
+                    created_by=created_by
+                )
+                session.add(new_rate)
+                session.flush()
+                rate_id = new_rate.id
+
+        self.rate_cache.invalidate()
+        return rate_id
+
+    def update_rate(
+        self,
+        rate_id: int,
+        from_currency: str,
+        to_currency: str,
+        rate: float,
+        effective_date: date,
+        updated_by: Optional[int] = None
+    ) -> bool:
+        """
+        Edit an existing exchange rate.
+
+        Returns:
+            False when the rate does not exist
+        """
+        from_currency, to_currency = self._validate(from_currency, to_currency, rate)
+
+        with session_scope() as session:
+            rate_record = session.get(ExchangeRate, rate_id)
+            if not rate_record:
+                return False
+
+            rate_record.from_currency = from_currency
+            rate_record.to_currency = to_currency
+            rate_record.rate = Decimal(str(rate))
+            rate_record.effective_date = effective_date
+            rate_record.created_by = updated_by
+            bump_data_version(session, EXCHANGE_RATES)
+
+        self.rate_cache.invalidate()
+        return True
+
+    def delete_rate(self, rate_id: int) -> bool:
+        """
+        Delete an exchange rate.
+
+        Returns:
+            False when the rate does not exist
+        """
+        with session_scope() as session:
+            rate_record = session.get(ExchangeRate, rate_id)
+            if not rate_record:
+                return False
+
+            session.delete(rate_record)
+            bump_data_version(session, EXCHANGE_RATES)
+
+        self.rate_cache.invalidate()
+        return True
 
     def get_rate(
         self,
@@ -102,37 +277,7 @@ class ExchangeRateService:
         if from_currency == to_currency:
             return 1.0
 
-        with session_scope() as session:
-            rate = (
-                session.query(ExchangeRate)
-                .filter(
-                    ExchangeRate.from_currency == from_currency,
-                    ExchangeRate.to_currency == to_currency,
-                    ExchangeRate.effective_date <= for_date
-                )
-                .order_by(desc(ExchangeRate.effective_date))
-                .first()
-            )
-
-            if rate:
-                return float(rate.rate)
-
-            # Try reverse conversion
-            reverse_rate = (
-                session.query(ExchangeRate)
-                .filter(
-                    ExchangeRate.from_currency == to_currency,
-                    ExchangeRate.to_currency == from_currency,
-                    ExchangeRate.effective_date <= for_date
-                )
-                .order_by(desc(ExchangeRate.effective_date))
-                .first()
-            )
-
-            if reverse_rate and float(reverse_rate.rate) != 0:
-                return 1.0 / float(reverse_rate.rate)
-
-            return None
+        return self.rate_cache.lookup(from_currency, to_currency, for_date)
 
     def convert(
         self,
@@ -158,6 +303,122 @@ class ExchangeRateService:
             return None
         return amount * rate
 
+    def load_rate_timeline(self, currencies: Iterable[str], to_currency: str) -> pd.DataFrame:
+        """
+        Every rate between ``currencies`` and ``to_currency`` (both directions), from the rate cache.
+
+        Returns:
+            DataFrame with columns currency, effective_date (datetime64), rate, direct
+            (False for ``to_currency -> currency`` rows, whose rate must be inverted)
+        """
+        to_currency = to_currency.upper().strip()
+        currencies = sorted({c.upper().strip() for c in currencies} - {to_currency})
+        columns = ['currency', 'effective_date', 'rate', 'direct']
+        if not currencies:
+            return pd.DataFrame(columns=columns)
+
+        wanted = set(currencies)
+        rows = [
+            (from_currency, pair_to, date.fromordinal(ordinal), rate)
+            for (from_currency, pair_to), (ordinals, rates) in self.rate_cache.pairs().items()
+            if (pair_to == to_currency and from_currency in wanted)
+            or (from_currency == to_currency and pair_to in wanted)
+            for ordinal, rate in zip(ordinals, rates)
+        ]
+
+        timeline = pd.DataFrame(rows, columns=['from_currency', 'to_currency', 'effective_date', 'rate'])
+        timeline['direct'] = timeline['to_currency'] == to_currency
+        timeline['currency'] = timeline['from_currency'].where(timeline['direct'], timeline['to_currency'])
+        timeline['effective_date'] = pd.to_datetime(timeline['effective_date'])
+        timeline['rate'] = timeline['rate'].astype(float)
+        return timeline[columns].sort_values('effective_date', kind='stable').reset_index(drop=True)
+
+    def get_rate_series(
+        self,
+        currencies: Iterable[str],
+        dates: Iterable[Any],
+        to_currency: str,
+        timeline: Optional[pd.DataFrame] = None
+    ) -> pd.Series:
+        """
+        As-of rates for many (currency, date) pairs, same rules as ``get_rate``.
+
+        The most recent direct rate on or before each date wins; otherwise the most recent
+        reverse rate is inverted; otherwise NaN.
+
+        Args:
+            currencies: Source currency per element
+            dates: Date per element (None = today)
+            to_currency: Target currency
+            timeline: Preloaded ``load_rate_timeline`` result (optional)
+
+        Returns:
+            Float Series aligned with the inputs (positional index)
+        """
+        to_currency = to_currency.upper().strip()
+        frame = pd.DataFrame({
+            'currency': pd.Series(list(currencies), dtype=object).fillna(to_currency).astype(str).str.upper().str.strip(),
+            'date': pd.to_datetime(pd.Series(list(dates), dtype=object)).fillna(pd.Timestamp(date.today())),
+        })
+        frame['date'] = frame['date'].dt.normalize().astype('datetime64[ns]')
+        frame['_pos'] = np.arange(len(frame))
+
+        rates = pd.Series(np.where(frame['currency'] == to_currency, 1.0, np.nan), index=frame.index)
+        foreign = frame[frame['currency'] != to_currency]
+        if foreign.empty:
+            return rates
+
+        if timeline is None:
+            timeline = self.load_rate_timeline(foreign['currency'].unique(), to_currency)
+        timeline = timeline.assign(effective_date=timeline['effective_date'].astype('datetime64[ns]'))
+
+        left = foreign.sort_values('date', kind='stable')
+        for direct in (True, False):
+            pairs = timeline[timeline['direct'] == direct][['currency', 'effective_date', 'rate']]
+            if pairs.empty:
+                continue
+            pending = left[rates.iloc[left['_pos']].isna().to_numpy()]
+            if pending.empty:
+                break
+            matched = pd.merge_asof(
+                pending, pairs,
+                left_on='date', right_on='effective_date', by='currency', direction='backward'
+            )
+            values = matched['rate'].to_numpy(dtype=float)
+            if not direct:
+                with np.errstate(divide='ignore'):
+                    values = np.where(values > 0, 1.0 / values, np.nan)
+            rates.iloc[matched['_pos'].to_numpy()] = values
+
+        return rates
+
+    def convert_series(
+        self,
+        amounts: Iterable[float],
+        currencies: Iterable[str],
+        dates: Iterable[Any],
+        to_currency: str = 'BRL',
+        timeline: Optional[pd.DataFrame] = None
+    ) -> pd.Series:
+        """
+        Convert many amounts at once (vectorized ``convert``).
+
+        Args:
+            amounts: Amounts to convert
+            currencies: Source currency per amount
+            dates: Date per amount, used for the as-of rate lookup
+            to_currency: Target currency
+            timeline: Preloaded ``load_rate_timeline`` result (optional)
+
+        Returns:
+            Converted amounts (NaN where no rate is available), indexed like ``amounts``
+            when it is a Series
+        """
+        index = amounts.index if isinstance(amounts, pd.Series) else None
+        values = np.asarray(list(amounts) if index is None else amounts.to_numpy(), dtype=float)
+        rates = self.get_rate_series(currencies, dates, to_currency, timeline=timeline).to_numpy()
+        return pd.Series(values * rates, index=index)
+
     def list_rates(
         self,
         from_currency: Optional[str] = None,
@@ -241,4 +502,4 @@ class ExchangeRateService:
         }
 
 
-__all__ = ['ExchangeRateService']
+__all__ = ['ExchangeRateService', 'RateTimelineCache']
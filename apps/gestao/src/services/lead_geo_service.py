@@ -0,0 +1,422 @@
+"""Lead geo service - proximity and map-viewport queries over CRM leads.
+
+Every lead with coordinates keeps ``crm_leads.geohash`` (precision 9, ~5 m cells),
+computed in Python so SQLite and PostgreSQL share the same column and B-tree index.
+A bounding box is covered by a handful of geohash prefixes, each one an index range
+(``geohash >= 'u4pr' AND geohash < 'u4ps'``, the upper bound being the prefix with its
+last character advanced in the geohash alphabet, so the range holds under any collation
+that orders digits before letters, not only C); candidates are then filtered by
+the exact box and re-ranked by great-circle distance with a vectorized NumPy
+haversine.
+
+PostgreSQL with the PostGIS extension already installed uses a GiST index on the
+``geography`` point instead (``ST_DWithin`` / ``ST_MakeEnvelope``); the distance
+re-rank stays the same.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..db import get_engine
+
+logger = logging.getLogger(__name__)
+
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Limite de prefixos por consulta (cada um vira um range no índice)
+MAX_COVER_CELLS = 40
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+NEARBY_LIMIT = 50
+NEARBY_LIMIT_MAX = 500
+MAX_RADIUS_KM = 500.0
+VIEWPORT_LIMIT = 2000
+VIEWPORT_LIMIT_MAX = 10000
+
+POINT_COLUMNS = 'id, name, status, city, user_id, latitude, longitude'
+
+_PG_POSTGIS_INDEX = (
+    "CREATE INDEX IF NOT EXISTS ix_crm_leads_geography ON crm_leads USING GIST "
+    "((ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography))"
+)
+_PG_POINT = "(ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography)"
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Standard base32 geohash: ``geohash_encode(57.64911, 10.40744, 11)`` -> ``'u4pruydqqvj'``."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # bits pares são longitude
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = (value << 1) | 1
+            interval[0] = middle
+        else:
+            value <<= 1
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def lead_geohash(latitude: Any, longitude: Any) -> Optional[str]:
+    """``geohash`` column value for a lead; None without valid coordinates."""
+    try:
+        lat, lng = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+        return None
+    return geohash_encode(lat, lng)
+
+
+def geohash_prefix_upper(prefix: str) -> Optional[str]:
+    """
+    Smallest string above every geohash starting with ``prefix``: ``'u4pr'`` -> ``'u4ps'``,
+    ``'u4pz'`` -> ``'u4q'``. ``None`` when the prefix is all ``'z'`` (no upper bound).
+    """
+    prefix = prefix.rstrip(GEOHASH_ALPHABET[-1])
+    if not prefix:
+        return None
+    return prefix[:-1] + GEOHASH_ALPHABET[GEOHASH_ALPHABET.index(prefix[-1]) + 1]
+
+
+def _ordering_samples() -> List[Tuple[str, str]]:
+    """(smaller, larger) pairs the geohash ranges rely on, to compare against the database."""
+    pairs = list(zip(GEOHASH_ALPHABET, GEOHASH_ALPHABET[1:]))
+    for char in GEOHASH_ALPHABET:
+        prefix = '6gy' + char
+        upper = geohash_prefix_upper(prefix)
+        pairs.append((prefix, prefix + '0'))
+        pairs.append((prefix + 'z' * (GEOHASH_PRECISION - len(prefix)), upper))
+    return pairs
+
+
+def _cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a geohash cell."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def geohash_cover(
+    south: float, west: float, north: float, east: float, max_cells: int = MAX_COVER_CELLS,
+) -> List[str]:
+    """
+    Geohash prefixes whose cells cover the box, at the finest precision that needs
+    at most ``max_cells`` cells. Boxes crossing the antimeridian (``west > east``)
+    are split in two.
+    """
+    if west > east:
+        half = max(1, max_cells // 2)
+        return sorted(set(
+            geohash_cover(south, west, north, 180.0, half) + geohash_cover(south, -180.0, north, east, half)
+        ))
+
+    south, north = max(-90.0, south), min(90.0, north)
+    west, east = max(-180.0, west), min(180.0, east)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size(precision)
+        rows = range(int((south + 90.0) // height), int(min(north + 90.0, 179.999999) // height) + 1)
+        cols = range(int((west + 180.0) // width), int(min(east + 180.0, 359.999999) // width) + 1)
+        if len(rows) * len(cols) <= max_cells or precision == 1:
+            return sorted({
+                geohash_encode(-90.0 + (row + 0.5) * height, -180.0 + (col + 0.5) * width, precision)
+                for row in rows
+                for col in cols
+            })
+    return []
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) enclosing a circle; longitude wraps at ±180."""
+    lat_delta = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    lng_delta = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (KM_PER_DEGREE * cos_lat))
+    south, north = max(-90.0, latitude - lat_delta), min(90.0, latitude + lat_delta)
+    if lng_delta >= 180.0 or south <= -90.0 or north >= 90.0:
+        return south, -180.0, north, 180.0
+    west, east = longitude - lng_delta, longitude + lng_delta
+    if west < -180.0:
+        west += 360.0
+    if east > 180.0:
+        east -= 360.0
+    return south, west, north, east
+
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Great-circle distance (km) from one point to arrays of points."""
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(latitudes)
+    dlat = lat2 - lat1
+    dlng = np.radians(longitudes) - math.radians(longitude)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def validate_coordinates(latitude: Any, longitude: Any) -> Tuple[float, float]:
+    try:
+        lat, lng = float(latitude), float(longitude)
+    except (TypeError, ValueError) as exc:
+        raise ValueError('Latitude e longitude inválidas') from exc
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+        raise ValueError('Latitude e longitude inválidas')
+    return lat, lng
+
+
+class LeadGeoService:
+    """
+    Nearby-lead and viewport queries.
+
+    The backend ('postgis' or 'geohash') is detected once per process; the PostGIS
+    index is created lazily (only when the extension is already installed).
+    """
+
+    def __init__(self, engine: Optional[Engine] = None):
+        self._engine = engine
+        self._backend: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self) -> Engine:
+        return self._engine or get_engine()
+
+    def ensure_index(self) -> str:
+        """
+        Create the PostGIS index when available.
+
+        Returns:
+            Backend in use: 'postgis' or 'geohash'
+        """
+        if self._backend is not None:
+            return self._backend
+
+        with self._lock:
+            if self._backend is not None:
+                return self._backend
+
+            backend = 'geohash'
+            if self.engine.dialect.name == 'postgresql':
+                try:
+                    with self.engine.begin() as conn:
+                        has_postgis = conn.execute(
+                            text("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")
+                        ).first()
+                        if has_postgis:
+                            conn.execute(text(_PG_POSTGIS_INDEX))
+                            backend = 'postgis'
+                except SQLAlchemyError as exc:
+                    logger.warning("Índice PostGIS de leads indisponível, usando geohash: %s", exc)
+
+            if backend == 'geohash' and not self.check_geohash_ordering():
+                logger.error(
+                    "A collation do banco não ordena geohashes como esperado; "
+                    "consultas de proximidade podem não retornar leads"
+                )
+            self._backend = backend
+            return backend
+
+    def check_geohash_ordering(self) -> bool:
+        """
+        Ask the database whether it orders geohash strings the way the prefix ranges
+        assume, under its default collation (the one ``crm_leads.geohash`` uses).
+        """
+        pairs = _ordering_samples()
+        checks = ' AND '.join(
+            f"CAST(:a{i} AS VARCHAR) < CAST(:b{i} AS VARCHAR)" for i in range(len(pairs))
+        )
+        params: Dict[str, Any] = {}
+        for i, (smaller, larger) in enumerate(pairs):
+            params[f'a{i}'], params[f'b{i}'] = smaller, larger
+        try:
+            with self.engine.connect() as conn:
+                return bool(conn.execute(
+                    text(f"SELECT CASE WHEN {checks} THEN 1 ELSE 0 END"), params
+                ).scalar())
+        except SQLAlchemyError as exc:
+            logger.warning("Não foi possível verificar a ordenação de geohash: %s", exc)
+            return True
+
+    def rebuild_geohashes(self, batch_size: int = 1000) -> int:
+        """Recompute ``geohash`` for every lead; returns how many have coordinates."""
+        with self.engine.begin() as conn:
+            rows = conn.execute(text("SELECT id, latitude, longitude FROM crm_leads")).all()
+            updates = [
+                {'id': row.id, 'geohash': lead_geohash(row.latitude, row.longitude)}
+                for row in rows
+            ]
+            for start in range(0, len(updates), batch_size):
+                conn.execute(
+                    text("UPDATE crm_leads SET geohash = :geohash WHERE id = :id"),
+                    updates[start:start + batch_size],
+                )
+        return sum(1 for update in updates if update['geohash'])
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def nearby(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        user_id: Optional[int] = None,
+        status: Optional[str] = None,
+        limit: int = NEARBY_LIMIT,
+    ) -> List[Dict[str, Any]]:
+        """
+        Leads within ``radius_km`` of a point, closest first.
+
+        Returns:
+            ``[{'id', 'name', 'status', 'city', 'user_id', 'latitude', 'longitude', 'distance_km'}]``
+        """
+        latitude, longitude = validate_coordinates(latitude, longitude)
+        radius_km = float(radius_km)
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            raise ValueError(f'Raio deve estar entre 0 e {MAX_RADIUS_KM:g} km')
+        limit = max(1, min(int(limit), NEARBY_LIMIT_MAX))
+
+        if self.ensure_index() == 'postgis':
+            rows = self._query(
+                f"ST_DWithin({_PG_POINT}, ST_SetSRID(ST_MakePoint(:lng, :lat), 4326)::geography, :radius_m)",
+                {'lat': latitude, 'lng': longitude, 'radius_m': radius_km * 1000},
+                user_id, status,
+            )
+        else:
+            rows = self._query_box(*bounding_box(latitude, longitude, radius_km), user_id, status)
+
+        return self._rank_by_distance(rows, latitude, longitude, radius_km, limit)
+
+    def in_viewport(
+        self,
+        south: float,
+        west: float,
+        north: float,
+        east: float,
+        user_id: Optional[int] = None,
+        status: Optional[str] = None,
+        limit: int = VIEWPORT_LIMIT,
+    ) -> Dict[str, Any]:
+        """
+        Leads inside a map viewport (``west > east`` crosses the antimeridian).
+
+        Returns:
+            ``{'leads': [...points], 'truncated': bool}``; when more than ``limit`` leads
+            match, the ones closest to the viewport center are kept
+        """
+        south, west = validate_coordinates(south, west)
+        north, east = validate_coordinates(north, east)
+        if south > north:
+            raise ValueError('Limite sul maior que o norte')
+        limit = max(1, min(int(limit), VIEWPORT_LIMIT_MAX))
+
+        if self.ensure_index() == 'postgis':
+            boxes = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+            condition = ' OR '.join(
+                f"{_PG_POINT} && ST_MakeEnvelope(:west{i}, :south, :east{i}, :north, 4326)::geography"
+                for i in range(len(boxes))
+            )
+            params: Dict[str, Any] = {'south': south, 'north': north}
+            for i, (box_west, box_east) in enumerate(boxes):
+                params[f'west{i}'], params[f'east{i}'] = box_west, box_east
+            rows = self._query(f"({condition})", params, user_id, status)
+        else:
+            rows = self._query_box(south, west, north, east, user_id, status)
+
+        center_lat = (south + north) / 2
+        center_lng = (west + east) / 2 if west <= east else ((west + east + 360.0) / 2 + 180.0) % 360.0 - 180.0
+        truncated = len(rows) > limit
+        points = self._rank_by_distance(rows, center_lat, center_lng, None, limit)
+        return {'leads': points, 'truncated': truncated}
+
+    def _query_box(
+        self, south: float, west: float, north: float, east: float,
+        user_id: Optional[int], status: Optional[str],
+    ) -> List[Any]:
+        prefixes = geohash_cover(south, west, north, east)
+        params: Dict[str, Any] = {'south': south, 'north': north, 'west': west, 'east': east}
+        ranges = []
+        for i, prefix in enumerate(prefixes):
+            params[f'p{i}'] = prefix
+            upper = geohash_prefix_upper(prefix)
+            if upper is None:
+                ranges.append(f"(geohash >= :p{i})")
+                continue
+            params[f'q{i}'] = upper
+            ranges.append(f"(geohash >= :p{i} AND geohash < :q{i})")
+        lng_condition = (
+            "longitude BETWEEN :west AND :east" if west <= east
+            else "(longitude >= :west OR longitude <= :east)"
+        )
+        condition = f"({' OR '.join(ranges)}) AND latitude BETWEEN :south AND :north AND {lng_condition}"
+        return self._query(condition, params, user_id, status)
+
+    def _query(self, condition: str, params: Dict[str, Any], user_id: Optional[int], status: Optional[str]) -> List[Any]:
+        sql = f"SELECT {POINT_COLUMNS} FROM crm_leads WHERE {condition}"
+        if user_id:
+            sql += " AND user_id = :user_id"
+            params['user_id'] = user_id
+        if status:
+            sql += " AND status = :status"
+            params['status'] = status
+        with self.engine.connect() as conn:
+            return conn.execute(text(sql), params).all()
+
+    @staticmethod
+    def _rank_by_distance(
+        rows: Sequence[Any],
+        latitude: float,
+        longitude: float,
+        radius_km: Optional[float],
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        latitudes = np.fromiter((row.latitude for row in rows), dtype=float, count=len(rows))
+        longitudes = np.fromiter((row.longitude for row in rows), dtype=float, count=len(rows))
+        distances = haversine_km(latitude, longitude, latitudes, longitudes)
+
+        candidates = np.flatnonzero(distances <= radius_km) if radius_km is not None else np.arange(len(rows))
+        if len(candidates) > limit:
+            # Só os `limit` mais próximos precisam de ordenação completa
+            candidates = candidates[np.argpartition(distances[candidates], limit - 1)[:limit]]
+        order = candidates[np.argsort(distances[candidates], kind='stable')]
+        return [_point(rows[index], float(distances[index])) for index in order]
+
+
+def _point(row: Any, distance_km: float) -> Dict[str, Any]:
+    return {
+        'id': row.id,
+        'name': row.name,
+        'status': row.status,
+        'city': row.city,
+        'user_id': row.user_id,
+        'latitude': row.latitude,
+        'longitude': row.longitude,
+        'distance_km': round(distance_km, 3),
+    }
+
+
+__all__ = [
+    'LeadGeoService', 'geohash_encode', 'geohash_cover', 'lead_geohash', 'haversine_km', 'bounding_box',
+]
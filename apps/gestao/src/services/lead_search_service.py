@@ -0,0 +1,424 @@
+"""Lead search service - accent-insensitive fuzzy search over CRM leads.
+
+Every lead keeps ``crm_leads.search_text``: name, city, state, neighborhood, Instagram
+and phone digits, lowercased and without accents (normalized in Python, so both
+databases see the same text and no ``unaccent`` call is needed at query time).
+
+PostgreSQL: ``pg_trgm`` GIN index on ``search_text``, ranked by ``word_similarity``.
+SQLite: FTS5 ``trigram`` external-content table kept in sync by triggers; candidates
+sharing trigrams with the query are re-ranked in Python with the same score.
+Other dialects (or a database where migration 005 has not run) fall back to ``LIKE``
+on ``search_text``.
+
+The extension, index and triggers are created by migration 005 (``create_index``); at
+runtime the service only detects whether they exist.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..db import get_engine
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ('name', 'city', 'state', 'neighborhood', 'instagram', 'phone')
+TYPEAHEAD_LIMIT = 10
+# Candidatos por trigramas reavaliados em Python (SQLite)
+CANDIDATE_LIMIT = 500
+# Abaixo disso o termo é só ruído de trigramas em comum
+MIN_SIMILARITY = 0.3
+
+# Sem índice (migração 005 pendente) a detecção é refeita depois deste intervalo
+BACKEND_RECHECK_SECONDS = 300
+
+_PG_INDEX_NAME = 'ix_crm_leads_search_trgm'
+# CONCURRENTLY: leads stay writable while the GIN index is built
+_PG_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {_PG_INDEX_NAME} ON crm_leads USING GIN (search_text gin_trgm_ops)",
+]
+
+_PG_DETECT = f"""
+    SELECT to_regprocedure('word_similarity(text, text)') IS NOT NULL
+       AND EXISTS (
+           SELECT 1 FROM pg_index WHERE indisvalid AND indexrelid = to_regclass('{_PG_INDEX_NAME}')
+       )
+"""
+
+_SQLITE_SETUP = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS crm_leads_search USING fts5(
+        search_text,
+        content='crm_leads',
+        content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS crm_leads_search_ai AFTER INSERT ON crm_leads BEGIN
+        INSERT INTO crm_leads_search(rowid, search_text) VALUES (new.id, new.search_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS crm_leads_search_ad AFTER DELETE ON crm_leads BEGIN
+        INSERT INTO crm_leads_search(crm_leads_search, rowid, search_text)
+        VALUES ('delete', old.id, old.search_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS crm_leads_search_au AFTER UPDATE OF search_text ON crm_leads BEGIN
+        INSERT INTO crm_leads_search(crm_leads_search, rowid, search_text)
+        VALUES ('delete', old.id, old.search_text);
+        INSERT INTO crm_leads_search(rowid, search_text) VALUES (new.id, new.search_text);
+    END
+    """,
+]
+
+_NON_WORD_RE = re.compile(r'[^0-9a-z]+')
+_DIGIT_GAP_RE = re.compile(r'(?<=\d) (?=\d)')
+
+
+def normalize_search_text(value: Any) -> str:
+    """Lowercase, strip accents and punctuation: ``'Café São João!'`` -> ``'cafe sao joao'``."""
+    if value is None:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_WORD_RE.sub(' ', stripped.lower()).strip()
+
+
+def build_lead_search_text(lead: Any) -> str:
+    """``search_text`` for a lead (ORM object or dict)."""
+    get = lead.get if isinstance(lead, dict) else (lambda field: getattr(lead, field, None))
+    parts = []
+    for field in SEARCH_FIELDS:
+        value = get(field)
+        if not value:
+            continue
+        if field == 'phone':
+            value = re.sub(r'\D', '', str(value))
+        parts.append(normalize_search_text(value))
+    return ' '.join(part for part in parts if part)
+
+
+def trigrams(value: str) -> Set[str]:
+    """pg_trgm-style trigrams: each word padded with two leading and one trailing space."""
+    grams: Set[str] = set()
+    for word in value.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def match_score(query: str, search_text: str) -> float:
+    """
+    Rank of a lead for a normalized query.
+
+    Share of the query trigrams found in the lead (like ``word_similarity``) plus 1
+    when every query word appears verbatim, so exact substrings always rank first.
+    """
+    return _match_score(tuple(trigrams(query)), query.split(), search_text)
+
+
+def _match_score(query_grams: Sequence[str], tokens: Sequence[str], search_text: str) -> float:
+    if not query_grams or not search_text:
+        return 0.0
+    # Mesmo preenchimento de trigrams(): um trigrama da consulta está no texto sse é substring
+    padded = ''.join(f'  {word} ' for word in search_text.split())
+    score = sum(gram in padded for gram in query_grams) / len(query_grams)
+    if all(token in search_text for token in tokens):
+        score += 1.0
+    return score
+
+
+class LeadSearchService:
+    """
+    Ranked fuzzy lead search and typeahead.
+
+    The backend is detected on the first search and kept for the process; a missing
+    index (migration 005 not applied yet) is detected again every
+    ``BACKEND_RECHECK_SECONDS`` instead of pinning the process to ``LIKE``.
+    """
+
+    def __init__(self, engine: Optional[Engine] = None):
+        self._engine = engine
+        self._backend: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self) -> Engine:
+        return self._engine or get_engine()
+
+    # ------------------------------------------------------------------
+    # Index management
+    # ------------------------------------------------------------------
+
+    def create_index(self) -> str:
+        """
+        Create the search index for the current dialect (migration 005).
+
+        The PostgreSQL index is built with ``CREATE INDEX CONCURRENTLY`` on an
+        autocommit connection; an invalid index left by an interrupted build is
+        dropped and built again.
+
+        Returns:
+            Backend detected afterwards: 'postgres_trgm', 'sqlite_trigram' or 'like'
+        """
+        dialect = self.engine.dialect.name
+        try:
+            if dialect == 'postgresql':
+                with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                    invalid = conn.execute(
+                        text("SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(:name) AND NOT indisvalid"),
+                        {'name': _PG_INDEX_NAME},
+                    ).first()
+                    if invalid:
+                        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {_PG_INDEX_NAME}"))
+                    for statement in _PG_SETUP:
+                        conn.execute(text(statement))
+            elif dialect == 'sqlite':
+                with self.engine.begin() as conn:
+                    created = not self._sqlite_fts_exists(conn)
+                    for statement in _SQLITE_SETUP:
+                        conn.execute(text(statement))
+                    if created:
+                        conn.execute(text("INSERT INTO crm_leads_search(crm_leads_search) VALUES ('rebuild')"))
+        except SQLAlchemyError as exc:
+            logger.warning("Não foi possível criar o índice de busca de leads (%s): %s", dialect, exc)
+
+        with self._lock:
+            self._backend = None
+        return self.detect_backend()
+
+    def detect_backend(self) -> str:
+        """
+        Detect which search backend the database supports; never runs DDL.
+
+        Returns:
+            Backend in use: 'postgres_trgm', 'sqlite_trigram' or 'like'
+        """
+        if self._backend_is_fresh():
+            return self._backend
+
+        with self._lock:
+            if self._backend_is_fresh():
+                return self._backend
+
+            dialect = self.engine.dialect.name
+            backend = 'like'
+            try:
+                with self.engine.connect() as conn:
+                    if dialect == 'postgresql' and conn.execute(text(_PG_DETECT)).scalar():
+                        backend = 'postgres_trgm'
+                    elif dialect == 'sqlite' and self._sqlite_fts_exists(conn):
+                        backend = 'sqlite_trigram'
+            except SQLAlchemyError as exc:
+                logger.warning("Falha ao detectar o índice de busca de leads (%s): %s", dialect, exc)
+            if backend == 'like' and dialect in ('postgresql', 'sqlite'):
+                logger.warning(
+                    "Índice de busca de leads ausente (%s); usando LIKE até a migração 005 rodar",
+                    dialect,
+                )
+
+            self._backend = backend
+            self._checked_at = time.monotonic()
+            return backend
+
+    def _backend_is_fresh(self) -> bool:
+        if self._backend is None:
+            return False
+        return self._backend != 'like' or time.monotonic() - self._checked_at < BACKEND_RECHECK_SECONDS
+
+    def rebuild_index(self, batch_size: int = 1000) -> int:
+        """
+        Recompute every ``search_text`` and rebuild the SQLite FTS table if it exists.
+
+        Returns:
+            Number of leads updated
+        """
+        with self.engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, name, city, state, neighborhood, instagram, phone FROM crm_leads"
+            )).mappings().all()
+            updates = [{'id': row['id'], 'search_text': build_lead_search_text(dict(row))} for row in rows]
+            for start in range(0, len(updates), batch_size):
+                conn.execute(
+                    text("UPDATE crm_leads SET search_text = :search_text WHERE id = :id"),
+                    updates[start:start + batch_size],
+                )
+            if self.engine.dialect.name == 'sqlite' and self._sqlite_fts_exists(conn):
+                conn.execute(text("INSERT INTO crm_leads_search(crm_leads_search) VALUES ('rebuild')"))
+        return len(updates)
+
+    @staticmethod
+    def _sqlite_fts_exists(conn: Connection) -> bool:
+        row = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'crm_leads_search'")
+        ).first()
+        return row is not None
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(self, query: str, user_id: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Fuzzy search, best matches first.
+
+        Args:
+            query: Free text typed by the user (accents and case are ignored)
+            user_id: Restrict to the leads of this seller (optional)
+            limit: Maximum number of hits
+
+        Returns:
+            List of ``{'id', 'rank'}``
+        """
+        # "41 9999" -> "419999": telefones são indexados só com dígitos
+        normalized = _DIGIT_GAP_RE.sub('', normalize_search_text(query))
+        if not normalized:
+            return []
+
+        backend = self.detect_backend()
+        if backend == 'postgres_trgm':
+            return self._search_postgres(normalized, user_id, limit)
+        if backend == 'sqlite_trigram' and any(len(token) >= 3 for token in normalized.split()):
+            return self._search_sqlite(normalized, user_id, limit)
+        return self._search_like(normalized, user_id, limit)
+
+    def typeahead(self, query: str, user_id: Optional[int] = None, limit: int = TYPEAHEAD_LIMIT) -> List[Dict[str, Any]]:
+        """Top matches with the fields a suggestion list needs."""
+        hits = self.search(query, user_id=user_id, limit=limit)
+        if not hits:
+            return []
+
+        params = {f'id{i}': hit['id'] for i, hit in enumerate(hits)}
+        placeholders = ', '.join(f':{key}' for key in params)
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(f"SELECT id, name, city, country, status FROM crm_leads WHERE id IN ({placeholders})"),
+                params,
+            ).mappings().all()
+        by_id = {row['id']: dict(row) for row in rows}
+        return [
+            {**by_id[hit['id']], 'rank': hit['rank']}
+            for hit in hits
+            if hit['id'] in by_id
+        ]
+
+    def _search_postgres(self, query: str, user_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        tokens = query.split()
+        all_tokens = ' AND '.join(f'search_text LIKE :token{i}' for i in range(len(tokens)))
+        sql = f"""
+            SELECT id,
+                   word_similarity(:query, search_text)
+                     + CASE WHEN {all_tokens} THEN 1 ELSE 0 END AS rank
+            FROM crm_leads
+            WHERE (:query <% search_text OR ({all_tokens}))
+        """
+        params: Dict[str, Any] = {'query': query, 'limit': limit}
+        params.update({f'token{i}': f'%{token}%' for i, token in enumerate(tokens)})
+        if user_id:
+            sql += " AND user_id = :user_id"
+            params['user_id'] = user_id
+        sql += " ORDER BY rank DESC, updated_at DESC, id DESC LIMIT :limit"
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(sql), params).all()
+        return [{'id': row.id, 'rank': float(row.rank or 0)} for row in rows]
+
+    def _search_sqlite(self, query: str, user_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        # 1) Todas as palavras como substring (interseção no índice; corte pelos mais recentes, sem bm25)
+        tokens = [token for token in query.split() if len(token) >= 3]
+        exact = self._sqlite_candidates(' AND '.join(f'"{token}"' for token in tokens), user_id, ranked=False)
+        hits = self._rank(query, exact, limit)
+        if len(hits) >= limit:
+            return hits
+
+        # 2) Erros de digitação: leads com mais trigramas em comum (bm25) reavaliados em Python
+        fuzzy = self._sqlite_candidates(self._trigram_match_expression(query), user_id, ranked=True)
+        seen = {hit['id'] for hit in hits}
+        extra = self._rank(query, [row for row in fuzzy if row.id not in seen], limit - len(hits))
+        return hits + extra
+
+    def _sqlite_candidates(self, match: str, user_id: Optional[int], ranked: bool) -> List[Any]:
+        sql = """
+            SELECT l.id, l.search_text, l.updated_at
+            FROM crm_leads_search
+            JOIN crm_leads l ON l.id = crm_leads_search.rowid
+            WHERE crm_leads_search MATCH :match
+        """
+        params: Dict[str, Any] = {'match': match, 'limit': CANDIDATE_LIMIT}
+        if user_id:
+            sql += " AND l.user_id = :user_id"
+            params['user_id'] = user_id
+        # Ordem determinística antes do LIMIT: os mesmos candidatos sobrevivem ao corte
+        if ranked:
+            sql += " ORDER BY bm25(crm_leads_search), l.updated_at DESC, l.id DESC"
+        else:
+            sql += " ORDER BY l.updated_at DESC, l.id DESC"
+        sql += " LIMIT :limit"
+
+        with self.engine.connect() as conn:
+            return conn.execute(text(sql), params).all()
+
+    def _search_like(self, query: str, user_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        # Termos curtos (typeahead): cada palavra é início de alguma palavra do lead
+        tokens = query.split()
+        conditions = ' AND '.join(
+            f'(search_text LIKE :prefix{i} OR search_text LIKE :word_prefix{i})' for i in range(len(tokens))
+        )
+        sql = f"SELECT id, search_text, updated_at FROM crm_leads WHERE {conditions}"
+        params: Dict[str, Any] = {'limit': CANDIDATE_LIMIT}
+        for i, token in enumerate(tokens):
+            params[f'prefix{i}'] = f'{token}%'
+            params[f'word_prefix{i}'] = f'% {token}%'
+        if user_id:
+            sql += " AND user_id = :user_id"
+            params['user_id'] = user_id
+        sql += " ORDER BY updated_at DESC, id DESC LIMIT :limit"
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(sql), params).all()
+        return self._rank(query, rows, limit, min_similarity=0.0)
+
+    @staticmethod
+    def _rank(query: str, rows: Iterable[Any], limit: int, min_similarity: float = MIN_SIMILARITY) -> List[Dict[str, Any]]:
+        query_grams, tokens = tuple(trigrams(query)), query.split()
+        scored = [
+            (_match_score(query_grams, tokens, row.search_text or ''), str(row.updated_at or ''), row.id)
+            for row in rows
+        ]
+        scored = [item for item in scored if item[0] >= min_similarity]
+        scored.sort(reverse=True)
+        return [{'id': lead_id, 'rank': score} for score, _, lead_id in scored[:limit]]
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _trigram_match_expression(query: str) -> str:
+        """Any 3-char substring of the query tokens: ``"caf" OR "afe" OR ...``."""
+        grams = sorted({
+            token[i:i + 3]
+            for token in query.split()
+            for i in range(len(token) - 2)
+        })
+        return ' OR '.join(f'"{gram}"' for gram in grams)
+
+
+__all__ = [
+    'LeadSearchService', 'build_lead_search_text', 'normalize_search_text',
+    'match_score', 'trigrams',
+]
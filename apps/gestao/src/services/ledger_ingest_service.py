@@ -0,0 +1,391 @@
+"""Ledger ingest service - bulk load of the Financeiro/dados JSON ledgers.
+
+``lancamentos.json`` is stream-parsed (ijson when installed, incremental ``json`` decoding
+otherwise), deduplicated against ``transactions`` by a content hash and written with one
+bulk INSERT per chunk. ``pendentes.json`` marks rows still waiting for a category and
+``reconciliacoes.json`` links conta-corrente/caixinha pairs as transfers.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, IO, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..db import session_scope
+from ..models import Account, Category, Transaction
+from .ledger_rollup_service import LedgerRollupService
+
+# fonte -> (nome da conta, tipo, banco)
+SOURCE_ACCOUNTS: Dict[str, Tuple[str, str, Optional[str]]] = {
+    'conta-corrente': ('Nubank Conta Corrente', 'checking', 'Nubank'),
+    'cartao-credito': ('Nubank Cartão de Crédito', 'credit_card', 'Nubank'),
+    'caixinha': ('Caixinha', 'cash', None),
+}
+
+DEFAULT_CHUNK_SIZE = 500
+_READ_BLOCK_SIZE = 64 * 1024
+
+
+# -------------------------------------------------------------------------
+# Streaming JSON
+# -------------------------------------------------------------------------
+
+def iter_json_array(path: str, key: str, block_size: int = _READ_BLOCK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the objects of the top-level array ``key`` without loading the whole file.
+
+    Args:
+        path: JSON file (``{"version": ..., "<key>": [{...}, ...], ...}``)
+        key: Name of the array to iterate
+        block_size: Bytes read per refill when ijson is not available
+    """
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+
+    if ijson is not None:
+        with open(path, 'rb') as fp:
+            yield from ijson.items(fp, f'{key}.item', use_float=True)
+        return
+
+    with open(path, 'r', encoding='utf-8') as fp:
+        yield from _iter_json_array_stdlib(fp, key, block_size)
+
+
+def _iter_json_array_stdlib(fp: IO[str], key: str, block_size: int) -> Iterator[Dict[str, Any]]:
+    decoder = json.JSONDecoder()
+    marker = f'"{key}"'
+    buffer = ''
+    eof = False
+
+    def refill() -> bool:
+        nonlocal buffer, eof
+        block = fp.read(block_size)
+        if not block:
+            eof = True
+            return False
+        buffer += block
+        return True
+
+    # Localizar "<key>": [
+    while True:
+        idx = buffer.find(marker)
+        if idx >= 0:
+            buffer = buffer[idx + len(marker):]
+            break
+        buffer = buffer[-len(marker):]
+        if not refill():
+            return
+
+    pos = 0
+    expected = ':['
+    while expected:
+        while pos >= len(buffer):
+            if not refill():
+                raise ValueError(f'JSON truncado: array "{key}" não encontrado')
+        char = buffer[pos]
+        pos += 1
+        if char.isspace():
+            continue
+        if char != expected[0]:
+            raise ValueError(f'"{key}" não é um array JSON')
+        expected = expected[1:]
+
+    while True:
+        # Pular espaços e vírgulas entre objetos
+        while True:
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ','):
+                pos += 1
+            if pos < len(buffer) or not refill():
+                break
+        if pos >= len(buffer):
+            raise ValueError(f'JSON truncado no array "{key}"')
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Objeto incompleto no buffer: compactar e ler mais
+            buffer = buffer[pos:]
+            pos = 0
+            if not refill():
+                raise
+            continue
+
+        yield item
+        pos = end
+
+
+def _chunks(items: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# -------------------------------------------------------------------------
+# Content hash
+# -------------------------------------------------------------------------
+
+def content_hash(account_id: int, txn_date: date, amount: Any, description: Optional[str]) -> str:
+    """Hash of the fields import_ofx already uses to detect duplicates."""
+    normalized = ' '.join((description or '').split()).lower()
+    value = Decimal(str(amount or 0)).quantize(Decimal('0.01'))
+    raw = f'{account_id}|{txn_date.isoformat()}|{value}|{normalized}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class LedgerIngestService:
+    """Bulk loader for the JSON ledgers kept under ``Financeiro/dados``."""
+
+    def __init__(
+        self,
+        rollup_service: Optional[LedgerRollupService] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        self.rollups = rollup_service or LedgerRollupService()
+        self.chunk_size = chunk_size
+        self._account_ids: Dict[str, int] = {}
+        self._category_ids: Dict[str, int] = {}
+
+    # ------------------------------------------------------------------
+    # Entry point
+    # ------------------------------------------------------------------
+
+    def ingest_directory(self, data_dir: str) -> Dict[str, Any]:
+        """
+        Ingest ``lancamentos.json`` (+ ``pendentes.json`` / ``reconciliacoes.json`` when present).
+
+        Returns:
+            Report with counts, elapsed seconds and rows/s throughput
+        """
+        started = time.perf_counter()
+        pending_path = os.path.join(data_dir, 'pendentes.json')
+        reconciliations_path = os.path.join(data_dir, 'reconciliacoes.json')
+
+        pending_ids: Set[str] = set()
+        if os.path.exists(pending_path):
+            pending_ids = {
+                item['lancamento_id']
+                for item in iter_json_array(pending_path, 'pendentes')
+                if item.get('lancamento_id')
+            }
+
+        report = self.ingest_ledger(os.path.join(data_dir, 'lancamentos.json'), pending_ids)
+
+        report['transfers_linked'] = 0
+        if os.path.exists(reconciliations_path):
+            report['transfers_linked'] = self.link_reconciliations(
+                reconciliations_path, report.pop('source_ids')
+            )
+        else:
+            report.pop('source_ids')
+
+        elapsed = time.perf_counter() - started
+        report['pending'] = len(pending_ids)
+        report['elapsed_seconds'] = elapsed
+        report['rows_per_second'] = report['read'] / elapsed if elapsed > 0 else 0.0
+        return report
+
+    def ingest_ledger(self, path: str, pending_ids: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """Stream ``lancamentos.json`` into ``transactions``, one DB transaction per chunk."""
+        pending_ids = pending_ids or set()
+        report: Dict[str, Any] = {'read': 0, 'inserted': 0, 'duplicates': 0, 'skipped': 0, 'chunks': 0}
+        source_ids: Dict[str, int] = {}
+
+        for chunk in _chunks(iter_json_array(path, 'lancamentos'), self.chunk_size):
+            with session_scope() as session:
+                self._ingest_chunk(session, chunk, pending_ids, report, source_ids)
+            report['read'] += len(chunk)
+            report['chunks'] += 1
+
+        report['source_ids'] = source_ids
+        return report
+
+    # ------------------------------------------------------------------
+    # Chunk processing
+    # ------------------------------------------------------------------
+
+    def _ingest_chunk(
+        self,
+        session: Session,
+        chunk: List[Dict[str, Any]],
+        pending_ids: Set[str],
+        report: Dict[str, Any],
+        source_ids: Dict[str, int],
+    ) -> None:
+        # Backfill do rollup antes de inserir, para não contar as linhas novas duas vezes
+        self.rollups.ensure_built(session)
+
+        rows: List[Tuple[str, str, Dict[str, Any]]] = []
+        for item in chunk:
+            row = self._map_item(session, item, pending_ids)
+            if row is None:
+                report['skipped'] += 1
+                continue
+            digest = content_hash(row['account_id'], row['date'], row['amount'], row['description'])
+            rows.append((item.get('id') or '', digest, row))
+
+        if not rows:
+            return
+
+        existing = self._existing_hashes(session, [row for _, _, row in rows])
+
+        new_rows: List[Dict[str, Any]] = []
+        new_sources: List[str] = []
+        for source_id, digest, row in rows:
+            matches = existing.get(digest)
+            if matches:
+                # Mesmo conteúdo já no ledger: consome uma ocorrência (lançamentos idênticos legítimos)
+                existing_id = matches.pop()
+                if source_id:
+                    source_ids[source_id] = existing_id
+                report['duplicates'] += 1
+                continue
+            new_rows.append(row)
+            new_sources.append(source_id)
+
+        if not new_rows:
+            return
+
+        inserted_ids = session.scalars(
+            insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True),
+            new_rows,
+        ).all()
+
+        deltas: Dict = {}
+        for source_id, txn_id, row in zip(new_sources, inserted_ids, new_rows):
+            if source_id:
+                source_ids[source_id] = txn_id
+            self.rollups.accumulate(deltas, Transaction(**row))
+        self.rollups.apply_deltas(session, deltas)
+        report['inserted'] += len(new_rows)
+
+    def _existing_hashes(self, session: Session, rows: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+        """Hash -> ids of ledger rows in the chunk's accounts and date window (one query)."""
+        account_ids = {row['account_id'] for row in rows}
+        dates = [row['date'] for row in rows]
+        existing = (
+            session.query(Transaction.id, Transaction.account_id, Transaction.date,
+                          Transaction.amount, Transaction.description)
+            .filter(
+                Transaction.account_id.in_(account_ids),
+                Transaction.date >= min(dates),
+                Transaction.date <= max(dates),
+            )
+            .all()
+        )
+        hashes: Dict[str, List[int]] = defaultdict(list)
+        for txn_id, account_id, txn_date, amount, description in existing:
+            hashes[content_hash(account_id, txn_date, amount, description)].append(txn_id)
+        return hashes
+
+    def _map_item(self, session: Session, item: Dict[str, Any], pending_ids: Set[str]) -> Optional[Dict[str, Any]]:
+        try:
+            txn_date = date.fromisoformat(item['data'])
+            amount = Decimal(str(item['valor']))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        description = item.get('descricao_original') or item.get('descricao') or ''
+        code = item.get('categoria')
+        category_id = None
+        if code and item.get('id') not in pending_ids:
+            category_id = self._category_id(session, code)
+
+        if code and code.startswith('OP_'):
+            txn_type = 'transfer'
+        else:
+            txn_type = 'revenue' if amount > 0 else 'expense'
+
+        return {
+            'account_id': self._account_id(session, item.get('fonte') or 'conta-corrente'),
+            'date': txn_date,
+            'description': description,
+            'original_description': description,
+            'amount': amount,
+            'type': txn_type,
+            'category_id': category_id,
+        }
+
+    def _account_id(self, session: Session, source: str) -> int:
+        if source in self._account_ids:
+            return self._account_ids[source]
+
+        name, account_type, bank_name = SOURCE_ACCOUNTS.get(source, (source, 'checking', None))
+        account = session.query(Account).filter(Account.name == name).first()
+        if account is None:
+            account = Account(name=name, type=account_type, bank_name=bank_name)
+            session.add(account)
+            session.flush()
+        self._account_ids[source] = account.id
+        return account.id
+
+    def _category_id(self, session: Session, code: str) -> int:
+        if code in self._category_ids:
+            return self._category_ids[code]
+
+        category = session.query(Category).filter(Category.name == code).first()
+        if category is None:
+            if code.startswith('REC_'):
+                category_type = 'revenue'
+            elif code.startswith('OP_'):
+                category_type = 'transfer'
+            else:
+                category_type = 'expense'
+            category = Category(name=code, type=category_type)
+            session.add(category)
+            session.flush()
+        self._category_ids[code] = category.id
+        return category.id
+
+    # ------------------------------------------------------------------
+    # Reconciliations
+    # ------------------------------------------------------------------
+
+    def link_reconciliations(self, path: str, source_ids: Dict[str, int]) -> int:
+        """Link reconciled conta/caixinha pairs as transfers (transfer_id on both sides)."""
+        linked = 0
+        with session_scope() as session:
+            deltas: Dict = {}
+            for item in iter_json_array(path, 'reconciliacoes'):
+                first_id = source_ids.get(item.get('lancamento_conta'))
+                second_id = source_ids.get(item.get('lancamento_caixinha'))
+                if not first_id or not second_id:
+                    continue
+
+                first = session.get(Transaction, first_id)
+                second = session.get(Transaction, second_id)
+                if not first or not second or first.transfer_id == second.id:
+                    continue
+
+                self.rollups.accumulate(deltas, first, sign=-1)
+                self.rollups.accumulate(deltas, second, sign=-1)
+                first.transfer_id = second.id
+                second.transfer_id = first.id
+                first.type = 'transfer'
+                second.type = 'transfer'
+                self.rollups.accumulate(deltas, first)
+                self.rollups.accumulate(deltas, second)
+                linked += 1
+
+            self.rollups.apply_deltas(session, deltas)
+        return linked
+
+
+__all__ = ['LedgerIngestService', 'content_hash', 'iter_json_array']
@@ -0,0 +1,333 @@
+"""Ledger rollup service - monthly pre-aggregated totals for DRE and dashboards."""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, case, cast, extract, func, insert, update
+from sqlalchemy.orm import Session
+
+from ..db import session_scope
+from ..models import Category, LedgerMonthlyRollup, Transaction
+
+# (account_id, category_id, year, month, type)
+RollupKey = Tuple[int, Optional[int], int, int, str]
+RollupDeltas = Dict[RollupKey, List[Any]]
+# Colunas dos índices únicos ux_ledger_rollups_key / ux_ledger_rollups_uncategorized_key
+ROLLUP_KEY_COLUMNS = ('account_id', 'category_id', 'year', 'month', 'type')
+UNCATEGORIZED_KEY_COLUMNS = ('account_id', 'year', 'month', 'type')
+
+
+class LedgerRollupService:
+    """
+    Maintains ``ledger_monthly_rollups`` (account x category x month x type -> sum, count).
+
+    Write paths accumulate deltas for the transactions they touch and apply them in
+    the same session, so the rollup commits or rolls back together with the ledger.
+    """
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def rollup_key(transaction: Transaction) -> Optional[RollupKey]:
+        """Return the rollup bucket of a transaction, or None if it cannot be placed."""
+        txn_date = transaction.date
+        if isinstance(txn_date, str):
+            txn_date = date.fromisoformat(txn_date)
+        elif isinstance(txn_date, datetime):
+            txn_date = txn_date.date()
+        if not txn_date or not transaction.account_id or not transaction.type:
+            return None
+        return (
+            int(transaction.account_id),
+            int(transaction.category_id) if transaction.category_id else None,
+            txn_date.year,
+            txn_date.month,
+            transaction.type,
+        )
+
+    def accumulate(self, deltas: RollupDeltas, transaction: Transaction, sign: int = 1) -> None:
+        """Add (sign=1) or remove (sign=-1) a transaction from a pending delta map."""
+        key = self.rollup_key(transaction)
+        if key is None:
+            return
+        amount = Decimal(str(transaction.amount or 0))
+        bucket = deltas.setdefault(key, [Decimal('0'), 0])
+        bucket[0] += amount * sign
+        bucket[1] += sign
+
+    def apply_deltas(self, session: Session, deltas: RollupDeltas) -> None:
+        """
+        Merge pending deltas into the rollup table, dropping buckets that become empty.
+
+        Each bucket is one atomic ``INSERT ... ON CONFLICT DO UPDATE SET total_amount =
+        total_amount + excluded.total_amount`` on its unique key, so concurrent writers
+        add to the same row instead of overwriting each other's read-modify-write.
+        """
+        now = datetime.utcnow()
+        rows = [
+            {
+                'account_id': account_id,
+                'category_id': category_id,
+                'year': year,
+                'month': month,
+                'type': txn_type,
+                'total_amount': amount,
+                'transaction_count': count,
+                'updated_at': now,
+            }
+            for (account_id, category_id, year, month, txn_type), (amount, count) in deltas.items()
+            if amount or count
+        ]
+        if not rows:
+            return
+
+        categorized = [row for row in rows if row['category_id'] is not None]
+        uncategorized = [row for row in rows if row['category_id'] is None]
+        dialect_insert = self._dialect_insert(session)
+        if dialect_insert is None:
+            for row in rows:
+                self._add_delta(session, row)
+        else:
+            table = LedgerMonthlyRollup.__table__
+            for batch, elements, where in (
+                (categorized, ROLLUP_KEY_COLUMNS, table.c.category_id.isnot(None)),
+                (uncategorized, UNCATEGORIZED_KEY_COLUMNS, table.c.category_id.is_(None)),
+            ):
+                if not batch:
+                    continue
+                statement = dialect_insert(table)
+                session.execute(statement.on_conflict_do_update(
+                    index_elements=list(elements),
+                    index_where=where,
+                    set_={
+                        'total_amount': table.c.total_amount + statement.excluded.total_amount,
+                        'transaction_count': table.c.transaction_count + statement.excluded.transaction_count,
+                        'updated_at': statement.excluded.updated_at,
+                    },
+                ), batch)
+
+        # Buckets esvaziados (ou nunca existentes, vindos só de remoções)
+        session.query(LedgerMonthlyRollup).filter(
+            LedgerMonthlyRollup.transaction_count <= 0,
+            LedgerMonthlyRollup.account_id.in_({row['account_id'] for row in rows}),
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def _dialect_insert(session: Session):
+        dialect = session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            dialect_insert = None
+        return dialect_insert
+
+    @staticmethod
+    def _add_delta(session: Session, row: Dict[str, Any]) -> None:
+        """Fallback without ON CONFLICT: atomic UPDATE ... SET total = total + delta, else INSERT."""
+        table = LedgerMonthlyRollup.__table__
+        key_filter = [table.c[column] == row[column] for column in UNCATEGORIZED_KEY_COLUMNS]
+        if row['category_id'] is None:
+            key_filter.append(table.c.category_id.is_(None))
+        else:
+            key_filter.append(table.c.category_id == row['category_id'])
+        result = session.execute(
+            update(table).where(*key_filter).values(
+                total_amount=table.c.total_amount + row['total_amount'],
+                transaction_count=table.c.transaction_count + row['transaction_count'],
+                updated_at=row['updated_at'],
+            )
+        )
+        if not result.rowcount:
+            session.execute(insert(table).values(**row))
+
+    def ensure_built(self, session: Session) -> None:
+        """Backfill the rollup on first use when the ledger already has rows."""
+        if session.query(LedgerMonthlyRollup.id).first() is not None:
+            return
+        if session.query(Transaction.id).first() is None:
+            return
+        self._rebuild(session)
+
+    # ------------------------------------------------------------------
+    # Rebuild
+    # ------------------------------------------------------------------
+
+    def rebuild(self, year: Optional[int] = None) -> int:
+        """
+        Recompute the rollup from the ledger with a single INSERT ... SELECT ... GROUP BY.
+
+        Args:
+            year: Only rebuild this year (default: everything)
+
+        Returns:
+            Number of rollup rows written
+        """
+        with session_scope() as session:
+            return self._rebuild(session, year)
+
+    def _rebuild(self, session: Session, year: Optional[int] = None) -> int:
+        delete_query = session.query(LedgerMonthlyRollup)
+        if year is not None:
+            delete_query = delete_query.filter(LedgerMonthlyRollup.year == year)
+        delete_query.delete(synchronize_session=False)
+
+        year_col = cast(extract('year', Transaction.date), Integer)
+        month_col = cast(extract('month', Transaction.date), Integer)
+        select_stmt = (
+            session.query(
+                Transaction.account_id,
+                Transaction.category_id,
+                year_col,
+                month_col,
+                Transaction.type,
+                func.coalesce(func.sum(Transaction.amount), 0),
+                func.count(Transaction.id),
+                func.current_timestamp(),
+            )
+            .group_by(Transaction.account_id, Transaction.category_id, year_col, month_col, Transaction.type)
+        )
+        if year is not None:
+            select_stmt = select_stmt.filter(
+                Transaction.date >= date(year, 1, 1),
+                Transaction.date <= date(year, 12, 31),
+            )
+
+        result = session.execute(
+            insert(LedgerMonthlyRollup).from_select(
+                [
+                    'account_id', 'category_id', 'year', 'month', 'type',
+                    'total_amount', 'transaction_count', 'updated_at',
+                ],
+                select_stmt.statement,
+            )
+        )
+        return int(result.rowcount or 0)
+
+    # ------------------------------------------------------------------
+    # Read API
+    # ------------------------------------------------------------------
+
+    def get_monthly_result(self, year: int, month: int, account_id: Optional[int] = None) -> Dict[str, float]:
+        """Revenue, expense and result (DRE) for one month."""
+        with session_scope() as session:
+            self.ensure_built(session)
+            query = session.query(
+                LedgerMonthlyRollup.type,
+                func.sum(LedgerMonthlyRollup.total_amount),
+            ).filter(
+                LedgerMonthlyRollup.year == year,
+                LedgerMonthlyRollup.month == month,
+                LedgerMonthlyRollup.type.in_(('revenue', 'expense')),
+            )
+            if account_id:
+                query = query.filter(LedgerMonthlyRollup.account_id == account_id)
+            totals = {txn_type: float(total or 0) for txn_type, total in query.group_by(LedgerMonthlyRollup.type)}
+
+        revenue = totals.get('revenue', 0.0)
+        expense = totals.get('expense', 0.0)
+        # Expenses are stored with negative amounts (OFX sign), so the sum is the result
+        return {'revenue': revenue, 'expense': expense, 'result': revenue + expense}
+
+    def get_year_over_year(self, year: int, month: int, account_id: Optional[int] = None) -> Dict[str, Any]:
+        """Compare one month against the same month of the previous year."""
+        current = self.get_monthly_result(year, month, account_id)
+        previous = self.get_monthly_result(year - 1, month, account_id)
+
+        def _variation(now: float, before: float) -> Optional[float]:
+            if not before:
+                return None
+            return (now - before) / abs(before) * 100
+
+        return {
+            'current': current,
+            'previous': previous,
+            'variation': {key: _variation(current[key], previous[key]) for key in current},
+        }
+
+    def get_category_breakdown(
+        self,
+        year: int,
+        month: Optional[int] = None,
+        account_id: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Totals per category and type for a month (or a whole year when month is None)."""
+        with session_scope() as session:
+            self.ensure_built(session)
+            query = (
+                session.query(
+                    LedgerMonthlyRollup.category_id,
+                    Category.name,
+                    LedgerMonthlyRollup.type,
+                    func.sum(LedgerMonthlyRollup.total_amount).label('total'),
+                    func.sum(LedgerMonthlyRollup.transaction_count).label('count'),
+                )
+                .outerjoin(Category, Category.id == LedgerMonthlyRollup.category_id)
+                .filter(LedgerMonthlyRollup.year == year)
+            )
+            if month is not None:
+                query = query.filter(LedgerMonthlyRollup.month == month)
+            if account_id:
+                query = query.filter(LedgerMonthlyRollup.account_id == account_id)
+
+            rows = (
+                query
+                .group_by(LedgerMonthlyRollup.category_id, Category.name, LedgerMonthlyRollup.type)
+                .order_by(func.sum(LedgerMonthlyRollup.total_amount))
+                .all()
+            )
+            return [
+                {
+                    'category_id': category_id,
+                    'category_name': name or 'Sem Categoria',
+                    'type': txn_type,
+                    'total': float(total or 0),
+                    'count': int(count or 0),
+                }
+                for category_id, name, txn_type, total, count in rows
+            ]
+
+    def get_monthly_totals(
+        self,
+        year: int,
+        account_id: Optional[int] = None,
+        credit_types: Tuple[str, ...] = ('revenue',),
+        debit_types: Tuple[str, ...] = ('expense',),
+    ) -> List[Dict[str, Any]]:
+        """Per-month credit/debit totals for a year, read from the rollup."""
+        with session_scope() as session:
+            self.ensure_built(session)
+            query = session.query(
+                LedgerMonthlyRollup.month,
+                func.sum(case(
+                    (LedgerMonthlyRollup.type.in_(credit_types), LedgerMonthlyRollup.total_amount),
+                    else_=0,
+                )).label('total_credits'),
+                func.sum(case(
+                    (LedgerMonthlyRollup.type.in_(debit_types), LedgerMonthlyRollup.total_amount),
+                    else_=0,
+                )).label('total_debits'),
+                func.sum(LedgerMonthlyRollup.transaction_count).label('total_transactions'),
+            ).filter(LedgerMonthlyRollup.year == year)
+            if account_id:
+                query = query.filter(LedgerMonthlyRollup.account_id == account_id)
+
+            rows = query.group_by(LedgerMonthlyRollup.month).order_by(LedgerMonthlyRollup.month).all()
+            return [
+                {
+                    'month': int(row.month),
+                    'total_credits': float(row.total_credits or 0),
+                    'total_debits': float(row.total_debits or 0),
+                    'total_transactions': int(row.total_transactions or 0),
+                }
+                for row in rows
+            ]
+
+
+__all__ = ['LedgerRollupService']
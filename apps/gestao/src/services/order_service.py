@@ -3,18 +3,21 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from decimal import Decimal, ROUND_HALF_UP
 
 from sqlalchemy.orm import joinedload
 
 from ..db import session_scope
 from ..models import Order, OrderItem, CRMLead, CRMUser
+from .data_purge import PurgeReport, purge_orders, reset_orders_and_leads
+from .data_versions import ORDERS, bump_data_version
+from .sales_cube_service import SalesCubeService
 
 
 class OrderService:
-    def __init__(self):
-        pass
+    def __init__(self, sales_cube: Optional[SalesCubeService] = None):
+        self.sales_cube = sales_cube or SalesCubeService()
 
     def list_orders(
         self,
@@ -68,6 +71,11 @@ class OrderService:
             return self._serialize_order(order, include_items=True)
 
     def create_order(self, data: Dict[str, Any], items: List[Dict[str, Any]]) -> int:
+        order_id, order_date = self._create_order(data, items)
+        self._refresh_sales_cube([order_date])
+        return order_id
+
+    def _create_order(self, data: Dict[str, Any], items: List[Dict[str, Any]]) -> Tuple[int, date]:
         if not items:
             raise ValueError('Pedido precisa de pelo menos um item')
 
@@ -94,8 +102,9 @@ class OrderService:
 
             order.total_amount = self._apply_items(order, items)
             order_id = order.id
+            bump_data_version(session, ORDERS)
 
-        return order_id
+        return order_id, order_date
 
     def update_order(self, order_id: int, data: Dict[str, Any], items: List[Dict[str, Any]]) -> None:
         if not items:
@@ -112,6 +121,7 @@ class OrderService:
             if not order:
                 raise ValueError('Pedido não encontrado')
 
+            previous_date = order.order_date
             order.lead_id = data.get('lead_id')
             order.client_id = data.get('client_id')
             order.user_id = data.get('user_id')
@@ -123,6 +133,9 @@ class OrderService:
             # Clear existing items (delete-orphan ensures DB sync)
             order.items[:] = []
             order.total_amount = self._apply_items(order, items)
+            bump_data_version(session, ORDERS)
+
+        self._refresh_sales_cube([previous_date, order_date])
 
     def update_payment(
         self,
@@ -176,6 +189,10 @@ class OrderService:
 
             order.user_id = user_id
             order.updated_at = datetime.utcnow()
+            order_date = order.order_date
+            bump_data_version(session, ORDERS)  # muda o recorte por vendedor
+
+        self._refresh_sales_cube([order_date])
 
     def order_exists(self, lead_id: int, order_date: Optional[date], total_amount: float) -> bool:
         with session_scope() as session:
@@ -188,21 +205,36 @@ class OrderService:
             return query.first() is not None
 
     def delete_order(self, order_id: int) -> None:
+        order_date = None
         with session_scope() as session:
             order = session.get(Order, order_id)
             if order:
+                order_date = order.order_date
                 session.delete(order)
+                bump_data_version(session, ORDERS)
+
+        self._refresh_sales_cube([order_date])
 
-    def delete_all_orders(self) -> int:
-        """Delete all orders and their items. Returns count of deleted orders."""
+    def delete_all_orders(self) -> PurgeReport:
+        """Delete all orders with their items and commissions. Returns the per-table counts."""
         with session_scope() as session:
-            count = session.query(Order).count()
-            session.query(Order).delete()
-            return count
+            report = purge_orders(session)
+
+        self.sales_cube.clear()
+        return report
+
+    def reset_orders_and_leads(self) -> PurgeReport:
+        """Delete every order and lead (and their children) in a single transaction."""
+        with session_scope() as session:
+            report = reset_orders_and_leads(session)
+
+        self.sales_cube.clear()
+        return report
 
     def import_simple_orders(self, rows: List[Dict[str, Any]], default_coffee_id: int, *, source: str = 'import_planilha') -> Dict[str, int]:
         created = 0
         skipped = 0
+        imported_dates = set()
         for row in rows:
             try:
                 order_date = row.get('order_month') or row.get('order_date')
@@ -220,7 +252,7 @@ class OrderService:
 
             unit_price = value / quantity if quantity else value
             try:
-                self.create_order(
+                _, imported_date = self._create_order(
                     {
                         'lead_id': lead_id,
                         'order_date': order_date,
@@ -239,11 +271,25 @@ class OrderService:
                     ]
                 )
                 created += 1
+                imported_dates.add(imported_date)
             except ValueError:
                 skipped += 1
 
+        # Uma atualização do cubo por mês importado, não por pedido
+        self._refresh_sales_cube(imported_dates)
         return {'created': created, 'skipped': skipped}
 
+    def _refresh_sales_cube(self, order_dates) -> None:
+        """Refresh the touched cube months (bumping ``ORDERS`` again); on failure force a rebuild."""
+        try:
+            self.sales_cube.refresh_months(order_dates)
+        except Exception as exc:
+            print(f"⚠️ Falha ao atualizar cubo de vendas: {exc}")
+            try:
+                self.sales_cube.invalidate()
+            except Exception:
+                pass
+
     def _serialize_order(self, order: Order, *, include_items: bool) -> Dict[str, Any]:
         data = {
             'id': order.id,
@@ -0,0 +1,285 @@
+"""Sales cube service - monthly pre-aggregated order items for the B2B dashboard."""
+
+from __future__ import annotations
+
+import calendar
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import Session
+
+from ..b2b.sales_repository import SalesRepository
+from ..db import get_engine, session_scope
+from ..models import CURRENCIES, CRMLead, SalesCubeCell
+from .data_versions import (
+    EXCHANGE_RATES, ORDERS, SALES_CUBE_RATES, bump_data_version, get_data_version, set_data_version,
+)
+from .exchange_rate_service import ExchangeRateService
+
+CUBE_DIMENSIONS = ['month', 'lead_id', 'client_id', 'user_id', 'product', 'currency']
+# Chave do pg_advisory_xact_lock que serializa as escritas no cubo entre workers
+CUBE_LOCK_KEY = 0x5A1E5C0B
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _month_end(value: date) -> date:
+    return date(value.year, value.month, calendar.monthrange(value.year, value.month)[1])
+
+
+@contextmanager
+def _cube_transaction() -> Iterator[Session]:
+    """
+    Writer transaction on its own session, not the thread's scoped one: the aggregation
+    reads through ``session_scope`` while the cube lock is held, and would otherwise
+    commit (and release) it early.
+    """
+    session = Session(bind=get_engine(), expire_on_commit=False)
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+class SalesCubeService:
+    """
+    Maintains ``sales_cube`` (target currency x month x lead/client x seller x product x
+    native currency -> revenue, quantity, item and order counts, first/last order date).
+
+    Order writes refresh only the months they touch, after their own commit. Every cube
+    write bumps ``ORDERS`` again in its own transaction: a dashboard read between the
+    order commit and the refresh may cache pre-refresh cube data under the order's
+    version, and the second bump retires that entry. Values in
+    the target currency depend on exchange rates, so the cube is rebuilt when the rate
+    generation differs from the one it was built with.
+
+    Cells have nullable dimensions, so there is no unique key to upsert on: every write
+    replaces its months under a cube-wide lock and aggregates only after taking it, so
+    concurrent order saves cannot both insert (and double-count) the same month.
+    """
+
+    def __init__(
+        self,
+        exchange_rate_service: Optional[ExchangeRateService] = None,
+        target_currencies: Iterable[str] = CURRENCIES,
+    ):
+        self.exchange_rate_service = exchange_rate_service or ExchangeRateService()
+        self.target_currencies = tuple(currency.upper() for currency in target_currencies)
+
+    def supports(self, target_currency: Optional[str]) -> bool:
+        return (target_currency or 'BRL').upper() in self.target_currencies
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def refresh_months(self, months: Iterable[Optional[date]]) -> int:
+        """
+        Recompute the cube rows of the given months (e.g. old and new order dates).
+
+        Returns:
+            Number of cube rows written
+        """
+        starts = sorted({month_start(value) for value in months if value})
+        if not starts:
+            return 0
+
+        with _cube_transaction() as session:
+            self._lock(session)
+            session.query(SalesCubeCell).filter(SalesCubeCell.month.in_(starts)).delete(synchronize_session=False)
+            rates_generation = self._reload_rates()
+            cells = [
+                self._aggregate(target, start, _month_end(start))
+                for target in self.target_currencies
+                for start in starts
+            ]
+            written = self._insert(session, cells)
+            if get_data_version(SALES_CUBE_RATES, session) != rates_generation + 1:
+                # Estes meses usaram outra geração de câmbio que o resto do cubo
+                set_data_version(session, SALES_CUBE_RATES, 0)
+            bump_data_version(session, ORDERS)
+            return written
+
+    def rebuild(self) -> int:
+        """Recompute the whole cube from orders and record the rate generation used."""
+        with _cube_transaction() as session:
+            self._lock(session)
+            session.query(SalesCubeCell).delete(synchronize_session=False)
+            rates_generation = self._reload_rates()
+            cells = [self._aggregate(target) for target in self.target_currencies]
+            written = self._insert(session, cells)
+            set_data_version(session, SALES_CUBE_RATES, rates_generation + 1)
+            bump_data_version(session, ORDERS)
+        return written
+
+    def invalidate(self) -> None:
+        """Force a full rebuild on the next read (e.g. after a failed refresh)."""
+        with session_scope() as session:
+            set_data_version(session, SALES_CUBE_RATES, 0)
+            bump_data_version(session, ORDERS)
+
+    def clear(self) -> None:
+        with session_scope() as session:
+            self._lock(session)
+            session.query(SalesCubeCell).delete(synchronize_session=False)
+            bump_data_version(session, ORDERS)
+
+    def ensure_current(self) -> None:
+        """Build on first use, and rebuild after exchange-rate changes."""
+        with session_scope() as session:
+            synced = get_data_version(SALES_CUBE_RATES, session)
+            current = get_data_version(EXCHANGE_RATES, session)
+        if synced != current + 1:
+            print("🔧 Reconstruindo cubo de vendas (primeiro uso ou câmbio alterado)...")
+            self.rebuild()
+
+    @staticmethod
+    def _lock(session) -> None:
+        """
+        Serialize cube writers until the transaction ends.
+
+        PostgreSQL takes a transaction-level advisory lock; on SQLite the ``DELETE``
+        that follows already holds the database write lock.
+        """
+        if session.get_bind().dialect.name == 'postgresql':
+            session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': CUBE_LOCK_KEY})
+
+    def _reload_rates(self) -> int:
+        """Reload the rate timeline now and return the generation the cube is built with."""
+        rate_cache = getattr(self.exchange_rate_service, 'rate_cache', None)
+        if rate_cache is None:
+            return get_data_version(EXCHANGE_RATES)
+        return rate_cache.reload()
+
+    def _aggregate(
+        self,
+        target_currency: str,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> pd.DataFrame:
+        repository = SalesRepository(
+            exchange_rate_service=self.exchange_rate_service,
+            target_currency=target_currency,
+        )
+        frame = repository.fetch_sales_dataframe(start_date=start_date, end_date=end_date)
+        if frame.empty:
+            return pd.DataFrame()
+
+        # Chaves originais (client_id do frame vira "L12"/"C3")
+        raw = frame[['lead_id']].copy()
+        raw['client_id'] = frame['source_client_id']
+        raw['month'] = frame['date'].dt.to_period('M').dt.start_time.dt.date
+        raw['user_id'] = frame['user_id']
+        raw['product'] = frame['product']
+        raw['currency'] = frame['moeda']
+
+        cells = pd.concat([raw, frame[['valor', 'valor_original', 'quantidade', 'item_id', 'order_id', 'date']]], axis=1)
+        grouped = cells.groupby(CUBE_DIMENSIONS, dropna=False).agg(
+            revenue=('valor', 'sum'),
+            revenue_native=('valor_original', 'sum'),
+            quantity=('quantidade', 'sum'),
+            item_count=('item_id', 'count'),
+            order_count=('order_id', 'nunique'),
+            first_order_date=('date', 'min'),
+            last_order_date=('date', 'max'),
+        ).reset_index()
+        grouped['target_currency'] = target_currency
+        return grouped
+
+    @staticmethod
+    def _insert(session, cells: List[pd.DataFrame]) -> int:
+        frames = [cell for cell in cells if not cell.empty]
+        if not frames:
+            return 0
+
+        rows = pd.concat(frames, ignore_index=True)
+        rows['first_order_date'] = rows['first_order_date'].dt.date
+        rows['last_order_date'] = rows['last_order_date'].dt.date
+        records = rows.astype(object).where(rows.notna(), None).to_dict('records')
+        for record in records:
+            for key in ('lead_id', 'client_id', 'user_id', 'item_count', 'order_count'):
+                if record[key] is not None:
+                    record[key] = int(record[key])
+        session.execute(insert(SalesCubeCell), records)
+        return len(records)
+
+    # ------------------------------------------------------------------
+    # Read API
+    # ------------------------------------------------------------------
+
+    def load_cells(self, target_currency: str = 'BRL', user_id: Optional[int] = None) -> pd.DataFrame:
+        """
+        Cube rows rolled up to (month, client) with current lead name and country.
+
+        Columns: ``mes_ano`` (Period), ``cliente``, ``pais``, ``valor``, ``quantidade``,
+        ``itens``, ``primeira_compra``, ``ultima_compra``.
+        """
+        self.ensure_current()
+        with session_scope() as session:
+            query = (
+                session.query(
+                    SalesCubeCell.month,
+                    SalesCubeCell.lead_id,
+                    SalesCubeCell.client_id,
+                    CRMLead.name,
+                    CRMLead.country,
+                    func.sum(SalesCubeCell.revenue),
+                    func.sum(SalesCubeCell.quantity),
+                    func.sum(SalesCubeCell.item_count),
+                    func.min(SalesCubeCell.first_order_date),
+                    func.max(SalesCubeCell.last_order_date),
+                )
+                .outerjoin(CRMLead, CRMLead.id == SalesCubeCell.lead_id)
+                .filter(SalesCubeCell.target_currency == target_currency.upper())
+            )
+            if user_id:
+                query = query.filter(SalesCubeCell.user_id == user_id)
+            rows = query.group_by(
+                SalesCubeCell.month, SalesCubeCell.lead_id, SalesCubeCell.client_id, CRMLead.name, CRMLead.country,
+            ).all()
+
+        columns = [
+            'month', 'lead_id', 'client_id', 'lead_name', 'lead_country',
+            'valor', 'quantidade', 'itens', 'primeira_compra', 'ultima_compra',
+        ]
+        cells = pd.DataFrame(rows, columns=columns)
+        if cells.empty:
+            return cells
+
+        # Mesmas regras de nome/país do SalesRepository
+        lead_names = cells['lead_name'].fillna('').astype(str).str.strip()
+        has_client = cells['client_id'].notna().to_numpy()
+        client_labels = 'Cliente #' + cells['client_id'].astype('Int64').astype(str)
+        cells['cliente'] = np.where(
+            lead_names != '',
+            lead_names,
+            np.where(has_client, client_labels, 'Cliente não identificado'),
+        )
+        cells['pais'] = cells['lead_country'].fillna('Brasil')
+        cells['mes_ano'] = pd.to_datetime(cells['month']).dt.to_period('M')
+        for column in ('valor', 'quantidade'):
+            cells[column] = cells[column].astype(float)
+        cells['primeira_compra'] = pd.to_datetime(cells['primeira_compra'])
+        cells['ultima_compra'] = pd.to_datetime(cells['ultima_compra'])
+        return cells[['mes_ano', 'cliente', 'pais', 'valor', 'quantidade', 'itens', 'primeira_compra', 'ultima_compra']]
+
+    def count_rows(self) -> Dict[str, int]:
+        with session_scope() as session:
+            return {
+                currency: int(count)
+                for currency, count in session.query(SalesCubeCell.target_currency, func.count(SalesCubeCell.id))
+                .group_by(SalesCubeCell.target_currency)
+            }
+
+
+__all__ = ['SalesCubeService', 'month_start']
@@ -1,11 +1,14 @@
-import csv
-import requests
-import io
-from datetime import datetime
-from typing import List, Dict, Any
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any, Optional
+
+from .sheet_ingest import (
+    DEFAULT_BATCH_SIZE, CsvExportRangeSource, drop_blank_rows, iter_sheet_batches,
+    parse_br_numbers, parse_dates,
+)
 
 class SheetImporter:
-    def __init__(self, sheet_url: str):
+    def __init__(self, sheet_url: str = '', source=None, batch_size: int = DEFAULT_BATCH_SIZE):
         # Convert view URL to export URL if needed
         if '/edit' in sheet_url:
             self.csv_url = sheet_url.replace('/edit?usp=sharing', '/export?format=csv')
@@ -13,55 +16,72 @@ class SheetImporter:
         else:
             self.csv_url = sheet_url
 
-    def import_transactions(self) -> List[Dict[str, Any]]:
+        # Any object with read_range(first_row, last_row); LocalCsvSource works offline
+        self.source = source or CsvExportRangeSource(self.csv_url, last_column='D')
+        self.batch_size = batch_size
+        self.last_row: Optional[int] = None
+
+    @property
+    def sheet_key(self) -> str:
+        return getattr(self.source, 'path', None) or self.csv_url
+
+    def import_transactions(self, start_row: int = 2) -> List[Dict[str, Any]]:
         """
-        Import transactions from public Google Sheet CSV
+        Import transactions from public Google Sheet CSV, in row batches.
+
+        Args:
+            start_row: First sheet row to read (watermark + 1 for incremental syncs)
+
+        After a successful call, ``self.last_row`` holds the last non-empty row read.
         """
+        self.last_row = None
         try:
-            response = requests.get(self.csv_url)
-            response.raise_for_status()
-            
-            # Decode content
-            content = response.content.decode('utf-8')
-            
-            # Parse CSV
-            reader = csv.DictReader(io.StringIO(content))
-            
             transactions = []
-            
-            for row in reader:
-                # Expected columns: Data, Descrição, Valor, Tipo
-                if not row['Data'] or not row['Valor']:
-                    continue
-                    
-                # Parse Date (DD/MM/YYYY)
-                try:
-                    date_obj = datetime.strptime(row['Data'], '%d/%m/%Y').date()
-                except ValueError:
-                    continue # Skip invalid dates
-                
-                # Parse Amount (Handle "1.234,56" or "1234.56" or "199,9")
-                amount_str = row['Valor'].replace('.', '').replace(',', '.')
-                try:
-                    amount = float(amount_str)
-                except ValueError:
-                    continue
-                    
-                # Determine Type
-                # If amount is negative, it's expense. If positive, revenue.
-                # The sheet has 'Tipo' column (CRÉDITO/DÉBITO) but amount sign is safer if consistent
-                t_type = 'revenue' if amount > 0 else 'expense'
-                
-                transactions.append({
-                    'date': date_obj,
-                    'description': row['Descrição'],
-                    'amount': amount,
-                    'type': t_type,
-                    'source': 'caixinha_sheet'
-                })
-                
+            last_row = start_row - 1
+            for batch_last_row, frame in iter_sheet_batches(self.source, start_row, self.batch_size):
+                transactions.extend(self._normalize_frame(frame))
+                last_row = max(last_row, batch_last_row)
+
+            self.last_row = last_row
             return transactions
-            
+
         except Exception as e:
             print(f"Error importing sheet: {e}")
             return []
+
+    @staticmethod
+    def _normalize_frame(frame) -> List[Dict[str, Any]]:
+        # Expected columns: Data, Descrição, Valor, Tipo
+        frame = drop_blank_rows(frame, ['Data', 'Valor'])
+        if frame.empty or 'Data' not in frame.columns or 'Valor' not in frame.columns:
+            return []
+
+        # Parse Date (DD/MM/YYYY) and Amount ("1.234,56", "1234.56", "199,9") in one pass
+        dates = parse_dates(frame['Data'], formats=('%d/%m/%Y',))
+        amounts = parse_br_numbers(frame['Valor'])
+        valid = dates.notna() & amounts.notna()  # Skip invalid dates/amounts
+        if not valid.any():
+            return []
+
+        # If amount is negative, it's expense. If positive, revenue.
+        # The sheet has 'Tipo' column (CRÉDITO/DÉBITO) but amount sign is safer if consistent
+        amounts = amounts[valid]
+        if 'Descrição' in frame.columns:
+            descriptions = frame.loc[valid, 'Descrição']
+        else:
+            descriptions = pd.Series('', index=amounts.index)
+        return [
+            {
+                'date': txn_date,
+                'description': description,
+                'amount': float(amount),
+                'type': txn_type,
+                'source': 'caixinha_sheet'
+            }
+            for txn_date, description, amount, txn_type in zip(
+                dates[valid].dt.date,
+                descriptions,
+                amounts,
+                np.where(amounts > 0, 'revenue', 'expense'),
+            )
+        ]
@@ -0,0 +1,225 @@
+"""Sheet ingestion stage - batched A1 range reads, vectorized parsing and row watermarks.
+
+Sources expose ``read_range(first_row, last_row)`` (1-based, inclusive), so a sheet is
+read in fixed-size batches instead of ``get_all_values()``. Each batch becomes a
+DataFrame that is parsed in one pandas pass; ``SheetWatermarkStore`` remembers the last
+row imported per sheet so re-syncs start after it.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import itertools
+from datetime import datetime
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import requests
+from sqlalchemy.orm import Session
+
+from ..models import SheetImportWatermark
+
+DEFAULT_BATCH_SIZE = 500
+DATE_FORMATS: Tuple[str, ...] = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%Y/%m/%d')
+ROW_COLUMN = '_row'
+
+
+# -------------------------------------------------------------------------
+# Sources
+# -------------------------------------------------------------------------
+
+class GspreadRangeSource:
+    """Reads A1 ranges from a gspread worksheet (``worksheet.get('A2:E501')``)."""
+
+    def __init__(self, worksheet, last_column: str = 'Z'):
+        self.worksheet = worksheet
+        self.last_column = last_column
+
+    def read_range(self, first_row: int, last_row: int) -> List[List[str]]:
+        return self.worksheet.get(f'A{first_row}:{self.last_column}{last_row}')
+
+
+class CsvExportRangeSource:
+    """
+    Reads ranges from a Google Sheets CSV export URL (``&range=A2:Z501``).
+
+    Plain CSV URLs ignore ``range``; in that case the file is downloaded once and
+    sliced locally.
+    """
+
+    def __init__(self, csv_url: str, last_column: str = 'Z', timeout: int = 30):
+        self.csv_url = csv_url
+        self.last_column = last_column
+        self.timeout = timeout
+        self._full_rows: Optional[List[List[str]]] = None
+
+    def read_range(self, first_row: int, last_row: int) -> List[List[str]]:
+        if self._full_rows is not None:
+            return self._full_rows[first_row - 1:last_row]
+
+        separator = '&' if '?' in self.csv_url else '?'
+        url = f'{self.csv_url}{separator}range=A{first_row}:{self.last_column}{last_row}'
+        response = requests.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        rows = list(csv.reader(io.StringIO(response.content.decode('utf-8'))))
+
+        if len(rows) > last_row - first_row + 1:
+            # Servidor ignorou o range: guardar o arquivo inteiro e fatiar localmente
+            self._full_rows = rows
+            return rows[first_row - 1:last_row]
+        return rows
+
+
+class LocalCsvSource:
+    """Offline stand-in for a sheet: a CSV file read range by range."""
+
+    def __init__(self, path: str, encoding: str = 'utf-8'):
+        self.path = path
+        self.encoding = encoding
+
+    def read_range(self, first_row: int, last_row: int) -> List[List[str]]:
+        with open(self.path, newline='', encoding=self.encoding) as fp:
+            return list(itertools.islice(csv.reader(fp), first_row - 1, last_row))
+
+
+# -------------------------------------------------------------------------
+# Batches
+# -------------------------------------------------------------------------
+
+def read_header(source) -> List[str]:
+    rows = source.read_range(1, 1)
+    return [str(cell).strip() for cell in rows[0]] if rows else []
+
+
+def iter_sheet_batches(
+    source,
+    start_row: int = 2,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    header: Optional[Sequence[str]] = None,
+) -> Iterator[Tuple[int, pd.DataFrame]]:
+    """
+    Yield ``(last_filled_row, frame)`` batches starting at ``start_row``.
+
+    Frames have one column per header cell (missing cells as '') plus ``_row``
+    with the 1-based sheet row number. Iteration stops at the first short batch.
+    """
+    header = list(header) if header is not None else read_header(source)
+    if not header:
+        return
+
+    first_row = max(start_row, 2)
+    width = len(header)
+    while True:
+        last_row = first_row + batch_size - 1
+        rows = source.read_range(first_row, last_row)
+        if not rows:
+            return
+
+        padded = [(list(row) + [''] * width)[:width] for row in rows]
+        frame = pd.DataFrame(padded, columns=header, dtype=str)
+        frame[ROW_COLUMN] = range(first_row, first_row + len(rows))
+
+        # Linhas em branco no fim não avançam o watermark (podem ser preenchidas depois)
+        filled = [index for index, row in enumerate(rows) if any(str(cell).strip() for cell in row)]
+        last_data_row = first_row + filled[-1] if filled else first_row - 1
+        yield last_data_row, frame
+
+        if len(rows) < batch_size:
+            return
+        first_row = last_row + 1
+
+
+def drop_blank_rows(frame: pd.DataFrame, columns: Sequence[str]) -> pd.DataFrame:
+    """Remove rows whose given columns are all empty."""
+    present = [col for col in columns if col in frame.columns]
+    if not present:
+        return frame.iloc[0:0]
+    filled = frame[present].apply(lambda col: col.fillna('').str.strip() != '').any(axis=1)
+    return frame[filled]
+
+
+# -------------------------------------------------------------------------
+# Vectorized parsing
+# -------------------------------------------------------------------------
+
+def parse_br_numbers(series: pd.Series) -> pd.Series:
+    """'R$ 1.234,56' / '199,9' -> float (NaN when invalid)."""
+    cleaned = (
+        series.fillna('').astype(str)
+        .str.replace('R$', '', regex=False)
+        .str.strip()
+        .str.replace('.', '', regex=False)
+        .str.replace(',', '.', regex=False)
+    )
+    return pd.to_numeric(cleaned, errors='coerce')
+
+
+def parse_dates(series: pd.Series, formats: Sequence[str] = DATE_FORMATS) -> pd.Series:
+    """Parse with each explicit format in turn, only over rows still unparsed."""
+    values = series.fillna('').astype(str).str.strip()
+    parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    for fmt in formats:
+        missing = parsed.isna() & (values != '')
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(values[missing], format=fmt, errors='coerce')
+    return parsed
+
+
+def parse_month_dates(series: pd.Series, day: int = 15) -> pd.Series:
+    """'08/2025', '1/24', '2025-08' -> that month's ``day`` (NaT when invalid)."""
+    values = series.fillna('').astype(str).str.strip()
+
+    month_year = values.str.extract(r'^(\d{1,2})/(\d{2}|\d{4})$')
+    month = pd.to_numeric(month_year[0], errors='coerce')
+    year = pd.to_numeric(month_year[1], errors='coerce')
+    short_year = month_year[1].str.len() == 2
+    # Ano com 2 dígitos: > 50 => século passado
+    year = year.where(~short_year, year + 1900).where(~(short_year & (year <= 50)), year + 2000)
+
+    iso = values.str.extract(r'^(\d{4})-(\d{2})$')
+    year = year.fillna(pd.to_numeric(iso[0], errors='coerce'))
+    month = month.fillna(pd.to_numeric(iso[1], errors='coerce'))
+
+    valid = month.between(1, 12) & year.notna()
+    parts = pd.DataFrame({
+        'year': year.where(valid, 1970),
+        'month': month.where(valid, 1),
+        'day': day,
+    }).astype(int)
+    dates = pd.to_datetime(parts, errors='coerce')
+    return dates.where(valid)
+
+
+# -------------------------------------------------------------------------
+# Watermarks
+# -------------------------------------------------------------------------
+
+class SheetWatermarkStore:
+    """Last imported row per sheet, stored in ``sheet_import_watermarks``."""
+
+    @staticmethod
+    def get(session: Session, sheet_key: str) -> int:
+        row = session.query(SheetImportWatermark).filter(SheetImportWatermark.sheet_key == sheet_key).first()
+        return int(row.last_row) if row else 1
+
+    @staticmethod
+    def set(session: Session, sheet_key: str, last_row: int) -> None:
+        row = session.query(SheetImportWatermark).filter(SheetImportWatermark.sheet_key == sheet_key).first()
+        if row is None:
+            session.add(SheetImportWatermark(sheet_key=sheet_key, last_row=last_row))
+        elif last_row > row.last_row:
+            row.last_row = last_row
+            row.updated_at = datetime.utcnow()
+
+    @staticmethod
+    def reset(session: Session, sheet_key: str) -> None:
+        session.query(SheetImportWatermark).filter(SheetImportWatermark.sheet_key == sheet_key).delete()
+
+
+__all__ = [
+    'GspreadRangeSource', 'CsvExportRangeSource', 'LocalCsvSource', 'SheetWatermarkStore',
+    'read_header', 'iter_sheet_batches', 'drop_blank_rows',
+    'parse_br_numbers', 'parse_dates', 'parse_month_dates',
+]
@@ -0,0 +1,375 @@
+"""Transaction search service - full-text search over ledger descriptions.
+
+PostgreSQL: ``tsvector`` (portuguese) + GIN, ``unaccent`` and ``pg_trgm`` for partial words.
+SQLite: FTS5 external-content table kept in sync by triggers.
+Other dialects (or a database where migration 002 has not run) fall back to ``ILIKE``.
+
+The extensions, indexes and triggers are created by migration 002 (``create_index``);
+at runtime the service only detects whether they exist.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from markupsafe import escape
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..db import get_engine
+
+logger = logging.getLogger(__name__)
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+# Delimitadores neutros pedidos ao banco; a descrição é escapada antes de virarem <mark>
+_SENTINEL_START = '\x02'
+_SENTINEL_END = '\x03'
+_HEADLINE_OPTIONS = f'StartSel={_SENTINEL_START}, StopSel={_SENTINEL_END}, HighlightAll=true'
+# Caractere de escape dos padrões LIKE montados a partir do texto digitado
+LIKE_ESCAPE = '\\'
+
+# Sem índice (migração 002 pendente) a detecção é refeita depois deste intervalo
+BACKEND_RECHECK_SECONDS = 300
+
+# unaccent() is only STABLE; an IMMUTABLE wrapper is required to use it in index expressions
+_PG_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS
+    $$ SELECT public.unaccent('public.unaccent', $1) $$
+    """,
+]
+
+# CONCURRENTLY: the ledger stays writable while the GIN indexes are built
+_PG_INDEXES = {
+    'ix_transactions_description_fts': """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_description_fts
+        ON transactions USING GIN (to_tsvector('portuguese', f_unaccent(coalesce(description, ''))))
+    """,
+    'ix_transactions_description_trgm': """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_description_trgm
+        ON transactions USING GIN (lower(f_unaccent(coalesce(description, ''))) gin_trgm_ops)
+    """,
+}
+
+_PG_DETECT = """
+    SELECT to_regprocedure('f_unaccent(text)') IS NOT NULL
+       AND to_regprocedure('similarity(text, text)') IS NOT NULL
+       AND (
+           SELECT count(*) FROM pg_index
+           WHERE indisvalid AND indexrelid IN (
+               to_regclass('ix_transactions_description_fts'),
+               to_regclass('ix_transactions_description_trgm')
+           )
+       ) = 2
+"""
+
+_SQLITE_SETUP = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+        description,
+        content='transactions',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts(rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_ad AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description)
+        VALUES ('delete', old.id, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_au AFTER UPDATE OF description ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description)
+        VALUES ('delete', old.id, old.description);
+        INSERT INTO transactions_fts(rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+]
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def escape_like(value: str) -> str:
+    """Escape ``%``, ``_`` and the escape character so user input matches literally in LIKE."""
+    return (
+        value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2)
+        .replace('%', LIKE_ESCAPE + '%')
+        .replace('_', LIKE_ESCAPE + '_')
+    )
+
+
+class TransactionSearchService:
+    """
+    Ranked, highlighted search over ``transactions.description``.
+
+    The backend is detected on the first search and kept for the process; a missing
+    index (migration 002 not applied yet) is detected again every
+    ``BACKEND_RECHECK_SECONDS`` instead of pinning the process to ``ILIKE``.
+    """
+
+    def __init__(self, engine: Optional[Engine] = None):
+        self._engine = engine
+        self._backend: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self) -> Engine:
+        return self._engine or get_engine()
+
+    # ------------------------------------------------------------------
+    # Index management
+    # ------------------------------------------------------------------
+
+    def create_index(self) -> str:
+        """
+        Create the search index for the current dialect (migration 002).
+
+        PostgreSQL indexes are built with ``CREATE INDEX CONCURRENTLY`` on an
+        autocommit connection; an invalid index left by an interrupted build is
+        dropped and built again.
+
+        Returns:
+            Backend detected afterwards: 'postgres', 'sqlite_fts5' or 'like'
+        """
+        dialect = self.engine.dialect.name
+        try:
+            if dialect == 'postgresql':
+                with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                    for statement in _PG_SETUP:
+                        conn.execute(text(statement))
+                    for name, statement in _PG_INDEXES.items():
+                        invalid = conn.execute(
+                            text("SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(:name) AND NOT indisvalid"),
+                            {'name': name},
+                        ).first()
+                        if invalid:
+                            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                        conn.execute(text(statement))
+            elif dialect == 'sqlite':
+                with self.engine.begin() as conn:
+                    created = not self._sqlite_fts_exists(conn)
+                    for statement in _SQLITE_SETUP:
+                        conn.execute(text(statement))
+                    if created:
+                        # Populate from existing ledger rows
+                        conn.execute(text("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')"))
+        except SQLAlchemyError as exc:
+            logger.warning("Não foi possível criar o índice de busca (%s): %s", dialect, exc)
+
+        with self._lock:
+            self._backend = None
+        return self.detect_backend()
+
+    def detect_backend(self) -> str:
+        """
+        Detect which search backend the database supports; never runs DDL.
+
+        Returns:
+            Backend in use: 'postgres', 'sqlite_fts5' or 'like'
+        """
+        if self._backend_is_fresh():
+            return self._backend
+
+        with self._lock:
+            if self._backend_is_fresh():
+                return self._backend
+
+            dialect = self.engine.dialect.name
+            backend = 'like'
+            try:
+                with self.engine.connect() as conn:
+                    if dialect == 'postgresql' and conn.execute(text(_PG_DETECT)).scalar():
+                        backend = 'postgres'
+                    elif dialect == 'sqlite' and self._sqlite_fts_exists(conn):
+                        backend = 'sqlite_fts5'
+            except SQLAlchemyError as exc:
+                logger.warning("Falha ao detectar o índice de busca (%s): %s", dialect, exc)
+            if backend == 'like' and dialect in ('postgresql', 'sqlite'):
+                logger.warning(
+                    "Índice de busca de lançamentos ausente (%s); usando ILIKE até a migração 002 rodar",
+                    dialect,
+                )
+
+            self._backend = backend
+            self._checked_at = time.monotonic()
+            return backend
+
+    def _backend_is_fresh(self) -> bool:
+        if self._backend is None:
+            return False
+        return self._backend != 'like' or time.monotonic() - self._checked_at < BACKEND_RECHECK_SECONDS
+
+    def rebuild_index(self) -> str:
+        """Rebuild the SQLite FTS table from the ledger (no-op on PostgreSQL)."""
+        backend = self.detect_backend()
+        if backend == 'sqlite_fts5':
+            with self.engine.begin() as conn:
+                conn.execute(text("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')"))
+        return backend
+
+    @staticmethod
+    def _sqlite_fts_exists(conn: Connection) -> bool:
+        row = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions_fts'")
+        ).first()
+        return row is not None
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(self, query: str, account_id: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Search transaction descriptions.
+
+        Args:
+            query: Free text typed by the user
+            account_id: Internal ``accounts.id`` to filter on (optional)
+            limit: Maximum number of hits
+
+        Returns:
+            List of ``{'id', 'rank', 'highlight'}`` ordered by relevance, then date
+        """
+        query = (query or '').strip()
+        if not query:
+            return []
+
+        backend = self.detect_backend()
+        if backend == 'postgres':
+            return self._search_postgres(query, account_id, limit)
+        if backend == 'sqlite_fts5':
+            match = self._fts5_match_expression(query)
+            if match:
+                return self._search_sqlite(match, account_id, limit)
+        return self._search_like(query, account_id, limit)
+
+    def _search_postgres(self, query: str, account_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        sql = """
+            WITH q AS (
+                SELECT websearch_to_tsquery('portuguese', f_unaccent(:query)) AS tsq,
+                       lower(f_unaccent(:query)) AS plain,
+                   lower(f_unaccent(:like_query)) AS like_plain
+            )
+            SELECT t.id,
+                   ts_rank_cd(to_tsvector('portuguese', f_unaccent(coalesce(t.description, ''))), q.tsq)
+                     + similarity(lower(f_unaccent(coalesce(t.description, ''))), q.plain) AS rank,
+                   ts_headline('portuguese', coalesce(t.description, ''), q.tsq, :headline_options) AS highlight
+            FROM transactions t, q
+            WHERE (
+                to_tsvector('portuguese', f_unaccent(coalesce(t.description, ''))) @@ q.tsq
+                OR lower(f_unaccent(coalesce(t.description, ''))) LIKE '%' || q.like_plain || '%' ESCAPE :escape
+            )
+        """
+        params: Dict[str, Any] = {
+            'query': query,
+            'like_query': escape_like(query),
+            'escape': LIKE_ESCAPE,
+            'limit': limit,
+            'headline_options': _HEADLINE_OPTIONS,
+        }
+        if account_id:
+            sql += " AND t.account_id = :account_id"
+            params['account_id'] = account_id
+        sql += " ORDER BY rank DESC, t.date DESC, t.id DESC LIMIT :limit"
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(sql), params).all()
+
+        hits = []
+        for row in rows:
+            marked = row.highlight or ''
+            # ts_headline does not mark partial (trigram) matches; mark them in Python
+            if _SENTINEL_START not in marked:
+                marked = self._mark(marked, query)
+            hits.append({'id': row.id, 'rank': float(row.rank or 0), 'highlight': self._render(marked)})
+        return hits
+
+    def _search_sqlite(self, match: str, account_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        sql = """
+            SELECT t.id,
+                   -bm25(transactions_fts) AS rank,
+                   highlight(transactions_fts, 0, char(2), char(3)) AS highlight
+            FROM transactions_fts
+            JOIN transactions t ON t.id = transactions_fts.rowid
+            WHERE transactions_fts MATCH :match
+        """
+        params: Dict[str, Any] = {'match': match, 'limit': limit}
+        if account_id:
+            sql += " AND t.account_id = :account_id"
+            params['account_id'] = account_id
+        sql += " ORDER BY bm25(transactions_fts), t.date DESC, t.id DESC LIMIT :limit"
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(sql), params).all()
+        return [
+            {'id': row.id, 'rank': float(row.rank or 0), 'highlight': self._render(row.highlight or '')}
+            for row in rows
+        ]
+
+    def _search_like(self, query: str, account_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        sql = "SELECT t.id, t.description FROM transactions t WHERE lower(t.description) LIKE :pattern ESCAPE :escape"
+        params: Dict[str, Any] = {'pattern': f'%{escape_like(query.lower())}%', 'escape': LIKE_ESCAPE, 'limit': limit}
+        if account_id:
+            sql += " AND t.account_id = :account_id"
+            params['account_id'] = account_id
+        sql += " ORDER BY t.date DESC, t.id DESC LIMIT :limit"
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(sql), params).all()
+        return [
+            {'id': row.id, 'rank': 0.0, 'highlight': self.highlight(row.description or '', query)}
+            for row in rows
+        ]
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _fts5_match_expression(query: str) -> str:
+        """Turn user input into an FTS5 prefix query (``"pix"* "mercado"*``), quoting every token."""
+        tokens = _TOKEN_RE.findall(query)
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    @staticmethod
+    def _mark(description: str, query: str) -> str:
+        """Wrap case-insensitive occurrences of the query tokens with the sentinel delimiters."""
+        tokens = sorted(set(_TOKEN_RE.findall(query)), key=len, reverse=True)
+        if not tokens or not description:
+            return description
+        pattern = re.compile('|'.join(re.escape(token) for token in tokens), re.IGNORECASE)
+        return pattern.sub(lambda m: f'{_SENTINEL_START}{m.group(0)}{_SENTINEL_END}', description)
+
+    @staticmethod
+    def _render(marked: str) -> str:
+        """HTML-escape a sentinel-marked description, then turn the sentinels into <mark> tags."""
+        return (
+            str(escape(marked))
+            .replace(_SENTINEL_START, HIGHLIGHT_START)
+            .replace(_SENTINEL_END, HIGHLIGHT_END)
+        )
+
+    @classmethod
+    def highlight(cls, description: str, query: str) -> str:
+        """HTML-safe description with case-insensitive occurrences of the query tokens in <mark>."""
+        clean = (description or '').replace(_SENTINEL_START, '').replace(_SENTINEL_END, '')
+        return cls._render(cls._mark(clean, query))
+
+
+__all__ = ['LIKE_ESCAPE', 'TransactionSearchService', 'escape_like']
@@ -1,7 +1,7 @@
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from datetime import datetime, timedelta
-from sqlalchemy import extract, func, or_, and_
+from sqlalchemy import or_, and_
 from sqlalchemy.orm import Session
 
 from ..models import Transaction, Account, Category
@@ -9,10 +9,13 @@ from ..db import session_scope
 from ..ofx_parser import OFXParser
 from ..ml_categorizer import MLCategorizer
 from .sheet_importer import SheetImporter
+from .sheet_ingest import SheetWatermarkStore
+from .ledger_rollup_service import LedgerRollupService
 
 class TransactionService:
-    def __init__(self):
+    def __init__(self, rollup_service: Optional[LedgerRollupService] = None):
         self.ml_categorizer = MLCategorizer()
+        self.rollups = rollup_service or LedgerRollupService()
 
     def list_transactions(self, 
                          start_date: Optional[datetime] = None, 
@@ -36,6 +39,7 @@ class TransactionService:
     def create_transaction(self, data: Dict[str, Any]) -> Transaction:
         """Create a single transaction"""
         with session_scope() as session:
+            self.rollups.ensure_built(session)
             transaction = Transaction(
                 account_id=data['account_id'],
                 date=data['date'],
@@ -51,6 +55,10 @@ class TransactionService:
                 self._predict_category(session, transaction)
                 
             session.add(transaction)
+
+            deltas = {}
+            self.rollups.accumulate(deltas, transaction)
+            self.rollups.apply_deltas(session, deltas)
             session.commit()
             return transaction
 
@@ -72,6 +80,8 @@ class TransactionService:
         stats = {'imported': 0, 'skipped': 0}
         
         with session_scope() as session:
+            self.rollups.ensure_built(session)
+            deltas = {}
             for t_data in transactions_data:
                 # Check for duplicates (same account, date, amount, description)
                 exists = session.query(Transaction).filter(
@@ -101,18 +111,29 @@ class TransactionService:
                 self._predict_category(session, transaction)
                 
                 session.add(transaction)
+                self.rollups.accumulate(deltas, transaction)
                 stats['imported'] += 1
+
+            self.rollups.apply_deltas(session, deltas)
                 
         return stats
 
-    def import_from_sheet(self, sheet_url: str, account_id: int) -> Dict[str, int]:
-        """Import transactions from Google Sheet"""
-        importer = SheetImporter(sheet_url)
-        transactions_data = importer.import_transactions()
+    def import_from_sheet(self, sheet_url: str, account_id: int, full_resync: bool = False,
+                          importer: Optional[SheetImporter] = None) -> Dict[str, int]:
+        """Import transactions from Google Sheet, starting after the last imported row"""
+        importer = importer or SheetImporter(sheet_url)
+        watermark_key = f"transactions:{account_id}:{importer.sheet_key}"
+
+        with session_scope() as session:
+            start_row = 2 if full_resync else SheetWatermarkStore.get(session, watermark_key) + 1
+
+        transactions_data = importer.import_transactions(start_row=start_row)
         
         stats = {'imported': 0, 'skipped': 0}
         
         with session_scope() as session:
+            self.rollups.ensure_built(session)
+            deltas = {}
             for t_data in transactions_data:
                 # Check for duplicates
                 exists = session.query(Transaction).filter(
@@ -132,14 +153,18 @@ class TransactionService:
                     description=t_data['description'],
                     amount=t_data['amount'],
                     type=t_data['type'],
-                    original_description=t_data['description'],
-                    source_file='google_sheet'
+                    original_description=t_data['description']
                 )
                 
                 self._predict_category(session, transaction)
                 
                 session.add(transaction)
+                self.rollups.accumulate(deltas, transaction)
                 stats['imported'] += 1
+
+            self.rollups.apply_deltas(session, deltas)
+            if importer.last_row is not None:
+                SheetWatermarkStore.set(session, watermark_key, importer.last_row)
                 
         return stats
 
@@ -151,6 +176,9 @@ class TransactionService:
                 return None
             
             old_category_id = transaction.category_id
+            self.rollups.ensure_built(session)
+            deltas = {}
+            self.rollups.accumulate(deltas, transaction, sign=-1)
             
             # Update fields
             if 'category_id' in data:
@@ -160,7 +188,9 @@ class TransactionService:
                 transaction.description = data['description']
             if 'type' in data:
                 transaction.type = data['type']
-                
+
+            self.rollups.accumulate(deltas, transaction)
+            self.rollups.apply_deltas(session, deltas)
             session.commit()
             
             # Trigger ML training if category changed
@@ -201,31 +231,22 @@ class TransactionService:
         )
 
     def get_monthly_result(self, year: int, month: int) -> Dict[str, float]:
-        """Calculate DRE for a specific month"""
-        with session_scope() as session:
-            # Revenue
-            revenue = session.query(func.sum(Transaction.amount)).filter(
-                extract('year', Transaction.date) == year,
-                extract('month', Transaction.date) == month,
-                Transaction.type == 'revenue'
-            ).scalar() or 0
-            
-            # Expense
-            expense = session.query(func.sum(Transaction.amount)).filter(
-                extract('year', Transaction.date) == year,
-                extract('month', Transaction.date) == month,
-                Transaction.type == 'expense'
-            ).scalar() or 0
-            
-            return {
-                'revenue': float(revenue),
-                'expense': float(expense),
-                'result': float(revenue) + float(expense) # Expense is usually negative in DB? 
-                # Wait, if I store expense as negative, then sum is correct. 
-                # If I store absolute value and use type, then I need to subtract.
-                # My import logic stores amount as is from OFX (negative for expense).
-                # So sum is correct.
-            }
+        """Calculate DRE for a specific month from the monthly ledger rollup"""
+        # Expense amounts are stored as they come from OFX (negative),
+        # so revenue + expense is the net result.
+        return self.rollups.get_monthly_result(year, month)
+
+    def get_year_over_year(self, year: int, month: int) -> Dict[str, Any]:
+        """Compare a month's DRE with the same month of the previous year"""
+        return self.rollups.get_year_over_year(year, month)
+
+    def get_category_breakdown(self, year: int, month: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Totals per category for a month (or whole year)"""
+        return self.rollups.get_category_breakdown(year, month)
+
+    def rebuild_rollups(self, year: Optional[int] = None) -> int:
+        """Recompute the monthly rollup from the ledger (backfills)"""
+        return self.rollups.rebuild(year)
 
     def detect_transfers(self) -> List[Dict[str, Any]]:
         """
@@ -290,6 +311,11 @@ class TransactionService:
             t2 = session.query(Transaction).get(inbound_id)
             
             if t1 and t2:
+                self.rollups.ensure_built(session)
+                deltas = {}
+                self.rollups.accumulate(deltas, t1, sign=-1)
+                self.rollups.accumulate(deltas, t2, sign=-1)
+
                 t1.transfer_id = t2.id
                 t2.transfer_id = t1.id
                 
@@ -301,5 +327,8 @@ class TransactionService:
                     
                 t1.type = 'transfer'
                 t2.type = 'transfer'
-                
+
+                self.rollups.accumulate(deltas, t1)
+                self.rollups.accumulate(deltas, t2)
+                self.rollups.apply_deltas(session, deltas)
                 session.commit()